@@ -15,6 +15,24 @@ def create_app(config_name='default'):
     
     # Import WebSocket handlers
     from app import websocket_handlers
+
+    # Register background job handlers
+    from app import job_queue
+    from app.modules.loyalty import loyalty_service
+
+    # Keep the dashboard rollups, table statuses, menu ratings, stock, campaign totals,
+    # the menu catalog, campaign rules and settings versions and the user cache current on every write
+    from app import user_cache
+    from app.modules.admin import (
+        rollup_service, occupancy_service, settings_service, campaign_stats_service, loyalty_overview_service
+    )
+    from app.modules.customer import rating_service
+    from app.modules.loyalty import campaign_service, ledger_service
+    from app.modules.menu import catalog_service, stock_service, popularity_service
+
+    # Register maintenance CLI commands
+    from app.commands import register_commands
+    register_commands(app)
     
     # Register blueprints
     from app.modules.auth import bp as auth_bp
@@ -77,4 +95,7 @@ def create_app(config_name='default'):
 
         return dict(get_system_setting=get_system_setting)
 
+    # Pick up background jobs left queued by the last run
+    job_queue.start_workers(app)
+
     return app
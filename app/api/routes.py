@@ -4,6 +4,8 @@ from app.api import bp
 from app.models import MenuItem, Category, Order, OrderItem, User, Table, Service, ServiceRequest, TableSession
 from app.extensions import db
 from datetime import datetime
+from decimal import Decimal
+import random
 import uuid
 
 @bp.route('/health')
@@ -15,36 +17,13 @@ def health():
 def get_menu_items():
     """Get all available menu items"""
     try:
-        items = MenuItem.query.filter_by(status='available').all()
-        menu_items = []
-
-        for item in items:
-            # Get default image URL based on category
-            default_images = {
-                'Hookah': 'https://images.unsplash.com/photo-1578662996442-48f60103fc96?w=300&h=200&fit=crop',
-                'Drinks': 'https://images.unsplash.com/photo-1544145945-f90425340c7e?w=300&h=200&fit=crop',
-                'Brunch': 'https://images.unsplash.com/photo-1533089860892-a7c6f0a88666?w=300&h=200&fit=crop',
-                'Main Courses': 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=300&h=200&fit=crop',
-                'Desserts': 'https://images.unsplash.com/photo-1551024506-0bccd828d307?w=300&h=200&fit=crop'
-            }
-
-            category_name = item.category.name if item.category else 'Main Courses'
-            image_url = item.image_url or default_images.get(category_name, 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=300&h=200&fit=crop')
-
-            menu_items.append({
-                'id': item.item_id,
-                'name': item.name,
-                'description': item.description,
-                'price': float(item.price),
-                'category': category_name,
-                'image': image_url,
-                'stock': item.stock
-            })
+        from app.modules.menu.catalog_service import get_menu_catalog
 
-        return jsonify({
-            'status': 'success',
-            'data': menu_items
-        })
+        # Serialized once per catalog version; repeat clients get a 304
+        catalog = get_menu_catalog()
+        response = current_app.response_class(catalog.items_json, mimetype='application/json')
+        response.set_etag(catalog.etag)
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -55,6 +34,10 @@ def get_menu_items():
 def get_suggested_items():
     """Get suggested menu items for cart"""
     try:
+        from app.modules.menu.catalog_service import get_menu_catalog
+
+        catalog = get_menu_catalog()
+
         # Get different types of items for variety
         suggested_items = []
         
@@ -62,14 +45,14 @@ def get_suggested_items():
         categories = ['Beverages', 'Main Courses', 'Desserts', 'Appetizers', 'Drinks']
         
         for category_name in categories:
-            # Find items from this category
-            category_items = MenuItem.query.join(Category).filter(
-                Category.name == category_name,
-                MenuItem.status == 'available'
-            ).limit(1).all()
+            # Find the first item from this category
+            category_item = next(
+                (item for item in catalog.items if item.category and item.category.name == category_name),
+                None
+            )
             
-            if category_items:
-                suggested_items.extend(category_items)
+            if category_item:
+                suggested_items.append(category_item)
             
             # Stop if we have enough items
             if len(suggested_items) >= 3:
@@ -78,29 +61,25 @@ def get_suggested_items():
         # If we don't have enough items from specific categories, get random ones
         if len(suggested_items) < 3:
             remaining_needed = 3 - len(suggested_items)
-            existing_ids = [item.item_id for item in suggested_items]
-            
-            additional_items = MenuItem.query.filter(
-                MenuItem.status == 'available',
-                ~MenuItem.item_id.in_(existing_ids) if existing_ids else True
-            ).order_by(db.func.random()).limit(remaining_needed).all()
+            existing_ids = {item.item_id for item in suggested_items}
+            candidates = [item for item in catalog.items if item.item_id not in existing_ids]
             
-            suggested_items.extend(additional_items)
+            suggested_items.extend(random.sample(candidates, min(remaining_needed, len(candidates))))
+
+        # Default image URL based on category
+        default_images = {
+            'Hookah': 'https://images.unsplash.com/photo-1578662996442-48f60103fc96?w=200&h=200&fit=crop',
+            'Beverages': 'https://images.unsplash.com/photo-1544145945-f90425340c7e?w=200&h=200&fit=crop',
+            'Drinks': 'https://images.unsplash.com/photo-1544145945-f90425340c7e?w=200&h=200&fit=crop',
+            'Brunch': 'https://images.unsplash.com/photo-1533089860892-a7c6f0a88666?w=200&h=200&fit=crop',
+            'Main Courses': 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=200&h=200&fit=crop',
+            'Desserts': 'https://images.unsplash.com/photo-1551024506-0bccd828d307?w=200&h=200&fit=crop',
+            'Appetizers': 'https://images.unsplash.com/photo-1504674900247-0877df9cc836?w=200&h=200&fit=crop'
+        }
 
         # Format response
         response_items = []
         for item in suggested_items[:3]:  # Ensure max 3 items
-            # Get default image URL based on category
-            default_images = {
-                'Hookah': 'https://images.unsplash.com/photo-1578662996442-48f60103fc96?w=200&h=200&fit=crop',
-                'Beverages': 'https://images.unsplash.com/photo-1544145945-f90425340c7e?w=200&h=200&fit=crop',
-                'Drinks': 'https://images.unsplash.com/photo-1544145945-f90425340c7e?w=200&h=200&fit=crop',
-                'Brunch': 'https://images.unsplash.com/photo-1533089860892-a7c6f0a88666?w=200&h=200&fit=crop',
-                'Main Courses': 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=200&h=200&fit=crop',
-                'Desserts': 'https://images.unsplash.com/photo-1551024506-0bccd828d307?w=200&h=200&fit=crop',
-                'Appetizers': 'https://images.unsplash.com/photo-1504674900247-0877df9cc836?w=200&h=200&fit=crop'
-            }
-
             category_name = item.category.name if item.category else 'Main Courses'
             image_url = item.image_url or default_images.get(category_name, 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=200&h=200&fit=crop')
 
@@ -143,24 +122,9 @@ def create_order():
                 'message': 'Cart is empty'
             }), 400
 
-        # Create new order using the logged-in user
-        order = Order(
-            user_id=current_user.user_id,  # Use the authenticated user's ID
-            status='new',
-            total_amount=0,  # Will be calculated
-            notes=data.get('notes', ''),
-            order_time=datetime.utcnow(),
-            table_id=data.get('table_id')  # Add table_id if provided
-        )
-
-        db.session.add(order)
-        db.session.flush()  # Get order ID
-
-        total_amount = 0
-
-        # Process each cart item
+        # Validate item ID format
+        lines = []
         for cart_item in data['items']:
-            # Validate item ID format
             item_id = cart_item['id']
             try:
                 item_id_int = int(item_id)
@@ -175,48 +139,36 @@ def create_order():
                     'message': f'Invalid item ID format: {item_id}'
                 }), 400
 
-            # Find menu item
-            menu_item = MenuItem.query.get(item_id)
-            if not menu_item:
-                return jsonify({
-                    'status': 'error',
-                    'message': f'Menu item {item_id} not found. Please refresh the page and try again.'
-                }), 400
+            lines.append((item_id_int, cart_item['quantity'], cart_item.get('specialInstructions', '')))
 
-            # Check availability
-            if menu_item.status != 'available':
-                return jsonify({
-                    'status': 'error',
-                    'message': f'{menu_item.name} is not available'
-                }), 400
-
-            # Create order item
-            order_item = OrderItem(
-                order_id=order.order_id,
-                item_id=menu_item.item_id,
-                quantity=cart_item['quantity'],
-                note=cart_item.get('specialInstructions', ''),
-                unit_price=menu_item.price
+        # Create the order and its items for the logged-in user
+        # (the occupancy tracker marks the table occupied)
+        from app.modules.order.order_service import (
+            place_order, OrderPlacementError, MenuItemNotFound, MenuItemUnavailable
+        )
+        try:
+            order = place_order(
+                current_user.user_id,
+                lines,
+                table_id=data.get('table_id'),
+                notes=data.get('notes', ''),
+                service_charge=Decimal('2.00')
             )
-
-            db.session.add(order_item)
-            total_amount += float(menu_item.price) * cart_item['quantity']
-
-        # Add service charge
-        service_charge = 2.00
-        total_amount += service_charge
-
-        # Update order total
-        order.total_amount = total_amount
-        
-        # Update table status if a table is associated with this order
-        if order.table_id:
-            table = Table.query.get(order.table_id)
-            if table:
-                table.status = 'occupied'  # Mark table as occupied for new orders
-
-        # Commit transaction
-        db.session.commit()
+        except MenuItemNotFound as e:
+            return jsonify({
+                'status': 'error',
+                'message': f'Menu item {e.item_id} not found. Please refresh the page and try again.'
+            }), 400
+        except MenuItemUnavailable as e:
+            return jsonify({
+                'status': 'error',
+                'message': f'{e.menu_item.name} is not available'
+            }), 400
+        except OrderPlacementError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
 
         # Generate order number for display
         order_number = f"ORD-{order.order_id:06d}"
@@ -227,7 +179,7 @@ def create_order():
             'data': {
                 'order_id': order.order_id,
                 'order_number': order_number,
-                'total_amount': float(total_amount),
+                'total_amount': float(order.total_amount),
                 'status': order.status,
                 'estimated_time': 25,  # Default 25 minutes
                 'order_time': order.order_time.isoformat()
@@ -306,26 +258,13 @@ def update_order_status(order_id):
         if data['status'] == 'completed':
             order.completed_at = datetime.utcnow()
 
-        # Update table status if the order has a table assigned
-        # Check table status on ANY order status change, not just completion
-        if order.table_id is not None:
-            table = order.table
-            table.update_status_based_on_orders()  # This now handles the commit
-        else:
-            # Only commit here if we didn't update a table (since update_status_based_on_orders commits)
-            db.session.commit()
-
-        # Award loyalty points when order is completed
+        # Loyalty points are awarded in the background, queued in the same commit
         if data['status'] == 'completed' and previous_status != 'completed':
-            try:
-                from app.modules.loyalty.loyalty_service import award_points_for_order
-                current_app.logger.info(f"Attempting to award points for order {order_id} to user {order.user_id}")
-                result = award_points_for_order(order_id, order.user_id)
-                current_app.logger.info(f"Point awarding result for order {order_id}: {result}")
-            except Exception as e:
-                current_app.logger.error(f"Error awarding loyalty points for order {order_id}: {str(e)}")
-                import traceback
-                current_app.logger.error(f"Traceback: {traceback.format_exc()}")
+            from app.modules.loyalty.loyalty_service import queue_points_for_order
+            queue_points_for_order(order)
+
+        # The occupancy tracker updates the table's status in the same commit
+        db.session.commit()
 
         return jsonify({
             'status': 'success',
@@ -368,17 +307,10 @@ def update_order(order_id):
                 if data['status'] == 'completed':
                     order.completed_at = datetime.utcnow()
 
-                # Award loyalty points when order is completed
+                # Loyalty points are awarded in the background once the update commits
                 if data['status'] == 'completed' and previous_status != 'completed':
-                    try:
-                        from app.modules.loyalty.loyalty_service import award_points_for_order
-                        current_app.logger.info(f"Attempting to award points for order {order_id} to user {order.user_id}")
-                        result = award_points_for_order(order_id, order.user_id)
-                        current_app.logger.info(f"Point awarding result for order {order_id}: {result}")
-                    except Exception as e:
-                        current_app.logger.error(f"Error awarding loyalty points for order {order_id}: {str(e)}")
-                        import traceback
-                        current_app.logger.error(f"Traceback: {traceback.format_exc()}")
+                    from app.modules.loyalty.loyalty_service import queue_points_for_order
+                    queue_points_for_order(order)
         
         # Update notes if provided
         if 'notes' in data:
@@ -504,7 +436,8 @@ def get_table_statuses():
     """Get detailed information about table statuses
     
     This is a debugging endpoint to help diagnose issues with table status tracking.
-    It shows each table along with its status and any active orders.
+    It shows each table along with its status and any active orders. A table is
+    expected to be occupied while it has an active order or table session.
     
     Query parameters:
     - fix=true: Automatically fix any status mismatches
@@ -517,6 +450,9 @@ def get_table_statuses():
         # Track tables with mismatches
         mismatched_tables = []
         
+        from app.modules.admin.occupancy_service import get_active_table_ids
+        active_table_ids = get_active_table_ids(db.session.connection())
+        
         for table in tables:
             # Get active orders for this table
             active_orders = Order.query.filter(
@@ -525,16 +461,16 @@ def get_table_statuses():
             ).all()
             
             # Check for status mismatch
-            has_active_orders = len(active_orders) > 0
-            status_mismatch = (table.status == 'occupied' and not has_active_orders) or \
-                             (table.status == 'available' and has_active_orders)
+            is_active = table.table_id in active_table_ids
+            expected_status = 'occupied' if is_active else 'available'
+            status_mismatch = (table.status == 'occupied' and not is_active) or \
+                             (table.status == 'available' and is_active)
             
             if status_mismatch:
                 mismatched_tables.append(table.table_id)
                 
                 # Auto-fix if requested
                 if auto_fix:
-                    expected_status = 'occupied' if has_active_orders else 'available'
                     print(f"Fixing table {table.table_number} status: {table.status} -> {expected_status}")
                     table.status = expected_status
             
@@ -556,7 +492,7 @@ def get_table_statuses():
                 'active_orders_count': len(active_orders),
                 'active_orders': order_info,
                 'status_mismatch': status_mismatch,
-                'expected_status': 'occupied' if has_active_orders else 'available'
+                'expected_status': expected_status
             })
         
         # Commit changes if we did auto-fixes
@@ -569,11 +505,7 @@ def get_table_statuses():
         occupied_tables = Table.query.filter_by(status='occupied').count()
         tables_with_active_orders = len([t for t in results if t['active_orders_count'] > 0])
         
-        mismatch_tables = [
-            t for t in results 
-            if (t['status'] == 'occupied' and t['active_orders_count'] == 0) or
-               (t['status'] == 'available' and t['active_orders_count'] > 0)
-        ]
+        mismatch_tables = [t for t in results if t['status_mismatch']]
         
         return jsonify({
             'status': 'success',
@@ -780,21 +712,9 @@ def table_session_api():
                 )
                 
                 if table_session:
+                    # Ending the session frees the table if nothing else keeps it occupied
                     table_session.end_session()
                     
-                    # Update table status to available if no other active sessions
-                    other_sessions = TableSession.query.filter(
-                        TableSession.table_id == table_id,
-                        TableSession.is_active == True,
-                        TableSession.session_id != table_session.session_id
-                    ).count()
-                    
-                    if other_sessions == 0:
-                        table = Table.query.get(table_id)
-                        if table:
-                            table.status = 'available'
-                            db.session.commit()
-                    
                     return jsonify({
                         'success': True,
                         'message': 'Session ended successfully'
@@ -0,0 +1,145 @@
+"""
+Flask CLI commands for maintenance jobs
+Run with `flask --app run <command>`; safe to schedule from cron
+"""
+import click
+
+
+def register_commands(app):
+    """Register maintenance commands on the app's CLI"""
+
+    @app.cli.command('rebuild-dashboard-rollup')
+    def rebuild_dashboard_rollup():
+        """Recompute the dashboard's daily sales rollup from orders"""
+        from app.modules.admin.rollup_service import rebuild_daily_rollup
+
+        days = rebuild_daily_rollup()
+        click.echo(f"Rebuilt dashboard rollup for {days} days")
+
+    @app.cli.command('rebuild-analytics-buckets')
+    def rebuild_analytics_buckets():
+        """Recompute the analytics pages' hourly buckets from orders"""
+        from app.modules.admin.rollup_service import rebuild_hourly_buckets
+
+        hours = rebuild_hourly_buckets()
+        click.echo(f"Rebuilt analytics buckets for {hours} hours")
+
+    @app.cli.command('rebuild-campaign-stats')
+    def rebuild_campaign_stats():
+        """Recompute every campaign's statistics from its point transactions"""
+        from app.modules.admin.campaign_stats_service import rebuild_campaign_stats as rebuild
+
+        rows = rebuild()
+        click.echo(f"Rebuilt campaign statistics for {rows} campaign customers")
+
+    @app.cli.command('rebuild-item-popularity')
+    def rebuild_item_popularity():
+        """Recompute every menu item's popularity counters from orders"""
+        from app.modules.menu.popularity_service import rebuild_item_popularity as rebuild
+
+        items = rebuild()
+        click.echo(f"Rebuilt popularity for {items} menu items")
+
+    @app.cli.command('roll-popularity-windows')
+    def roll_popularity_windows():
+        """Move the 7- and 30-day popularity windows to today; schedule daily"""
+        from app.extensions import db
+        from app.modules.menu.popularity_service import roll_windows
+
+        with db.engine.begin() as connection:
+            items = roll_windows(connection)
+        click.echo(f"Rolled popularity windows for {items} menu items")
+
+    @app.cli.command('rebuild-loyalty-spend')
+    def rebuild_loyalty_spend():
+        """Recompute every loyalty account's total spent from completed and delivered orders"""
+        from app.modules.admin.loyalty_overview_service import rebuild_total_spent
+
+        accounts = rebuild_total_spent()
+        click.echo(f"Rebuilt total spent for {accounts} loyalty accounts")
+
+    @app.cli.command('expire-points')
+    @click.option('--batch-size', type=int, default=1000, show_default=True,
+                  help='Customers expired per transaction.')
+    def expire_points(batch_size):
+        """Expire the unspent points of lots past their expiry date"""
+        from app.modules.loyalty.ledger_service import expire_lots
+
+        report = expire_lots(batch_size=batch_size)
+        rate = report['lots'] / report['seconds'] if report['seconds'] else 0
+        click.echo(f"Expired {report['points']} points from {report['lots']} lots of "
+                   f"{report['customers']} customers in {report['batches']} batches, "
+                   f"{report['seconds']:.2f}s ({rate:,.0f} lots/s)")
+
+    @app.cli.command('verify-loyalty-totals')
+    @click.option('--fix', is_flag=True, help='Recompute the totals of drifted accounts.')
+    def verify_loyalty_totals(fix):
+        """Check loyalty accounts' running point totals against their transactions"""
+        from app.modules.loyalty.ledger_service import verify_totals
+
+        drifted = verify_totals(fix=fix)
+        for account in drifted:
+            changes = ', '.join(f"{column} {stored} != {actual}"
+                                for column, (stored, actual) in account.items() if column != 'user_id')
+            click.echo(f"User {account['user_id']}: {changes}")
+        if drifted and not fix:
+            raise click.ClickException(f"{len(drifted)} loyalty accounts drifted; re-run with --fix")
+        click.echo(f"Fixed {len(drifted)} drifted loyalty accounts" if drifted
+                   else "All loyalty totals match their transactions")
+
+    @app.cli.command('reconcile-tables')
+    @click.option('--session-timeout', type=int, default=None,
+                  help='End table sessions older than this many hours.')
+    def reconcile_tables(session_timeout):
+        """End stale table sessions and correct drifted table statuses"""
+        from app.modules.admin.occupancy_service import reconcile_table_statuses
+
+        result = reconcile_table_statuses(session_timeout)
+        click.echo(f"Ended {result['sessions_ended']} stale sessions, "
+                   f"corrected {result['tables_changed']} tables")
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Fail if any hot query falls back to a full table scan"""
+        from app.query_plans import check_query_plans as run_checks
+
+        full_scans = run_checks()
+        for name, plan in full_scans:
+            click.echo(f"Full scan in '{name}':")
+            for line in plan:
+                click.echo(f"    {line}")
+        if full_scans:
+            raise click.ClickException(f"{len(full_scans)} hot queries scan their table")
+        click.echo("All hot queries use an index")
+
+    @app.cli.command('rebuild-menu-ratings')
+    def rebuild_menu_ratings():
+        """Recompute every menu item's rating from approved feedback"""
+        from app.modules.customer.rating_service import rebuild_item_ratings
+
+        updated = rebuild_item_ratings()
+        click.echo(f"Rebuilt ratings for {updated} menu items")
+
+    @app.cli.command('run-jobs')
+    @click.option('--limit', type=int, default=None, help='Stop after this many attempts.')
+    def run_jobs(limit):
+        """Run due background jobs in this process until the queue is empty"""
+        from app.job_queue import run_pending_jobs
+
+        report = run_pending_jobs(limit)
+        click.echo(f"Ran {report['succeeded'] + report['failed']} background jobs, {report['failed']} failed")
+
+    @app.cli.command('job-stats')
+    @click.option('--retry-failed', is_flag=True, help='Queue failed jobs again with fresh attempts.')
+    def job_stats(retry_failed):
+        """Show the background job queue's depth and recent failures"""
+        from app.job_queue import queue_stats, retry_failed_jobs
+
+        stats = queue_stats()
+        click.echo(f"Pending {stats['pending']} ({stats['due']} due, oldest {stats['oldest_due_seconds']}s), "
+                   f"running {stats['running']}, failed {stats['failed']}")
+        for failure in stats['recent_failures']:
+            click.echo(f"Job {failure['job_id']} {failure['name']} {failure['payload']} "
+                       f"failed after {failure['attempts']} attempts: {failure['last_error']}")
+        if retry_failed:
+            click.echo(f"Queued {retry_failed_jobs()} failed jobs again")
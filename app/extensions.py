@@ -20,7 +20,15 @@ def init_extensions(app):
     db.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
-    socketio.init_app(app, cors_allowed_origins="*")
+    # Rooms are shared through the message queue when running several workers
+    from app.socketio_queue import create_client_manager
+    # init_app builds a new Socket.IO server; event handlers registered on an
+    # earlier one (websocket_handlers is only imported once) must carry over
+    previous_handlers = socketio.server.handlers if socketio.server else {}
+    socketio.init_app(app, cors_allowed_origins="*", client_manager=create_client_manager(app))
+    for namespace, handlers in previous_handlers.items():
+        for event, handler in handlers.items():
+            socketio.server.on(event, handler, namespace=namespace)
     csrf.init_app(app)
     
     # Configure login manager
@@ -30,5 +38,6 @@ def init_extensions(app):
     
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User
-        return User.query.get(int(user_id))
+        # Served from the user cache; only misses query the users table
+        from app.user_cache import load_cached_user
+        return load_cached_user(int(user_id))
@@ -0,0 +1,362 @@
+"""
+Background job queue
+Side effects of a write that the request need not wait for, such as awarding
+an order's loyalty points, are saved as background_jobs rows in the same
+transaction as the write and run by a small pool of worker threads once it
+commits. The table is the queue, so jobs survive restarts (the workers start
+with the app); a failing job is retried with a doubling delay and kept as
+failed once out of attempts.
+A job can run more than once (a worker may stop mid-job), so handlers must
+be safe to repeat
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.helpers import get_debug_flag
+from sqlalchemy import event, select, func
+from werkzeug.serving import is_running_from_reloader
+
+from app.extensions import db, socketio
+from app.models import BackgroundJob
+
+_handlers = {}
+
+_workers_lock = threading.Lock()
+
+
+def job(name):
+    """Register the decorated function as the handler of the named job"""
+    def register(handler):
+        _handlers[name] = handler
+        return handler
+    return register
+
+
+def enqueue(name, delay=0, **payload):
+    """
+    Queue a job to run once the current transaction commits
+
+    Args:
+        name (str): Registered job name
+        delay (int): Seconds to wait before the first attempt
+        **payload: JSON-serialisable keyword arguments for the handler
+
+    Returns:
+        BackgroundJob: The pending job, added to the session
+
+    Raises:
+        ValueError: If no handler is registered under the name
+    """
+    if name not in _handlers:
+        raise ValueError(f"Unknown background job '{name}'")
+
+    background_job = BackgroundJob(
+        name=name,
+        payload=json.dumps(payload),
+        max_attempts=current_app.config.get('BACKGROUND_JOB_MAX_ATTEMPTS', 5),
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(background_job)
+    db.session.info['background_jobs_queued'] = True
+    return background_job
+
+
+@event.listens_for(db.session, 'after_commit')
+def wake_workers(session):
+    """Start or wake this app's workers once queued jobs are committed"""
+    if session.info.pop('background_jobs_queued', False):
+        workers = get_workers()
+        if workers is not None:
+            workers.wake()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_queued_jobs(session):
+    session.info.pop('background_jobs_queued', None)
+
+
+def claim_next_job(now=None):
+    """
+    Claim the next due job for this thread
+
+    Candidates are read without locks and claimed with a conditional UPDATE
+    from pending to running, so each attempt goes to exactly one worker
+
+    Returns:
+        Row: job_id, name, payload, attempts and max_attempts, or None
+    """
+    now = now or datetime.utcnow()
+    jobs = BackgroundJob.__table__
+    connection = db.session.connection()
+
+    candidates = connection.execute(
+        select(jobs.c.job_id).where(jobs.c.status == 'pending', jobs.c.run_at <= now)
+        .order_by(jobs.c.run_at, jobs.c.job_id).limit(10)
+    ).scalars().all()
+
+    for job_id in candidates:
+        claimed = connection.execute(
+            jobs.update().where(jobs.c.job_id == job_id, jobs.c.status == 'pending')
+            .values(status='running', attempts=jobs.c.attempts + 1, locked_at=now)
+        ).rowcount
+        if claimed:
+            row = connection.execute(
+                select(jobs.c.job_id, jobs.c.name, jobs.c.payload, jobs.c.attempts, jobs.c.max_attempts)
+                .where(jobs.c.job_id == job_id)
+            ).one()
+            db.session.commit()
+            return row
+
+    db.session.rollback()
+    return None
+
+
+def run_job(claimed):
+    """
+    Run a claimed job's handler and record the outcome
+
+    A job that succeeds is deleted. One that raises goes back to pending
+    with BACKGROUND_JOB_RETRY_SECONDS doubled per attempt so far, or is kept
+    as failed with its error once it has used max_attempts. Whatever the
+    handler leaves uncommitted is committed with its job's deletion
+
+    Args:
+        claimed: Row returned by claim_next_job
+
+    Returns:
+        bool: Whether the handler succeeded
+    """
+    handler = _handlers.get(claimed.name)
+    error = None
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job '{claimed.name}'")
+        handler(**json.loads(claimed.payload))
+    except Exception as e:
+        db.session.rollback()
+        error = f"{type(e).__name__}: {e}"
+        current_app.logger.warning(
+            f"Background job {claimed.job_id} ({claimed.name}) failed "
+            f"on attempt {claimed.attempts}/{claimed.max_attempts}: {error}"
+        )
+
+    now = datetime.utcnow()
+    jobs = BackgroundJob.__table__
+    connection = db.session.connection()
+    this_job = jobs.c.job_id == claimed.job_id
+
+    if error is None:
+        connection.execute(jobs.delete().where(this_job))
+    elif claimed.attempts >= claimed.max_attempts:
+        connection.execute(jobs.update().where(this_job).values(
+            status='failed', last_error=error, locked_at=None, finished_at=now
+        ))
+    else:
+        delay = current_app.config.get('BACKGROUND_JOB_RETRY_SECONDS', 10) * 2 ** (claimed.attempts - 1)
+        connection.execute(jobs.update().where(this_job).values(
+            status='pending', last_error=error, locked_at=None, run_at=now + timedelta(seconds=delay)
+        ))
+    db.session.commit()
+    return error is None
+
+
+def release_stale_jobs(now=None):
+    """
+    Put back jobs whose worker stopped mid-run
+
+    Jobs running for longer than BACKGROUND_JOB_TIMEOUT_SECONDS are due
+    again, or failed if that was their last attempt
+
+    Returns:
+        int: Number of jobs released
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config.get('BACKGROUND_JOB_TIMEOUT_SECONDS', 300))
+    jobs = BackgroundJob.__table__
+    connection = db.session.connection()
+    stale = (jobs.c.status == 'running', jobs.c.locked_at < cutoff)
+    error = 'Timed out: the worker stopped before the job finished'
+
+    released = connection.execute(
+        jobs.update().where(*stale, jobs.c.attempts >= jobs.c.max_attempts)
+        .values(status='failed', last_error=error, locked_at=None, finished_at=now)
+    ).rowcount
+    released += connection.execute(
+        jobs.update().where(*stale)
+        .values(status='pending', last_error=error, locked_at=None, run_at=now)
+    ).rowcount
+    db.session.commit()
+    return released
+
+
+def run_pending_jobs(limit=None):
+    """
+    Run due jobs in this thread until none are left
+
+    Args:
+        limit (int): Stop after this many attempts
+
+    Returns:
+        dict: Attempts that 'succeeded' and that 'failed'
+    """
+    release_stale_jobs()
+    report = {'succeeded': 0, 'failed': 0}
+    while limit is None or report['succeeded'] + report['failed'] < limit:
+        claimed = claim_next_job()
+        if claimed is None:
+            break
+        report['succeeded' if run_job(claimed) else 'failed'] += 1
+    return report
+
+
+def retry_failed_jobs(job_ids=None):
+    """
+    Give failed jobs a fresh set of attempts
+
+    Args:
+        job_ids (list): Jobs to retry; every failed job when omitted
+
+    Returns:
+        int: Number of jobs queued again
+    """
+    jobs = BackgroundJob.__table__
+    failed = [jobs.c.status == 'failed']
+    if job_ids is not None:
+        failed.append(jobs.c.job_id.in_(job_ids))
+
+    retried = db.session.execute(jobs.update().where(*failed).values(
+        status='pending', attempts=0, run_at=datetime.utcnow(), finished_at=None
+    )).rowcount
+    db.session.commit()
+    return retried
+
+
+def queue_stats(failures=10, now=None):
+    """
+    Get the queue's depth and its most recent failures
+
+    Returns:
+        dict: Jobs 'pending' (of which 'due' now), 'running' and 'failed',
+        the age of the oldest due job in seconds and the latest failed jobs
+    """
+    now = now or datetime.utcnow()
+    jobs = BackgroundJob.__table__
+    counts = dict(db.session.execute(
+        select(jobs.c.status, func.count()).group_by(jobs.c.status)
+    ).all())
+    due, oldest = db.session.execute(
+        select(func.count(), func.min(jobs.c.run_at))
+        .where(jobs.c.status == 'pending', jobs.c.run_at <= now)
+    ).one()
+    recent = db.session.execute(
+        select(jobs.c.job_id, jobs.c.name, jobs.c.payload, jobs.c.attempts, jobs.c.last_error, jobs.c.finished_at)
+        .where(jobs.c.status == 'failed')
+        .order_by(jobs.c.finished_at.desc()).limit(failures)
+    ).all()
+
+    workers = current_app.extensions.get('job_workers')
+    return {
+        'pending': counts.get('pending', 0),
+        'due': due,
+        'running': counts.get('running', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_due_seconds': round((now - oldest).total_seconds(), 1) if oldest else 0.0,
+        'workers': workers.count if workers else 0,
+        'recent_failures': [{
+            'job_id': row.job_id,
+            'name': row.name,
+            'payload': json.loads(row.payload),
+            'attempts': row.attempts,
+            'last_error': row.last_error,
+            'failed_at': row.finished_at.isoformat() if row.finished_at else None
+        } for row in recent]
+    }
+
+
+class JobWorkers:
+    """Threads that run due jobs, sleeping until a commit queues more or the poll interval passes"""
+
+    def __init__(self, app, count, poll_seconds):
+        self.app = app
+        self.count = count
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopping = False
+
+    def start(self):
+        for _ in range(self.count):
+            socketio.start_background_task(self._run)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping:
+                try:
+                    claimed = claim_next_job()
+                    if claimed is not None:
+                        run_job(claimed)
+                    else:
+                        release_stale_jobs()
+                except Exception as e:
+                    claimed = None
+                    db.session.rollback()
+                    self.app.logger.error(f"Background job worker error: {str(e)}")
+                finally:
+                    db.session.remove()
+
+                if claimed is None:
+                    self._wake.wait(self.poll_seconds)
+                    self._wake.clear()
+
+
+def get_workers():
+    """
+    Get this app's job workers, starting them on first use
+
+    Returns:
+        JobWorkers: Or None when BACKGROUND_JOB_WORKERS is 0
+    """
+    count = current_app.config.get('BACKGROUND_JOB_WORKERS', 0)
+    if not count:
+        return None
+
+    workers = current_app.extensions.get('job_workers')
+    if workers is None:
+        with _workers_lock:
+            workers = current_app.extensions.get('job_workers')
+            if workers is None:
+                workers = JobWorkers(current_app._get_current_object(), count,
+                                     current_app.config.get('BACKGROUND_JOB_POLL_SECONDS', 5))
+                workers.start()
+                current_app.extensions['job_workers'] = workers
+    return workers
+
+
+def start_workers(app):
+    """
+    Start an app's workers as it starts serving, so jobs left pending or
+    waiting to retry by the last run go ahead without waiting for a new one
+
+    Skipped under CLI commands other than `flask run`, and in the debug
+    reloader's watcher process, which serves nothing (its child starts them)
+    """
+    if not app.config.get('BACKGROUND_JOB_WORKERS', 0):
+        return
+
+    command = click.get_current_context(silent=True)
+    if command is not None and command.info_name != 'run':
+        return
+    if (app.debug or get_debug_flag()) and not is_running_from_reloader():
+        return
+
+    with app.app_context():
+        get_workers()
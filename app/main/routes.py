@@ -16,14 +16,19 @@ def index():
         else:
             return redirect(url_for('customer.home'))
 
+    from app.modules.menu.catalog_service import get_menu_catalog
+
+    catalog = get_menu_catalog()
+
     # Load popular menu items based on order frequency for the landing page
     popular_items = MenuItem.get_popular_items(limit=4)
 
     # If no popular items (no orders yet), fall back to first 4 available items
     if not popular_items:
-        popular_items = MenuItem.query.filter_by(status='available').limit(4).all()
+        popular_items = catalog.items[:4]
 
-    return render_template('shared/landing.html', popular_items=popular_items)
+    return render_template('shared/landing.html', popular_items=popular_items,
+                           ratings=catalog.ratings)
 
 @bp.route('/test-checkout')
 def test_checkout():
@@ -71,21 +76,20 @@ def table_landing(table_id):
             ip_address=ip_address
         )
     
-    # Store session token in browser session
+    # Store session token in browser session (the active session keeps the table occupied)
     session[f'table_{table_id}_session'] = table_session.session_token
     
-    # Update table status if available
-    if table.status == 'available':
-        table.status = 'occupied'
-        db.session.commit()
-    
+    from app.modules.menu.catalog_service import get_menu_catalog
+
+    catalog = get_menu_catalog()
+
     # Get popular menu items for the table landing
     popular_items = MenuItem.get_popular_items(limit=6)
     if not popular_items:
-        popular_items = MenuItem.query.filter_by(status='available').limit(6).all()
+        popular_items = catalog.items[:6]
     
-    # Get all categories for menu navigation
-    categories = Category.query.filter_by(status='active').all()
+    # Get all active categories for menu navigation
+    categories = catalog.categories
     
     return render_template('table_landing.html',
                          table=table,
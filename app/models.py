@@ -93,134 +93,49 @@ class Table(db.Model):
     
     @classmethod
     def get_occupied_tables_count(cls):
-        """Get count of tables that are currently occupied based on table status and active orders
-        
-        This is a more accurate way to count occupied tables, as it:
-        1. Checks tables explicitly marked as 'occupied'
-        2. Includes tables with active orders even if not explicitly marked
+        """Get count of tables that are currently occupied
+
+        Read-only: table statuses are kept current by the occupancy tracker
+        as orders and table sessions change, so no resync is needed here.
         """
-        from sqlalchemy import func, distinct, or_, and_
-        
-        # Let's first try to get tables that are explicitly marked as occupied
-        explicitly_marked = cls.query.filter_by(status='occupied').count()
-        print(f"Tables explicitly marked as occupied: {explicitly_marked}")
-        
-        # Now get tables with active orders
-        tables_with_orders = db.session.query(func.count(distinct(Order.table_id))).filter(
-            Order.status.in_(['new', 'processing']),
-            Order.table_id.isnot(None)
-        ).scalar() or 0
-        print(f"Tables with active orders: {tables_with_orders}")
-        
-        # For the combined count, use a query with OR condition to get tables that are either
-        # marked as occupied OR have active orders
-        occupied_tables_count = db.session.query(func.count(distinct(cls.table_id))).outerjoin(
-            Order, Order.table_id == cls.table_id
-        ).filter(
-            or_(
-                cls.status == 'occupied',
-                and_(
-                    Order.status.in_(['new', 'processing']),
-                    Order.table_id.isnot(None)
-                )
-            )
-        ).scalar() or 0
-        
-        print(f"Combined occupied tables count: {occupied_tables_count}")
-        
-        # If there's a mismatch, update table statuses to match reality
-        if occupied_tables_count != explicitly_marked:
-            print(f"Mismatch detected between occupied status ({explicitly_marked}) and actual occupied tables ({occupied_tables_count})")
-            # Force an update of table statuses to match reality
-            cls.update_all_table_statuses()
-            # Recalculate after update
-            occupied_tables_count = cls.query.filter_by(status='occupied').count()
-            print(f"After forced update: {occupied_tables_count} tables are occupied")
-        
-        return occupied_tables_count
+        return cls.query.filter_by(status='occupied').count()
+
+    @classmethod
+    def get_status_counts(cls):
+        """Get the number of tables in each status, plus the total, in one query"""
+        from sqlalchemy import func
+
+        counts = {'available': 0, 'occupied': 0, 'reserved': 0}
+        for status, count in db.session.query(cls.status, func.count(cls.table_id)).group_by(cls.status):
+            counts[status] = count
+        counts['total'] = sum(counts.values())
+        return counts
     
     def update_status_based_on_orders(self):
-        """Update the table's status based on its active orders
+        """Update the table's status based on its active orders and sessions
         
-        If there are any active orders (new or processing), mark as occupied.
-        If no active orders, mark as available.
+        If there are any active orders (new or processing) or sessions, mark as
+        occupied. Otherwise an occupied table becomes available.
         """
-        # Check if there are any active orders for this table
-        active_orders_count = self.orders.filter(Order.status.in_(['new', 'processing'])).count()
-        
-        # Get old status for logging
-        old_status = self.status
-        
-        # Update status accordingly
-        if active_orders_count > 0:
-            # If there are active orders, table should be occupied
-            self.status = 'occupied'
-        else:
-            # If no active orders, table can be available
-            self.status = 'available'
-        
-        # Log status change if it changed
-        if old_status != self.status:
-            print(f"Table {self.table_number} status changed from {old_status} to {self.status}")
-        
-        # Make sure changes are saved immediately
+        from app.modules.admin.occupancy_service import refresh_table_statuses
+
+        refresh_table_statuses(db.session.connection(), [self.table_id])
         db.session.commit()
         
         return self.status
     
     @classmethod
     def update_all_table_statuses(cls):
-        """Update all tables' statuses based on their orders.
-        This can be used for a system-wide refresh if needed.
+        """Update all tables' statuses based on their orders and sessions.
+        This can be used for a system-wide refresh if needed; only tables
+        whose status is wrong are written.
         """
-        # Count tables before update for logging
-        total_tables = cls.query.count()
-        
-        # Get tables with their status before the update for logging
-        tables_before = {table.table_id: table.status for table in cls.query.all()}
-        
-        # First, reset all tables to available
-        cls.query.update({cls.status: 'available'}, synchronize_session=False)
-        
-        # Then identify tables with active orders and set them to occupied
-        occupied_table_ids = db.session.query(Order.table_id).filter(
-            Order.status.in_(['new', 'processing']),
-            Order.table_id.isnot(None)
-        ).distinct().all()
-        
-        occupied_ids = [t[0] for t in occupied_table_ids]
-        print(f"Found {len(occupied_ids)} tables with active orders: {occupied_ids}")
-        
-        if occupied_ids:
-            update_result = cls.query.filter(cls.table_id.in_(occupied_ids)).update(
-                {cls.status: 'occupied'}, 
-                synchronize_session=False
-            )
-            print(f"Updated {update_result} tables to 'occupied' status")
-        
-        # Get tables with their status after the update for logging
-        tables_after = {table.table_id: table.status for table in cls.query.all()}
-        
-        # Log changed tables
-        changed_tables = []
-        for table_id, status_after in tables_after.items():
-            status_before = tables_before.get(table_id)
-            if status_before != status_after:
-                changed_tables.append(f"Table {table_id}: {status_before} -> {status_after}")
-        
-        if changed_tables:
-            print(f"Changed table statuses: {'; '.join(changed_tables)}")
-        else:
-            print("No table statuses changed")
-        
-        # Commit all changes
+        from app.modules.admin.occupancy_service import refresh_table_statuses
+
+        refresh_table_statuses(db.session.connection())
         db.session.commit()
         
-        # Final verification - count currently occupied tables
-        occupied_count = cls.query.filter_by(status='occupied').count()
-        print(f"After sync: {occupied_count} tables are occupied")
-        
-        return total_tables
+        return cls.query.count()
     
     def __repr__(self):
         return f'<Table {self.table_number}>'
@@ -252,7 +167,8 @@ class MenuItem(db.Model):
     price = db.Column(Numeric(10, 2), nullable=False)  # EGP
     category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'), nullable=False)
     image_url = db.Column(db.String(255), nullable=True)
-    stock = db.Column(db.Integer, nullable=False, default=0)
+    # None: stock is not tracked and the item never sells out
+    stock = db.Column(db.Integer, nullable=True)
     status = db.Column(db.Enum('available', 'out_of_stock', 'discontinued', name='item_status'),
                       nullable=False, default='available')
 
@@ -274,6 +190,10 @@ class MenuItem(db.Model):
     is_vegetarian = db.Column(db.Boolean, nullable=False, default=False)
     is_vegan = db.Column(db.Boolean, nullable=False, default=False)
 
+    # Approved feedback summary, kept current by the rating service
+    rating_avg = db.Column(Numeric(3, 2), nullable=False, default=0.00)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -284,67 +204,60 @@ class MenuItem(db.Model):
     reward_items = db.relationship('RewardItem', backref='menu_item', lazy='dynamic')
     
     @classmethod
-    def get_popular_items(cls, limit=4):
-        """Get the most popular menu items based on order frequency"""
-        from sqlalchemy import func
+    def get_popular_items(cls, limit=4, days=None):
+        """Get the most popular menu items based on order frequency
 
-        popular_items = db.session.query(
-            cls,
-            func.sum(OrderItem.quantity).label('total_ordered')
-        ).join(OrderItem).filter(
-            cls.status == 'available'
-        ).group_by(cls.item_id).order_by(
-            func.sum(OrderItem.quantity).desc()
-        ).limit(limit).all()
+        Args:
+            limit (int): Maximum number of items to return
+            days (int): 7 or 30 for the last days only, None for all time
+        """
+        from app.modules.menu.popularity_service import get_popular_items
 
         # Return just the menu items (not the tuples with counts)
-        return [item[0] for item in popular_items]
+        return [item for item, _ in get_popular_items(limit, days)]
 
     @classmethod
-    def get_popular_items_with_counts(cls, limit=10, start_date=None, end_date=None):
+    def get_popular_items_with_counts(cls, limit=10, start_date=None, end_date=None, days=None):
         """Get popular items with their order counts for analytics
-        
+
         Args:
             limit (int): Maximum number of results to return
-            start_date (datetime): Optional start date for filtering
-            end_date (datetime): Optional end date for filtering
+            start_date (datetime): Optional start date for filtering (whole days)
+            end_date (datetime): Optional end date for filtering (whole days)
+            days (int): 7 or 30 for the last days only, when no dates are given
         """
-        from sqlalchemy import func
-        
-        query = db.session.query(
-            cls,
-            func.sum(OrderItem.quantity).label('total_ordered')
-        ).join(OrderItem).join(Order, OrderItem.order_id == Order.order_id)
-        
-        # Apply filters
-        query = query.filter(cls.status == 'available')
-        
-        # Apply date filtering if specified
-        if start_date:
-            query = query.filter(Order.order_time >= start_date)
-        if end_date:
-            query = query.filter(Order.order_time <= end_date)
-            
-        return query.group_by(cls.item_id).order_by(
-            func.sum(OrderItem.quantity).desc()
-        ).limit(limit).all()
+        from app.modules.menu import popularity_service
+
+        if start_date or end_date:
+            return popularity_service.get_popular_items_between(limit, start_date, end_date)
+        return popularity_service.get_popular_items(limit, days)
+
+    @classmethod
+    def get_ratings(cls, item_ids):
+        """Get {item_id: (average, count)} of approved feedback for many items in one query
+
+        Args:
+            item_ids (iterable): Menu item ids
+        """
+        item_ids = list(item_ids)
+        if not item_ids:
+            return {}
+
+        rows = db.session.query(
+            cls.item_id, cls.rating_avg, cls.rating_count
+        ).filter(cls.item_id.in_(item_ids)).all()
+
+        return {
+            item_id: (round(float(rating_avg or 0), 1), rating_count or 0)
+            for item_id, rating_avg, rating_count in rows
+        }
 
     def get_average_rating(self):
         """Get the average rating for this menu item"""
-        from sqlalchemy import func
-        
-        result = db.session.query(
-            func.avg(Feedback.rating).label('avg_rating'),
-            func.count(Feedback.feedback_id).label('review_count')
-        ).filter(
-            Feedback.item_id == self.item_id,
-            Feedback.is_approved == True
-        ).first()
-        
-        if result.review_count > 0:
+        if self.rating_count:
             return {
-                'average': round(float(result.avg_rating), 1),
-                'count': result.review_count
+                'average': round(float(self.rating_avg), 1),
+                'count': self.rating_count
             }
         else:
             return {
@@ -356,6 +269,13 @@ class MenuItem(db.Model):
         """Get the distribution of ratings (1-5 stars) for this menu item"""
         from sqlalchemy import func
         
+        # Initialize distribution with zeros
+        distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+
+        # Nothing to count for items without approved reviews
+        if not self.rating_count:
+            return distribution
+
         ratings = db.session.query(
             Feedback.rating,
             func.count(Feedback.feedback_id).label('count')
@@ -364,9 +284,6 @@ class MenuItem(db.Model):
             Feedback.is_approved == True
         ).group_by(Feedback.rating).all()
         
-        # Initialize distribution with zeros
-        distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        
         # Fill in actual counts
         for rating, count in ratings:
             distribution[rating] = count
@@ -434,6 +351,12 @@ class MenuItemImage(db.Model):
 class Order(db.Model):
     """Customer orders with status tracking"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_status_order_time', 'status', 'order_time'),
+        db.Index('ix_orders_order_time', 'order_time'),
+        db.Index('ix_orders_user_id_order_time', 'user_id', 'order_time'),
+        db.Index('ix_orders_table_id_status', 'table_id', 'status'),
+    )
 
     order_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -445,10 +368,13 @@ class Order(db.Model):
     notes = db.Column(db.Text, nullable=True)
     estimated_time = db.Column(db.Integer, nullable=True)  # minutes
     completed_at = db.Column(db.DateTime, nullable=True)
+    # Whether the order's lines took menu item stock; only these give it back
+    stock_reserved = db.Column(db.Boolean, nullable=False, default=True)
 
     # Relationships
-    order_items = db.relationship('OrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
-    payments = db.relationship('Payment', backref='order', lazy='dynamic')
+    # Plain lists rather than dynamic queries, so pages can eager load them
+    order_items = db.relationship('OrderItem', backref='order', lazy='select', cascade='all, delete-orphan')
+    payments = db.relationship('Payment', backref='order', lazy='select')
     point_transactions = db.relationship('PointTransaction', backref='order', lazy='dynamic')
     reward_redemptions = db.relationship('RewardRedemption', backref='order', lazy='dynamic')
 
@@ -517,6 +443,10 @@ class Order(db.Model):
 class OrderItem(db.Model):
     """Individual items within orders"""
     __tablename__ = 'order_items'
+    __table_args__ = (
+        db.Index('ix_order_items_order_id', 'order_id'),
+        db.Index('ix_order_items_item_id', 'item_id'),
+    )
 
     order_item_id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.order_id'), nullable=False)
@@ -530,9 +460,113 @@ class OrderItem(db.Model):
     def __repr__(self):
         return f'<OrderItem {self.order_item_id}>'
 
+class DailySalesRollup(db.Model):
+    """Per-day order totals maintained incrementally for the admin dashboard"""
+    __tablename__ = 'daily_sales_rollup'
+
+    day = db.Column(db.Date, primary_key=True)  # UTC day of Order.order_time
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0.00)
+
+    # Current status of the orders placed that day
+    new_count = db.Column(db.Integer, nullable=False, default=0)
+    processing_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    rejected_count = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailySalesRollup {self.day}>'
+
+class DailyCategoryRollup(db.Model):
+    """Per-day, per-category count of ordered lines for the admin dashboard"""
+    __tablename__ = 'daily_category_rollup'
+
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.category_id'), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyCategoryRollup {self.day} {self.category_id}>'
+
+class HourlySalesBucket(db.Model):
+    """Per-hour, per-status order totals maintained incrementally for the analytics pages"""
+    __tablename__ = 'hourly_sales_buckets'
+
+    hour = db.Column(db.DateTime, primary_key=True)  # Order.order_time truncated to the hour
+    status = db.Column(db.String(20), primary_key=True)  # Current status of the orders
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0.00)
+
+    def __repr__(self):
+        return f'<HourlySalesBucket {self.hour} {self.status}>'
+
+class HourlyCustomerBucket(db.Model):
+    """Per-hour, per-customer order totals maintained incrementally for the analytics pages"""
+    __tablename__ = 'hourly_customer_buckets'
+    __table_args__ = (
+        db.Index('ix_hourly_customer_buckets_user_id', 'user_id'),
+    )
+
+    hour = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0.00)
+
+    def __repr__(self):
+        return f'<HourlyCustomerBucket {self.hour} {self.user_id}>'
+
+class HourlyItemBucket(db.Model):
+    """Per-hour, per-menu-item sales maintained incrementally for the analytics pages"""
+    __tablename__ = 'hourly_item_buckets'
+
+    hour = db.Column(db.DateTime, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_items.item_id'), primary_key=True)
+    line_count = db.Column(db.Integer, nullable=False, default=0)  # Order lines for the item
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0.00)  # quantity * unit_price
+
+    def __repr__(self):
+        return f'<HourlyItemBucket {self.hour} {self.item_id}>'
+
+class ItemPopularity(db.Model):
+    """Per-menu-item ordered quantity of live orders, all-time and over rolling windows"""
+    __tablename__ = 'item_popularity'
+    __table_args__ = (
+        db.Index('ix_item_popularity_all_time', 'all_time'),
+        db.Index('ix_item_popularity_last_7_days', 'last_7_days'),
+        db.Index('ix_item_popularity_last_30_days', 'last_30_days'),
+        db.Index('ix_item_popularity_window_day', 'window_day'),
+    )
+
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_items.item_id'), primary_key=True)
+    all_time = db.Column(db.Integer, nullable=False, default=0)
+    last_7_days = db.Column(db.Integer, nullable=False, default=0)
+    last_30_days = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0.00)  # All-time quantity * unit_price
+    window_day = db.Column(db.Date, nullable=False)  # Last day the rolling windows cover
+
+    def __repr__(self):
+        return f'<ItemPopularity {self.item_id}>'
+
+class DailyItemPopularity(db.Model):
+    """Per-day, per-menu-item ordered quantity of live orders; ages the rolling windows"""
+    __tablename__ = 'daily_item_popularity'
+
+    day = db.Column(db.Date, primary_key=True)  # UTC day of Order.order_time
+    item_id = db.Column(db.Integer, db.ForeignKey('menu_items.item_id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0.00)  # quantity * unit_price
+
+    def __repr__(self):
+        return f'<DailyItemPopularity {self.day} {self.item_id}>'
+
 class Payment(db.Model):
     """Payment tracking and processing"""
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_order_id', 'order_id'),
+    )
 
     payment_id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.order_id'), nullable=False)
@@ -574,6 +608,9 @@ class Service(db.Model):
 class ServiceRequest(db.Model):
     """Waiter service requests"""
     __tablename__ = 'service_requests'
+    __table_args__ = (
+        db.Index('ix_service_requests_status_created_at', 'status', 'created_at'),
+    )
 
     request_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -595,6 +632,9 @@ class ServiceRequest(db.Model):
 class Notification(db.Model):
     """System-wide messaging"""
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_seen', 'user_id', 'seen'),
+    )
 
     notification_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -610,6 +650,9 @@ class Notification(db.Model):
 class Feedback(db.Model):
     """Customer reviews and ratings"""
     __tablename__ = 'feedback'
+    __table_args__ = (
+        db.Index('ix_feedback_item_id_is_approved', 'item_id', 'is_approved'),
+    )
 
     feedback_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -644,6 +687,10 @@ class LoyaltyProgram(db.Model):
 class CustomerLoyalty(db.Model):
     """Individual customer loyalty accounts"""
     __tablename__ = 'customer_loyalty'
+    __table_args__ = (
+        db.Index('ix_customer_loyalty_total_points', 'total_points'),
+        db.Index('ix_customer_loyalty_total_spent', 'total_spent'),
+    )
 
     loyalty_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, unique=True)
@@ -654,19 +701,32 @@ class CustomerLoyalty(db.Model):
     join_date = db.Column(db.DateTime, default=datetime.utcnow)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Sum of the customer's completed orders, kept current by the loyalty overview service
+    total_spent = db.Column(Numeric(12, 2), nullable=False, default=0.00)
+
+    # Running sums of the customer's point transactions, kept current by the points ledger
+    total_earned = db.Column(db.Integer, nullable=False, default=0)
+    total_redeemed = db.Column(db.Integer, nullable=False, default=0)  # Excludes expired points
+    total_bonus = db.Column(db.Integer, nullable=False, default=0)
+    total_expired = db.Column(db.Integer, nullable=False, default=0)
+
     # Relationships
     user = db.relationship('User', back_populates='loyalty_account', lazy='joined')
 
+    # Lifetime points needed for each tier above bronze, highest first
+    TIER_THRESHOLDS = (('platinum', 10000), ('gold', 5000), ('silver', 2000))
+
+    @classmethod
+    def tier_for(cls, lifetime_points):
+        """Get the tier earned by a number of lifetime points"""
+        for tier, threshold in cls.TIER_THRESHOLDS:
+            if lifetime_points >= threshold:
+                return tier
+        return 'bronze'
+
     def update_tier(self):
         """Update tier based on lifetime points"""
-        if self.lifetime_points >= 10000:
-            self.tier_level = 'platinum'
-        elif self.lifetime_points >= 5000:
-            self.tier_level = 'gold'
-        elif self.lifetime_points >= 2000:
-            self.tier_level = 'silver'
-        else:
-            self.tier_level = 'bronze'
+        self.tier_level = self.tier_for(self.lifetime_points)
 
     def calculate_loyalty_points(self, order_total):
         """Calculate loyalty points based on order total"""
@@ -710,9 +770,30 @@ class CustomerLoyalty(db.Model):
     def __repr__(self):
         return f'<CustomerLoyalty {self.user_id}>'
 
+def _lot_size(context):
+    """A credit starts as a lot holding all of its points"""
+    return context.get_current_parameters().get('points_earned') or 0
+
 class PointTransaction(db.Model):
     """Point earning and redemption history"""
     __tablename__ = 'point_transactions'
+    __table_args__ = (
+        db.Index('ix_point_transactions_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_point_transactions_order_id_type', 'order_id', 'transaction_type'),
+        db.Index('ix_point_transactions_type_expiry_date', 'transaction_type', 'expiry_date'),
+        db.Index('ix_point_transactions_campaign_id', 'campaign_id'),
+        # Only lots with points left, oldest first per user and by expiry for the expiry job
+        db.Index('ix_point_transactions_open_lots', 'user_id', 'timestamp',
+                 sqlite_where=db.text('points_remaining > 0'),
+                 postgresql_where=db.text('points_remaining > 0')),
+        db.Index('ix_point_transactions_expiring_lots', 'expiry_date',
+                 sqlite_where=db.text('points_remaining > 0'),
+                 postgresql_where=db.text('points_remaining > 0')),
+        # An order earns points once, however many requests try to award them
+        db.Index('uq_point_transactions_earned_order', 'order_id', unique=True,
+                 sqlite_where=db.text("transaction_type = 'earned'"),
+                 postgresql_where=db.text("transaction_type = 'earned'")),
+    )
 
     transaction_id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
@@ -725,6 +806,13 @@ class PointTransaction(db.Model):
     description = db.Column(db.String(255), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     expiry_date = db.Column(db.DateTime, nullable=True)
+
+    # Campaign whose multiplier applied, and the points it added over the base rate
+    campaign_id = db.Column(db.Integer, db.ForeignKey('promotional_campaigns.campaign_id'), nullable=True)
+    bonus_points = db.Column(db.Integer, nullable=False, default=0)
+
+    # Points of this credit not yet redeemed or expired; spent oldest lot first
+    points_remaining = db.Column(db.Integer, nullable=False, default=_lot_size)
     
     @property
     def customer(self):
@@ -799,6 +887,9 @@ class PromotionalCampaign(db.Model):
     discount_type = db.Column(db.String(20), nullable=True)  # Changed from Enum to String for SQLite compatibility
     discount_value = db.Column(db.Float, nullable=True)  # For percentage or fixed discounts
 
+    # Awards this campaign has boosted, claimed atomically against total_usage_limit
+    usage_count = db.Column(db.Integer, nullable=False, default=0)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -848,6 +939,35 @@ class PromotionalCampaign(db.Model):
     def __repr__(self):
         return f'<PromotionalCampaign {self.name}>'
 
+class CampaignCustomerStats(db.Model):
+    """Per-campaign, per-customer totals of campaign awards, maintained as points are awarded"""
+    __tablename__ = 'campaign_customer_stats'
+
+    campaign_id = db.Column(db.Integer, db.ForeignKey('promotional_campaigns.campaign_id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    bonus_points = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0.00)
+
+    # Set by the customer's first award under the campaign
+    tier_level = db.Column(db.String(20), nullable=True)
+    first_award = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<CampaignCustomerStats {self.campaign_id} {self.user_id}>'
+
+class CampaignHourStats(db.Model):
+    """Per-campaign orders by hour of day, maintained as points are awarded"""
+    __tablename__ = 'campaign_hour_stats'
+
+    campaign_id = db.Column(db.Integer, db.ForeignKey('promotional_campaigns.campaign_id'), primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)  # 0-23, hour of Order.order_time
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Numeric(12, 2), nullable=False, default=0.00)
+
+    def __repr__(self):
+        return f'<CampaignHourStats {self.campaign_id} {self.hour}>'
+
 class QRCode(db.Model):
     """Table-based QR codes"""
     __tablename__ = 'qr_codes'
@@ -917,6 +1037,9 @@ class CustomerPreferences(db.Model):
 class TableSession(db.Model):
     """Track customer sessions at tables"""
     __tablename__ = 'table_sessions'
+    __table_args__ = (
+        db.Index('ix_table_sessions_table_id_is_active', 'table_id', 'is_active'),
+    )
     
     session_id = db.Column(db.Integer, primary_key=True)
     table_id = db.Column(db.Integer, db.ForeignKey('tables.table_id'), nullable=False)
@@ -990,19 +1113,10 @@ class SystemSettings(db.Model):
     
     @classmethod
     def get_setting(cls, key, default=None):
-        """Get a system setting value by key"""
-        setting = cls.query.filter_by(key=key, is_active=True).first()
-        if setting:
-            # Convert based on type
-            if setting.setting_type == 'integer':
-                return int(setting.value) if setting.value else default
-            elif setting.setting_type == 'boolean':
-                return setting.value.lower() in ('true', '1', 'yes') if setting.value else default
-            elif setting.setting_type == 'float':
-                return float(setting.value) if setting.value else default
-            else:
-                return setting.value if setting.value else default
-        return default
+        """Get a system setting value by key, converted to its type"""
+        # Served from the cached settings snapshot
+        from app.modules.admin.settings_service import get_settings
+        return get_settings().get(key, default)
     
     @classmethod
     def set_setting(cls, key, value, description=None, setting_type='string'):
@@ -1039,3 +1153,62 @@ class SystemSettings(db.Model):
     
     def __repr__(self):
         return f'<SystemSettings {self.key}={self.value}>'
+
+class CacheVersion(db.Model):
+    """Version stamps for in-process caches; bumped when the cached data changes"""
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def bump(cls, connection, name):
+        """Invalidate every process's copy of the named cache
+
+        Args:
+            connection: Connection of the writing transaction
+            name (str): Cache to invalidate
+        """
+        versions = cls.__table__
+        bumped = connection.execute(
+            versions.update()
+            .where(versions.c.name == name)
+            .values(version=versions.c.version + 1)
+        ).rowcount
+        if not bumped:
+            connection.execute(versions.insert().values(name=name, version=1))
+
+    @classmethod
+    def get_version(cls, name):
+        """Get the named cache's current version (0 before its first write)"""
+        return db.session.query(cls.version).filter(cls.name == name).scalar() or 0
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
+
+class BackgroundJob(db.Model):
+    """Side effect queued by a write and run after it commits; see app.job_queue"""
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        db.Index('ix_background_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    job_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    # JSON keyword arguments for the job's handler
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    # Finished jobs are deleted; failed ones are kept until retried
+    status = db.Column(db.Enum('pending', 'running', 'failed', name='background_job_statuses'),
+                       nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.job_id} {self.name} {self.status}>'
@@ -0,0 +1,117 @@
+"""
+Analytics Service
+Reads the revenue and customer analytics from the hourly buckets kept by the
+rollup service. Whole hours inside a period come from the buckets and only the
+partial hours at its edges are read from orders, so a year-to-date page reads
+a few thousand bucket rows however many orders the year holds
+"""
+from datetime import timedelta
+
+from sqlalchemy import and_, literal, or_, select, union_all
+
+from app.models import Order, OrderItem, HourlySalesBucket, HourlyCustomerBucket, HourlyItemBucket
+from app.modules.admin.rollup_service import order_hour
+
+
+def _first_whole_hour(start):
+    hour = order_hour(start)
+    return hour if hour == start else hour + timedelta(hours=1)
+
+
+def _bucket_range(hour_column, start, end):
+    """Conditions selecting the buckets of the whole hours inside a period"""
+    conditions = [hour_column < order_hour(end)]
+    if start is not None:
+        conditions.append(hour_column >= _first_whole_hour(start))
+    return conditions
+
+
+def _edge_range(time_column, start, end, include_end):
+    """Condition selecting the orders of a period that fall outside its whole hours"""
+    conditions = [time_column <= end if include_end else time_column < end]
+    if start is None:
+        conditions.append(time_column >= order_hour(end))
+    else:
+        conditions += [
+            time_column >= start,
+            or_(time_column < _first_whole_hour(start), time_column >= order_hour(end))
+        ]
+    return and_(*conditions)
+
+
+def sales_source(start, end, include_end=True):
+    """
+    Rows of (at, status, order_count, revenue) that together cover the orders of a period
+
+    Bucket rows stand for an hour of orders with one status; edge orders are
+    one row each. Aggregate them with SUM, never COUNT
+
+    Args:
+        start (datetime): Start of the period, None for all time
+        end (datetime): End of the period
+        include_end (bool): Whether orders placed exactly at end count
+
+    Returns:
+        Subquery: Columns at, status, order_count, revenue
+    """
+    buckets = select(
+        HourlySalesBucket.hour.label('at'),
+        HourlySalesBucket.status,
+        HourlySalesBucket.order_count,
+        HourlySalesBucket.revenue
+    ).where(HourlySalesBucket.order_count > 0, *_bucket_range(HourlySalesBucket.hour, start, end))
+
+    orders = select(
+        Order.order_time, Order.status, literal(1), Order.total_amount
+    ).where(_edge_range(Order.order_time, start, end, include_end))
+
+    return union_all(buckets, orders).subquery('sales')
+
+
+def customer_source(start, end, include_end=True):
+    """
+    Rows of (at, user_id, order_count, revenue) that together cover the orders of a period
+
+    `at` is exact for edge orders and the start of the hour for bucket rows, so
+    first and last order times derived from it are accurate to the hour
+
+    Returns:
+        Subquery: Columns at, user_id, order_count, revenue
+    """
+    buckets = select(
+        HourlyCustomerBucket.hour.label('at'),
+        HourlyCustomerBucket.user_id,
+        HourlyCustomerBucket.order_count,
+        HourlyCustomerBucket.revenue
+    ).where(HourlyCustomerBucket.order_count > 0, *_bucket_range(HourlyCustomerBucket.hour, start, end))
+
+    orders = select(
+        Order.order_time, Order.user_id, literal(1), Order.total_amount
+    ).where(_edge_range(Order.order_time, start, end, include_end))
+
+    return union_all(buckets, orders).subquery('customers')
+
+
+def item_source(start, end, include_end=True):
+    """
+    Rows of (at, item_id, line_count, quantity, revenue) that together cover the order lines of a period
+
+    Returns:
+        Subquery: Columns at, item_id, line_count, quantity, revenue
+    """
+    buckets = select(
+        HourlyItemBucket.hour.label('at'),
+        HourlyItemBucket.item_id,
+        HourlyItemBucket.line_count,
+        HourlyItemBucket.quantity,
+        HourlyItemBucket.revenue
+    ).where(HourlyItemBucket.line_count > 0, *_bucket_range(HourlyItemBucket.hour, start, end))
+
+    lines = select(
+        Order.order_time, OrderItem.item_id, literal(1), OrderItem.quantity,
+        OrderItem.quantity * OrderItem.unit_price
+    ).join(
+        Order, Order.order_id == OrderItem.order_id
+    ).where(_edge_range(Order.order_time, start, end, include_end))
+
+    return union_all(buckets, lines).subquery('items')
@@ -0,0 +1,273 @@
+"""
+Campaign Statistics Service
+Credits each campaign with the orders whose points it boosted, keeping
+per-customer and per-hour totals current as points are awarded, so a
+campaign's statistics are a few grouped reads however long it has run
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import event, exists, func, select
+
+from app.extensions import db
+from app.models import (
+    Order, PointTransaction, CustomerLoyalty, CampaignCustomerStats, CampaignHourStats
+)
+from app.modules.admin import analytics_service
+from app.modules.admin.rollup_service import increment_rows
+from app.modules.loyalty.campaign_service import refresh_usage_counts
+
+TIERS = ('bronze', 'silver', 'gold', 'platinum')
+
+
+def _money(value):
+    return Decimal(str(value or 0))
+
+
+def _is_campaign_award(obj):
+    return (isinstance(obj, PointTransaction) and obj.campaign_id is not None
+            and obj.transaction_type == 'earned')
+
+
+def _lookup(session, awards):
+    """Get {order_id: (order_time, total_amount)} and {user_id: tier_level} for a flush's awards"""
+    connection = session.connection()
+
+    orders = {
+        obj.order_id: (obj.order_time, obj.total_amount)
+        for obj in session.identity_map.values() if isinstance(obj, Order)
+    }
+    missing = {award.order_id for award, _ in awards if award.order_id is not None} - set(orders)
+    if missing:
+        orders.update((order_id, (order_time, total)) for order_id, order_time, total in connection.execute(
+            select(Order.order_id, Order.order_time, Order.total_amount).where(Order.order_id.in_(missing))
+        ))
+
+    tiers = {
+        obj.user_id: obj.tier_level
+        for obj in session.identity_map.values() if isinstance(obj, CustomerLoyalty)
+    }
+    missing = {award.user_id for award, _ in awards} - set(tiers)
+    if missing:
+        tiers.update(connection.execute(
+            select(CustomerLoyalty.user_id, CustomerLoyalty.tier_level)
+            .where(CustomerLoyalty.user_id.in_(missing))
+        ).all())
+
+    return orders, tiers
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_campaign_awards(session, flush_context):
+    """Add flushed campaign awards to their campaign's totals in the same transaction"""
+    awards = [(obj, 1) for obj in session.new if _is_campaign_award(obj)]
+    awards += [(obj, -1) for obj in session.deleted if _is_campaign_award(obj)]
+    if not awards:
+        return
+
+    orders, tiers = _lookup(session, awards)
+    customers = defaultdict(lambda: defaultdict(int))
+    hours = defaultdict(lambda: defaultdict(int))
+    first_awards = {}
+
+    for award, sign in awards:
+        order_time, total = orders.get(award.order_id, (None, 0))
+        revenue = sign * _money(total)
+
+        key = (award.campaign_id, award.user_id)
+        customers[key]['order_count'] += sign
+        customers[key]['bonus_points'] += sign * (award.bonus_points or 0)
+        customers[key]['revenue'] += revenue
+        first_awards.setdefault(key, {
+            'tier_level': tiers.get(award.user_id, 'bronze'),
+            'first_award': award.timestamp or datetime.utcnow()
+        })
+
+        hour = (order_time or award.timestamp or datetime.utcnow()).hour
+        hours[(award.campaign_id, hour)]['order_count'] += sign
+        hours[(award.campaign_id, hour)]['revenue'] += revenue
+
+    connection = session.connection()
+    increment_rows(connection, CampaignCustomerStats.__table__, ['campaign_id', 'user_id'], customers, first_awards)
+    increment_rows(connection, CampaignHourStats.__table__, ['campaign_id', 'hour'], hours)
+
+
+def _hour_label(hour):
+    return f"{hour % 12 or 12}:00 {'AM' if hour < 12 else 'PM'}"
+
+
+def _growth(current, previous):
+    if not previous:
+        return 100 if current > 0 else 0
+    return round((current - previous) / previous * 100, 2)
+
+
+def _window_totals(start, end, include_end=True):
+    """Orders, revenue and distinct customers of all orders in a window"""
+    sales = analytics_service.sales_source(start, end, include_end)
+    customers = analytics_service.customer_source(start, end, include_end)
+    orders, revenue = db.session.query(
+        func.sum(sales.c.order_count), func.sum(sales.c.revenue)
+    ).one()
+    customer_count = db.session.query(func.count(func.distinct(customers.c.user_id))).scalar()
+    return int(orders or 0), float(revenue or 0), int(customer_count or 0)
+
+
+def _performance(campaign, orders, window_orders):
+    """(percentage, description) of how much the campaign has been used"""
+    if campaign.total_usage_limit:
+        percentage = min(100, round(orders / campaign.total_usage_limit * 100))
+        basis = f'{orders} of {campaign.total_usage_limit} allowed uses'
+    else:
+        percentage = round(orders / window_orders * 100) if window_orders else 0
+        basis = f'{percentage}% of orders in the campaign period earned its bonus'
+
+    if not orders:
+        return 0, 'No orders have earned this campaign\'s bonus yet'
+    if percentage >= 60:
+        return percentage, f'Strong uptake: {basis}'
+    if percentage >= 25:
+        return percentage, f'Steady uptake: {basis}'
+    return percentage, f'Low uptake: {basis}'
+
+
+def get_campaign_stats(campaign, now=None):
+    """
+    Get a campaign's statistics from its maintained totals
+
+    Orders, bonus points, engaged customers and revenue count the orders
+    whose points the campaign boosted. Growth compares all orders in the
+    campaign period (so far) with the period of the same length before it
+
+    Returns:
+        dict: The fields the campaign statistics page and API show
+    """
+    now = now or datetime.utcnow()
+    customers = CampaignCustomerStats.__table__
+    mine = customers.c.campaign_id == campaign.campaign_id
+
+    engaged, orders, bonus_points, revenue = db.session.execute(
+        select(
+            func.count(customers.c.user_id),
+            func.sum(customers.c.order_count),
+            func.sum(customers.c.bonus_points),
+            func.sum(customers.c.revenue)
+        ).where(mine, customers.c.order_count > 0)
+    ).one()
+    engaged, orders, bonus_points = int(engaged or 0), int(orders or 0), int(bonus_points or 0)
+    revenue = float(revenue or 0)
+
+    engagement_breakdown = dict.fromkeys(TIERS, 0)
+    engagement_breakdown.update(db.session.execute(
+        select(customers.c.tier_level, func.count(customers.c.user_id))
+        .where(mine, customers.c.order_count > 0)
+        .group_by(customers.c.tier_level)
+    ).all())
+
+    # Engaged customers who had ordered before the campaign started
+    repeat = db.session.execute(
+        select(func.count(customers.c.user_id)).where(
+            mine, customers.c.order_count > 0,
+            exists().where(Order.user_id == customers.c.user_id, Order.order_time < campaign.start_date)
+        )
+    ).scalar() or 0
+
+    peak = db.session.execute(
+        select(CampaignHourStats.hour)
+        .where(CampaignHourStats.campaign_id == campaign.campaign_id, CampaignHourStats.order_count > 0)
+        .order_by(CampaignHourStats.order_count.desc(), CampaignHourStats.hour)
+        .limit(1)
+    ).scalar()
+
+    # All orders in the campaign period against the period before it
+    end = min(campaign.end_date, now)
+    if end > campaign.start_date:
+        window_orders, window_revenue, window_customers = _window_totals(campaign.start_date, end)
+        # Orders placed exactly at the start belong to the campaign, not the period before
+        previous_orders, previous_revenue, _ = _window_totals(
+            campaign.start_date - (end - campaign.start_date), campaign.start_date, include_end=False)
+    else:
+        window_orders = window_revenue = window_customers = previous_orders = previous_revenue = 0
+
+    performance_percentage, performance_description = _performance(campaign, orders, window_orders)
+
+    return {
+        'total_orders': orders,
+        'bonus_points_awarded': bonus_points,
+        'customers_engaged': engaged,
+        'revenue_impact': f'{revenue:.2f}',
+        'performance_percentage': performance_percentage,
+        'performance_description': performance_description,
+        'total_orders_growth': _growth(window_orders, previous_orders),
+        'revenue_growth': _growth(window_revenue, previous_revenue),
+        'unique_customers_percentage': round(engaged / window_customers * 100) if window_customers else 0,
+        'engagement_breakdown': engagement_breakdown,
+        'order_patterns': {
+            'avg_order_value': revenue / orders if orders else 0,
+            'peak_time': f'{_hour_label(peak)} - {_hour_label((peak + 1) % 24)}' if peak is not None else None,
+            'repeat_customers': round(repeat / engaged * 100) if engaged else 0,
+            'new_customers': round((engaged - repeat) / engaged * 100) if engaged else 0
+        }
+    }
+
+
+def rebuild_campaign_stats():
+    """
+    Recompute every campaign's totals and usage count from its point transactions
+    Tiers are customers' current tiers, as the tier at the time is not recorded
+
+    Returns:
+        int: Number of (campaign, customer) rows rebuilt
+    """
+    awards = select(PointTransaction).where(
+        PointTransaction.campaign_id.isnot(None),
+        PointTransaction.transaction_type == 'earned'
+    ).subquery()
+    hour = func.extract('hour', Order.order_time)
+
+    customer_rows = db.session.execute(
+        select(
+            awards.c.campaign_id, awards.c.user_id,
+            func.count(awards.c.transaction_id),
+            func.coalesce(func.sum(awards.c.bonus_points), 0),
+            func.coalesce(func.sum(Order.total_amount), 0),
+            func.coalesce(func.max(CustomerLoyalty.tier_level), 'bronze'),
+            func.min(awards.c.timestamp)
+        ).outerjoin(
+            Order, Order.order_id == awards.c.order_id
+        ).outerjoin(
+            CustomerLoyalty, CustomerLoyalty.user_id == awards.c.user_id
+        ).group_by(awards.c.campaign_id, awards.c.user_id)
+    ).all()
+
+    hour_rows = db.session.execute(
+        select(
+            awards.c.campaign_id, hour,
+            func.count(awards.c.transaction_id),
+            func.coalesce(func.sum(Order.total_amount), 0)
+        ).join(
+            Order, Order.order_id == awards.c.order_id
+        ).group_by(awards.c.campaign_id, hour)
+    ).all()
+
+    db.session.execute(CampaignHourStats.__table__.delete())
+    db.session.execute(CampaignCustomerStats.__table__.delete())
+
+    if customer_rows:
+        db.session.execute(CampaignCustomerStats.__table__.insert(), [
+            dict(campaign_id=campaign_id, user_id=user_id, order_count=count, bonus_points=bonus,
+                 revenue=revenue, tier_level=tier, first_award=first_award)
+            for campaign_id, user_id, count, bonus, revenue, tier, first_award in customer_rows
+        ])
+    if hour_rows:
+        db.session.execute(CampaignHourStats.__table__.insert(), [
+            dict(campaign_id=campaign_id, hour=int(hour), order_count=count, revenue=revenue)
+            for campaign_id, hour, count, revenue in hour_rows
+        ])
+
+    # Usage counters the campaign rules claim against
+    refresh_usage_counts(db.session.connection())
+
+    db.session.commit()
+    return len(customer_rows)
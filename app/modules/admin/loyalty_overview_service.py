@@ -0,0 +1,196 @@
+"""
+Loyalty Overview Service
+Keeps each loyalty account's total_spent current as orders are written, by
+adding what each flush changed, and answers the loyalty management page in
+a fixed number of queries: one page of accounts, one GROUP BY for the tiers
+and one pass for program totals
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import event, func, select, case, inspect
+
+from app.extensions import db
+from app.models import Order, CustomerLoyalty, RewardRedemption
+
+TIERS = ('bronze', 'silver', 'gold', 'platinum')
+
+# Finished orders, which count towards what a customer has spent
+SPENT_STATUSES = ('completed', 'delivered')
+
+# Sort orders of the accounts table
+SORTS = {
+    'points': (CustomerLoyalty.total_points.desc(), CustomerLoyalty.loyalty_id),
+    'spent': (CustomerLoyalty.total_spent.desc(), CustomerLoyalty.loyalty_id)
+}
+
+
+def refresh_total_spent(connection, user_ids=None):
+    """Recompute total_spent from finished (SPENT_STATUSES) orders
+
+    Args:
+        connection: Connection to write with
+        user_ids (iterable): Limit the refresh to these customers (default: all)
+
+    Returns:
+        int: Number of loyalty accounts updated
+    """
+    accounts = CustomerLoyalty.__table__
+    spent = select(func.coalesce(func.sum(Order.total_amount), 0)).where(
+        Order.user_id == accounts.c.user_id,
+        Order.status.in_(SPENT_STATUSES)
+    ).scalar_subquery()
+
+    stmt = accounts.update().values(total_spent=spent)
+    if user_ids is not None:
+        stmt = stmt.where(accounts.c.user_id.in_(user_ids))
+
+    return connection.execute(stmt).rowcount
+
+
+def _spend(status, total_amount):
+    """What an order in this state adds to its customer's total_spent"""
+    return Decimal(str(total_amount or 0)) if status in SPENT_STATUSES else Decimal(0)
+
+
+def _previous(obj, key):
+    """An order attribute as it was before this flush"""
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    """No-op; registered with active_history so flush history has the old value"""
+
+
+for _attribute in (Order.user_id, Order.status, Order.total_amount):
+    event.listen(_attribute, 'set', _keep_previous_value, active_history=True)
+
+
+def _spend_changes(session):
+    """
+    Work out how this flush moved customers' spend
+
+    Returns:
+        tuple: ({user_id: change to total_spent}, user ids whose new
+        loyalty account must be summed from their past orders)
+    """
+    changes = defaultdict(Decimal)
+    new_accounts = set()
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            changes[obj.user_id] += _spend(obj.status, obj.total_amount)
+        elif isinstance(obj, CustomerLoyalty):
+            new_accounts.add(obj.user_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            changes[_previous(obj, 'user_id')] -= _spend(_previous(obj, 'status'), _previous(obj, 'total_amount'))
+
+    for obj in session.dirty:
+        if isinstance(obj, Order) and session.is_modified(obj):
+            # The order leaves its old customer's spend and joins its current one's
+            changes[_previous(obj, 'user_id')] -= _spend(_previous(obj, 'status'), _previous(obj, 'total_amount'))
+            changes[obj.user_id] += _spend(obj.status, obj.total_amount)
+
+    new_accounts.discard(None)
+    changes = {
+        user_id: change for user_id, change in changes.items()
+        if change and user_id is not None and user_id not in new_accounts
+    }
+    return changes, new_accounts
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_customer_spend(session, flush_context):
+    """Add the flushed order changes to total_spent; sum new accounts from their orders"""
+    changes, new_accounts = _spend_changes(session)
+    if changes:
+        accounts = CustomerLoyalty.__table__
+        session.connection().execute(accounts.update().where(
+            accounts.c.user_id.in_(changes)
+        ).values(
+            total_spent=accounts.c.total_spent + case(changes, value=accounts.c.user_id)
+        ))
+    if new_accounts:
+        refresh_total_spent(session.connection(), new_accounts)
+
+
+def get_customer_page(page, per_page, sort='points'):
+    """
+    Get one page of loyalty accounts with their users, sorted by a maintained column
+
+    Args:
+        sort (str): 'points' (available points) or 'spent'
+
+    Returns:
+        Pagination: CustomerLoyalty items
+    """
+    return CustomerLoyalty.query.order_by(*SORTS.get(sort, SORTS['points'])).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+
+
+def get_tier_distribution():
+    """
+    Get account counts per tier in one GROUP BY
+
+    Returns:
+        dict: {tier: count} plus 'total' and 'active' (accounts with points)
+    """
+    distribution = dict.fromkeys(TIERS, 0)
+    distribution['total'] = distribution['active'] = 0
+
+    for tier, count, active in db.session.execute(
+        select(
+            CustomerLoyalty.tier_level,
+            func.count(CustomerLoyalty.loyalty_id),
+            func.sum(case((CustomerLoyalty.total_points > 0, 1), else_=0))
+        ).group_by(CustomerLoyalty.tier_level)
+    ):
+        distribution[tier] = count
+        distribution['total'] += count
+        distribution['active'] += active or 0
+
+    return distribution
+
+
+def get_program_totals():
+    """
+    Get points earned and redeemed and completed redemptions in one statement
+    Points come from the accounts' running totals rather than every transaction
+
+    Returns:
+        dict: points_distributed, points_redeemed (expired included), redemptions
+    """
+    redemptions = select(func.count(RewardRedemption.redemption_id)).where(
+        RewardRedemption.status == 'completed'
+    ).scalar_subquery()
+
+    distributed, redeemed, completed = db.session.execute(
+        select(
+            func.coalesce(func.sum(CustomerLoyalty.total_earned), 0),
+            func.coalesce(func.sum(CustomerLoyalty.total_redeemed + CustomerLoyalty.total_expired), 0),
+            redemptions
+        )
+    ).one()
+
+    return {
+        'points_distributed': int(distributed),
+        'points_redeemed': int(redeemed),
+        'redemptions': int(completed or 0)
+    }
+
+
+def rebuild_total_spent():
+    """
+    Recompute every loyalty account's total_spent from orders
+    Used to backfill an existing database and to reconcile drift after bulk edits
+
+    Returns:
+        int: Number of loyalty accounts updated
+    """
+    updated = refresh_total_spent(db.session.connection())
+    db.session.commit()
+    return updated
@@ -0,0 +1,128 @@
+"""
+Table Occupancy Service
+Keeps tables.status in step with active orders and table sessions as they are
+written, so reading occupancy never has to rewrite the tables table
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, union, inspect
+
+from app.extensions import db
+from app.models import Order, Table, TableSession
+
+# Order statuses that keep a table occupied
+ACTIVE_ORDER_STATUSES = ('new', 'processing')
+
+
+def get_active_table_ids(connection, table_ids=None):
+    """Get ids of tables with an active order or an active session
+
+    Args:
+        connection: Connection to query with
+        table_ids (iterable): Limit the check to these tables (default: all)
+    """
+    orders = select(Order.table_id).where(
+        Order.status.in_(ACTIVE_ORDER_STATUSES),
+        Order.table_id.isnot(None)
+    )
+    sessions = select(TableSession.table_id).where(TableSession.is_active == True)
+
+    if table_ids is not None:
+        orders = orders.where(Order.table_id.in_(table_ids))
+        sessions = sessions.where(TableSession.table_id.in_(table_ids))
+
+    return {row[0] for row in connection.execute(union(orders, sessions))}
+
+
+def refresh_table_statuses(connection, table_ids=None):
+    """Mark tables occupied/available from their orders and sessions
+
+    Only rows whose status actually changes are written. Reserved tables stay
+    reserved until they become active.
+
+    Returns:
+        int: Number of tables whose status changed
+    """
+    tables = Table.__table__
+    active_ids = get_active_table_ids(connection, table_ids)
+
+    occupy = tables.update().where(tables.c.status != 'occupied')
+    release = tables.update().where(tables.c.status == 'occupied')
+    if table_ids is not None:
+        release = release.where(tables.c.table_id.in_(table_ids))
+    if active_ids:
+        release = release.where(tables.c.table_id.notin_(active_ids))
+
+    changed = 0
+    if active_ids:
+        changed += connection.execute(
+            occupy.where(tables.c.table_id.in_(active_ids)).values(status='occupied')
+        ).rowcount
+    changed += connection.execute(release.values(status='available')).rowcount
+    return changed
+
+
+def _changed_table_ids(session):
+    """Collect tables touched by order status or session changes in this flush"""
+    table_ids = set()
+
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, (Order, TableSession)) and obj.table_id:
+            table_ids.add(obj.table_id)
+
+    for obj in session.dirty:
+        if not isinstance(obj, (Order, TableSession)):
+            continue
+        attrs = inspect(obj).attrs
+        state = attrs.status if isinstance(obj, Order) else attrs.is_active
+        if state.history.has_changes():
+            table_ids.add(obj.table_id)
+
+        moved = attrs.table_id.history
+        if moved.has_changes():
+            table_ids.update(moved.deleted)
+            table_ids.update(moved.added)
+
+    table_ids.discard(None)
+    return table_ids
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_table_occupancy(session, flush_context):
+    """Update the status of tables whose orders or sessions changed"""
+    table_ids = _changed_table_ids(session)
+    if table_ids:
+        refresh_table_statuses(session.connection(), table_ids)
+
+
+def reconcile_table_statuses(session_timeout_hours=None):
+    """
+    Scheduled reconciliation of every table's status
+    Ends table sessions older than the timeout, then corrects any drift
+    (e.g. after manual edits or bulk scripts)
+
+    Args:
+        session_timeout_hours (int): End active sessions started before this
+            many hours ago (default: TABLE_SESSION_TIMEOUT_HOURS)
+
+    Returns:
+        dict: Sessions ended and tables changed
+    """
+    from flask import current_app
+
+    if session_timeout_hours is None:
+        session_timeout_hours = current_app.config.get('TABLE_SESSION_TIMEOUT_HOURS', 4)
+
+    now = datetime.utcnow()
+    sessions = TableSession.__table__
+    ended = db.session.execute(
+        sessions.update().where(
+            sessions.c.is_active == True,
+            sessions.c.started_at < now - timedelta(hours=session_timeout_hours)
+        ).values(is_active=False, ended_at=now)
+    ).rowcount
+
+    changed = refresh_table_statuses(db.session.connection())
+    db.session.commit()
+
+    return {'sessions_ended': ended, 'tables_changed': changed}
@@ -0,0 +1,267 @@
+"""
+RFM Service
+Scores and segments customers by Recency, Frequency and Monetary value, and
+estimates their lifetime value, on NumPy arrays, one element per customer,
+so the customer analytics page can
+cover hundreds of thousands of customers. Only the handful of customers the
+page lists are turned into dicts
+"""
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.models import User
+from app.modules.admin import analytics_service
+
+# Checked in order; a customer falls in the first segment whose rule matches
+SEGMENTS = (
+    'Champions',
+    'Loyal Customers',
+    'Potential Loyalists',
+    'New Customers',
+    'At Risk',
+    'Cannot Lose Them',
+    'Hibernating'
+)
+
+# (lowest order count, label) of each frequency histogram bin
+FREQUENCY_BINS = (
+    (1, 'One-time'),
+    (2, 'Occasional'),
+    (4, 'Regular'),
+    (8, 'Frequent'),
+    (16, 'VIP')
+)
+
+# Rows fetched per round trip while loading customer columns
+FETCH_SIZE = 10000
+
+# Lifetime value: how long a customer keeps ordering, and the shortest
+# history an order rate is measured over (so one recent order is not
+# extrapolated as an order a day)
+EXPECTED_LIFESPAN_YEARS = 3
+MIN_OBSERVED_DAYS = 30
+
+_DAY = np.timedelta64(1, 'D')
+
+
+class CustomerColumns(NamedTuple):
+    """Per-customer order totals for a period, one array element per customer"""
+    user_id: np.ndarray  # int64
+    frequency: np.ndarray  # int64, orders in the period
+    monetary: np.ndarray  # float64, total spent in the period
+    first_order: np.ndarray  # datetime64[s]
+    last_order: np.ndarray  # datetime64[s]
+
+
+class Segment:
+    """A segment's size and its highest spending customers"""
+    __slots__ = ('name', 'count', 'top')
+
+    def __init__(self, name, count, top):
+        self.name = name
+        self.count = count
+        self.top = top
+
+    def __len__(self):
+        return self.count
+
+
+def load_customer_columns(start_date, end_date):
+    """
+    Load every customer's order count, spend and first/last order time for a period
+
+    Reads the hourly customer buckets, so first and last order times are
+    accurate to the hour
+
+    Returns:
+        CustomerColumns: Arrays ordered by user_id
+    """
+    customers = analytics_service.customer_source(start_date, end_date)
+    result = db.session.execute(
+        select(
+            customers.c.user_id,
+            func.sum(customers.c.order_count),
+            func.sum(customers.c.revenue),
+            func.min(customers.c.at),
+            func.max(customers.c.at)
+        ).group_by(customers.c.user_id).order_by(customers.c.user_id)
+    )
+
+    chunks = [[] for _ in CustomerColumns._fields]
+    for rows in result.partitions(FETCH_SIZE):
+        user_ids, frequencies, monetary, first_orders, last_orders = zip(*rows)
+        chunks[0].append(np.array(user_ids, dtype=np.int64))
+        chunks[1].append(np.array(frequencies, dtype=np.int64))
+        chunks[2].append(np.array([float(value or 0) for value in monetary], dtype=np.float64))
+        chunks[3].append(np.array(first_orders, dtype='datetime64[s]'))
+        chunks[4].append(np.array(last_orders, dtype='datetime64[s]'))
+
+    dtypes = (np.int64, np.int64, np.float64, 'datetime64[s]', 'datetime64[s]')
+    return CustomerColumns(*[
+        np.concatenate(chunk) if chunk else np.empty(0, dtype=dtype)
+        for chunk, dtype in zip(chunks, dtypes)
+    ])
+
+
+def quintile_scores(values):
+    """Score values 1-5 by quintile, higher values scoring higher; equal values score alike"""
+    if not len(values):
+        return np.empty(0, dtype=np.int8)
+    edges = np.quantile(values, (0.2, 0.4, 0.6, 0.8))
+    return (np.searchsorted(edges, values, side='right') + 1).astype(np.int8)
+
+
+def recency_days(columns, now):
+    """Whole days since each customer's last order"""
+    return (np.datetime64(now, 's') - columns.last_order) // _DAY
+
+
+def lifetime_values(columns, now, lifespan_years=EXPECTED_LIFESPAN_YEARS):
+    """
+    Estimate every customer's lifetime value (CLV)
+
+    Average order value x orders per year x expected lifespan in years,
+    with orders per year measured from the customer's first order to now
+
+    Returns:
+        ndarray: float64, one value per customer
+    """
+    observed_days = np.maximum((np.datetime64(now, 's') - columns.first_order) / _DAY, MIN_OBSERVED_DAYS)
+    # Average order value x order count is the customer's spend
+    return columns.monetary / observed_days * 365.0 * lifespan_years
+
+
+def rfm_scores(columns, now):
+    """
+    Score every customer 1-5 on recency, frequency and monetary value
+
+    Returns:
+        tuple: (r, f, m) int8 arrays; 5 is the most recent, most frequent, highest spending fifth
+    """
+    return (
+        quintile_scores(-recency_days(columns, now)),
+        quintile_scores(columns.frequency),
+        quintile_scores(columns.monetary)
+    )
+
+
+def assign_segments(columns, r, f, m):
+    """Get each customer's index into SEGMENTS from their RFM scores"""
+    rules = [
+        (r >= 4) & (f >= 4) & (m >= 4),  # Champions
+        (r >= 3) & (f >= 4),  # Loyal Customers
+        (r >= 3) & (columns.frequency >= 2),  # Potential Loyalists
+        (r >= 4),  # New Customers: recent, a single order
+        (r <= 2) & (f >= 3) & (m < 4),  # At Risk
+        (r <= 2) & (m >= 4),  # Cannot Lose Them
+    ]
+    return np.select(rules, np.arange(len(rules), dtype=np.int8), default=len(SEGMENTS) - 1).astype(np.int8)
+
+
+def frequency_histogram(frequency):
+    """Count customers per FREQUENCY_BINS bin"""
+    lows = np.array([low for low, _ in FREQUENCY_BINS])
+    counts = np.bincount(np.searchsorted(lows, frequency, side='right') - 1, minlength=len(lows))
+    return {label: int(count) for (_, label), count in zip(FREQUENCY_BINS, counts)}
+
+
+def top_indices(values, limit, within=None):
+    """Indices of the `limit` largest values, largest first, optionally among `within` indices"""
+    candidates = np.arange(len(values)) if within is None else within
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-values[candidates], limit - 1)[:limit]]
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def _users(user_ids):
+    """{user_id: (name, email)} for the customers a page lists"""
+    if not len(user_ids):
+        return {}
+    rows = db.session.execute(
+        select(User.user_id, User.name, User.email).where(User.user_id.in_(user_ids.tolist()))
+    )
+    return {user_id: (name, email) for user_id, name, email in rows}
+
+
+def customer_rows(columns, indices, users, clv):
+    """Build the template rows for the customers at `indices`
+
+    Args:
+        columns (CustomerColumns): All customers
+        indices (ndarray): Positions of the customers to list
+        users (dict): {user_id: (name, email)} covering those customers
+        clv (ndarray): Every customer's lifetime value
+    """
+    days_active = (columns.last_order[indices] - columns.first_order[indices]) // _DAY + 1
+
+    rows = []
+    for index, days, value in zip(indices.tolist(), days_active.tolist(), clv[indices].tolist()):
+        user_id = int(columns.user_id[index])
+        order_count = int(columns.frequency[index])
+        total_spent = float(columns.monetary[index])
+        name, email = users.get(user_id, (None, None))
+        rows.append({
+            'user_id': user_id,
+            'name': name,
+            'email': email,
+            'total_spent': total_spent,
+            'order_count': order_count,
+            'avg_order_value': total_spent / order_count if order_count else 0.0,
+            'days_active': days,
+            'frequency': round(order_count / days, 3),
+            'clv': round(value, 2),
+            'first_order': columns.first_order[index].item(),
+            'last_order': columns.last_order[index].item()
+        })
+    return rows
+
+
+def customer_behavior(columns, top_n=10, now=None):
+    """
+    Spending summary of all customers and rows for the top spenders
+
+    Returns:
+        dict: customer_metrics (top_n rows, highest spend first), frequency_analysis,
+        total_customers, avg_customer_value, avg_clv, avg_orders_per_customer
+    """
+    total = len(columns.user_id)
+    clv = lifetime_values(columns, now or datetime.now())
+    top = top_indices(columns.monetary, top_n)
+    return {
+        'customer_metrics': customer_rows(columns, top, _users(columns.user_id[top]), clv),
+        'frequency_analysis': frequency_histogram(columns.frequency),
+        'total_customers': total,
+        'avg_customer_value': float(columns.monetary.mean()) if total else 0,
+        'avg_clv': float(clv.mean()) if total else 0,
+        'avg_orders_per_customer': float(columns.frequency.mean()) if total else 0
+    }
+
+
+def customer_segments(columns, now, top_n=5):
+    """
+    Segment customers by RFM score
+
+    Returns:
+        dict: {segment name: Segment}, in SEGMENTS order; each Segment holds
+        its size and its top_n highest spending customers
+    """
+    r, f, m = rfm_scores(columns, now)
+    codes = assign_segments(columns, r, f, m)
+    counts = np.bincount(codes, minlength=len(SEGMENTS))
+
+    tops = [top_indices(columns.monetary, top_n, np.flatnonzero(codes == code)) for code in range(len(SEGMENTS))]
+    users = _users(columns.user_id[np.concatenate(tops)])
+    recency = recency_days(columns, now)
+    clv = lifetime_values(columns, now)
+
+    segments = {}
+    for code, (name, top) in enumerate(zip(SEGMENTS, tops)):
+        rows = customer_rows(columns, top, users, clv)
+        for row, index in zip(rows, top.tolist()):
+            row.update(recency=int(recency[index]), r=int(r[index]), f=int(f[index]), m=int(m[index]))
+        segments[name] = Segment(name, int(counts[code]), rows)
+    return segments
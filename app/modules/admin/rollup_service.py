@@ -0,0 +1,398 @@
+"""
+Dashboard Rollup Service
+Keeps the daily sales and category rollups and the hourly analytics buckets
+current as orders are written, so the admin dashboard and analytics pages
+read pre-aggregated rows
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from sqlalchemy import event, func, case, select, inspect
+from sqlalchemy.dialects import sqlite, postgresql
+
+from app.extensions import db
+from app.models import (
+    Order, OrderItem, MenuItem, Category, DailySalesRollup, DailyCategoryRollup,
+    HourlySalesBucket, HourlyCustomerBucket, HourlyItemBucket
+)
+
+# Rollup column for each order status; other statuses only count towards totals
+STATUS_COLUMNS = {
+    'new': 'new_count',
+    'processing': 'processing_count',
+    'completed': 'completed_count',
+    'rejected': 'rejected_count',
+    'cancelled': 'cancelled_count'
+}
+
+# Every maintained table with its key columns
+ROLLUP_TABLES = {
+    'sales': (DailySalesRollup.__table__, ['day']),
+    'categories': (DailyCategoryRollup.__table__, ['day', 'category_id']),
+    'hourly_sales': (HourlySalesBucket.__table__, ['hour', 'status']),
+    'hourly_customers': (HourlyCustomerBucket.__table__, ['hour', 'user_id']),
+    'hourly_items': (HourlyItemBucket.__table__, ['hour', 'item_id'])
+}
+
+_UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert
+}
+
+
+def _money(value):
+    return Decimal(str(value or 0))
+
+
+def _order_day(order_time):
+    return (order_time or datetime.utcnow()).date()
+
+
+def order_hour(order_time):
+    """Start of the hour an order falls in, the key of its analytics buckets"""
+    return (order_time or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+
+def _new_deltas():
+    """{rollup name: {key tuple: {column: delta}}}"""
+    return {name: defaultdict(lambda: defaultdict(int)) for name in ROLLUP_TABLES}
+
+
+def increment_rows(connection, table, key_columns, rows, initial=None):
+    """Add each row's deltas onto the matching rollup row, creating it if missing
+
+    Args:
+        connection: Connection of the flushing session
+        table (Table): Rollup table
+        key_columns (list): Primary key column names
+        rows (dict): {key tuple: {column: delta}}
+        initial (dict): {key tuple: {column: value}} set only when a row is created
+    """
+    insert = _UPSERT_DIALECTS.get(connection.dialect.name)
+    initial = initial or {}
+
+    for keys, deltas in rows.items():
+        deltas = {column: value for column, value in deltas.items() if value}
+        if not deltas:
+            continue
+
+        key_values = dict(zip(key_columns, keys))
+        insert_values = {**key_values, **initial.get(keys, {}), **deltas}
+
+        if insert is not None:
+            stmt = insert(table).values(**insert_values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=key_columns,
+                set_={column: table.c[column] + stmt.excluded[column] for column in deltas}
+            )
+            connection.execute(stmt)
+            continue
+
+        result = connection.execute(
+            table.update()
+            .where(*[table.c[column] == value for column, value in key_values.items()])
+            .values({column: table.c[column] + value for column, value in deltas.items()})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**insert_values))
+
+
+def _write_deltas(connection, deltas):
+    for name, rows in deltas.items():
+        if rows:
+            table, key_columns = ROLLUP_TABLES[name]
+            increment_rows(connection, table, key_columns, rows)
+
+
+def _add_order(deltas, order, sign):
+    """Count (sign=1) or uncount (sign=-1) a whole order"""
+    total = sign * _money(order.total_amount)
+
+    bucket = deltas['sales'][(_order_day(order.order_time),)]
+    bucket['order_count'] += sign
+    bucket['revenue'] += total
+    if order.status in STATUS_COLUMNS:
+        bucket[STATUS_COLUMNS[order.status]] += sign
+
+    hour = order_hour(order.order_time)
+    for bucket in (deltas['hourly_sales'][(hour, order.status)],
+                   deltas['hourly_customers'][(hour, order.user_id)]):
+        bucket['order_count'] += sign
+        bucket['revenue'] += total
+
+
+def _add_order_update(deltas, order):
+    """Move an updated order between status buckets and adjust revenue"""
+    state = inspect(order)
+    status = state.attrs.status.history
+    total = state.attrs.total_amount.history
+    bucket = deltas['sales'][(_order_day(order.order_time),)]
+
+    old_status = status.deleted[0] if status.has_changes() and status.deleted else order.status
+    old_total = total.deleted[0] if total.has_changes() and total.deleted else order.total_amount
+
+    if status.has_changes():
+        if old_status in STATUS_COLUMNS:
+            bucket[STATUS_COLUMNS[old_status]] -= 1
+        if order.status in STATUS_COLUMNS:
+            bucket[STATUS_COLUMNS[order.status]] += 1
+
+    if total.has_changes():
+        revenue_change = _money(order.total_amount) - _money(old_total)
+        bucket['revenue'] += revenue_change
+        deltas['hourly_customers'][(order_hour(order.order_time), order.user_id)]['revenue'] += revenue_change
+
+    if status.has_changes() or total.has_changes():
+        hour = order_hour(order.order_time)
+        old_bucket = deltas['hourly_sales'][(hour, old_status)]
+        old_bucket['order_count'] -= 1
+        old_bucket['revenue'] -= _money(old_total)
+        new_bucket = deltas['hourly_sales'][(hour, order.status)]
+        new_bucket['order_count'] += 1
+        new_bucket['revenue'] += _money(order.total_amount)
+
+
+def _add_order_lines(session, deltas, lines):
+    """Count new (sign=1) and deleted (sign=-1) order lines per day and category and per hour and item"""
+    connection = session.connection()
+
+    order_times = {
+        obj.order_id: obj.order_time
+        for obj in list(session.identity_map.values()) + list(session.deleted)
+        if isinstance(obj, Order)
+    }
+    missing_orders = {line.order_id for line, _ in lines} - set(order_times)
+    if missing_orders:
+        order_times.update(connection.execute(
+            select(Order.order_id, Order.order_time).where(Order.order_id.in_(missing_orders))
+        ).all())
+
+    item_ids = {line.item_id for line, _ in lines}
+    item_categories = {
+        obj.item_id: obj.category_id
+        for obj in session.identity_map.values()
+        if isinstance(obj, MenuItem) and obj.item_id in item_ids
+    }
+    missing_items = item_ids - set(item_categories)
+    if missing_items:
+        item_categories.update(connection.execute(
+            select(MenuItem.item_id, MenuItem.category_id).where(MenuItem.item_id.in_(missing_items))
+        ).all())
+
+    for line, sign in lines:
+        order_time = order_times.get(line.order_id)
+
+        category_id = item_categories.get(line.item_id)
+        if category_id is not None:
+            deltas['categories'][(_order_day(order_time), category_id)]['item_count'] += sign
+
+        bucket = deltas['hourly_items'][(order_hour(order_time), line.item_id)]
+        bucket['line_count'] += sign
+        bucket['quantity'] += sign * (line.quantity or 0)
+        bucket['revenue'] += sign * (line.quantity or 0) * _money(line.unit_price)
+
+
+def _previous_line(line):
+    """The flushed state of an edited order line"""
+    state = inspect(line)
+    values = {}
+    for key in ('item_id', 'quantity', 'unit_price'):
+        history = state.attrs[key].history
+        values[key] = history.deleted[0] if history.has_changes() and history.deleted else getattr(line, key)
+    return SimpleNamespace(order_id=line.order_id, **values)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    """No-op; registered with active_history so flush history has the old value"""
+
+
+for _attribute in (Order.status, Order.total_amount,
+                   OrderItem.item_id, OrderItem.quantity, OrderItem.unit_price):
+    event.listen(_attribute, 'set', _keep_previous_value, active_history=True)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_order_changes(session, flush_context):
+    """Apply the flushed order changes to the rollups in the same transaction"""
+    deltas = _new_deltas()
+    lines = []
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            _add_order(deltas, obj, 1)
+        elif isinstance(obj, OrderItem):
+            lines.append((obj, 1))
+
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            _add_order(deltas, obj, -1)
+        elif isinstance(obj, OrderItem):
+            lines.append((obj, -1))
+
+    for obj in session.dirty:
+        if isinstance(obj, Order) and session.is_modified(obj):
+            _add_order_update(deltas, obj)
+        elif isinstance(obj, OrderItem) and session.is_modified(obj):
+            # An edited line moves out of its old buckets and into its new ones
+            lines.append((_previous_line(obj), -1))
+            lines.append((obj, 1))
+
+    if lines:
+        _add_order_lines(session, deltas, lines)
+
+    if any(deltas.values()):
+        _write_deltas(session.connection(), deltas)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_bulk_order_items(orm_execute_state):
+    """Count order lines written with a bulk insert(OrderItem), which skips flush events"""
+    if not (orm_execute_state.is_insert and orm_execute_state.bind_mapper is inspect(OrderItem)):
+        return None
+
+    result = orm_execute_state.invoke_statement()
+
+    rows = orm_execute_state.parameters
+    if isinstance(rows, dict):
+        rows = [rows]
+    lines = [
+        (SimpleNamespace(order_id=row['order_id'], item_id=row['item_id'],
+                         quantity=row.get('quantity', 1), unit_price=row.get('unit_price')), 1)
+        for row in rows or []
+    ]
+    if lines:
+        session = orm_execute_state.session
+        deltas = _new_deltas()
+        _add_order_lines(session, deltas, lines)
+        _write_deltas(session.connection(), deltas)
+
+    return result
+
+
+def get_daily_rollups(start_day, end_day):
+    """Get {day: DailySalesRollup} for an inclusive range of days"""
+    rows = DailySalesRollup.query.filter(
+        DailySalesRollup.day >= start_day,
+        DailySalesRollup.day <= end_day
+    ).all()
+    return {row.day: row for row in rows}
+
+
+def get_top_categories(start_day, limit=5):
+    """Get (name, item_count) for the most ordered categories since start_day"""
+    item_count = func.sum(DailyCategoryRollup.item_count).label('item_count')
+
+    return db.session.query(
+        Category.name,
+        item_count
+    ).select_from(
+        DailyCategoryRollup
+    ).join(
+        Category, Category.category_id == DailyCategoryRollup.category_id
+    ).filter(
+        DailyCategoryRollup.day >= start_day
+    ).group_by(
+        Category.category_id
+    ).having(
+        item_count > 0
+    ).order_by(
+        item_count.desc()
+    ).limit(limit).all()
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value
+
+
+def rebuild_daily_rollup():
+    """
+    Recompute both rollup tables from orders
+    Used to backfill an existing database and to reconcile drift after bulk edits
+
+    Returns:
+        int: Number of days rebuilt
+    """
+    order_day = func.date(Order.order_time)
+
+    sales_rows = db.session.query(
+        order_day.label('day'),
+        func.count(Order.order_id),
+        func.coalesce(func.sum(Order.total_amount), 0),
+        *[func.sum(case((Order.status == status, 1), else_=0)) for status in STATUS_COLUMNS]
+    ).group_by(order_day).all()
+
+    category_rows = db.session.query(
+        order_day.label('day'),
+        MenuItem.category_id,
+        func.count(OrderItem.order_item_id)
+    ).join(
+        Order, Order.order_id == OrderItem.order_id
+    ).join(
+        MenuItem, MenuItem.item_id == OrderItem.item_id
+    ).group_by(order_day, MenuItem.category_id).all()
+
+    db.session.execute(DailyCategoryRollup.__table__.delete())
+    db.session.execute(DailySalesRollup.__table__.delete())
+
+    if sales_rows:
+        db.session.execute(DailySalesRollup.__table__.insert(), [
+            dict(
+                day=_as_date(day),
+                order_count=order_count,
+                revenue=revenue,
+                **{column: count or 0 for column, count in zip(STATUS_COLUMNS.values(), status_counts)}
+            )
+            for day, order_count, revenue, *status_counts in sales_rows
+        ])
+
+    if category_rows:
+        db.session.execute(DailyCategoryRollup.__table__.insert(), [
+            dict(day=_as_date(day), category_id=category_id, item_count=item_count)
+            for day, category_id, item_count in category_rows
+        ])
+
+    db.session.commit()
+    return len(sales_rows)
+
+
+def rebuild_hourly_buckets(batch_size=1000):
+    """
+    Recompute the hourly analytics buckets from orders and order lines
+    Orders are read in batches and summed in memory, one entry per bucket
+
+    Returns:
+        int: Number of hours rebuilt
+    """
+    deltas = _new_deltas()
+
+    orders = db.session.execute(
+        select(Order.order_time, Order.status, Order.user_id, Order.total_amount)
+        .execution_options(yield_per=batch_size)
+    )
+    for order in orders:
+        _add_order(deltas, order, 1)
+
+    lines = db.session.execute(
+        select(Order.order_time, OrderItem.item_id, OrderItem.quantity, OrderItem.unit_price)
+        .join(Order, Order.order_id == OrderItem.order_id)
+        .execution_options(yield_per=batch_size)
+    )
+    for line in lines:
+        bucket = deltas['hourly_items'][(order_hour(line.order_time), line.item_id)]
+        bucket['line_count'] += 1
+        bucket['quantity'] += line.quantity or 0
+        bucket['revenue'] += (line.quantity or 0) * _money(line.unit_price)
+
+    for name in ('hourly_items', 'hourly_customers', 'hourly_sales'):
+        table, key_columns = ROLLUP_TABLES[name]
+        db.session.execute(table.delete())
+        rows = [dict(zip(key_columns, keys), **values) for keys, values in deltas[name].items()]
+        if rows:
+            db.session.execute(table.insert(), rows)
+
+    db.session.commit()
+    return len({hour for hour, _ in deltas['hourly_sales']})
@@ -5,6 +5,8 @@ from sqlalchemy import func
 from app.modules.admin import bp
 from app.models import MenuItem, Category, User, Order, Table, OrderItem, QRCode, RewardItem, CustomerLoyalty, PointTransaction, RewardRedemption, PromotionalCampaign, LoyaltyProgram, Service, SystemSettings
 from app.extensions import db
+from app.modules.admin import analytics_service, campaign_stats_service, loyalty_overview_service, rfm_service
+from app.modules.menu import popularity_service
 from datetime import datetime, timedelta
 import os
 from PIL import Image
@@ -68,7 +70,6 @@ def dashboard():
 
     # Current time and date (UTC for database operations)
     now = datetime.now(timezone.utc)
-    today_start = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
 
     # Dashboard stats query
     stats_query = db.session.query(
@@ -83,102 +84,48 @@ def dashboard():
     # Staff count - Use the dedicated method for accurate counting
     staff_count = User.get_active_staff_count()
 
-    # Tables status based on active QR codes and their table status
-    # Get all tables that have active QR codes
-    tables_with_qr = db.session.query(Table.table_id).join(
-        QRCode, QRCode.table_id == Table.table_id
+    # Tables that have an active menu QR code
+    qr_tables_count = db.session.query(
+        func.count(func.distinct(QRCode.table_id))
     ).filter(
         QRCode.is_active == True,
         QRCode.qr_type == 'menu'
-    ).distinct().all()
-    
-    # Extract table IDs from result
-    table_ids = [table.table_id for table in tables_with_qr]
-    
-    if table_ids:
-        # If we have tables with QR codes, get their stats
-        tables_data = db.session.query(
-            func.count(Table.table_id).label('total_tables'),
-            func.sum(case((Table.status == 'available', 1), else_=0)).label('available_tables'),
-            func.sum(case((Table.status == 'occupied', 1), else_=0)).label('occupied_tables')
-        ).filter(Table.table_id.in_(table_ids)).first()
-    else:
-        # If no tables with QR codes, use None to trigger fallback
-        tables_data = None
+    ).scalar() or 0
+
+    # Order figures come from the daily rollup: one row per day, kept current on order writes
+    from app.modules.admin.rollup_service import get_daily_rollups, get_top_categories
+    today = now.date()
+    week_start = today - timedelta(days=6)
+    month_start = today.replace(day=1)
+    rollups = get_daily_rollups(min(week_start, month_start), today)
+    week_rollups = [rollups.get(week_start + timedelta(days=i)) for i in range(7)]
+
+    today_rollup = rollups.get(today)
+    todays_orders = today_rollup.order_count if today_rollup else 0
+    todays_revenue = round(float(today_rollup.revenue if today_rollup else 0), 2)
 
-    # Today's orders and revenue
-    today_orders_query = db.session.query(
-        func.count(Order.order_id).label('order_count'),
-        func.sum(Order.total_amount).label('total_revenue')
-    ).filter(
-        Order.order_time >= today_start
-    ).first()
-    
     # Recent orders for last 7 days
-    week_orders_count = Order.query.filter(
-        Order.order_time >= now - timedelta(days=7)
-    ).count()
-    
+    week_orders_count = sum(row.order_count for row in week_rollups if row)
+
     # Monthly revenue (current month)
-    month_start = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
-    monthly_revenue = db.session.query(
-        func.sum(Order.total_amount)
-    ).filter(
-        Order.order_time >= month_start
-    ).scalar() or 0
-    
-    # Prepare today's order data
-    todays_orders = today_orders_query.order_count or 0
-    todays_revenue = round(float(today_orders_query.total_revenue or 0), 2)
-    
+    monthly_revenue = sum(float(row.revenue) for day, row in rollups.items() if day >= month_start)
+
     # Revenue data for chart (last 7 days)
     revenue_data = {'labels': [], 'orders': [], 'revenue': []}
-    
-    for i in range(6, -1, -1):
-        day_date = now - timedelta(days=i)
-        day_start = datetime(day_date.year, day_date.month, day_date.day, tzinfo=timezone.utc)
-        day_end = day_start + timedelta(days=1)
-        
-        # Get orders and revenue for this day
-        day_data = db.session.query(
-            func.count(Order.order_id).label('order_count'),
-            func.sum(Order.total_amount).label('revenue')
-        ).filter(
-            Order.order_time >= day_start,
-            Order.order_time < day_end
-        ).first()
-        
-        # Format date as day name
-        day_label = day_date.strftime('%a')
+
+    for i, row in enumerate(week_rollups):
+        day_label = (week_start + timedelta(days=i)).strftime('%a')
         revenue_data['labels'].append(day_label)
-        revenue_data['orders'].append(day_data.order_count or 0)
-        revenue_data['revenue'].append(float(day_data.revenue or 0))
-    
-    # Popular categories data for chart
+        revenue_data['orders'].append(row.order_count if row else 0)
+        revenue_data['revenue'].append(float(row.revenue) if row else 0.0)
+
+    # Popular categories data for chart (top 5 by ordered lines in the past month)
     category_data = {'labels': [], 'data': []}
-    
-    # Get top 5 categories by order count in the past month
-    top_categories = db.session.query(
-        Category.name,
-        func.count(OrderItem.order_item_id).label('item_count')
-    ).join(
-        MenuItem, MenuItem.item_id == OrderItem.item_id
-    ).join(
-        Category, Category.category_id == MenuItem.category_id
-    ).join(
-        Order, Order.order_id == OrderItem.order_id
-    ).filter(
-        Order.order_time >= now - timedelta(days=30)
-    ).group_by(
-        Category.category_id
-    ).order_by(
-        desc('item_count')
-    ).limit(5).all()
-    
-    for cat in top_categories:
+
+    for cat in get_top_categories(today - timedelta(days=30), limit=5):
         category_data['labels'].append(cat.name)
-        category_data['data'].append(cat.item_count)
-    
+        category_data['data'].append(int(cat.item_count))
+
     # Order status distribution
     status_data = {'labels': ['New', 'Processing', 'Completed', 'Rejected'], 'data': [], 'colors': []}
     status_colors = {
@@ -187,59 +134,28 @@ def dashboard():
         'completed': 'rgba(16, 185, 129, 0.8)',   # Green
         'rejected': 'rgba(239, 68, 68, 0.8)'      # Red
     }
-    
+
     for status in status_data['labels']:
-        count = Order.query.filter(
-            Order.status == status.lower(),
-            Order.order_time >= now - timedelta(days=7)
-        ).count()
-        status_data['data'].append(count)
+        column = f'{status.lower()}_count'
+        status_data['data'].append(sum(getattr(row, column) for row in week_rollups if row))
         status_data['colors'].append(status_colors[status.lower()])
-    
+
     # Prepare stats dictionary
     # Count total QR codes for tables
     qr_code_count = QRCode.query.filter_by(is_active=True, qr_type='menu').count()
     
-    # Force sync all table statuses before generating stats
-    # This will set tables with active orders to 'occupied' and others to 'available'
-    print("Dashboard view: Updating all table statuses before rendering")
-    Table.update_all_table_statuses()
-    
-    # If no tables with QR codes found or no tables in result, get total count of all tables
-    if not tables_data or not tables_data.total_tables:
-        # Explicit query for all tables
-        all_tables_data = db.session.query(
-            func.count(Table.table_id).label('total_tables'),
-        ).first()
-        
-        total_tables = all_tables_data.total_tables or 0
-        print(f"Using all_tables_data count: {total_tables}")
-    else:
-        total_tables = tables_data.total_tables or 0
-        print(f"Using tables_with_qr count: {total_tables}")
-    
-    # Double check - get full table count for validation
-    actual_total = Table.query.count()
-    print(f"Actual total tables in database: {actual_total}")
-    
-    # Direct query for occupied tables - should match get_occupied_tables_count
-    direct_occupied_count = Table.query.filter_by(status='occupied').count()
-    print(f"Direct query occupied tables: {direct_occupied_count}")
-    
-    # Get accurate count of occupied tables using our newly fixed method
-    # This checks both table status and active orders in a single query
-    occupied_tables = Table.get_occupied_tables_count()
-    print(f"Final occupied tables count: {occupied_tables}")
-    
-    # Ensure total_tables is at least the number of occupied tables
+    # Table statuses are kept current by the occupancy tracker, so this is a plain read
+    table_counts = Table.get_status_counts()
+    occupied_tables = table_counts['occupied']
+
+    # Count tables with QR codes, falling back to all tables if none have one yet
+    total_tables = qr_tables_count or table_counts['total']
     if total_tables < occupied_tables:
-        print(f"Warning: total_tables ({total_tables}) < occupied_tables ({occupied_tables}), adjusting")
-        total_tables = actual_total
-    
+        total_tables = table_counts['total']
+
     # Calculate available tables as the difference between total and occupied
     # This ensures consistency between the numbers
     available_tables = max(0, total_tables - occupied_tables)
-    print(f"Available tables: {available_tables}")
     
     stats = {
         'total_menu_items': stats_query.total_menu_items or 0,
@@ -390,23 +306,17 @@ def revenue_analytics():
         start_date = None
         end_date = now
 
-    # Build base query
-    base_query = Order.query
-    if start_date:
-        base_query = base_query.filter(Order.order_time >= start_date)
-    base_query = base_query.filter(Order.order_time <= end_date)
-
     # Revenue metrics
-    revenue_data = calculate_revenue_metrics(base_query, start_date, end_date, period)
+    revenue_data = calculate_revenue_metrics(start_date, end_date, period)
 
     # Customer analytics
-    customer_data = calculate_customer_analytics(base_query, start_date, end_date)
+    customer_data = calculate_customer_analytics(start_date, end_date)
 
     # Product performance
-    product_data = calculate_product_performance(base_query, start_date, end_date)
+    product_data = calculate_product_performance(start_date, end_date)
 
     # Time-based analytics
-    time_data = calculate_time_analytics(base_query, start_date, end_date, period)
+    time_data = calculate_time_analytics(start_date, end_date, period)
 
     return render_template('revenue_analytics.html',
                          revenue_data=revenue_data,
@@ -442,20 +352,15 @@ def customer_analytics():
 
     end_date = now
 
-    # Build base query
-    base_query = Order.query
-    if start_date:
-        base_query = base_query.filter(Order.order_time >= start_date)
-    base_query = base_query.filter(Order.order_time <= end_date)
-
-    # Customer behavior metrics
-    behavior_data = calculate_detailed_customer_behavior(base_query, start_date, end_date)
+    # Customer behavior metrics and segmentation share one load of per-customer totals
+    columns = rfm_service.load_customer_columns(start_date, end_date)
+    behavior_data = calculate_detailed_customer_behavior(start_date, end_date, columns)
 
     # Customer segmentation
-    segmentation_data = calculate_customer_segmentation(base_query, start_date, end_date)
+    segmentation_data = calculate_customer_segmentation(start_date, end_date, columns)
 
     # Order patterns
-    pattern_data = calculate_order_patterns(base_query, start_date, end_date)
+    pattern_data = calculate_order_patterns(start_date, end_date)
 
     # Customer lifecycle
     lifecycle_data = calculate_customer_lifecycle(start_date, end_date)
@@ -498,36 +403,40 @@ def popular_items_analytics():
             # If parsing fails, fall back to all-time
             pass
 
-    # Get popular items with counts, filtered by date range if applicable
-    if start_date and period != 'all':
-        popular_items_data = MenuItem.get_popular_items_with_counts(limit=15, start_date=start_date, end_date=end_date)
-    else:
-        popular_items_data = MenuItem.get_popular_items_with_counts(limit=15)
+    # One page of item sales plus totals across every item, filtered by date range if applicable
+    if not (start_date and period != 'all'):
+        start_date = end_date = None
+    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config['POPULAR_ITEMS_PER_PAGE']
+    sales = popularity_service.get_item_sales(page, per_page, start_date, end_date)
+    totals = popularity_service.get_item_sales_totals(start_date, end_date)
 
     # Format data for template
-    analytics_data = []
-    for item, count in popular_items_data:
-        analytics_data.append({
-            'name': item.name,
-            'category': item.category.name,
-            'price': float(item.price),
-            'total_ordered': int(count),
-            'revenue': float(item.price) * int(count),
-            'image_url': item.image_url
-        })
+    analytics_data = [
+        {
+            'rank': (sales.page - 1) * per_page + index,
+            'name': row.name,
+            'category': row.category,
+            'price': float(row.price),
+            'status': row.status,
+            'total_ordered': int(row.quantity),
+            'revenue': float(row.revenue),
+            'image_url': row.image_url
+        }
+        for index, row in enumerate(sales.items, start=1)
+    ]
 
     # Handle empty analytics data
     if not analytics_data:
         flash('No data available for the selected time period.', 'info')
-        
-    # Calculate totals
-    total_orders = sum(item['total_ordered'] for item in analytics_data) if analytics_data else 0
-    total_revenue = sum(item['revenue'] for item in analytics_data) if analytics_data else 0
 
     return render_template('popular_items_analytics.html',
                          analytics_data=analytics_data,
-                         total_orders=total_orders,
-                         total_revenue=total_revenue)
+                         sales=sales,
+                         total_orders=totals['quantity'],
+                         total_revenue=totals['revenue'],
+                         top_ordered=totals['top_quantity'],
+                         item_count=totals['items'])
 
 @bp.route('/services')
 @login_required
@@ -894,8 +803,11 @@ def add_menu_item():
         description = request.form.get('description')
         price = request.form.get('price', type=float)
         category_id = request.form.get('category_id', type=int)
-        stock = request.form.get('stock', type=int, default=0)
+        # Blank (or Unlimited ticked) leaves stock untracked; 0 means sold out
+        stock = request.form.get('stock', type=int)
         status = request.form.get('status', 'available')
+        if stock == 0 and status == 'available':
+            status = 'out_of_stock'
 
         # Get discount information
         discount_percentage = request.form.get('discount_percentage', type=float)
@@ -995,6 +907,8 @@ def edit_menu_item(item_id):
         category_id = request.form.get('category_id', type=int)
         stock = request.form.get('stock', type=int)
         status = request.form.get('status')
+        if stock == 0 and status == 'available':
+            status = 'out_of_stock'
 
         # Get discount information
         discount_percentage = request.form.get('discount_percentage', type=float)
@@ -1067,7 +981,7 @@ def edit_menu_item(item_id):
         menu_item.description = description
         menu_item.price = price
         menu_item.category_id = category_id
-        menu_item.stock = stock or 0
+        menu_item.stock = stock
         menu_item.status = status
         menu_item.ingredients = ingredients
         menu_item.calories = calories
@@ -1346,77 +1260,30 @@ def loyalty_management():
     if not current_user.is_admin():
         return redirect(url_for('main.index'))
     
-    # Get pagination parameters
+    # Get pagination and sort parameters
     page = request.args.get('page', 1, type=int)
     per_page = 20  # Number of customers per page
-    
-    # Get paginated customers with total spent calculation
-    customers_query = CustomerLoyalty.query.order_by(
-        CustomerLoyalty.total_points.desc()
-    )
-    
-    customers_paginated = customers_query.paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
-    )
-    
-    # Calculate total spent for each customer in the current page
-    customers_with_spent = []
-    for customer in customers_paginated.items:
-        # Calculate total spent from completed orders
-        total_spent = db.session.query(func.sum(Order.total_amount)).filter(
-            Order.user_id == customer.user_id,
-            Order.status.in_(['completed', 'delivered'])
-        ).scalar() or 0
-        
-        # Add the total_spent attribute to the customer object
-        customer.total_spent = float(total_spent)
-        customers_with_spent.append(customer)
-    
-    # Update the paginated object items
-    customers_paginated.items = customers_with_spent
-    
-    # Get loyalty program statistics
-    total_customers = CustomerLoyalty.query.count()
-    active_customers = CustomerLoyalty.query.filter(CustomerLoyalty.total_points > 0).count()
-    
-    # Get tier distribution
-    bronze_customers = CustomerLoyalty.query.filter_by(tier_level='bronze').count()
-    silver_customers = CustomerLoyalty.query.filter_by(tier_level='silver').count()
-    gold_customers = CustomerLoyalty.query.filter_by(tier_level='gold').count()
-    platinum_customers = CustomerLoyalty.query.filter_by(tier_level='platinum').count()
-    
-    # Get total points distributed
-    total_points_distributed = db.session.query(func.sum(PointTransaction.points_earned)).scalar() or 0
-    total_points_redeemed = db.session.query(func.sum(PointTransaction.points_redeemed)).scalar() or 0
-    
-    # Get recent transactions
-    recent_transactions = PointTransaction.query.order_by(
-        PointTransaction.timestamp.desc()
-    ).limit(10).all()
-    
-    # Top customers by points
-    top_customers = CustomerLoyalty.query.order_by(
-        CustomerLoyalty.total_points.desc()
-    ).limit(10).all()
-    
-    # Calculate total redemptions
-    total_redemptions = RewardRedemption.query.filter_by(status='completed').count()
-    
+    sort = request.args.get('sort', 'points')
+
+    # One page of accounts; total spent is a maintained column
+    customers_paginated = loyalty_overview_service.get_customer_page(page, per_page, sort)
+
+    # Tier distribution and program totals
+    tiers = loyalty_overview_service.get_tier_distribution()
+    totals = loyalty_overview_service.get_program_totals()
+
     return render_template('loyalty_management.html',
                          customers=customers_paginated,
-                         total_customers=total_customers,
-                         active_customers=active_customers,
-                         bronze_customers=bronze_customers,
-                         silver_customers=silver_customers,
-                         gold_customers=gold_customers,
-                         platinum_customers=platinum_customers,
-                         total_points_distributed=total_points_distributed,
-                         total_points_redeemed=total_points_redeemed,
-                         total_redemptions=total_redemptions,
-                         recent_transactions=recent_transactions,
-                         top_customers=top_customers,
+                         sort=sort,
+                         total_customers=tiers['total'],
+                         active_customers=tiers['active'],
+                         bronze_customers=tiers['bronze'],
+                         silver_customers=tiers['silver'],
+                         gold_customers=tiers['gold'],
+                         platinum_customers=tiers['platinum'],
+                         total_points_distributed=totals['points_distributed'],
+                         total_points_redeemed=totals['points_redeemed'],
+                         total_redemptions=totals['redemptions'],
                          datetime=datetime)
 
 @bp.route('/loyalty-settings', methods=['GET', 'POST'])
@@ -1623,21 +1490,17 @@ def loyalty_transactions(customer_id):
         PointTransaction.timestamp.desc()
     ).paginate(page=page, per_page=20, error_out=False)
     
-    # Calculate summary statistics
-    all_transactions = PointTransaction.query.filter_by(user_id=customer.user_id).all()
-    total_earned = sum(t.points_earned or 0 for t in all_transactions)
-    total_redeemed = sum(t.points_redeemed or 0 for t in all_transactions)
-    total_bonuses = sum(t.points_earned or 0 for t in all_transactions if t.transaction_type == 'bonus')
-    
+    # Summary statistics are running totals kept on the account by the points ledger
     return render_template('loyalty_transactions.html',
                          customer=customer,
                          transactions=transactions,
                          transaction_type=transaction_type,
                          date_from=date_from,
                          date_to=date_to,
-                         total_earned=total_earned,
-                         total_redeemed=total_redeemed,
-                         total_bonuses=total_bonuses)
+                         total_earned=customer.total_earned,
+                         total_redeemed=customer.total_redeemed,
+                         total_bonuses=customer.total_bonus,
+                         total_expired=customer.total_expired)
 
 # ======================== END LOYALTY MANAGEMENT ROUTES ========================
 
@@ -1780,102 +1643,13 @@ def campaign_statistics(campaign_id):
         return redirect(url_for('admin.campaigns_management'))
     
     # Calculate campaign statistics
-    stats = calculate_campaign_stats(campaign)
+    stats = campaign_stats_service.get_campaign_stats(campaign)
     
     return render_template('campaign_statistics.html',
                          campaign=campaign,
                          stats=stats,
                          datetime=datetime)
 
-def calculate_campaign_stats(campaign):
-    """Calculate comprehensive statistics for a campaign"""
-    # Mock statistics - in a real application, these would be calculated from actual data
-    
-    # Basic stats
-    total_orders = 0
-    bonus_points_awarded = 0
-    customers_engaged = 0
-    revenue_impact = 0.0
-    
-    # Calculate if campaign is currently active
-    now = datetime.utcnow()
-    is_active = (campaign.status == 'active' and 
-                campaign.start_date and campaign.end_date and 
-                campaign.start_date <= now <= campaign.end_date)
-    
-    if is_active:
-        # Mock data for active campaigns
-        total_orders = 150
-        bonus_points_awarded = 15000
-        customers_engaged = 85
-        revenue_impact = 2500.00
-        performance_percentage = 75
-        performance_description = "Campaign is performing well with good customer engagement"
-        
-        # Growth metrics
-        total_orders_growth = 25
-        revenue_growth = 18
-        unique_customers_percentage = 45
-        
-        # Engagement breakdown by tier
-        engagement_breakdown = {
-            'bronze': 45,
-            'silver': 25,
-            'gold': 12,
-            'platinum': 3
-        }
-        
-        # Order patterns
-        order_patterns = {
-            'avg_order_value': 35.50,
-            'peak_time': '7:00 PM - 9:00 PM',
-            'repeat_customers': 65,
-            'new_customers': 35
-        }
-    else:
-        # Mock data for inactive/completed campaigns
-        total_orders = 320
-        bonus_points_awarded = 25000
-        customers_engaged = 150
-        revenue_impact = 4200.00
-        performance_percentage = 85
-        performance_description = "Campaign completed successfully with excellent results"
-        
-        # Growth metrics
-        total_orders_growth = 35
-        revenue_growth = 28
-        unique_customers_percentage = 60
-        
-        # Engagement breakdown by tier
-        engagement_breakdown = {
-            'bronze': 80,
-            'silver': 45,
-            'gold': 20,
-            'platinum': 5
-        }
-        
-        # Order patterns
-        order_patterns = {
-            'avg_order_value': 42.75,
-            'peak_time': '6:30 PM - 8:30 PM',
-            'repeat_customers': 70,
-            'new_customers': 30
-        }
-    
-    return {
-        'total_orders': total_orders,
-        'bonus_points_awarded': bonus_points_awarded,
-        'customers_engaged': customers_engaged,
-        'revenue_impact': revenue_impact,
-        'performance_percentage': performance_percentage,
-        'performance_description': performance_description,
-        'total_orders_growth': total_orders_growth,
-        'revenue_growth': revenue_growth,
-        'unique_customers_percentage': unique_customers_percentage,
-        'engagement_breakdown': engagement_breakdown,
-        'order_patterns': order_patterns
-    }
-
 # ======================== END CAMPAIGNS MANAGEMENT ROUTES
 
 # API Routes for AJAX operations
@@ -1906,6 +1680,28 @@ def api_recent_activity():
     return jsonify({'activities': activities})
 
 
+@bp.route('/api/cache-stats')
+@login_required
+def api_cache_stats():
+    """API endpoint for this worker's user cache hit rate"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    from app.user_cache import get_user_cache
+    return jsonify({'user_cache': get_user_cache().stats()})
+
+
+@bp.route('/api/job-stats')
+@login_required
+def api_job_stats():
+    """API endpoint for the background job queue's depth and recent failures"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    from app.job_queue import queue_stats
+    return jsonify({'background_jobs': queue_stats()})
+
+
 
 @bp.route('/api/search')
 @login_required
@@ -1963,11 +1759,12 @@ def update_item_stock(item_id):
         return jsonify({'error': 'Stock value required'}), 400
 
     try:
-        menu_item.stock = int(data['stock'])
+        # null or '' stops tracking the item's stock
+        menu_item.stock = None if data['stock'] in (None, '') else int(data['stock'])
         # Auto-update status based on stock
-        if menu_item.stock <= 0:
+        if menu_item.stock is not None and menu_item.stock <= 0:
             menu_item.status = 'out_of_stock'
-        elif menu_item.status == 'out_of_stock' and menu_item.stock > 0:
+        elif menu_item.status == 'out_of_stock':
             menu_item.status = 'available'
 
         db.session.commit()
@@ -2127,6 +1924,7 @@ def adjust_customer_points():
             return jsonify({'success': False, 'message': 'Customer not found'}), 404
         
         # Apply adjustment
+        old_points = loyalty.total_points
         if adjustment_type == 'add':
             loyalty.total_points += points_amount
             loyalty.lifetime_points += points_amount
@@ -2139,7 +1937,6 @@ def adjust_customer_points():
             transaction_type = 'adjustment'
             description = f'Admin adjustment: {reason} (-{points_amount} points)'
         elif adjustment_type == 'set':
-            old_points = loyalty.total_points
             loyalty.total_points = points_amount
             if points_amount > old_points:
                 loyalty.lifetime_points += (points_amount - old_points)
@@ -2149,11 +1946,11 @@ def adjust_customer_points():
         # Update tier
         loyalty.update_tier()
         
-        # Create transaction record
+        # Create transaction record; a 'set' records the difference so the points ledger follows it
         transaction = PointTransaction(
             user_id=loyalty.user_id,
-            points_earned=points_amount if adjustment_type == 'add' else 0,
-            points_redeemed=points_amount if adjustment_type == 'deduct' else 0,
+            points_earned=max(0, loyalty.total_points - old_points),
+            points_redeemed=max(0, old_points - loyalty.total_points),
             transaction_type=transaction_type,
             description=description
         )
@@ -2223,19 +2020,8 @@ def get_campaign_stats(campaign_id):
         if not campaign:
             return jsonify({'success': False, 'message': 'Campaign not found'}), 404
         
-        # Calculate statistics (mock data for now)
-        stats = {
-            'total_orders': 0,
-            'bonus_points_awarded': 0,
-            'customers_engaged': 0,
-            'revenue_impact': '0.00',
-            'performance_percentage': 0,
-            'performance_description': 'Campaign statistics will be calculated based on actual usage'
-        }
-        
-        # You can enhance this with real data from point transactions
-        # where the campaign was active
-        
+        stats = campaign_stats_service.get_campaign_stats(campaign)
+
         return jsonify({
             'success': True,
             'stats': stats
@@ -2846,50 +2632,50 @@ def system_settings():
     if request.method == 'POST':
         try:
             # Currency & Pricing Settings
-            SystemSettings.set_setting('system_currency', request.form.get('system_currency', 'EGP'), 'string', 
-                                     'Default system currency', 'currency')
-            SystemSettings.set_setting('tax_rate', request.form.get('tax_rate', '0'), 'float', 
-                                     'Tax rate percentage', 'currency')
-            SystemSettings.set_setting('service_charge', request.form.get('service_charge', '0'), 'float', 
-                                     'Service charge percentage', 'currency')
+            SystemSettings.set_setting('system_currency', request.form.get('system_currency', 'EGP'), setting_type='string',
+                                     description='Default system currency')
+            SystemSettings.set_setting('tax_rate', request.form.get('tax_rate', '0'), setting_type='float',
+                                     description='Tax rate percentage')
+            SystemSettings.set_setting('service_charge', request.form.get('service_charge', '0'), setting_type='float',
+                                     description='Service charge percentage')
             
             # Restaurant Information
-            SystemSettings.set_setting('restaurant_name', request.form.get('restaurant_name', 'Restaurant Management System'), 'string', 
-                                     'Restaurant display name', 'general')
-            SystemSettings.set_setting('restaurant_phone', request.form.get('restaurant_phone', ''), 'string', 
-                                     'Restaurant phone number', 'general')
-            SystemSettings.set_setting('restaurant_address', request.form.get('restaurant_address', ''), 'string', 
-                                     'Restaurant address', 'general')
+            SystemSettings.set_setting('restaurant_name', request.form.get('restaurant_name', 'Restaurant Management System'), setting_type='string',
+                                     description='Restaurant display name')
+            SystemSettings.set_setting('restaurant_phone', request.form.get('restaurant_phone', ''), setting_type='string',
+                                     description='Restaurant phone number')
+            SystemSettings.set_setting('restaurant_address', request.form.get('restaurant_address', ''), setting_type='string',
+                                     description='Restaurant address')
             
             # Order Settings
-            SystemSettings.set_setting('auto_accept_orders', 'auto_accept_orders' in request.form, 'boolean', 
-                                     'Automatically accept new orders', 'orders')
-            SystemSettings.set_setting('default_prep_time', request.form.get('default_prep_time', '30'), 'integer', 
-                                     'Default preparation time in minutes', 'orders')
-            SystemSettings.set_setting('max_order_items', request.form.get('max_order_items', '50'), 'integer', 
-                                     'Maximum items per order', 'orders')
+            SystemSettings.set_setting('auto_accept_orders', 'auto_accept_orders' in request.form, setting_type='boolean',
+                                     description='Automatically accept new orders')
+            SystemSettings.set_setting('default_prep_time', request.form.get('default_prep_time', '30'), setting_type='integer',
+                                     description='Default preparation time in minutes')
+            SystemSettings.set_setting('max_order_items', request.form.get('max_order_items', '50'), setting_type='integer',
+                                     description='Maximum items per order')
             
             # Notification Settings
-            SystemSettings.set_setting('enable_push_notifications', 'enable_push_notifications' in request.form, 'boolean', 
-                                     'Enable push notifications', 'notifications')
-            SystemSettings.set_setting('email_notifications', 'email_notifications' in request.form, 'boolean', 
-                                     'Send email notifications to staff', 'notifications')
-            SystemSettings.set_setting('notification_sound', 'notification_sound' in request.form, 'boolean', 
-                                     'Play sound for new orders', 'notifications')
+            SystemSettings.set_setting('enable_push_notifications', 'enable_push_notifications' in request.form, setting_type='boolean',
+                                     description='Enable push notifications')
+            SystemSettings.set_setting('email_notifications', 'email_notifications' in request.form, setting_type='boolean',
+                                     description='Send email notifications to staff')
+            SystemSettings.set_setting('notification_sound', 'notification_sound' in request.form, setting_type='boolean',
+                                     description='Play sound for new orders')
             
             # Loyalty Program Settings
-            SystemSettings.set_setting('loyalty_enabled', 'loyalty_enabled' in request.form, 'boolean', 
-                                     'Enable loyalty program', 'loyalty')
-            SystemSettings.set_setting('points_per_currency', request.form.get('points_per_currency', '2'), 'integer', 
-                                     'Points earned per currency unit spent', 'loyalty')
-            SystemSettings.set_setting('point_value', request.form.get('point_value', '0.5'), 'float', 
-                                     'Value of each loyalty point', 'loyalty')
+            SystemSettings.set_setting('loyalty_enabled', 'loyalty_enabled' in request.form, setting_type='boolean',
+                                     description='Enable loyalty program')
+            SystemSettings.set_setting('points_per_currency', request.form.get('points_per_currency', '2'), setting_type='integer',
+                                     description='Points earned per currency unit spent')
+            SystemSettings.set_setting('point_value', request.form.get('point_value', '0.5'), setting_type='float',
+                                     description='Value of each loyalty point')
             
             # System Maintenance
-            SystemSettings.set_setting('maintenance_mode', 'maintenance_mode' in request.form, 'boolean', 
-                                     'Enable maintenance mode', 'system')
-            SystemSettings.set_setting('backup_frequency', request.form.get('backup_frequency', 'daily'), 'string', 
-                                     'Automatic backup frequency', 'system')
+            SystemSettings.set_setting('maintenance_mode', 'maintenance_mode' in request.form, setting_type='boolean',
+                                     description='Enable maintenance mode')
+            SystemSettings.set_setting('backup_frequency', request.form.get('backup_frequency', 'daily'), setting_type='string',
+                                     description='Automatic backup frequency')
             
             flash('System settings saved successfully!', 'success')
             
@@ -2915,27 +2701,20 @@ def system_settings():
 
 # ======================== ANALYTICS HELPER FUNCTIONS ========================
 
-def calculate_revenue_metrics(base_query, start_date, end_date, period):
+def calculate_revenue_metrics(start_date, end_date, period):
     """Calculate comprehensive revenue metrics"""
-    from sqlalchemy import func
+    sales = analytics_service.sales_source(start_date, end_date)
 
-    # Total revenue and orders
-    total_stats = base_query.with_entities(
-        func.sum(Order.total_amount).label('total_revenue'),
-        func.count(Order.order_id).label('total_orders'),
-        func.avg(Order.total_amount).label('avg_order_value')
-    ).first()
+    # Revenue by status; totals are their sum
+    status_revenue = db.session.query(
+        sales.c.status,
+        func.sum(sales.c.revenue).label('revenue'),
+        func.sum(sales.c.order_count).label('count')
+    ).group_by(sales.c.status).all()
 
-    total_revenue = float(total_stats.total_revenue or 0)
-    total_orders = int(total_stats.total_orders or 0)
-    avg_order_value = float(total_stats.avg_order_value or 0)
-
-    # Revenue by status
-    status_revenue = base_query.with_entities(
-        Order.status,
-        func.sum(Order.total_amount).label('revenue'),
-        func.count(Order.order_id).label('count')
-    ).group_by(Order.status).all()
+    total_revenue = sum(float(revenue or 0) for _, revenue, _ in status_revenue)
+    total_orders = sum(int(count or 0) for _, _, count in status_revenue)
+    avg_order_value = total_revenue / total_orders if total_orders else 0
 
     # Calculate growth (compare with previous period)
     growth_data = calculate_growth_metrics(start_date, end_date, period)
@@ -2956,27 +2735,34 @@ def calculate_revenue_metrics(base_query, start_date, end_date, period):
         'growth': growth_data
     }
 
-def calculate_customer_analytics(base_query, start_date, end_date):
+def calculate_customer_analytics(start_date, end_date):
     """Calculate customer behavior analytics"""
-    from sqlalchemy import func
+    customers = analytics_service.customer_source(start_date, end_date)
 
-    # Customer metrics
-    customer_stats = base_query.join(User).with_entities(
-        func.count(func.distinct(Order.user_id)).label('unique_customers'),
-        func.count(Order.order_id).label('total_orders')
+    # Top customers by revenue
+    spending = db.session.query(
+        customers.c.user_id,
+        func.sum(customers.c.revenue).label('total_spent'),
+        func.sum(customers.c.order_count).label('order_count')
+    ).group_by(customers.c.user_id).subquery()
+
+    customer_stats = db.session.query(
+        func.count(spending.c.user_id).label('unique_customers'),
+        func.sum(spending.c.order_count).label('total_orders')
     ).first()
 
     unique_customers = int(customer_stats.unique_customers or 0)
     total_orders = int(customer_stats.total_orders or 0)
 
-    # Top customers by revenue
-    top_customers = base_query.join(User).with_entities(
+    top_customers = db.session.query(
         User.name,
         User.email,
-        func.sum(Order.total_amount).label('total_spent'),
-        func.count(Order.order_id).label('order_count')
-    ).group_by(User.user_id).order_by(
-        func.sum(Order.total_amount).desc()
+        spending.c.total_spent,
+        spending.c.order_count
+    ).select_from(spending).join(
+        User, User.user_id == spending.c.user_id
+    ).order_by(
+        spending.c.total_spent.desc()
     ).limit(10).all()
 
     return {
@@ -2994,29 +2780,36 @@ def calculate_customer_analytics(base_query, start_date, end_date):
         ]
     }
 
-def calculate_product_performance(base_query, start_date, end_date):
+def calculate_product_performance(start_date, end_date):
     """Calculate product performance analytics"""
-    from sqlalchemy import func
+    items = analytics_service.item_source(start_date, end_date)
+    revenue = func.sum(items.c.revenue)
 
-    # Top products by revenue
-    top_products = base_query.join(OrderItem).join(MenuItem).with_entities(
+    # Top products by revenue; an order holds one line per item, so lines count orders
+    top_products = db.session.query(
         MenuItem.name,
         MenuItem.category_id,
-        func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue'),
-        func.sum(OrderItem.quantity).label('quantity_sold'),
-        func.count(func.distinct(Order.order_id)).label('orders_count')
+        revenue.label('revenue'),
+        func.sum(items.c.quantity).label('quantity_sold'),
+        func.sum(items.c.line_count).label('orders_count')
+    ).select_from(items).join(
+        MenuItem, MenuItem.item_id == items.c.item_id
     ).group_by(MenuItem.item_id).order_by(
-        func.sum(OrderItem.quantity * OrderItem.unit_price).desc()
+        revenue.desc()
     ).limit(15).all()
 
     # Category performance
-    category_performance = base_query.join(OrderItem).join(MenuItem).join(Category).with_entities(
+    category_performance = db.session.query(
         Category.name,
-        func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue'),
-        func.sum(OrderItem.quantity).label('quantity_sold'),
-        func.count(func.distinct(Order.order_id)).label('orders_count')
+        revenue.label('revenue'),
+        func.sum(items.c.quantity).label('quantity_sold'),
+        func.sum(items.c.line_count).label('orders_count')
+    ).select_from(items).join(
+        MenuItem, MenuItem.item_id == items.c.item_id
+    ).join(
+        Category, Category.category_id == MenuItem.category_id
     ).group_by(Category.category_id).order_by(
-        func.sum(OrderItem.quantity * OrderItem.unit_price).desc()
+        revenue.desc()
     ).all()
 
     return {
@@ -3041,16 +2834,17 @@ def calculate_product_performance(base_query, start_date, end_date):
         ]
     }
 
-def calculate_time_analytics(base_query, start_date, end_date, period):
+def calculate_time_analytics(start_date, end_date, period):
     """Calculate time-based analytics"""
-    from sqlalchemy import func
+    sales = analytics_service.sales_source(start_date, end_date)
+    hour = func.extract('hour', sales.c.at)
 
     # Hourly distribution
-    hourly_data = base_query.with_entities(
-        func.extract('hour', Order.order_time).label('hour'),
-        func.sum(Order.total_amount).label('revenue'),
-        func.count(Order.order_id).label('orders')
-    ).group_by(func.extract('hour', Order.order_time)).all()
+    hourly_data = db.session.query(
+        hour.label('hour'),
+        func.sum(sales.c.revenue).label('revenue'),
+        func.sum(sales.c.order_count).label('orders')
+    ).group_by(hour).all()
 
     return {
         'hourly_distribution': [
@@ -3063,6 +2857,20 @@ def calculate_time_analytics(base_query, start_date, end_date, period):
         ]
     }
 
+def _period_totals(start_date, end_date, include_end):
+    """Revenue, order count and distinct customers of a period"""
+    sales = analytics_service.sales_source(start_date, end_date, include_end)
+    customers = analytics_service.customer_source(start_date, end_date, include_end)
+
+    revenue, orders = db.session.query(
+        func.sum(sales.c.revenue), func.sum(sales.c.order_count)
+    ).one()
+    customer_count = db.session.query(
+        func.count(func.distinct(customers.c.user_id))
+    ).scalar()
+
+    return float(revenue or 0), int(orders or 0), int(customer_count or 0)
+
 def calculate_growth_metrics(start_date, end_date, period):
     """Calculate growth metrics compared to previous period"""
     if not start_date:
@@ -3073,25 +2881,8 @@ def calculate_growth_metrics(start_date, end_date, period):
     prev_start = start_date - period_length
     prev_end = start_date
 
-    # Current period metrics
-    current_stats = Order.query.filter(
-        Order.order_time >= start_date,
-        Order.order_time <= end_date
-    ).with_entities(
-        func.sum(Order.total_amount).label('revenue'),
-        func.count(Order.order_id).label('orders'),
-        func.count(func.distinct(Order.user_id)).label('customers')
-    ).first()
-
-    # Previous period metrics
-    prev_stats = Order.query.filter(
-        Order.order_time >= prev_start,
-        Order.order_time < prev_end
-    ).with_entities(
-        func.sum(Order.total_amount).label('revenue'),
-        func.count(Order.order_id).label('orders'),
-        func.count(func.distinct(Order.user_id)).label('customers')
-    ).first()
+    current_revenue, current_orders, current_customers = _period_totals(start_date, end_date, True)
+    prev_revenue, prev_orders, prev_customers = _period_totals(prev_start, prev_end, False)
 
     # Calculate growth percentages
     def calc_growth(current, previous):
@@ -3100,173 +2891,53 @@ def calculate_growth_metrics(start_date, end_date, period):
         return round(((current - previous) / previous) * 100, 2)
 
     return {
-        'revenue_growth': calc_growth(
-            float(current_stats.revenue or 0),
-            float(prev_stats.revenue or 0)
-        ),
-        'order_growth': calc_growth(
-            int(current_stats.orders or 0),
-            int(prev_stats.orders or 0)
-        ),
-        'customer_growth': calc_growth(
-            int(current_stats.customers or 0),
-            int(prev_stats.customers or 0)
-        )
+        'revenue_growth': calc_growth(current_revenue, prev_revenue),
+        'order_growth': calc_growth(current_orders, prev_orders),
+        'customer_growth': calc_growth(current_customers, prev_customers)
     }
 
-def calculate_detailed_customer_behavior(base_query, start_date, end_date):
+def calculate_detailed_customer_behavior(start_date, end_date, columns=None):
     """Calculate detailed customer behavior metrics"""
-    from sqlalchemy import func
-
-    # Customer spending distribution
-    spending_distribution = base_query.join(User).with_entities(
-        User.user_id,
-        User.name,
-        User.email,
-        func.sum(Order.total_amount).label('total_spent'),
-        func.count(Order.order_id).label('order_count'),
-        func.avg(Order.total_amount).label('avg_order_value'),
-        func.min(Order.order_time).label('first_order'),
-        func.max(Order.order_time).label('last_order')
-    ).group_by(User.user_id).order_by(
-        func.sum(Order.total_amount).desc()
-    ).all()
-
-    # Calculate customer lifetime value and frequency
-    customer_metrics = []
-    for user_id, name, email, total_spent, order_count, avg_order, first_order, last_order in spending_distribution:
-        # Calculate days between first and last order
-        if first_order and last_order:
-            days_active = (last_order - first_order).days + 1
-            frequency = order_count / days_active if days_active > 0 else 0
-        else:
-            days_active = 0
-            frequency = 0
-
-        customer_metrics.append({
-            'user_id': user_id,
-            'name': name,
-            'email': email,
-            'total_spent': float(total_spent or 0),
-            'order_count': int(order_count or 0),
-            'avg_order_value': float(avg_order or 0),
-            'days_active': days_active,
-            'frequency': round(frequency, 3),
-            'first_order': first_order,
-            'last_order': last_order
-        })
-
-    # Order frequency analysis
-    frequency_ranges = [
-        (1, 1, 'One-time'),
-        (2, 3, 'Occasional'),
-        (4, 7, 'Regular'),
-        (8, 15, 'Frequent'),
-        (16, float('inf'), 'VIP')
-    ]
-
-    frequency_analysis = {}
-    for min_orders, max_orders, label in frequency_ranges:
-        count = len([c for c in customer_metrics if min_orders <= c['order_count'] <= max_orders])
-        frequency_analysis[label] = count
-
-    return {
-        'customer_metrics': customer_metrics,
-        'frequency_analysis': frequency_analysis,
-        'total_customers': len(customer_metrics),
-        'avg_customer_value': sum(c['total_spent'] for c in customer_metrics) / len(customer_metrics) if customer_metrics else 0,
-        'avg_orders_per_customer': sum(c['order_count'] for c in customer_metrics) / len(customer_metrics) if customer_metrics else 0
-    }
+    if columns is None:
+        columns = rfm_service.load_customer_columns(start_date, end_date)
+    return rfm_service.customer_behavior(columns, now=datetime.now())
 
-def calculate_customer_segmentation(base_query, start_date, end_date):
+def calculate_customer_segmentation(start_date, end_date, columns=None):
     """Calculate customer segmentation based on RFM analysis"""
-    from sqlalchemy import func
-
-    # RFM Analysis (Recency, Frequency, Monetary)
-    now = datetime.now()
-
-    rfm_data = base_query.join(User).with_entities(
-        User.user_id,
-        User.name,
-        func.max(Order.order_time).label('last_order_date'),
-        func.count(Order.order_id).label('frequency'),
-        func.sum(Order.total_amount).label('monetary')
-    ).group_by(User.user_id).all()
-
-    # Calculate RFM scores
-    rfm_customers = []
-    for user_id, name, last_order_date, frequency, monetary in rfm_data:
-        if last_order_date:
-            recency = (now - last_order_date).days
-        else:
-            recency = 999  # Very old
-
-        rfm_customers.append({
-            'user_id': user_id,
-            'name': name,
-            'recency': recency,
-            'frequency': int(frequency or 0),
-            'monetary': float(monetary or 0)
-        })
-
-    # Segment customers
-    segments = {
-        'Champions': [],
-        'Loyal Customers': [],
-        'Potential Loyalists': [],
-        'New Customers': [],
-        'At Risk': [],
-        'Cannot Lose Them': [],
-        'Hibernating': []
-    }
-
-    for customer in rfm_customers:
-        r = customer['recency']
-        f = customer['frequency']
-        m = customer['monetary']
-
-        # Simple segmentation logic
-        if r <= 7 and f >= 5 and m >= 200:
-            segments['Champions'].append(customer)
-        elif r <= 14 and f >= 3 and m >= 100:
-            segments['Loyal Customers'].append(customer)
-        elif r <= 30 and f >= 2:
-            segments['Potential Loyalists'].append(customer)
-        elif r <= 7 and f == 1:
-            segments['New Customers'].append(customer)
-        elif r > 30 and r <= 60 and f >= 2:
-            segments['At Risk'].append(customer)
-        elif r > 60 and m >= 150:
-            segments['Cannot Lose Them'].append(customer)
-        else:
-            segments['Hibernating'].append(customer)
+    if columns is None:
+        columns = rfm_service.load_customer_columns(start_date, end_date)
+    return rfm_service.customer_segments(columns, datetime.now())
 
-    return segments
-
-def calculate_order_patterns(base_query, start_date, end_date):
+def calculate_order_patterns(start_date, end_date):
     """Calculate order patterns and preferences"""
-    from sqlalchemy import func
+    sales = analytics_service.sales_source(start_date, end_date)
+    items = analytics_service.item_source(start_date, end_date)
+    day_of_week = func.extract('dow', sales.c.at)
+    hour = func.extract('hour', sales.c.at)
 
     # Day of week analysis
-    dow_analysis = base_query.with_entities(
-        func.extract('dow', Order.order_time).label('day_of_week'),
-        func.count(Order.order_id).label('order_count'),
-        func.sum(Order.total_amount).label('revenue')
-    ).group_by(func.extract('dow', Order.order_time)).all()
+    dow_analysis = db.session.query(
+        day_of_week.label('day_of_week'),
+        func.sum(sales.c.order_count).label('order_count'),
+        func.sum(sales.c.revenue).label('revenue')
+    ).group_by(day_of_week).all()
 
     # Hour of day analysis
-    hour_analysis = base_query.with_entities(
-        func.extract('hour', Order.order_time).label('hour'),
-        func.count(Order.order_id).label('order_count'),
-        func.sum(Order.total_amount).label('revenue')
-    ).group_by(func.extract('hour', Order.order_time)).all()
+    hour_analysis = db.session.query(
+        hour.label('hour'),
+        func.sum(sales.c.order_count).label('order_count'),
+        func.sum(sales.c.revenue).label('revenue')
+    ).group_by(hour).all()
 
     # Popular item combinations
-    item_combinations = base_query.join(OrderItem).join(MenuItem).with_entities(
+    line_count = func.sum(items.c.line_count)
+    item_combinations = db.session.query(
         MenuItem.name,
-        func.count(OrderItem.order_item_id).label('frequency')
+        line_count.label('frequency')
+    ).select_from(items).join(
+        MenuItem, MenuItem.item_id == items.c.item_id
     ).group_by(MenuItem.item_id).order_by(
-        func.count(OrderItem.order_item_id).desc()
+        line_count.desc()
     ).limit(10).all()
 
     return {
@@ -3298,8 +2969,6 @@ def calculate_order_patterns(base_query, start_date, end_date):
 
 def calculate_customer_lifecycle(start_date, end_date):
     """Calculate customer lifecycle metrics"""
-    from sqlalchemy import func
-
     # New customers in period
     new_customers = User.query.filter_by(role='customer')
     if start_date:
@@ -3309,18 +2978,16 @@ def calculate_customer_lifecycle(start_date, end_date):
     new_customers_count = new_customers.count()
 
     # Returning customers (customers who made orders in this period but registered before)
-    returning_query = Order.query.join(User)
+    customers = analytics_service.customer_source(start_date, end_date)
+    returning_query = db.session.query(
+        func.count(func.distinct(customers.c.user_id))
+    ).select_from(customers).join(
+        User, User.user_id == customers.c.user_id
+    )
     if start_date:
-        returning_query = returning_query.filter(
-            Order.order_time >= start_date,
-            User.created_at < start_date
-        )
-    if end_date:
-        returning_query = returning_query.filter(Order.order_time <= end_date)
+        returning_query = returning_query.filter(User.created_at < start_date)
 
-    returning_customers = returning_query.with_entities(
-        func.count(func.distinct(Order.user_id))
-    ).scalar() or 0
+    returning_customers = returning_query.scalar() or 0
 
     # Customer retention rate (simplified)
     total_customers = User.query.filter_by(role='customer').count()
@@ -0,0 +1,108 @@
+"""
+System Settings Service
+Serves SystemSettings from an in-process snapshot of every active setting,
+already converted to its type. Writes to the settings bump a version stamp,
+so every process reloads the snapshot on its next request, and a request
+checks the stamp once however many settings it reads
+"""
+import threading
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import event, select
+
+from app.extensions import db
+from app.models import SystemSettings, CacheVersion
+
+SETTINGS_VERSION_NAME = 'system_settings'
+
+_load_lock = threading.Lock()
+
+
+def convert_setting(setting_type, value):
+    """Convert a stored setting value to its type (None when empty)"""
+    if not value:
+        return None
+    if setting_type == 'integer':
+        return int(value)
+    if setting_type == 'boolean':
+        return value.lower() in ('true', '1', 'yes')
+    if setting_type == 'float':
+        return float(value)
+    return value
+
+
+class SettingsSnapshot:
+    """Typed values of every active setting at one settings version"""
+
+    def __init__(self, version, values):
+        self.version = version
+        self.values = values
+
+    def get(self, key, default=None):
+        value = self.values.get(key)
+        return default if value is None else value
+
+
+def bump_settings_version(connection):
+    """Invalidate every process's settings snapshot
+
+    Args:
+        connection: Connection of the writing transaction
+    """
+    CacheVersion.bump(connection, SETTINGS_VERSION_NAME)
+
+
+def _load_settings(version):
+    values = {}
+    for key, value, setting_type in db.session.execute(
+        select(SystemSettings.key, SystemSettings.value, SystemSettings.setting_type)
+        .where(SystemSettings.is_active == True)
+    ):
+        try:
+            values[key] = convert_setting(setting_type, value)
+        except ValueError:
+            # A malformed value reads as unset rather than breaking every page
+            current_app.logger.warning(f"Ignoring invalid {setting_type} setting {key}={value!r}")
+    return SettingsSnapshot(version, values)
+
+
+def get_settings():
+    """
+    Get the settings snapshot for the current settings version
+    Costs one version lookup per request; the settings themselves are only
+    queried after a settings write
+
+    Returns:
+        SettingsSnapshot: Shared, read-only snapshot
+    """
+    if has_request_context() and 'system_settings' in g:
+        return g.system_settings
+
+    version = CacheVersion.get_version(SETTINGS_VERSION_NAME)
+    snapshot = current_app.extensions.get('system_settings')
+
+    if snapshot is None or snapshot.version != version:
+        with _load_lock:
+            snapshot = current_app.extensions.get('system_settings')
+            if snapshot is None or snapshot.version != version:
+                snapshot = _load_settings(version)
+                current_app.extensions['system_settings'] = snapshot
+
+    if has_request_context():
+        g.system_settings = snapshot
+    return snapshot
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_settings_changes(session, flush_context):
+    """Bump the settings version when a flush touches system settings"""
+    changed = any(isinstance(obj, SystemSettings) for obj in list(session.new) + list(session.deleted))
+    if not changed:
+        changed = any(
+            isinstance(obj, SystemSettings) and session.is_modified(obj)
+            for obj in session.dirty
+        )
+    if changed:
+        bump_settings_version(session.connection())
+        # Later reads in this request see the write
+        g.pop('system_settings', None)
@@ -0,0 +1,86 @@
+"""
+Menu Rating Service
+Keeps each menu item's rating_avg/rating_count current as feedback is
+written, so menu pages read ratings straight off the menu item rows
+(and the menu catalog snapshot is rebuilt with the new ratings)
+"""
+from sqlalchemy import event, func, select, inspect
+
+from app.extensions import db
+from app.models import MenuItem, Feedback
+from app.modules.menu.catalog_service import bump_catalog_version
+
+
+def refresh_item_ratings(connection, item_ids=None):
+    """Recompute rating_avg/rating_count from approved feedback
+
+    Args:
+        connection: Connection to write with
+        item_ids (iterable): Limit the refresh to these items (default: all)
+
+    Returns:
+        int: Number of menu items updated
+    """
+    items = MenuItem.__table__
+    approved = (Feedback.item_id == items.c.item_id) & (Feedback.is_approved == True)
+
+    rating_count = select(func.count(Feedback.feedback_id)).where(approved).scalar_subquery()
+    rating_avg = select(func.coalesce(func.avg(Feedback.rating), 0)).where(approved).scalar_subquery()
+
+    stmt = items.update().values(
+        rating_count=rating_count,
+        rating_avg=rating_avg,
+        # A new review is not an edit of the menu item
+        updated_at=items.c.updated_at
+    )
+    if item_ids is not None:
+        stmt = stmt.where(items.c.item_id.in_(item_ids))
+
+    return connection.execute(stmt).rowcount
+
+
+def _changed_item_ids(session):
+    """Collect items whose approved feedback changed in this flush"""
+    item_ids = set()
+
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Feedback):
+            item_ids.add(obj.item_id)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Feedback):
+            continue
+        attrs = inspect(obj).attrs
+        if attrs.rating.history.has_changes() or attrs.is_approved.history.has_changes():
+            item_ids.add(obj.item_id)
+
+        moved = attrs.item_id.history
+        if moved.has_changes():
+            item_ids.update(moved.deleted)
+            item_ids.update(moved.added)
+
+    item_ids.discard(None)
+    return item_ids
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_feedback_changes(session, flush_context):
+    """Refresh the ratings of items whose feedback changed"""
+    item_ids = _changed_item_ids(session)
+    if item_ids:
+        refresh_item_ratings(session.connection(), item_ids)
+        bump_catalog_version(session.connection())
+
+
+def rebuild_item_ratings():
+    """
+    Recompute every menu item's rating from feedback
+    Used to reconcile drift after bulk edits of the feedback table
+
+    Returns:
+        int: Number of menu items updated
+    """
+    updated = refresh_item_ratings(db.session.connection())
+    bump_catalog_version(db.session.connection())
+    db.session.commit()
+    return updated
@@ -1,9 +1,10 @@
-from flask import render_template, redirect, url_for, request, flash, jsonify, session
+from flask import render_template, redirect, url_for, request, flash, jsonify, session, current_app
 from flask_login import login_required, current_user
 from app.modules.customer import bp
 from app.models import MenuItem, Category, Order, OrderItem, Payment, CustomerPreferences, Feedback, ServiceRequest, Service, db, Table
-from app.extensions import socketio
-from sqlalchemy.orm import joinedload
+from app.websocket_handlers import publish, STAFF_ROOMS
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
 import os
 from werkzeug.utils import secure_filename
@@ -11,23 +12,21 @@ from werkzeug.utils import secure_filename
 @bp.route('/menu')
 def menu():
     """Customer menu view with ratings"""
-    # Load categories and menu items from database
-    categories = Category.query.filter_by(is_active=True).order_by(Category.display_order).all()
-    menu_items = MenuItem.query.options(joinedload(MenuItem.category)).filter_by(status='available').join(Category).order_by(
-        Category.display_order, MenuItem.name
-    ).all()
+    from app.modules.menu.catalog_service import get_menu_catalog
 
-    # Calculate ratings for each menu item
+    # Categories, menu items and ratings come from the cached catalog snapshot
+    catalog = get_menu_catalog()
     items_with_ratings = []
-    for item in menu_items:
-        rating_data = item.get_average_rating()
+    for item in catalog.menu_items:
+        average, count = catalog.ratings.get(item.item_id, (0.0, 0))
         item_data = {
             'item': item,
-            'rating': rating_data
+            'rating': {'average': average, 'count': count}
         }
         items_with_ratings.append(item_data)
 
-    return render_template('menu.html', categories=categories, menu_items=menu_items, items_with_ratings=items_with_ratings)
+    return render_template('menu.html', categories=catalog.categories, menu_items=catalog.menu_items,
+                           items_with_ratings=items_with_ratings)
 
 @bp.route('/profile')
 @login_required
@@ -208,14 +207,19 @@ def track_order(order_id):
 @bp.route('/')
 def home():
     """Customer home page using default landing template"""
+    from app.modules.menu.catalog_service import get_menu_catalog
+
+    catalog = get_menu_catalog()
+
     # Load popular menu items for the landing page
     popular_items = MenuItem.get_popular_items(limit=4)
 
     # If no popular items (no orders yet), fall back to first 4 available items
     if not popular_items:
-        popular_items = MenuItem.query.filter_by(status='available').limit(4).all()
+        popular_items = catalog.items[:4]
 
-    return render_template('shared/landing.html', popular_items=popular_items)
+    return render_template('shared/landing.html', popular_items=popular_items,
+                           ratings=catalog.ratings)
 
 @bp.route('/orders')
 @login_required
@@ -225,42 +229,47 @@ def my_orders():
         flash('Access denied. Customer account required.', 'error')
         return redirect(url_for('main.index'))
     
+    page = request.args.get('page', 1, type=int)
+
     try:
-        # Get orders for the current user with simple query first
-        orders = Order.query.filter_by(user_id=current_user.user_id).order_by(Order.order_time.desc()).all()
-        
-        print(f"DEBUG: Loading orders for user {current_user.user_id} ({current_user.email})")
-        print(f"DEBUG: Found {len(orders)} orders")
-        
-        # Load relationships manually to avoid lazy loading issues
-        for order in orders:
-            try:
-                # Force load order items
-                order_items = order.order_items.all()
-                order._order_items = order_items
-                print(f"DEBUG: Order {order.order_id} has {len(order_items)} items")
-                
-                # Force load payments
-                payments = order.payments.all()
-                order._payments = payments
-                print(f"DEBUG: Order {order.order_id} has {len(payments)} payments")
-                
-            except Exception as item_error:
-                print(f"DEBUG: Error loading items/payments for order {order.order_id}: {item_error}")
-                order._order_items = []
-                order._payments = []
-        
-        if not orders:
+        # Everything a card shows loads with the page, one query per relationship
+        orders = Order.query.filter_by(user_id=current_user.user_id).options(
+            selectinload(Order.table),
+            selectinload(Order.order_items).selectinload(OrderItem.menu_item),
+            selectinload(Order.payments)
+        ).order_by(Order.order_time.desc(), Order.order_id.desc()).paginate(
+            page=page, per_page=current_app.config['ORDERS_PER_PAGE'], error_out=False
+        )
+
+        stats = _order_stats(current_user.user_id)
+
+        if not stats['total_orders']:
             flash('No orders found. Place your first order from our menu!', 'info')
-        
-        return render_template('customer_orders.html', orders=orders)
-        
+
+        return render_template('customer_orders.html', orders=orders, stats=stats)
+
     except Exception as e:
-        print(f"ERROR loading orders: {e}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f'Error loading orders: {e}')
         flash('Error loading orders. Please try again.', 'error')
-        return render_template('customer_orders.html', orders=[])
+        return render_template('customer_orders.html', orders=None, stats=None)
+
+
+def _order_stats(user_id):
+    """Totals across all of a customer's orders, not just the current page"""
+    done = Order.status.in_(['delivered', 'completed'])
+    row = db.session.query(
+        func.count(Order.order_id),
+        func.sum(case((done, 1), else_=0)),
+        func.sum(case((Order.status.in_(['new', 'processing', 'preparing']), 1), else_=0)),
+        func.sum(case((done, Order.total_amount), else_=0))
+    ).filter(Order.user_id == user_id).one()
+
+    return {
+        'total_orders': row[0],
+        'completed_orders': row[1] or 0,
+        'pending_orders': row[2] or 0,
+        'total_spent': float(row[3] or 0)
+    }
 
 @bp.route('/loyalty')
 @login_required
@@ -289,7 +298,7 @@ def reorder(order_id):
             return jsonify({'success': False, 'message': 'Can only reorder completed orders'}), 400
         
         # Get all items from the original order
-        order_items = order.order_items.all()
+        order_items = order.order_items
         if not order_items:
             return jsonify({'success': False, 'message': 'No items found in original order'}), 400
         
@@ -356,7 +365,7 @@ def cancel_order(order_id):
             return jsonify({'success': False, 'message': 'Order cannot be cancelled at this stage'}), 400
         
         # Check if order has been paid
-        payments = order.payments.filter_by(status='completed').all()
+        payments = [payment for payment in order.payments if payment.status == 'completed']
         if payments:
             return jsonify({'success': False, 'message': 'Paid orders cannot be cancelled. Please contact support for refund.'}), 400
         
@@ -427,7 +436,7 @@ def review_order(order_id):
                 db.session.add(order_review)
             
             # Process individual item reviews
-            order_items = order.order_items.all()
+            order_items = order.order_items
             for item in order_items:
                 item_rating_key = f'item_rating_{item.item_id}'
                 item_comment_key = f'item_comment_{item.item_id}'
@@ -491,7 +500,7 @@ def reorder_to_cart(order_id):
             return jsonify({'success': False, 'message': 'Can only reorder completed orders'}), 400
         
         # Get all items from the original order
-        order_items = order.order_items.all()
+        order_items = order.order_items
         if not order_items:
             return jsonify({'success': False, 'message': 'No items found in original order'}), 400
         
@@ -594,8 +603,10 @@ def delete_order(order_id):
         if order.status not in ['delivered', 'completed', 'cancelled']:
             return jsonify({'success': False, 'message': 'Can only delete completed, delivered, or cancelled orders'}), 400
         
-        # Delete related order items first (due to foreign key constraints)
-        OrderItem.query.filter_by(order_id=order_id).delete()
+        # Delete related order items first (due to foreign key constraints);
+        # deleted through the session so the dashboard rollup sees them
+        for order_item in order.order_items:
+            db.session.delete(order_item)
         
         # Delete related payments
         Payment.query.filter_by(order_id=order_id).delete()
@@ -666,20 +677,8 @@ def create_service_request():
         db.session.add(service_request)
         db.session.commit()
 
-        # Send real-time notification to waiters
-        socketio.emit('new_service_request', {
-            'request_id': service_request.request_id,
-            'customer_name': current_user.name,
-            'customer_id': current_user.user_id,
-            'request_type': request_type,
-            'description': description,
-            'table_id': table_id,
-            'timestamp': service_request.created_at.isoformat() if service_request.created_at else datetime.utcnow().isoformat(),
-            'status': 'pending'
-        }, room='waiter')
-
-        # Also notify admins
-        socketio.emit('new_service_request', {
+        # Send real-time notification to waiters and admins
+        publish('new_service_request', {
             'request_id': service_request.request_id,
             'customer_name': current_user.name,
             'customer_id': current_user.user_id,
@@ -688,7 +687,7 @@ def create_service_request():
             'table_id': table_id,
             'timestamp': service_request.created_at.isoformat() if service_request.created_at else datetime.utcnow().isoformat(),
             'status': 'pending'
-        }, room='admin')
+        }, STAFF_ROOMS)
 
         return jsonify({
             'success': True,
@@ -5,8 +5,9 @@ from app.models import (
     CustomerLoyalty, PointTransaction, RewardItem, RewardRedemption,
     LoyaltyProgram, PromotionalCampaign, Order, db
 )
+from app.modules.loyalty.ledger_service import InsufficientPoints
+from app.modules.loyalty.loyalty_service import redeem_reward as redeem_points
 from datetime import datetime, timedelta
-import uuid
 
 
 @bp.route('/points', methods=['GET'])
@@ -48,6 +49,10 @@ def get_customer_points():
                 'lifetime_points': loyalty.lifetime_points,
                 'tier_level': loyalty.tier_level,
                 'join_date': loyalty.join_date.isoformat(),
+                'total_earned': loyalty.total_earned,
+                'total_redeemed': loyalty.total_redeemed,
+                'total_bonus': loyalty.total_bonus,
+                'total_expired': loyalty.total_expired,
                 'transactions': transaction_data
             }
         })
@@ -142,45 +147,23 @@ def redeem_reward():
                 'message': 'Customer loyalty account not found'
             }), 404
 
-        # Check if customer has enough points
-        if loyalty.total_points < reward.points_required:
+        # The balance check and the deduction are one conditional UPDATE
+        try:
+            redemption, remaining_points = redeem_points(current_user.user_id, reward)
+        except InsufficientPoints:
+            db.session.rollback()
             return jsonify({
                 'status': 'error',
                 'message': 'Insufficient points for redemption'
             }), 400
 
-        # Create redemption record
-        redemption_code = str(uuid.uuid4())[:8].upper()
-        redemption = RewardRedemption(
-            user_id=current_user.user_id,
-            reward_id=reward_id,
-            points_used=reward.points_required,
-            redemption_code=redemption_code,
-            status='completed'
-        )
-        db.session.add(redemption)
-
-        # Deduct points from customer
-        loyalty.total_points -= reward.points_required
-        
-        # Create point transaction record
-        transaction = PointTransaction(
-            user_id=current_user.user_id,
-            points_redeemed=reward.points_required,
-            transaction_type='redeemed',
-            description=f'Redeemed: {reward.name}'
-        )
-        db.session.add(transaction)
-
-        db.session.commit()
-
         return jsonify({
             'status': 'success',
             'data': {
                 'redemption_id': redemption.redemption_id,
-                'redemption_code': redemption_code,
+                'redemption_code': redemption.redemption_code,
                 'points_used': reward.points_required,
-                'remaining_points': loyalty.total_points,
+                'remaining_points': remaining_points,
                 'reward_name': reward.name
             }
         })
@@ -0,0 +1,282 @@
+"""
+Campaign Rules Service
+Compiles every running promotional campaign once into a rule covering its
+tier, days, menu categories, minimum order and usage limits, and keeps the
+compiled set in process until the next campaign starts or ends or an admin
+edits one. An order is checked against all of them in one pass; the best
+match is then claimed with a conditional UPDATE of its usage counter so
+limits hold under concurrent awards
+"""
+import json
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, select, func
+
+from app.extensions import db
+from app.models import (
+    PromotionalCampaign, CampaignCustomerStats, PointTransaction, OrderItem, MenuItem, CacheVersion
+)
+
+CAMPAIGNS_VERSION_NAME = 'promotional_campaigns'
+
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+_build_lock = threading.Lock()
+
+
+def _parse_tiers(target_customer_tier):
+    if not target_customer_tier or target_customer_tier == 'all':
+        return None
+    return frozenset([target_customer_tier])
+
+
+def _parse_days(applicable_days, weekend_days):
+    """Weekdays (Monday is 0) a campaign runs on, None for every day
+
+    Accepts 'all', 'weekdays', 'weekends' or day names such as 'fri,sat'.
+    """
+    if not applicable_days or applicable_days == 'all':
+        return None
+    if applicable_days == 'weekends':
+        return frozenset(weekend_days)
+    if applicable_days == 'weekdays':
+        return frozenset(range(7)) - frozenset(weekend_days)
+
+    names = [name.strip()[:3].lower() for name in applicable_days.split(',')]
+    days = frozenset(DAY_NAMES.index(name) for name in names if name in DAY_NAMES)
+    return days or None
+
+
+def _parse_categories(specific_menu_categories):
+    if not specific_menu_categories:
+        return None
+    try:
+        return frozenset(int(category_id) for category_id in json.loads(specific_menu_categories)) or None
+    except (TypeError, ValueError):
+        return None
+
+
+class CompiledCampaign:
+    """A running campaign's rules, parsed once; holds no database state"""
+
+    __slots__ = ('campaign_id', 'name', 'bonus_multiplier', 'tiers', 'days', 'categories',
+                 'minimum_order_amount', 'maximum_uses_per_customer', 'total_usage_limit')
+
+    def __init__(self, campaign, weekend_days):
+        self.campaign_id = campaign.campaign_id
+        self.name = campaign.name
+        self.bonus_multiplier = campaign.bonus_multiplier or 1.0
+        self.tiers = _parse_tiers(campaign.target_customer_tier)
+        self.days = _parse_days(campaign.applicable_days, weekend_days)
+        self.categories = _parse_categories(campaign.specific_menu_categories)
+        self.minimum_order_amount = float(campaign.minimum_order_amount or 0)
+        self.maximum_uses_per_customer = campaign.maximum_uses_per_customer
+        self.total_usage_limit = campaign.total_usage_limit
+
+    def accepts(self, order):
+        """Check the order-level rules; usage limits are checked when the campaign is claimed
+
+        Args:
+            order (OrderFacts): What the rules look at
+        """
+        if self.tiers is not None and order.tier not in self.tiers:
+            return False
+        if self.days is not None and order.time.weekday() not in self.days:
+            return False
+        if order.total < self.minimum_order_amount:
+            return False
+        if self.categories is not None and not self.categories & order.category_ids():
+            return False
+        return True
+
+    def __repr__(self):
+        return f'<CompiledCampaign {self.campaign_id} x{self.bonus_multiplier}>'
+
+
+class OrderFacts:
+    """The parts of an order campaign rules look at; category ids are loaded on first use
+
+    time is when the order was placed, which applicable days are checked against
+    """
+
+    def __init__(self, order_id, total, tier, time):
+        self.order_id = order_id
+        self.total = float(total or 0)
+        self.tier = tier or 'bronze'
+        self.time = time
+        self._category_ids = None
+
+    def category_ids(self):
+        if self._category_ids is None:
+            self._category_ids = frozenset(db.session.execute(
+                select(MenuItem.category_id).distinct()
+                .join(OrderItem, OrderItem.item_id == MenuItem.item_id)
+                .where(OrderItem.order_id == self.order_id)
+            ).scalars())
+        return self._category_ids
+
+
+class ActiveCampaigns:
+    """Compiled campaigns running from valid_from until the next start/end boundary, best multiplier first"""
+
+    def __init__(self, version, campaigns, valid_from, valid_until):
+        self.version = version
+        self.campaigns = campaigns
+        self.valid_from = valid_from
+        # The next moment a campaign starts or ends; None when nothing is scheduled
+        self.valid_until = valid_until
+
+    def is_current(self, version, now):
+        return (self.version == version and self.valid_from <= now
+                and (self.valid_until is None or now < self.valid_until))
+
+    def evaluate(self, order):
+        """Campaigns the order qualifies for, best multiplier first, in one pass"""
+        return [campaign for campaign in self.campaigns if campaign.accepts(order)]
+
+
+def bump_campaigns_version(connection):
+    """Invalidate every process's compiled campaigns
+
+    Args:
+        connection: Connection of the writing transaction
+    """
+    CacheVersion.bump(connection, CAMPAIGNS_VERSION_NAME)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_campaign_edits(session, flush_context):
+    """Bump the campaigns version when a flush adds, edits or deletes a campaign"""
+    changed = any(isinstance(obj, PromotionalCampaign) for obj in list(session.new) + list(session.deleted))
+    if not changed:
+        changed = any(
+            isinstance(obj, PromotionalCampaign) and session.is_modified(obj)
+            for obj in session.dirty
+        )
+    if changed:
+        bump_campaigns_version(session.connection())
+
+
+def _build_active_campaigns(version, now):
+    weekend_days = current_app.config.get('CAMPAIGN_WEEKEND_DAYS', (4, 5))
+    scheduled = PromotionalCampaign.query.filter(
+        PromotionalCampaign.status == 'active',
+        PromotionalCampaign.end_date >= now
+    ).all()
+
+    running = [campaign for campaign in scheduled if campaign.start_date <= now]
+    boundaries = [campaign.start_date for campaign in scheduled if campaign.start_date > now]
+    # A campaign stops applying just after its end date
+    boundaries += [campaign.end_date for campaign in running]
+
+    compiled = sorted(
+        (CompiledCampaign(campaign, weekend_days) for campaign in running),
+        key=lambda campaign: (-campaign.bonus_multiplier, campaign.campaign_id)
+    )
+    return ActiveCampaigns(version, compiled, now, min(boundaries) if boundaries else None)
+
+
+def get_active_campaigns(now=None):
+    """
+    Get the compiled campaigns running now
+    Costs one version lookup per call; campaigns are only queried and
+    compiled again after an admin edit or when a campaign starts or ends
+
+    Returns:
+        ActiveCampaigns: Shared, read-only snapshot
+    """
+    now = now or datetime.utcnow()
+    version = CacheVersion.get_version(CAMPAIGNS_VERSION_NAME)
+    active = current_app.extensions.get('active_campaigns')
+
+    if active is None or not active.is_current(version, now):
+        with _build_lock:
+            active = current_app.extensions.get('active_campaigns')
+            if active is None or not active.is_current(version, now):
+                active = _build_active_campaigns(version, now)
+                current_app.extensions['active_campaigns'] = active
+
+    return active
+
+
+def claim_usage(connection, campaign, user_id):
+    """Count one use of a campaign by a customer, if its limits allow it
+
+    The total is claimed with one conditional UPDATE, which also holds the
+    campaign's row until the award commits, so the customer's own count read
+    afterwards cannot be raced by another award under the same campaign.
+
+    Returns:
+        bool: Whether the use was claimed
+    """
+    campaigns = PromotionalCampaign.__table__
+    claimed = connection.execute(
+        campaigns.update().where(
+            campaigns.c.campaign_id == campaign.campaign_id,
+            (campaigns.c.total_usage_limit.is_(None))
+            | (campaigns.c.usage_count < campaigns.c.total_usage_limit)
+        ).values(usage_count=campaigns.c.usage_count + 1)
+    ).rowcount
+    if not claimed:
+        return False
+
+    if campaign.maximum_uses_per_customer:
+        used = connection.execute(
+            select(CampaignCustomerStats.order_count).where(
+                CampaignCustomerStats.campaign_id == campaign.campaign_id,
+                CampaignCustomerStats.user_id == user_id
+            )
+        ).scalar() or 0
+        if used >= campaign.maximum_uses_per_customer:
+            connection.execute(
+                campaigns.update().where(campaigns.c.campaign_id == campaign.campaign_id)
+                .values(usage_count=campaigns.c.usage_count - 1)
+            )
+            return False
+
+    return True
+
+
+def choose_campaign(order, user_id, tier, now=None):
+    """
+    Pick and claim the campaign that boosts an order's points the most
+
+    Args:
+        order (Order): The completed order
+        user_id (int): Customer being awarded
+        tier (str): The customer's tier before this award
+        now (datetime): When the award is made; picks the running campaigns
+
+    Returns:
+        CompiledCampaign: The claimed campaign, or None
+    """
+    active = get_active_campaigns(now)
+    if not active.campaigns:
+        return None
+
+    facts = OrderFacts(order.order_id, order.total_amount, tier, order.order_time or now or datetime.utcnow())
+    connection = db.session.connection()
+    for campaign in active.evaluate(facts):
+        if campaign.bonus_multiplier <= 1.0:
+            break
+        if claim_usage(connection, campaign, user_id):
+            return campaign
+    return None
+
+
+def refresh_usage_counts(connection):
+    """Recompute every campaign's usage_count from the awards it boosted
+
+    Returns:
+        int: Number of campaigns updated
+    """
+    campaigns = PromotionalCampaign.__table__
+    transactions = PointTransaction.__table__
+    return connection.execute(campaigns.update().values(
+        usage_count=select(func.count(transactions.c.transaction_id)).where(
+            transactions.c.campaign_id == campaigns.c.campaign_id,
+            transactions.c.transaction_type == 'earned'
+        ).scalar_subquery()
+    )).rowcount
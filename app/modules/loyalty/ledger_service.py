@@ -0,0 +1,435 @@
+"""
+Points Ledger Service
+Every credit (earned, bonus or added points) is a lot whose points_remaining
+is used up oldest first by redemptions and deductions, and zeroed by the
+expiry job once the lot expires, so only unspent points expire and no lot
+expires twice
+
+Each customer's loyalty account also carries running totals of the points
+earned, redeemed, given as bonuses and expired, updated in the same
+transaction as every ledger write so pages never sum a customer's history
+
+Balances move with conditional UPDATEs (debit only while total_points
+covers the cost), so concurrent redemptions of one account cannot overspend
+it and only that account's row is locked
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, select, case, insert, func, or_, inspect, literal_column
+from sqlalchemy.exc import OperationalError
+
+from app.extensions import db
+from app.models import CustomerLoyalty, PointTransaction
+
+# Debits that spend points from lots; 'expired' debits are written by the expiry job itself
+SPENDING_TYPES = ('redeemed', 'adjustment')
+
+# A literal so the partial open-lot indexes match the query
+OPEN_LOT = PointTransaction.points_remaining > literal_column('0')
+
+
+class InsufficientPoints(Exception):
+    """Raised when a debit asks for more points than an account has"""
+
+    def __init__(self, user_id, points):
+        super().__init__(f"User {user_id} does not have {points} points")
+        self.user_id = user_id
+        self.points = points
+
+
+def _update_balance(connection, user_id, values, *conditions):
+    """Update one customer's account in one statement
+
+    Returns:
+        Row: total_points, lifetime_points and tier_level after the update,
+        or None if no account matched
+    """
+    accounts = CustomerLoyalty.__table__
+    stmt = accounts.update().where(accounts.c.user_id == user_id, *conditions).values(
+        last_activity=datetime.utcnow(), **values
+    )
+    returned = (accounts.c.total_points, accounts.c.lifetime_points, accounts.c.tier_level)
+
+    if connection.dialect.update_returning:
+        return connection.execute(stmt.returning(*returned)).first()
+    if not connection.execute(stmt).rowcount:
+        return None
+    return connection.execute(select(*returned).where(accounts.c.user_id == user_id)).first()
+
+
+def debit_points(connection, user_id, points):
+    """Take points from a customer's balance with one conditional UPDATE
+
+    The balance check and the decrement are the same statement, so two
+    concurrent debits can never both spend the same points.
+
+    Returns:
+        int: Balance left
+
+    Raises:
+        InsufficientPoints: If the account is missing or has fewer points
+    """
+    accounts = CustomerLoyalty.__table__
+    row = _update_balance(connection, user_id, {'total_points': accounts.c.total_points - points},
+                          accounts.c.total_points >= points)
+    if row is None:
+        raise InsufficientPoints(user_id, points)
+    return row.total_points
+
+
+def credit_points(connection, user_id, points, lifetime=True):
+    """Add points to a customer's balance with one UPDATE
+
+    Args:
+        lifetime (bool): Count the points towards lifetime points, moving the
+            tier with them in the same statement
+
+    Returns:
+        Row: total_points, lifetime_points and tier_level after the credit,
+        or None if the customer has no account
+    """
+    accounts = CustomerLoyalty.__table__
+    values = {'total_points': accounts.c.total_points + points}
+    if lifetime:
+        lifetime_points = accounts.c.lifetime_points + points
+        values['lifetime_points'] = lifetime_points
+        values['tier_level'] = case(
+            *[(lifetime_points >= threshold, tier) for tier, threshold in CustomerLoyalty.TIER_THRESHOLDS],
+            else_='bronze'
+        )
+    return _update_balance(connection, user_id, values)
+
+
+def run_with_retries(operation, retry_on=(OperationalError,), attempts=None, backoff=0.05):
+    """
+    Run a unit of work that commits its own transaction, retrying on conflicts
+
+    Lock timeouts, deadlocks and serialization failures surface as
+    OperationalError; the session is rolled back and the work re-run from
+    the start, with a growing pause, up to LOYALTY_WRITE_ATTEMPTS times.
+
+    Args:
+        operation (callable): The unit of work; re-run whole on each attempt
+        retry_on (tuple): Exception types worth another attempt
+
+    Returns:
+        Whatever operation returns
+    """
+    attempts = attempts or current_app.config.get('LOYALTY_WRITE_ATTEMPTS', 3)
+    for attempt in range(1, attempts + 1):
+        try:
+            return operation()
+        except retry_on as e:
+            db.session.rollback()
+            if attempt == attempts:
+                raise
+            current_app.logger.warning(f"Loyalty write conflict, retrying ({attempt}/{attempts}): {e}")
+            time.sleep(backoff * attempt)
+
+
+# Running totals kept on CustomerLoyalty
+TOTALS = ('total_earned', 'total_redeemed', 'total_bonus', 'total_expired')
+
+
+def _summed_totals(transactions):
+    """SUM expression of every running total over a set of point transactions"""
+    expired = transactions.c.transaction_type == 'expired'
+    bonus = transactions.c.transaction_type == 'bonus'
+    return {
+        'total_earned': func.sum(transactions.c.points_earned),
+        'total_redeemed': func.sum(case((expired, 0), else_=transactions.c.points_redeemed)),
+        'total_bonus': func.sum(case((bonus, transactions.c.points_earned), else_=0)),
+        'total_expired': func.sum(case((expired, transactions.c.points_redeemed), else_=0))
+    }
+
+
+def _add_to_totals(totals, transaction_type, earned, redeemed):
+    """Count one transaction into a customer's totals, as _summed_totals does"""
+    earned, redeemed = earned or 0, redeemed or 0
+    totals['total_earned'] += earned
+    if transaction_type == 'bonus':
+        totals['total_bonus'] += earned
+    if transaction_type == 'expired':
+        totals['total_expired'] += redeemed
+    else:
+        totals['total_redeemed'] += redeemed
+
+
+def _new_totals():
+    return defaultdict(lambda: dict.fromkeys(TOTALS, 0))
+
+
+def apply_totals(connection, deltas):
+    """Add per-customer deltas to the running totals in one UPDATE
+
+    Args:
+        connection: Connection of the writing transaction
+        deltas (dict): {user_id: {total column: points}}
+    """
+    accounts = CustomerLoyalty.__table__
+    values = {}
+    for column in TOTALS:
+        amounts = {user_id: totals[column] for user_id, totals in deltas.items() if totals[column]}
+        if amounts:
+            values[column] = accounts.c[column] + case(amounts, value=accounts.c.user_id, else_=0)
+
+    if values:
+        connection.execute(accounts.update().where(accounts.c.user_id.in_(deltas)).values(**values))
+
+
+def refresh_totals(connection, user_ids=None):
+    """Recompute the running totals from point transactions
+
+    Args:
+        connection: Connection to write with
+        user_ids (iterable): Limit the refresh to these customers (default: all)
+
+    Returns:
+        int: Number of loyalty accounts updated
+    """
+    transactions = PointTransaction.__table__
+    accounts = CustomerLoyalty.__table__
+    stmt = accounts.update().values(**{
+        column: select(func.coalesce(total, 0)).where(
+            transactions.c.user_id == accounts.c.user_id
+        ).scalar_subquery()
+        for column, total in _summed_totals(transactions).items()
+    })
+    if user_ids is not None:
+        stmt = stmt.where(accounts.c.user_id.in_(user_ids))
+
+    return connection.execute(stmt).rowcount
+
+
+def find_drift():
+    """
+    Compare every account's running totals with its transactions in one GROUP BY
+
+    Returns:
+        list: {'user_id': id, column: (stored, actual), ...} for each account that drifted
+    """
+    transactions = PointTransaction.__table__
+    accounts = CustomerLoyalty.__table__
+    sums = select(
+        transactions.c.user_id,
+        *[total.label(column) for column, total in _summed_totals(transactions).items()]
+    ).group_by(transactions.c.user_id).subquery()
+
+    actual = {column: func.coalesce(sums.c[column], 0) for column in TOTALS}
+    rows = db.session.execute(
+        select(accounts.c.user_id,
+               *[accounts.c[column] for column in TOTALS],
+               *[actual[column].label(f'actual_{column}') for column in TOTALS])
+        .select_from(accounts.outerjoin(sums, sums.c.user_id == accounts.c.user_id))
+        .where(or_(*[accounts.c[column] != actual[column] for column in TOTALS]))
+        .order_by(accounts.c.user_id)
+    ).mappings()
+
+    return [
+        {'user_id': row['user_id'],
+         **{column: (row[column], row[f'actual_{column}']) for column in TOTALS
+            if row[column] != row[f'actual_{column}']}}
+        for row in rows
+    ]
+
+
+def get_expiring_points(user_id, within_days=30, now=None):
+    """
+    Get the points of a customer's open lots expiring soon, from the open-lot index
+
+    Returns:
+        tuple: (points, earliest expiry date), (0, None) when nothing expires
+    """
+    now = now or datetime.utcnow()
+    points, first_expiry = db.session.execute(
+        select(func.coalesce(func.sum(PointTransaction.points_remaining), 0),
+               func.min(PointTransaction.expiry_date))
+        .where(PointTransaction.user_id == user_id, OPEN_LOT,
+               PointTransaction.expiry_date <= now + timedelta(days=within_days))
+    ).one()
+    return int(points), first_expiry
+
+
+def verify_totals(fix=False):
+    """
+    Find accounts whose running totals drifted from their transactions
+
+    Args:
+        fix (bool): Recompute the totals of drifted accounts
+
+    Returns:
+        list: Drifted accounts, as find_drift() reports them
+    """
+    drifted = find_drift()
+    if fix and drifted:
+        refresh_totals(db.session.connection(), [account['user_id'] for account in drifted])
+        db.session.commit()
+    return drifted
+
+
+def consume_lots(connection, user_id, points):
+    """Take points from a customer's oldest open lots in one UPDATE
+
+    Args:
+        connection: Connection of the writing transaction
+        user_id (int): Customer spending the points
+        points (int): Points spent
+
+    Returns:
+        int: Points taken from lots; less than asked when the lots do not cover it
+    """
+    transactions = PointTransaction.__table__
+    lots = connection.execute(
+        select(transactions.c.transaction_id, transactions.c.points_remaining)
+        .where(transactions.c.user_id == user_id, OPEN_LOT)
+        .order_by(transactions.c.timestamp, transactions.c.transaction_id)
+        .with_for_update()
+    ).all()
+
+    taken = {}
+    left = points
+    for transaction_id, remaining in lots:
+        if left <= 0:
+            break
+        taken[transaction_id] = min(left, remaining)
+        left -= taken[transaction_id]
+
+    if taken:
+        connection.execute(
+            transactions.update()
+            .where(transactions.c.transaction_id.in_(taken))
+            .values(points_remaining=transactions.c.points_remaining
+                    - case(taken, value=transactions.c.transaction_id))
+        )
+    return points - max(left, 0)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_point_debits(session, flush_context):
+    """Spend the lots of customers whose points were redeemed or deducted in this flush"""
+    debits = defaultdict(int)
+    for obj in session.new:
+        if (isinstance(obj, PointTransaction) and obj.transaction_type in SPENDING_TYPES
+                and obj.points_redeemed):
+            debits[obj.user_id] += obj.points_redeemed
+
+    for user_id, points in debits.items():
+        consume_lots(session.connection(), user_id, points)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_ledger_totals(session, flush_context):
+    """Add this flush's point transactions to their customers' running totals"""
+    opened = {obj.user_id for obj in session.new if isinstance(obj, CustomerLoyalty)}
+    deltas = _new_totals()
+    for obj in session.new:
+        if isinstance(obj, PointTransaction) and obj.user_id not in opened:
+            _add_to_totals(deltas[obj.user_id], obj.transaction_type,
+                           obj.points_earned, obj.points_redeemed)
+
+    connection = session.connection()
+    if deltas:
+        apply_totals(connection, deltas)
+    # A new account starts from whatever history the customer already has
+    if opened:
+        refresh_totals(connection, opened)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_bulk_transactions(orm_execute_state):
+    """Count point transactions written with a bulk insert(PointTransaction), which skips flush events"""
+    if not (orm_execute_state.is_insert and orm_execute_state.bind_mapper is inspect(PointTransaction)):
+        return None
+
+    rows = orm_execute_state.parameters
+    if isinstance(rows, dict):
+        rows = [rows]
+
+    deltas = _new_totals()
+    for row in rows or []:
+        _add_to_totals(deltas[row['user_id']], row['transaction_type'],
+                       row.get('points_earned'), row.get('points_redeemed'))
+
+    if deltas:
+        apply_totals(orm_execute_state.session.connection(), deltas)
+    # Let the insert run as usual
+    return None
+
+
+def expire_lots(now=None, batch_size=1000):
+    """
+    Expire what is left of every lot past its expiry date
+
+    Customers are handled batch_size at a time with set-based statements:
+    their expired lots are locked and zeroed, balances drop by what was
+    left, and one 'expired' transaction is written per customer. Each
+    batch commits on its own and zeroed lots are never picked up again, so
+    the job can be re-run, or resumed after a failure, at any time.
+
+    Args:
+        now (datetime): Expire lots whose expiry_date is at or before this
+        batch_size (int): Customers per batch
+
+    Returns:
+        dict: customers, lots, points, batches and seconds taken
+    """
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    transactions = PointTransaction.__table__
+    accounts = CustomerLoyalty.__table__
+    expiring = (transactions.c.expiry_date <= now, OPEN_LOT)
+
+    report = {'customers': 0, 'lots': 0, 'points': 0, 'batches': 0}
+    last_user_id = 0
+
+    while True:
+        user_ids = db.session.execute(
+            select(transactions.c.user_id)
+            .where(*expiring, transactions.c.user_id > last_user_id)
+            .group_by(transactions.c.user_id)
+            .order_by(transactions.c.user_id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not user_ids:
+            break
+
+        in_batch = transactions.c.user_id.in_(user_ids)
+        expired = defaultdict(int)
+        lots = db.session.execute(
+            select(transactions.c.user_id, transactions.c.points_remaining)
+            .where(*expiring, in_batch)
+            .with_for_update()
+        ).all()
+        for user_id, remaining in lots:
+            expired[user_id] += remaining
+
+        db.session.execute(transactions.update().where(*expiring, in_batch).values(points_remaining=0))
+
+        if expired:
+            amounts = case(expired, value=accounts.c.user_id)
+            db.session.execute(
+                accounts.update().where(accounts.c.user_id.in_(expired)).values(
+                    total_points=case((accounts.c.total_points > amounts, accounts.c.total_points - amounts), else_=0),
+                    total_expired=accounts.c.total_expired + amounts
+                )
+            )
+            # A core insert, which the ledger listeners do not see; total_expired is updated above
+            db.session.execute(insert(transactions), [
+                dict(user_id=user_id, points_redeemed=points, transaction_type='expired',
+                     description='Points expired', timestamp=now)
+                for user_id, points in expired.items()
+            ])
+
+        db.session.commit()
+
+        report['customers'] += len(expired)
+        report['lots'] += len(lots)
+        report['points'] += sum(expired.values())
+        report['batches'] += 1
+        last_user_id = user_ids[-1]
+
+    report['seconds'] = time.perf_counter() - started
+    return report
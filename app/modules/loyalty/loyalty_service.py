@@ -2,109 +2,32 @@
 Loyalty Program Service Functions
 Handles point calculations, tier updates, and automated rewards
 """
+import uuid
+from app.job_queue import job, enqueue
 from app.models import (
-    CustomerLoyalty, PointTransaction, LoyaltyProgram, Order, db
+    CustomerLoyalty, PointTransaction, LoyaltyProgram, Order, RewardRedemption, Notification, db
+)
+from app.modules.loyalty.campaign_service import choose_campaign
+from app.modules.loyalty.ledger_service import (
+    credit_points, debit_points, expire_lots, run_with_retries
 )
 from datetime import datetime, timedelta
 from flask import current_app
+from sqlalchemy.exc import IntegrityError, OperationalError
 
 
 def award_points_for_order(order_id, user_id):
     """
     Award points to customer when order is completed
     Standard rate: 100 points per 50 EGP spent
+
+    Safe to call twice or concurrently for the same order: its earned
+    transaction is unique per order, so a second award fails on insert and
+    its retry finds the points already awarded
     """
     try:
-        # Get the order
-        order = Order.query.get(order_id)
-        if not order or order.status != 'completed':
-            return False
-
-        # Check if points already awarded for this order
-        existing_transaction = PointTransaction.query.filter_by(
-            order_id=order_id,
-            transaction_type='earned'
-        ).first()
-        
-        if existing_transaction:
-            current_app.logger.info(f"Points already awarded for order {order_id}")
-            return True
-
-        # Get or create customer loyalty account
-        loyalty = CustomerLoyalty.query.filter_by(user_id=user_id).first()
-        if not loyalty:
-            loyalty = CustomerLoyalty(user_id=user_id)
-            db.session.add(loyalty)
-
-        # Get active loyalty program (or use default)
-        program = LoyaltyProgram.query.filter_by(status='active').first()
-        if not program:
-            # Create default program if none exists
-            program = LoyaltyProgram(
-                name='Default Rewards Program',
-                description='Earn points on every purchase',
-                points_per_50EGP=100,
-                status='active'
-            )
-            db.session.add(program)
-
-        # Calculate points (100 points per 50 EGP)
-        points_to_award = int((float(order.total_amount) / 50.0) * program.points_per_50EGP)
-        
-        # Check for promotional campaigns
-        active_campaigns = get_active_campaigns()
-        bonus_multiplier = 1.0
-        campaign_description = ""
-        
-        for campaign in active_campaigns:
-            if is_eligible_for_campaign(user_id, campaign):
-                bonus_multiplier = max(bonus_multiplier, campaign.bonus_multiplier)
-                campaign_description = f" (+ {campaign.name} bonus)"
-
-        # Apply bonus multiplier
-        final_points = int(points_to_award * bonus_multiplier)
-        
-        # Update customer loyalty
-        loyalty.total_points += final_points
-        loyalty.lifetime_points += final_points
-        loyalty.last_activity = datetime.utcnow()
-        
-        # Update tier if necessary
-        old_tier = loyalty.tier_level
-        loyalty.update_tier()
-        
-        # Create point transaction record
-        transaction = PointTransaction(
-            user_id=user_id,
-            order_id=order_id,
-            points_earned=final_points,
-            transaction_type='earned',
-            description=f'Order #{order_id} - {order.total_amount} EGP{campaign_description}',
-            expiry_date=datetime.utcnow() + timedelta(days=180)  # 6 months
-        )
-        db.session.add(transaction)
-
-        # Award tier upgrade bonus if applicable
-        if old_tier != loyalty.tier_level:
-            tier_bonus_points = get_tier_upgrade_bonus(loyalty.tier_level)
-            if tier_bonus_points > 0:
-                loyalty.total_points += tier_bonus_points
-                bonus_transaction = PointTransaction(
-                    user_id=user_id,
-                    points_earned=tier_bonus_points,
-                    transaction_type='bonus',
-                    description=f'Tier upgrade bonus - Welcome to {loyalty.tier_level.title()}!',
-                    expiry_date=datetime.utcnow() + timedelta(days=180)
-                )
-                db.session.add(bonus_transaction)
-
-        db.session.commit()
-        
-        current_app.logger.info(
-            f"Awarded {final_points} points to user {user_id} for order {order_id}"
-        )
-        
-        return True
+        return run_with_retries(lambda: _award_points_for_order(order_id, user_id),
+                                retry_on=(OperationalError, IntegrityError))
 
     except Exception as e:
         db.session.rollback()
@@ -112,28 +35,159 @@ def award_points_for_order(order_id, user_id):
         return False
 
 
-def get_active_campaigns():
-    """Get all active promotional campaigns"""
-    from app.models import PromotionalCampaign
-    
-    now = datetime.utcnow()
-    return PromotionalCampaign.query.filter(
-        PromotionalCampaign.start_date <= now,
-        PromotionalCampaign.end_date >= now
-    ).all()
+def queue_points_for_order(order):
+    """Award a completed order's points in the background once the caller commits"""
+    if order.user_id:
+        enqueue('award_order_points', order_id=order.order_id, user_id=order.user_id)
 
 
-def is_eligible_for_campaign(user_id, campaign):
-    """Check if user is eligible for a promotional campaign"""
-    # Basic eligibility check - can be extended with more complex rules
-    if not campaign.conditions:
+@job('award_order_points')
+def award_order_points_job(order_id, user_id):
+    """
+    Background job: award a completed order's points
+    Raises, so the job is retried, while the order is completed but its
+    points could not be awarded; an order no longer completed is skipped
+    """
+    if not award_points_for_order(order_id, user_id):
+        order = db.session.get(Order, order_id)
+        if order is not None and order.status == 'completed':
+            raise RuntimeError(f"Points for order {order_id} were not awarded")
+
+
+def _award_points_for_order(order_id, user_id):
+    """One attempt at awarding an order's points, in one transaction"""
+    # Get the order
+    order = db.session.get(Order, order_id)
+    if not order or order.status != 'completed':
+        return False
+
+    # Check if points already awarded for this order
+    existing_transaction = PointTransaction.query.filter_by(
+        order_id=order_id,
+        transaction_type='earned'
+    ).first()
+
+    if existing_transaction:
+        current_app.logger.info(f"Points already awarded for order {order_id}")
         return True
-    
-    # Add custom campaign eligibility logic here
-    # For now, all users are eligible for all campaigns
+
+    # Get or create customer loyalty account
+    loyalty = CustomerLoyalty.query.filter_by(user_id=user_id).first()
+    if not loyalty:
+        loyalty = CustomerLoyalty(user_id=user_id, tier_level='bronze')
+        db.session.add(loyalty)
+
+    # Get active loyalty program (or use default)
+    program = LoyaltyProgram.query.filter_by(status='active').first()
+    if not program:
+        # Create default program if none exists
+        program = LoyaltyProgram(
+            name='Default Rewards Program',
+            description='Earn points on every purchase',
+            points_per_50EGP=100,
+            status='active'
+        )
+        db.session.add(program)
+
+    # Calculate points (100 points per 50 EGP)
+    points_to_award = int((float(order.total_amount) / 50.0) * program.points_per_50EGP)
+
+    # The best campaign whose rules the order meets and whose usage limits
+    # allow another use applies, and is credited with the extra points
+    bonus_campaign = choose_campaign(order, user_id, loyalty.tier_level)
+    bonus_multiplier = bonus_campaign.bonus_multiplier if bonus_campaign else 1.0
+    campaign_description = f" (+ {bonus_campaign.name} bonus)" if bonus_campaign else ""
+
+    # Apply bonus multiplier
+    final_points = int(points_to_award * bonus_multiplier)
+
+    # Record the award first: a concurrent award of the same order fails on
+    # the unique earned-per-order index here, before any points move
+    transaction = PointTransaction(
+        user_id=user_id,
+        order_id=order_id,
+        points_earned=final_points,
+        transaction_type='earned',
+        description=f'Order #{order_id} - {order.total_amount} EGP{campaign_description}',
+        expiry_date=datetime.utcnow() + timedelta(days=180),  # 6 months
+        campaign_id=bonus_campaign.campaign_id if bonus_campaign else None,
+        bonus_points=final_points - points_to_award
+    )
+    db.session.add(transaction)
+    db.session.flush()
+
+    # Credit the points and move the tier in one UPDATE
+    connection = db.session.connection()
+    account = credit_points(connection, user_id, final_points)
+    transaction.balance_after = account.total_points
+
+    # Award tier upgrade bonus if applicable
+    if account.tier_level != CustomerLoyalty.tier_for(account.lifetime_points - final_points):
+        tier_bonus_points = get_tier_upgrade_bonus(account.tier_level)
+        if tier_bonus_points > 0:
+            account = credit_points(connection, user_id, tier_bonus_points, lifetime=False)
+            bonus_transaction = PointTransaction(
+                user_id=user_id,
+                points_earned=tier_bonus_points,
+                balance_after=account.total_points,
+                transaction_type='bonus',
+                description=f'Tier upgrade bonus - Welcome to {account.tier_level.title()}!',
+                expiry_date=datetime.utcnow() + timedelta(days=180)
+            )
+            db.session.add(bonus_transaction)
+
+    db.session.add(Notification(
+        user_id=user_id,
+        message=f"You earned {final_points} loyalty points from order #{order_id}!",
+        notification_type='loyalty_points'
+    ))
+    db.session.commit()
+
+    current_app.logger.info(
+        f"Awarded {final_points} points to user {user_id} for order {order_id}"
+    )
+
     return True
 
 
+def redeem_reward(user_id, reward):
+    """
+    Spend a customer's points on a reward
+
+    The balance is checked and lowered by one conditional UPDATE, so
+    concurrent redemptions cannot spend the same points twice.
+
+    Returns:
+        tuple: (RewardRedemption, points left)
+
+    Raises:
+        InsufficientPoints: If the customer's balance does not cover the reward
+    """
+    def redeem():
+        remaining = debit_points(db.session.connection(), user_id, reward.points_required)
+
+        redemption = RewardRedemption(
+            user_id=user_id,
+            reward_id=reward.reward_id,
+            points_used=reward.points_required,
+            redemption_code=str(uuid.uuid4())[:8].upper(),
+            status='completed'
+        )
+        db.session.add(redemption)
+        db.session.add(PointTransaction(
+            user_id=user_id,
+            points_redeemed=reward.points_required,
+            balance_after=remaining,
+            transaction_type='redeemed',
+            description=f'Redeemed: {reward.name}'
+        ))
+        db.session.commit()
+        return redemption, remaining
+
+    # A clashing redemption code fails the insert; the retry draws a new one
+    return run_with_retries(redeem, retry_on=(OperationalError, IntegrityError))
+
+
 def get_tier_upgrade_bonus(tier_level):
     """Get bonus points for tier upgrades"""
     tier_bonuses = {
@@ -144,47 +198,21 @@ def get_tier_upgrade_bonus(tier_level):
     return tier_bonuses.get(tier_level, 0)
 
 
-def expire_points():
+def expire_points(batch_size=1000):
     """
-    Expire points that are older than 6 months
-    This should be run as a scheduled task
+    Expire the unspent points of lots past their expiry date
+    This should be run as a scheduled task (`flask expire-points`)
+
+    Returns:
+        int: Points expired
     """
     try:
-        six_months_ago = datetime.utcnow() - timedelta(days=180)
-        
-        # Find expired point transactions
-        expired_transactions = PointTransaction.query.filter(
-            PointTransaction.expiry_date <= datetime.utcnow(),
-            PointTransaction.transaction_type == 'earned',
-            PointTransaction.points_earned > 0
-        ).all()
-
-        total_expired_points = 0
-        for transaction in expired_transactions:
-            # Check if these points haven't been used yet
-            user_loyalty = CustomerLoyalty.query.filter_by(
-                user_id=transaction.user_id
-            ).first()
-            
-            if user_loyalty and user_loyalty.total_points >= transaction.points_earned:
-                # Deduct expired points
-                user_loyalty.total_points -= transaction.points_earned
-                
-                # Create expiration transaction
-                expiry_transaction = PointTransaction(
-                    user_id=transaction.user_id,
-                    points_redeemed=transaction.points_earned,
-                    transaction_type='expired',
-                    description=f'Points expired from {transaction.timestamp.strftime("%Y-%m-%d")}'
-                )
-                db.session.add(expiry_transaction)
-                
-                total_expired_points += transaction.points_earned
-
-        db.session.commit()
-        current_app.logger.info(f"Expired {total_expired_points} points")
-        
-        return total_expired_points
+        report = expire_lots(batch_size=batch_size)
+        current_app.logger.info(
+            f"Expired {report['points']} points from {report['lots']} lots "
+            f"of {report['customers']} customers in {report['seconds']:.2f}s"
+        )
+        return report['points']
 
     except Exception as e:
         db.session.rollback()
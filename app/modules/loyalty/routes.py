@@ -8,6 +8,7 @@ from app.models import (
 from app.modules.loyalty.loyalty_service import (
     get_customer_tier_benefits, calculate_points_for_amount
 )
+from app.modules.loyalty.ledger_service import get_expiring_points
 from datetime import datetime, timedelta
 
 
@@ -40,6 +41,9 @@ def index():
         user_id=current_user.user_id
     ).order_by(RewardRedemption.redemption_date.desc()).limit(5).all()
 
+    # Points of open lots expiring within the next 30 days
+    expiring_points, expiry_date = get_expiring_points(current_user.user_id)
+
     # Get tier benefits
     tier_benefits = get_customer_tier_benefits(loyalty.tier_level)
 
@@ -97,7 +101,9 @@ def index():
                          next_tier=next_tier_info,
                          points_to_next=max(0, points_to_next) if points_to_next else 0,
                          progress_percentage=min(100, progress_percentage),
-                         active_campaigns=active_campaigns)
+                         active_campaigns=active_campaigns,
+                         expiring_points=expiring_points,
+                         expiry_date=expiry_date)
 
 
 @bp.route('/rewards')
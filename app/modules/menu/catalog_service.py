@@ -0,0 +1,151 @@
+"""
+Menu Catalog Service
+Serves the customer-facing menu from an in-process snapshot keyed by a
+catalog version. Any write to menu items, categories or their images bumps
+the version, so the next request rebuilds the snapshot once and every
+request after that reuses it (including its pre-serialized JSON and ETag)
+"""
+import hashlib
+import json
+import threading
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.extensions import db
+from app.models import MenuItem, Category, MenuItemImage, CacheVersion
+
+CATALOG_VERSION_NAME = 'menu_catalog'
+
+# Writes to these models change what the menu shows
+CATALOG_MODELS = (MenuItem, Category, MenuItemImage)
+
+DEFAULT_IMAGE = 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=300&h=200&fit=crop'
+
+# Default image URL based on category
+DEFAULT_IMAGES = {
+    'Hookah': 'https://images.unsplash.com/photo-1578662996442-48f60103fc96?w=300&h=200&fit=crop',
+    'Drinks': 'https://images.unsplash.com/photo-1544145945-f90425340c7e?w=300&h=200&fit=crop',
+    'Brunch': 'https://images.unsplash.com/photo-1533089860892-a7c6f0a88666?w=300&h=200&fit=crop',
+    'Main Courses': 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=300&h=200&fit=crop',
+    'Desserts': 'https://images.unsplash.com/photo-1551024506-0bccd828d307?w=300&h=200&fit=crop'
+}
+
+_build_lock = threading.Lock()
+
+
+def bump_catalog_version(connection):
+    """Invalidate every process's menu snapshot
+
+    Args:
+        connection: Connection of the writing transaction
+    """
+    CacheVersion.bump(connection, CATALOG_VERSION_NAME)
+
+
+def get_catalog_version():
+    """Get the current catalog version (0 before the first menu write)"""
+    return CacheVersion.get_version(CATALOG_VERSION_NAME)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_catalog_changes(session, flush_context):
+    """Bump the catalog version when a flush touches the menu"""
+    changed = any(isinstance(obj, CATALOG_MODELS) for obj in list(session.new) + list(session.deleted))
+    if not changed:
+        changed = any(
+            isinstance(obj, CATALOG_MODELS) and session.is_modified(obj)
+            for obj in session.dirty
+        )
+    if changed:
+        bump_catalog_version(session.connection())
+
+
+def _detached_copy(obj):
+    """Copy of a loaded instance that belongs to no session, safe to share between requests"""
+    model = type(obj)
+    return model(**{attr.key: getattr(obj, attr.key) for attr in inspect(model).column_attrs})
+
+
+class MenuCatalog:
+    """Immutable snapshot of the available menu for one catalog version"""
+
+    def __init__(self, version, categories, items):
+        self.version = version
+        # Active categories in display order
+        self.categories = categories
+        # Available items in id order, each with its category loaded
+        self.items = items
+        # Available items as the menu page lists them
+        self.menu_items = sorted(
+            items,
+            key=lambda item: (item.category.display_order if item.category else 0, item.name)
+        )
+        self.ratings = {
+            item.item_id: (round(float(item.rating_avg or 0), 1), item.rating_count or 0)
+            for item in items
+        }
+
+        self.items_json = json.dumps({
+            'status': 'success',
+            'data': [self._serialize(item) for item in items]
+        }).encode('utf-8')
+        self.etag = hashlib.sha1(self.items_json).hexdigest()
+
+    @staticmethod
+    def _serialize(item):
+        category_name = item.category.name if item.category else 'Main Courses'
+        return {
+            'id': item.item_id,
+            'name': item.name,
+            'description': item.description,
+            'price': float(item.price),
+            'category': category_name,
+            'image': item.image_url or DEFAULT_IMAGES.get(category_name, DEFAULT_IMAGE),
+            'stock': item.stock
+        }
+
+
+def _build_catalog(version):
+    categories = {
+        category.category_id: _detached_copy(category)
+        for category in Category.query.all()
+    }
+
+    items = []
+    for item in MenuItem.query.options(joinedload(MenuItem.category)).filter_by(
+        status='available'
+    ).order_by(MenuItem.item_id).all():
+        copy = _detached_copy(item)
+        set_committed_value(copy, 'category', categories.get(item.category_id))
+        items.append(copy)
+
+    active_categories = sorted(
+        (category for category in categories.values() if category.is_active),
+        key=lambda category: category.display_order
+    )
+    return MenuCatalog(version, active_categories, items)
+
+
+def get_menu_catalog():
+    """
+    Get the menu snapshot for the current catalog version
+    Costs one version lookup per call; the menu itself is only queried
+    after a menu write
+
+    Returns:
+        MenuCatalog: Shared, read-only snapshot
+    """
+    version = get_catalog_version()
+    catalog = current_app.extensions.get('menu_catalog')
+
+    if catalog is None or catalog.version != version:
+        with _build_lock:
+            catalog = current_app.extensions.get('menu_catalog')
+            if catalog is None or catalog.version != version:
+                catalog = _build_catalog(version)
+                current_app.extensions['menu_catalog'] = catalog
+
+    return catalog
@@ -0,0 +1,418 @@
+"""
+Menu Popularity Service
+Keeps each menu item's ordered quantity current as orders are placed,
+edited and cancelled, all-time and over the last 7 and 30 days, so the
+popular items are an indexed top-N read instead of a GROUP BY over every
+order line
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import event, func, select, inspect
+
+from app.extensions import db
+from app.models import Order, OrderItem, MenuItem, Category, ItemPopularity, DailyItemPopularity
+from app.modules.admin.rollup_service import increment_rows
+from app.modules.menu.stock_service import RELEASED_STATUSES
+
+# Counter column of each rolling window, by its length in days
+WINDOWS = {7: 'last_7_days', 30: 'last_30_days'}
+
+# Last day this process saw the rolling windows moved to
+_rolled_day = None
+
+
+def _today():
+    return datetime.utcnow().date()
+
+
+def _money(value):
+    return Decimal(str(value or 0))
+
+
+def _new_deltas():
+    """{key: {'quantity': delta, 'revenue': delta}}"""
+    return defaultdict(lambda: {'quantity': 0, 'revenue': Decimal(0)})
+
+
+def _order_day(order_time):
+    return (order_time or datetime.utcnow()).date()
+
+
+def _counts(status):
+    """Cancelled and rejected orders do not make an item popular"""
+    return status is not None and status not in RELEASED_STATUSES
+
+
+def roll_windows(connection, today=None):
+    """Move every item's rolling windows forward to today
+
+    Each stale window day takes one UPDATE that subtracts the days which
+    fell out of the windows since, read from the daily rows.
+
+    Args:
+        connection: Connection of the writing transaction
+        today (date): Day the windows should end on, defaults to today (UTC)
+
+    Returns:
+        int: Number of items whose windows moved
+    """
+    today = today or _today()
+    popularity = ItemPopularity.__table__
+    daily = DailyItemPopularity.__table__
+
+    stale_days = connection.execute(
+        select(popularity.c.window_day).where(popularity.c.window_day < today).distinct()
+    ).scalars().all()
+
+    rolled = 0
+    for window_day in stale_days:
+        expired = {
+            column: popularity.c[column] - func.coalesce(
+                select(func.sum(daily.c.quantity)).where(
+                    daily.c.item_id == popularity.c.item_id,
+                    daily.c.day > window_day - timedelta(days=days),
+                    daily.c.day <= today - timedelta(days=days)
+                ).scalar_subquery(), 0)
+            for days, column in WINDOWS.items()
+        }
+        rolled += connection.execute(
+            popularity.update().where(popularity.c.window_day == window_day).values(window_day=today, **expired)
+        ).rowcount
+    return rolled
+
+
+def _roll_if_stale():
+    """Roll the windows once per day per process before reading them"""
+    global _rolled_day
+    today = _today()
+    if _rolled_day == today:
+        return
+    with db.engine.begin() as connection:
+        roll_windows(connection, today)
+    _rolled_day = today
+
+
+def _apply(connection, deltas):
+    """Add {(day, item_id): {'quantity': delta, 'revenue': delta}} to the daily rows and the items' counters"""
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return
+
+    today = _today()
+    if _rolled_day != today:
+        roll_windows(connection, today)
+
+    daily = {}
+    items = defaultdict(lambda: defaultdict(int))
+    for (day, item_id), values in deltas.items():
+        daily[(day, item_id)] = values
+        counters = items[(item_id,)]
+        counters['all_time'] += values['quantity']
+        counters['revenue'] += values['revenue']
+        for days, column in WINDOWS.items():
+            if day > today - timedelta(days=days):
+                counters[column] += values['quantity']
+
+    increment_rows(connection, DailyItemPopularity.__table__, ['day', 'item_id'], daily)
+    increment_rows(connection, ItemPopularity.__table__, ['item_id'], items,
+                   {key: {'window_day': today} for key in items})
+
+
+def _order_states(session, order_ids):
+    """Get {order_id: (status before flush, status after flush, order_time)}"""
+    states = {}
+    for obj in list(session.identity_map.values()) + list(session.deleted) + list(session.new):
+        if not isinstance(obj, Order) or obj.order_id not in order_ids:
+            continue
+        if obj in session.new:
+            before, after = None, obj.status
+        elif obj in session.deleted:
+            before, after = obj.status, None
+        else:
+            history = inspect(obj).attrs.status.history
+            before, after = history.deleted[0] if history.deleted else obj.status, obj.status
+        states[obj.order_id] = (before, after, obj.order_time)
+
+    missing = set(order_ids) - set(states)
+    if missing:
+        for order_id, status, order_time in session.connection().execute(
+            select(Order.order_id, Order.status, Order.order_time).where(Order.order_id.in_(missing))
+        ):
+            states[order_id] = (status, status, order_time)
+
+    return states
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_item_popularity(session, flush_context):
+    """Count flushed order lines, and order status changes, towards their items' popularity"""
+    # Net line quantity and revenue added per (order, item) by this flush
+    added = _new_deltas()
+    order_ids = set()
+
+    def add(line, quantity, unit_price, sign):
+        values = added[(line.order_id, line.item_id)]
+        values['quantity'] += sign * (quantity or 0)
+        values['revenue'] += sign * (quantity or 0) * _money(unit_price)
+
+    for obj in session.new:
+        if isinstance(obj, OrderItem):
+            add(obj, obj.quantity, obj.unit_price, 1)
+        elif isinstance(obj, Order):
+            order_ids.add(obj.order_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, OrderItem):
+            add(obj, obj.quantity, obj.unit_price, -1)
+        elif isinstance(obj, Order):
+            order_ids.add(obj.order_id)
+
+    for obj in session.dirty:
+        if isinstance(obj, OrderItem) and session.is_modified(obj):
+            state = inspect(obj)
+            previous = {
+                key: (state.attrs[key].history.deleted or [getattr(obj, key)])[0]
+                for key in ('quantity', 'unit_price')
+            }
+            add(obj, previous['quantity'], previous['unit_price'], -1)
+            add(obj, obj.quantity, obj.unit_price, 1)
+        elif isinstance(obj, Order) and inspect(obj).attrs.status.history.has_changes():
+            order_ids.add(obj.order_id)
+
+    order_ids.update(order_id for order_id, _ in added)
+    order_ids.discard(None)
+    if not order_ids:
+        return
+
+    connection = session.connection()
+    orders = _order_states(session, order_ids)
+
+    # Lines as they are now, after the flush
+    current = _new_deltas()
+    for order_id, item_id, quantity, revenue in connection.execute(
+        select(
+            OrderItem.order_id, OrderItem.item_id,
+            func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.unit_price)
+        ).where(OrderItem.order_id.in_(order_ids))
+        .group_by(OrderItem.order_id, OrderItem.item_id)
+    ):
+        current[(order_id, item_id)] = {'quantity': quantity or 0, 'revenue': _money(revenue)}
+
+    # Counted after the flush minus counted before it, per day and item
+    deltas = _new_deltas()
+    for key in set(current) | set(added):
+        order_id, item_id = key
+        before_status, after_status, order_time = orders.get(order_id, (None, None, None))
+        values = deltas[(_order_day(order_time), item_id)]
+        for column in ('quantity', 'revenue'):
+            after = current[key][column]
+            before = after - added[key][column]
+            values[column] += after * _counts(after_status) - before * _counts(before_status)
+
+    _apply(connection, deltas)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_bulk_order_lines(orm_execute_state):
+    """Count order lines written with a bulk insert(OrderItem), which skips flush events"""
+    if not (orm_execute_state.is_insert and orm_execute_state.bind_mapper is inspect(OrderItem)):
+        return None
+
+    rows = orm_execute_state.parameters
+    if isinstance(rows, dict):
+        rows = [rows]
+    rows = rows or []
+
+    session = orm_execute_state.session
+    orders = _order_states(session, {row['order_id'] for row in rows})
+
+    deltas = _new_deltas()
+    for row in rows:
+        _, status, order_time = orders.get(row['order_id'], (None, None, None))
+        if _counts(status):
+            values = deltas[(_order_day(order_time), row['item_id'])]
+            quantity = row.get('quantity', 1) or 0
+            values['quantity'] += quantity
+            values['revenue'] += quantity * _money(row.get('unit_price'))
+
+    _apply(session.connection(), deltas)
+    # Let the insert run as usual
+    return None
+
+
+def get_popular_items(limit, days=None):
+    """
+    Get the available items ordered most, from the maintained counters
+
+    Args:
+        limit (int): Maximum number of items
+        days (int): 7 or 30 for a rolling window, None for all time
+
+    Returns:
+        list: (MenuItem, quantity ordered) tuples, most ordered first
+
+    Raises:
+        ValueError: If days is not a maintained window
+    """
+    if days is None:
+        counter = ItemPopularity.all_time
+    elif days in WINDOWS:
+        _roll_if_stale()
+        counter = ItemPopularity.__table__.c[WINDOWS[days]]
+    else:
+        raise ValueError(f"Popularity is kept for {sorted(WINDOWS)} days, not {days}")
+
+    return db.session.query(MenuItem, counter).join(
+        ItemPopularity, ItemPopularity.item_id == MenuItem.item_id
+    ).filter(
+        MenuItem.status == 'available',
+        counter > 0
+    ).order_by(counter.desc()).limit(limit).all()
+
+
+def _day_range(start_date, end_date):
+    """Filters on DailyItemPopularity.day for the (UTC) days of a date range"""
+    filters = []
+    if start_date:
+        filters.append(DailyItemPopularity.day >= start_date.date())
+    if end_date:
+        filters.append(DailyItemPopularity.day <= end_date.date())
+    return filters
+
+
+def get_popular_items_between(limit, start_date=None, end_date=None):
+    """
+    Get the available items ordered most on the (UTC) days of a date range
+
+    Returns:
+        list: (MenuItem, quantity ordered) tuples, most ordered first
+    """
+    daily = DailyItemPopularity
+    quantity = func.sum(daily.quantity)
+    return db.session.query(MenuItem, quantity).join(
+        daily, daily.item_id == MenuItem.item_id
+    ).filter(
+        MenuItem.status == 'available', *_day_range(start_date, end_date)
+    ).group_by(MenuItem.item_id).having(quantity > 0).order_by(quantity.desc()).limit(limit).all()
+
+
+def _item_sales_query(start_date=None, end_date=None):
+    """(query, quantity, revenue) projecting each ordered item's sales, for all time or a date range"""
+    columns = (
+        MenuItem.item_id, MenuItem.name, Category.name.label('category'),
+        MenuItem.price, MenuItem.image_url, MenuItem.status
+    )
+
+    if not (start_date or end_date):
+        quantity, revenue = ItemPopularity.all_time, ItemPopularity.revenue
+        query = db.session.query(
+            *columns, quantity.label('quantity'), revenue.label('revenue')
+        ).select_from(ItemPopularity).join(
+            MenuItem, MenuItem.item_id == ItemPopularity.item_id
+        ).join(
+            Category, Category.category_id == MenuItem.category_id
+        ).filter(quantity > 0)
+        return query, quantity, revenue
+
+    daily = DailyItemPopularity
+    quantity, revenue = func.sum(daily.quantity), func.sum(daily.revenue)
+    query = db.session.query(
+        *columns, quantity.label('quantity'), revenue.label('revenue')
+    ).select_from(daily).join(
+        MenuItem, MenuItem.item_id == daily.item_id
+    ).join(
+        Category, Category.category_id == MenuItem.category_id
+    ).filter(
+        *_day_range(start_date, end_date)
+    ).group_by(*columns).having(quantity > 0)
+    return query, quantity, revenue
+
+
+def get_item_sales(page=1, per_page=15, start_date=None, end_date=None):
+    """
+    Get one page of every ordered menu item's sales, best sellers first
+
+    Discontinued and sold-out items are included, and revenue is what the
+    lines sold for (quantity * unit_price) rather than today's price. A date
+    range covers whole (UTC) days.
+
+    Returns:
+        Pagination: Rows of item_id, name, category, price, image_url,
+            status, quantity and revenue
+    """
+    query, quantity, _ = _item_sales_query(start_date, end_date)
+    return query.order_by(quantity.desc(), MenuItem.item_id).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+
+
+def get_item_sales_totals(start_date=None, end_date=None):
+    """
+    Get the quantity and revenue of every ordered item together
+
+    Returns:
+        dict: quantity, revenue, top_quantity (the best seller's) and items
+    """
+    query, _, _ = _item_sales_query(start_date, end_date)
+    sales = query.subquery()
+    quantity, revenue, top_quantity, items = db.session.query(
+        func.sum(sales.c.quantity), func.sum(sales.c.revenue),
+        func.max(sales.c.quantity), func.count(sales.c.item_id)
+    ).one()
+    return {
+        'quantity': int(quantity or 0),
+        'revenue': float(revenue or 0),
+        'top_quantity': int(top_quantity or 0),
+        'items': items or 0
+    }
+
+
+def rebuild_item_popularity():
+    """
+    Recompute the daily rows and every item's counters from live orders
+    Used to backfill an existing database and to reconcile drift after bulk edits
+
+    Returns:
+        int: Number of menu items rebuilt
+    """
+    global _rolled_day
+    today = _today()
+    order_day = func.date(Order.order_time)
+
+    daily_rows = db.session.query(
+        order_day, OrderItem.item_id,
+        func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.unit_price)
+    ).join(
+        Order, Order.order_id == OrderItem.order_id
+    ).filter(
+        Order.status.notin_(RELEASED_STATUSES)
+    ).group_by(order_day, OrderItem.item_id).all()
+
+    daily = []
+    items = {}
+    for day, item_id, quantity, revenue in daily_rows:
+        day = datetime.strptime(day[:10], '%Y-%m-%d').date() if isinstance(day, str) else day
+        quantity, revenue = int(quantity or 0), _money(revenue)
+        daily.append(dict(day=day, item_id=item_id, quantity=quantity, revenue=revenue))
+
+        counters = items.setdefault(item_id, dict(
+            item_id=item_id, all_time=0, revenue=Decimal(0), window_day=today,
+            **dict.fromkeys(WINDOWS.values(), 0)))
+        counters['all_time'] += quantity
+        counters['revenue'] += revenue
+        for days, column in WINDOWS.items():
+            if day > today - timedelta(days=days):
+                counters[column] += quantity
+
+    db.session.execute(ItemPopularity.__table__.delete())
+    db.session.execute(DailyItemPopularity.__table__.delete())
+    if daily:
+        db.session.execute(DailyItemPopularity.__table__.insert(), daily)
+    if items:
+        db.session.execute(ItemPopularity.__table__.insert(), list(items.values()))
+
+    db.session.commit()
+    _rolled_day = today
+    return len(items)
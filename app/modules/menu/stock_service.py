@@ -0,0 +1,244 @@
+"""
+Menu Stock Service
+Reserves MenuItem.stock for the lines of live orders with conditional
+UPDATEs, one statement per batch of items, so concurrent checkouts cannot
+oversell an item and sold-out items leave the menu on their own.
+Items whose stock is NULL are not tracked and never sell out, and orders
+placed while stock was not reserved (Order.stock_reserved false) neither
+hold nor give back stock
+"""
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event, func, select, case, inspect
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.extensions import db
+from app.models import Order, OrderItem, MenuItem
+from app.modules.menu.catalog_service import bump_catalog_version
+
+# Orders in these statuses give their stock back
+RELEASED_STATUSES = ('cancelled', 'rejected')
+
+
+class InsufficientStock(Exception):
+    """Raised when a reservation asks for more than an item has left"""
+
+    def __init__(self, item_ids):
+        super().__init__(f"Not enough stock for menu items {sorted(item_ids)}")
+        self.item_ids = set(item_ids)
+
+
+def stock_tracking_enabled():
+    return current_app.config.get('MENU_STOCK_TRACKING', True)
+
+
+def _holds_stock(status):
+    return status is not None and status not in RELEASED_STATUSES
+
+
+def reserve_stock(connection, quantities):
+    """Take stock for {item_id: quantity} in one conditional UPDATE
+
+    Only available items with enough stock are decremented; items that reach
+    zero become out_of_stock. Untracked items (NULL stock) always fit and
+    are only checked to be available: their rows are not written and the
+    catalog version is bumped only when a tracked item's stock moved.
+    All or nothing: when any item falls short nothing is left reserved by
+    this call (the items that fit are put back, or without RETURNING the
+    UPDATE's savepoint is rolled back).
+
+    Raises:
+        InsufficientStock: With the items that could not be reserved
+    """
+    quantities = {item_id: quantity for item_id, quantity in quantities.items() if quantity > 0}
+    if not quantities or not stock_tracking_enabled():
+        return
+
+    items = MenuItem.__table__
+    requested = case(quantities, value=items.c.item_id)
+    stmt = items.update().where(
+        items.c.item_id.in_(quantities),
+        items.c.status == 'available',
+        items.c.stock >= requested
+    ).values(
+        stock=items.c.stock - requested,
+        status=case((items.c.stock - requested <= 0, 'out_of_stock'), else_=items.c.status),
+        # Stock movements are not edits of the menu item
+        updated_at=items.c.updated_at
+    )
+
+    if connection.dialect.update_returning:
+        reserved = {row[0] for row in connection.execute(stmt.returning(items.c.item_id))}
+        missing = set(quantities) - reserved
+        if missing:
+            missing -= _untracked_available(connection, missing)
+    else:
+        # Without RETURNING only the count of changed rows is known, so run
+        # the batch in a savepoint and take all of it back on a shortfall
+        savepoint = connection.begin_nested()
+        changed = connection.execute(stmt).rowcount
+        untracked = _untracked_available(connection, quantities) if changed < len(quantities) else set()
+        if changed == len(quantities) - len(untracked):
+            savepoint.commit()
+        else:
+            savepoint.rollback()
+            raise InsufficientStock(connection.execute(select(items.c.item_id).where(
+                items.c.item_id.in_(quantities),
+                ~((items.c.status == 'available')
+                  & (items.c.stock.is_(None) | (items.c.stock >= requested)))
+            )).scalars().all())
+        reserved = set(quantities) - untracked
+        missing = set()
+
+    if missing:
+        # Undo the items that did fit so the caller's transaction stays consistent
+        if reserved:
+            release_stock(connection, {item_id: quantities[item_id] for item_id in reserved}, bump=False)
+        raise InsufficientStock(missing)
+
+    if reserved:
+        bump_catalog_version(connection)
+
+
+def _untracked_available(connection, item_ids):
+    """Get the available items among item_ids whose stock is not tracked"""
+    items = MenuItem.__table__
+    return set(connection.execute(select(items.c.item_id).where(
+        items.c.item_id.in_(item_ids),
+        items.c.status == 'available',
+        items.c.stock.is_(None)
+    )).scalars())
+
+
+def release_stock(connection, quantities, bump=True):
+    """Give back stock for {item_id: quantity} in one UPDATE
+
+    Items that were sold out become available again; discontinued items
+    stay discontinued. Untracked items are left alone, and the catalog
+    version is only bumped when a tracked item got stock back.
+    """
+    quantities = {item_id: quantity for item_id, quantity in quantities.items() if quantity > 0}
+    if not quantities or not stock_tracking_enabled():
+        return
+
+    items = MenuItem.__table__
+    returned = case(quantities, value=items.c.item_id)
+    released = connection.execute(items.update().where(
+        items.c.item_id.in_(quantities),
+        items.c.stock.isnot(None)
+    ).values(
+        stock=items.c.stock + returned,
+        status=case(
+            ((items.c.status == 'out_of_stock') & (items.c.stock + returned > 0), 'available'),
+            else_=items.c.status
+        ),
+        updated_at=items.c.updated_at
+    )).rowcount
+
+    if bump and released:
+        bump_catalog_version(connection)
+
+
+def _order_statuses(session, order_ids):
+    """Get {order_id: (status before flush, status after flush)}
+
+    Orders that never reserved stock are left out, so their lines hold none
+    """
+    statuses = {}
+    unreserved = set()
+    for obj in list(session.identity_map.values()) + list(session.deleted) + list(session.new):
+        if not isinstance(obj, Order) or obj.order_id not in order_ids:
+            continue
+        if obj.stock_reserved is False:
+            unreserved.add(obj.order_id)
+        elif obj in session.new:
+            statuses[obj.order_id] = (None, obj.status)
+        elif obj in session.deleted:
+            statuses[obj.order_id] = (obj.status, None)
+        else:
+            history = inspect(obj).attrs.status.history
+            before = history.deleted[0] if history.deleted else obj.status
+            statuses[obj.order_id] = (before, obj.status)
+
+    missing = set(order_ids) - set(statuses) - unreserved
+    if missing:
+        for order_id, status in session.connection().execute(
+            select(Order.order_id, Order.status).where(Order.order_id.in_(missing), Order.stock_reserved == True)
+        ):
+            statuses[order_id] = (status, status)
+
+    return statuses
+
+
+def _mark_unreserved(session):
+    """Record that orders placed while tracking is off took no stock"""
+    new_orders = [obj for obj in session.new if isinstance(obj, Order) and obj.stock_reserved]
+    if new_orders:
+        orders = Order.__table__
+        session.connection().execute(orders.update().where(
+            orders.c.order_id.in_([order.order_id for order in new_orders])
+        ).values(stock_reserved=False))
+        for order in new_orders:
+            set_committed_value(order, 'stock_reserved', False)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_order_stock(session, flush_context):
+    """Reserve or release stock for flushed order line and order status changes"""
+    if not stock_tracking_enabled():
+        _mark_unreserved(session)
+        return
+
+    # Net line quantity added per (order, item) by this flush
+    added = defaultdict(int)
+    order_ids = set()
+
+    for obj in session.new:
+        if isinstance(obj, OrderItem):
+            added[(obj.order_id, obj.item_id)] += obj.quantity or 0
+        elif isinstance(obj, Order):
+            order_ids.add(obj.order_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, OrderItem):
+            added[(obj.order_id, obj.item_id)] -= obj.quantity or 0
+        elif isinstance(obj, Order):
+            order_ids.add(obj.order_id)
+
+    for obj in session.dirty:
+        if isinstance(obj, OrderItem):
+            quantity = inspect(obj).attrs.quantity.history
+            if quantity.has_changes() and quantity.deleted:
+                added[(obj.order_id, obj.item_id)] += (obj.quantity or 0) - (quantity.deleted[0] or 0)
+        elif isinstance(obj, Order) and inspect(obj).attrs.status.history.has_changes():
+            order_ids.add(obj.order_id)
+
+    order_ids.update(order_id for order_id, _ in added)
+    order_ids.discard(None)
+    if not order_ids:
+        return
+
+    connection = session.connection()
+    statuses = _order_statuses(session, order_ids)
+
+    # Lines as they are now, after the flush
+    current = defaultdict(int)
+    for order_id, item_id, quantity in connection.execute(
+        select(OrderItem.order_id, OrderItem.item_id, func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id.in_(order_ids))
+        .group_by(OrderItem.order_id, OrderItem.item_id)
+    ):
+        current[(order_id, item_id)] = quantity or 0
+
+    # Held after the flush minus held before it, per item
+    delta = defaultdict(int)
+    for key in set(current) | set(added):
+        order_id, item_id = key
+        before_status, after_status = statuses.get(order_id, (None, None))
+        after = current.get(key, 0)
+        before = after - added.get(key, 0)
+        delta[item_id] += after * _holds_stock(after_status) - before * _holds_stock(before_status)
+
+    release_stock(connection, {item_id: -change for item_id, change in delta.items() if change < 0})
+    reserve_stock(connection, {item_id: change for item_id, change in delta.items() if change > 0})
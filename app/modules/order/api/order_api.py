@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, json, url_for
 from flask_login import login_required, current_user
-from app.extensions import db, socketio, csrf
+from app.extensions import db, csrf
 from app.models import Order, OrderItem, MenuItem, Table, User
+from app.modules.loyalty.loyalty_service import queue_points_for_order
+from app.modules.menu.stock_service import InsufficientStock
+from app.modules.order.history_service import (
+    parse_order_query, order_page, iter_orders, InvalidOrderQuery
+)
+from app.websocket_handlers import publish_order_update
 from sqlalchemy.orm import joinedload
 from datetime import datetime
 
@@ -13,6 +19,7 @@ def add_cors_headers(response):
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization,X-CSRFToken'
     response.headers['Access-Control-Allow-Methods'] = 'GET,PUT,POST,DELETE,OPTIONS'
+    response.headers['Access-Control-Expose-Headers'] = 'Link,X-Next-Cursor'
     return response
 
 @bp.route('/test', methods=['GET'])
@@ -35,48 +42,24 @@ def create_order():
     if not items:
         return jsonify({'error': 'No items provided'}), 400
 
-    order = Order(user_id=current_user.user_id, table_id=table_id, notes=notes)
-    db.session.add(order)
-    db.session.flush()  # Get order_id
-
-    total = 0
+    lines = []
     for item in items:
-        try:
-            item_id = item.get('item_id')
-            if not item_id:
-                db.session.rollback()
-                return jsonify({'error': 'Item ID is required'}), 400
-            
-            # Validate that item_id is a reasonable database ID (not a timestamp)
-            if not isinstance(item_id, int) or item_id > 1000000:
-                db.session.rollback()
-                return jsonify({'error': f'Menu item {item_id} not found'}), 400
-            
-            menu_item = MenuItem.query.get(item_id)
-            if not menu_item:
-                db.session.rollback()
-                return jsonify({'error': f'Menu item {item_id} not found'}), 400
-            
-            if menu_item.status != 'available':
-                db.session.rollback()
-                return jsonify({'error': f'Menu item {menu_item.name} is not available'}), 400
-                
-        except Exception as e:
-            db.session.rollback()
-            current_app.logger.error(f"Error processing item {item.get('item_id', 'unknown')}: {str(e)}")
-            return jsonify({'error': f'Menu item {item.get("item_id", "unknown")} not found'}), 400
-        
-        order_item = OrderItem(
-            order_id=order.order_id,
-            item_id=menu_item.item_id,
-            quantity=item.get('quantity', 1),
-            note=item.get('note', ''),
-            unit_price=menu_item.price
-        )
-        db.session.add(order_item)
-        total += menu_item.price * order_item.quantity
-    order.total_amount = total
-    db.session.commit()
+        item_id = item.get('item_id')
+        if not item_id:
+            return jsonify({'error': 'Item ID is required'}), 400
+
+        # Validate that item_id is a reasonable database ID (not a timestamp)
+        if not isinstance(item_id, int) or item_id > 1000000:
+            return jsonify({'error': f'Menu item {item_id} not found'}), 400
+
+        lines.append((item_id, item.get('quantity', 1), item.get('note', '')))
+
+    from app.modules.order.order_service import place_order, OrderPlacementError
+    try:
+        order = place_order(current_user.user_id, lines, table_id=table_id, notes=notes)
+    except OrderPlacementError as e:
+        return jsonify({'error': str(e)}), 400
+
     return jsonify({'order_id': order.order_id, 'status': order.status, 'total': float(order.total_amount)}), 201
 
 @bp.route('/<int:order_id>', methods=['GET'])
@@ -146,18 +129,43 @@ def get_order(order_id):
         print(f"Error retrieving order {order_id}: {str(e)}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+def _list_orders(serialize, **scope):
+    """
+    Respond with a page of orders, or all of them as NDJSON with format=ndjson
+
+    Pages are a JSON list; the cursor for the next page is sent in the
+    X-Next-Cursor and Link headers (absent on the last page)
+    """
+    try:
+        query = parse_order_query(request.args)
+    except InvalidOrderQuery as e:
+        return jsonify({'error': str(e)}), 400
+    query.update(scope)
+
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for row in iter_orders(**query):
+                yield json.dumps(serialize(row)) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    rows, next_cursor = order_page(**query)
+    response = jsonify([serialize(row) for row in rows])
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, _external=True, **args)}>; rel="next"'
+    return response
+
 @bp.route('/history', methods=['GET'])
 @login_required
 def order_history():
-    orders = Order.query.filter_by(user_id=current_user.user_id).order_by(Order.order_time.desc()).all()
-    return jsonify([
-        {
-            'order_id': o.order_id,
-            'status': o.status,
-            'total': float(o.total_amount),
-            'order_time': o.order_time.isoformat()
-        } for o in orders
-    ])
+    return _list_orders(lambda o: {
+        'order_id': o.order_id,
+        'status': o.status,
+        'total': float(o.total_amount),
+        'order_time': o.order_time.isoformat()
+    }, user_id=current_user.user_id)
 
 @bp.route('/<int:order_id>/status', methods=['PATCH'])
 @login_required
@@ -172,27 +180,14 @@ def update_order_status(order_id):
     
     old_status = order.status
     order.status = new_status
-    db.session.commit()
-    
-    # Award loyalty points when order is completed
+
+    # Loyalty points are awarded in the background, queued in the same commit
     if new_status == 'completed' and old_status != 'completed':
-        try:
-            from app.modules.loyalty.loyalty_service import award_points_for_order
-            current_app.logger.info(f"Attempting to award points for order {order_id} to user {order.user_id}")
-            result = award_points_for_order(order_id, order.user_id)
-            current_app.logger.info(f"Point awarding result for order {order_id}: {result}")
-        except Exception as e:
-            current_app.logger.error(f"Error awarding loyalty points for order {order_id}: {str(e)}")
-            import traceback
-            current_app.logger.error(f"Traceback: {traceback.format_exc()}")
+        queue_points_for_order(order)
+    db.session.commit()
     
-    # Emit real-time update event
-    socketio.emit('order_status_updated', {
-        'order_id': order.order_id,
-        'status': order.status,
-        'user_id': order.user_id,
-        'table_id': order.table_id
-    })
+    # Emit real-time update to the customer, order room and staff
+    publish_order_update(order, old_status=old_status, updated_by=current_user.name)
     return jsonify({'order_id': order.order_id, 'status': order.status})
 
 @bp.route('/all', methods=['GET'])
@@ -200,17 +195,14 @@ def update_order_status(order_id):
 def get_all_orders():
     if current_user.role not in ['admin', 'waiter']:
         return jsonify({'error': 'Unauthorized'}), 403
-    orders = Order.query.order_by(Order.order_time.desc()).all()
-    return jsonify([
-        {
-            'order_id': o.order_id,
-            'user_id': o.user_id,
-            'table_id': o.table_id,
-            'status': o.status,
-            'total': float(o.total_amount),
-            'order_time': o.order_time.isoformat()
-        } for o in orders
-    ])
+    return _list_orders(lambda o: {
+        'order_id': o.order_id,
+        'user_id': o.user_id,
+        'table_id': o.table_id,
+        'status': o.status,
+        'total': float(o.total_amount),
+        'order_time': o.order_time.isoformat()
+    })
 
 @bp.route('/<int:order_id>', methods=['PUT'])
 @login_required
@@ -243,8 +235,10 @@ def edit_order(order_id):
         
         if items is not None:
             print(f"Updating {len(items)} items for order {order_id}")
-            # Remove existing items (preserve in transaction)
-            OrderItem.query.filter_by(order_id=order.order_id).delete()
+            # Remove existing items (preserve in transaction); deleted through the
+            # session so the dashboard rollup sees them
+            for order_item in order.order_items:
+                db.session.delete(order_item)
             
             # Add new items
             total = 0
@@ -287,12 +281,7 @@ def edit_order(order_id):
         # Commit changes
         db.session.commit()
         print(f"Committed changes for order {order_id}")          # Emit real-time update
-        socketio.emit('order_edited', {
-            'order_id': order.order_id,
-            'user_id': order.user_id,
-            'table_id': order.table_id,
-            'status': order.status
-        })
+        publish_order_update(order, event='order_edited')
         print(f"Emitted order_edited event for order {order_id} with status {order.status}")
         
         return jsonify({
@@ -302,6 +291,10 @@ def edit_order(order_id):
             'message': 'Order updated successfully'
         })
         
+    except InsufficientStock as e:
+        db.session.rollback()
+        print(f"Not enough stock to edit order {order_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         # Rollback transaction on error
         db.session.rollback()
@@ -0,0 +1,159 @@
+"""
+Order History Service
+Lists orders newest first with keyset pagination on (order_time, order_id):
+each page is one indexed range query however deep the client pages, and
+exports stream page by page so memory stays flat as the orders table grows
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, tuple_
+
+from app.extensions import db
+from app.models import Order
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Rows fetched per query while streaming an export
+EXPORT_BATCH_SIZE = 500
+
+
+class InvalidOrderQuery(Exception):
+    """Raised when a cursor, filter or page size cannot be used"""
+
+
+def encode_cursor(order_time, order_id):
+    """Opaque cursor pointing just past an order"""
+    raw = f'{order_time.isoformat()}|{order_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Get (order_time, order_id) back from a cursor
+
+    Raises:
+        InvalidOrderQuery: If the cursor was not made by encode_cursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        order_time, order_id = raw.split('|')
+        return datetime.fromisoformat(order_time), int(order_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidOrderQuery('Invalid cursor')
+
+
+def _parse_date(value, name, end=False):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidOrderQuery(f'Invalid {name} date')
+    # A bare end date includes that whole day
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def parse_order_query(args):
+    """
+    Read pagination and filter parameters from a request's query string
+
+    Supported: limit, cursor, status (comma separated), from, to (ISO dates
+    or datetimes, `to` inclusive), table_id
+
+    Returns:
+        dict: Keyword arguments for order_page/iter_orders
+
+    Raises:
+        InvalidOrderQuery: If a parameter is malformed
+    """
+    query = {}
+
+    limit = args.get('limit', DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise InvalidOrderQuery('Invalid limit')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidOrderQuery(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    query['limit'] = limit
+
+    if args.get('cursor'):
+        query['cursor'] = decode_cursor(args['cursor'])
+
+    if args.get('status'):
+        query['statuses'] = [status for status in args['status'].split(',') if status]
+    if args.get('from'):
+        query['date_from'] = _parse_date(args['from'], 'from')
+    if args.get('to'):
+        query['date_to'] = _parse_date(args['to'], 'to', end=True)
+    if args.get('table_id'):
+        try:
+            query['table_id'] = int(args['table_id'])
+        except ValueError:
+            raise InvalidOrderQuery('Invalid table_id')
+
+    return query
+
+
+def _orders_statement(user_id=None, statuses=None, date_from=None, date_to=None, table_id=None):
+    stmt = select(
+        Order.order_id, Order.user_id, Order.table_id, Order.status,
+        Order.total_amount, Order.order_time
+    ).order_by(Order.order_time.desc(), Order.order_id.desc())
+
+    if user_id is not None:
+        stmt = stmt.where(Order.user_id == user_id)
+    if statuses:
+        stmt = stmt.where(Order.status.in_(statuses))
+    if date_from is not None:
+        stmt = stmt.where(Order.order_time >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Order.order_time < date_to)
+    if table_id is not None:
+        stmt = stmt.where(Order.table_id == table_id)
+
+    return stmt
+
+
+def _page_statement(cursor, filters):
+    stmt = _orders_statement(**filters)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(Order.order_time, Order.order_id) < tuple_(*cursor))
+    return stmt
+
+
+def order_page(limit=DEFAULT_PAGE_SIZE, cursor=None, **filters):
+    """
+    Get one page of orders, newest first
+
+    Args:
+        limit (int): Page size
+        cursor (tuple): (order_time, order_id) of the last order of the previous page
+        **filters: user_id, statuses, date_from, date_to, table_id
+
+    Returns:
+        tuple: (rows, next_cursor); next_cursor is None on the last page
+    """
+    # One extra row tells whether another page follows
+    rows = db.session.execute(_page_statement(cursor, filters).limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.order_time, last.order_id)
+
+
+def iter_orders(limit=None, cursor=None, **filters):
+    """Yield every matching order, newest first, one keyset batch at a time
+
+    The page size limit is ignored; exports read EXPORT_BATCH_SIZE rows per query.
+    """
+    while True:
+        rows = db.session.execute(_page_statement(cursor, filters).limit(EXPORT_BATCH_SIZE)).all()
+        yield from rows
+        if len(rows) < EXPORT_BATCH_SIZE:
+            return
+        cursor = (rows[-1].order_time, rows[-1].order_id)
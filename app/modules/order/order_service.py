@@ -0,0 +1,128 @@
+"""
+Order Placement Service
+Shared checkout logic for the order endpoints: one query for every menu
+item in the cart, one stock reservation and one bulk insert for all of the
+order's lines
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models import Order, OrderItem, MenuItem
+from app.modules.menu.stock_service import reserve_stock, InsufficientStock
+
+
+class OrderPlacementError(Exception):
+    """Raised when a cart cannot be turned into an order"""
+
+
+class MenuItemNotFound(OrderPlacementError):
+    """A cart line refers to a menu item that does not exist"""
+
+    def __init__(self, item_id):
+        super().__init__(f'Menu item {item_id} not found')
+        self.item_id = item_id
+
+
+class OutOfStock(OrderPlacementError):
+    """Cart lines ask for more than the items have in stock"""
+
+    def __init__(self, menu_items):
+        names = ', '.join(sorted(menu_item.name for menu_item in menu_items))
+        super().__init__(f'Not enough stock for {names}')
+        self.menu_items = menu_items
+
+
+class MenuItemUnavailable(OrderPlacementError):
+    """A cart line refers to a menu item that cannot be ordered"""
+
+    def __init__(self, menu_item):
+        super().__init__(f'Menu item {menu_item.name} is not available')
+        self.menu_item = menu_item
+
+
+def place_order(user_id, lines, table_id=None, notes='', service_charge=0):
+    """
+    Create an order and its items in a single transaction
+
+    Args:
+        user_id (int): Customer placing the order
+        lines (list): (item_id, quantity, note) per cart line
+        table_id (int): Table the order is for, if any
+        notes (str): Order notes
+        service_charge: Flat charge added to the total
+
+    Returns:
+        Order: The committed order
+
+    Raises:
+        OrderPlacementError: If the cart is empty, a quantity is invalid or
+            an item is missing, unavailable or short of stock (nothing is written)
+    """
+    if not lines:
+        raise OrderPlacementError('No items provided')
+
+    item_ids = {item_id for item_id, _, _ in lines}
+    menu_items = {
+        menu_item.item_id: menu_item
+        for menu_item in MenuItem.query.filter(MenuItem.item_id.in_(item_ids)).all()
+    }
+
+    total_amount = Decimal(str(service_charge))
+    order = Order(
+        user_id=user_id,
+        table_id=table_id,
+        status='new',
+        notes=notes,
+        order_time=datetime.utcnow()
+    )
+
+    rows = []
+    for item_id, quantity, note in lines:
+        menu_item = menu_items.get(item_id)
+        if not menu_item:
+            raise MenuItemNotFound(item_id)
+        if menu_item.status != 'available':
+            raise MenuItemUnavailable(menu_item)
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise OrderPlacementError(f'Invalid quantity for {menu_item.name}')
+
+        unit_price = Decimal(str(menu_item.price))
+        rows.append({
+            'item_id': item_id,
+            'quantity': quantity,
+            'note': note or '',
+            'unit_price': unit_price
+        })
+        total_amount += unit_price * quantity
+
+    order.total_amount = total_amount
+
+    quantities = defaultdict(int)
+    for row in rows:
+        quantities[row['item_id']] += row['quantity']
+
+    try:
+        db.session.add(order)
+        db.session.flush()  # Get order ID
+
+        # Take stock for every item in one conditional UPDATE
+        try:
+            reserve_stock(db.session.connection(), quantities)
+        except InsufficientStock as e:
+            raise OutOfStock([menu_items[item_id] for item_id in e.item_ids]) from e
+
+        # All lines in one executemany INSERT
+        for row in rows:
+            row['order_id'] = order.order_id
+        db.session.execute(insert(OrderItem), rows)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return order
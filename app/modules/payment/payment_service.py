@@ -74,11 +74,7 @@ class PaymentService:
                 order.status = 'confirmed'
                 order.payment_status = 'paid'
                 
-                # Award loyalty points if customer has loyalty account
-                from app.modules.loyalty.loyalty_service import award_points_for_order
-                if order.user_id:
-                    award_points_for_order(order_id, order.user_id)
-                
+                # Loyalty points are queued when the order is completed, not when it is paid
                 db.session.commit()
                 
                 current_app.logger.info(f"Payment processed successfully for order {order_id}")
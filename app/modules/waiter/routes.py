@@ -2,7 +2,7 @@ from flask import render_template, redirect, url_for, request, jsonify, flash
 from flask_login import login_required, current_user
 from app.modules.waiter import bp
 from app.models import Order, OrderItem, Table, ServiceRequest, User, db
-from app.extensions import socketio
+from app.websocket_handlers import publish, publish_order_update, STAFF_ROOMS
 from datetime import datetime
 from sqlalchemy.orm import joinedload
 
@@ -79,29 +79,23 @@ def update_order_status():
         order.status = new_status
         order.updated_at = datetime.utcnow()
 
-        # If order is completed, update table status
-        if new_status == 'completed' and order.table:
-            order.table.status = 'available'
-
+        # The occupancy tracker frees the table once it has no active orders
         db.session.commit()
 
-        # Emit real-time update to all connected clients
-        socketio.emit('order_status_updated', {
-            'order_id': order_id,
-            'old_status': old_status,
-            'new_status': new_status,
-            'table_number': order.table.table_number if order.table else None,
-            'customer_name': order.customer.name if order.customer else 'Unknown',
-            'updated_by': current_user.name
-        }, room='admin')
+        # Emit real-time update to the customer, order room and staff
+        publish_order_update(
+            order,
+            old_status=old_status,
+            customer_name=order.customer.name if order.customer else 'Unknown',
+            updated_by=current_user.name
+        )
 
         # Notify customer
-        if order.customer:
-            socketio.emit('order_update', {
-                'order_id': order_id,
-                'status': new_status,
-                'message': f'Your order status has been updated to {new_status}'
-            }, room=f'user_{order.customer.user_id}')
+        publish('order_update', {
+            'order_id': order_id,
+            'status': new_status,
+            'message': f'Your order status has been updated to {new_status}'
+        }, [f'user_{order.user_id}'], coalesce_key=order_id)
 
         return jsonify({
             'success': True,
@@ -178,21 +172,21 @@ def update_service_request():
         db.session.commit()
 
         # Emit real-time update
-        socketio.emit('service_request_updated', {
+        publish('service_request_updated', {
             'request_id': request_id,
             'old_status': old_status,
             'new_status': new_status,
             'table_number': service_request.table.table_number if service_request.table else None,
             'handled_by': current_user.name
-        }, room='waiter')
+        }, STAFF_ROOMS, coalesce_key=request_id)
 
         # Notify customer
         if service_request.customer:
-            socketio.emit('service_update', {
+            publish('service_update', {
                 'request_id': request_id,
                 'status': new_status,
                 'message': f'Your service request has been {new_status}'
-            }, room=f'user_{service_request.customer.user_id}')
+            }, [f'user_{service_request.customer.user_id}'], coalesce_key=request_id)
 
         return jsonify({
             'success': True,
@@ -217,12 +211,7 @@ def table_management():
     ).all()
 
     # Get table statistics
-    table_stats = {
-        'total': Table.query.count(),
-        'available': Table.query.filter_by(status='available').count(),
-        'occupied': Table.query.filter_by(status='occupied').count(),
-        'reserved': Table.query.filter_by(status='reserved').count()
-    }
+    table_stats = Table.get_status_counts()
 
     return render_template('table_management.html',
                          tables=tables,
@@ -256,13 +245,13 @@ def update_table_status():
         db.session.commit()
 
         # Emit real-time update
-        socketio.emit('table_status_updated', {
+        publish('table_status_updated', {
             'table_id': table_id,
             'table_number': table.table_number,
             'old_status': old_status,
             'new_status': new_status,
             'updated_by': current_user.name
-        }, room='admin')
+        }, ['admin'])
 
         return jsonify({
             'success': True,
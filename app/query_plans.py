@@ -0,0 +1,141 @@
+"""
+Query Plan Checks
+Explains the known hot queries against the live database and reports any
+that fall back to a full table scan (e.g. a missing or dropped index)
+"""
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, tuple_, literal_column
+
+from app.extensions import db
+from app.models import (
+    Order, OrderItem, MenuItem, Payment, PointTransaction, ServiceRequest, Notification,
+    Feedback, TableSession, ItemPopularity, BackgroundJob
+)
+from app.modules.admin import analytics_service
+
+
+def hot_queries():
+    """Get (name, table, statement) for the queries the indexes are meant to serve"""
+    now = datetime.utcnow()
+    year = now - timedelta(days=365, minutes=1)
+    sales = select(func.sum(analytics_service.sales_source(year, now).c.revenue))
+    customers = select(func.sum(analytics_service.customer_source(year, now).c.revenue))
+    items = select(func.sum(analytics_service.item_source(year, now).c.revenue))
+
+    return [
+        ('active orders', 'orders',
+         select(func.count(Order.order_id)).where(Order.status.in_(['new', 'processing']))),
+        ('orders by status since', 'orders',
+         select(Order.order_id).where(Order.status == 'completed', Order.order_time >= now)),
+        ('orders since', 'orders',
+         select(Order.order_id, Order.total_amount).where(Order.order_time >= now)),
+        ('customer order history', 'orders',
+         select(Order).where(Order.user_id == 1).order_by(Order.order_time.desc())),
+        ('order list page', 'orders',
+         select(Order.order_id).where(tuple_(Order.order_time, Order.order_id) < tuple_(now, 1))
+         .order_by(Order.order_time.desc(), Order.order_id.desc()).limit(50)),
+        ('customer order history page', 'orders',
+         select(Order.order_id).where(
+             Order.user_id == 1, tuple_(Order.order_time, Order.order_id) < tuple_(now, 1))
+         .order_by(Order.order_time.desc(), Order.order_id.desc()).limit(50)),
+        ('active orders at table', 'orders',
+         select(Order.order_id).where(Order.table_id == 1, Order.status.in_(['new', 'processing']))),
+        ('order lines', 'order_items',
+         select(OrderItem).where(OrderItem.order_id == 1)),
+        ('item sales', 'order_items',
+         select(func.sum(OrderItem.quantity)).where(OrderItem.item_id == 1)),
+        ('order payments', 'payments',
+         select(Payment).where(Payment.order_id == 1)),
+        ('customer point history', 'point_transactions',
+         select(PointTransaction).where(PointTransaction.user_id == 1)
+         .order_by(PointTransaction.timestamp.desc())),
+        ('points earned for order', 'point_transactions',
+         select(PointTransaction.transaction_id).where(
+             PointTransaction.order_id == 1, PointTransaction.transaction_type == 'earned')),
+        ('expiring points', 'point_transactions',
+         select(PointTransaction.transaction_id).where(
+             PointTransaction.transaction_type == 'earned', PointTransaction.expiry_date <= now)),
+        ('open point lots', 'point_transactions',
+         select(PointTransaction.transaction_id).where(
+             PointTransaction.user_id == 1, PointTransaction.points_remaining > literal_column('0'))
+         .order_by(PointTransaction.timestamp)),
+        ('expiring point lots', 'point_transactions',
+         select(PointTransaction.user_id).where(
+             PointTransaction.expiry_date <= now, PointTransaction.points_remaining > literal_column('0'))
+         .group_by(PointTransaction.user_id)),
+        ('pending service requests', 'service_requests',
+         select(ServiceRequest).where(ServiceRequest.status == 'pending')
+         .order_by(ServiceRequest.created_at.desc())),
+        ('unseen notifications', 'notifications',
+         select(func.count(Notification.notification_id)).where(
+             Notification.user_id == 1, Notification.seen == False)),
+        ('approved item feedback', 'feedback',
+         select(func.avg(Feedback.rating)).where(Feedback.item_id == 1, Feedback.is_approved == True)),
+        ('active table sessions', 'table_sessions',
+         select(TableSession.session_id).where(TableSession.table_id == 1, TableSession.is_active == True)),
+        ('due background jobs', 'background_jobs',
+         select(BackgroundJob.job_id).where(BackgroundJob.status == 'pending', BackgroundJob.run_at <= now)
+         .order_by(BackgroundJob.run_at, BackgroundJob.job_id).limit(10)),
+        ('analytics sales buckets', 'hourly_sales_buckets', sales),
+        ('analytics sales edge hours', 'orders', sales),
+        ('analytics customer buckets', 'hourly_customer_buckets', customers),
+        ('analytics customer edge hours', 'orders', customers),
+        ('analytics item buckets', 'hourly_item_buckets', items),
+        ('analytics item edge hours', 'orders', items),
+        ('analytics item edge lines', 'order_items', items),
+        ('popular items', 'item_popularity',
+         select(MenuItem.item_id, ItemPopularity.all_time)
+         .join(ItemPopularity, ItemPopularity.item_id == MenuItem.item_id)
+         .where(MenuItem.status == 'available', ItemPopularity.all_time > 0)
+         .order_by(ItemPopularity.all_time.desc()).limit(4)),
+    ]
+
+
+def _explain_sqlite(connection, compiled):
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).all()
+    return [row[-1] for row in rows]
+
+
+def _explain_postgresql(connection, compiled):
+    # With sequential scans priced out, any that remain have no usable index
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', compiled.params).all()
+    return [row[0] for row in rows]
+
+
+_EXPLAINERS = {
+    'sqlite': (_explain_sqlite, r'^SCAN {table}$'),
+    'postgresql': (_explain_postgresql, r'Seq Scan on {table}\b')
+}
+
+
+def check_query_plans():
+    """
+    Explain every hot query and collect the ones that scan their table
+
+    Returns:
+        list: (name, plan lines) for each query that needs a full scan
+
+    Raises:
+        ValueError: If the database dialect cannot be checked
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect
+
+    if dialect.name not in _EXPLAINERS:
+        raise ValueError(f"Query plan checks are not supported on {dialect.name}")
+    explain, scan_pattern = _EXPLAINERS[dialect.name]
+
+    full_scans = []
+    for name, table, statement in hot_queries():
+        compiled = statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+        plan = explain(connection, compiled)
+        pattern = re.compile(scan_pattern.format(table=table))
+        if any(pattern.search(line.strip()) for line in plan):
+            full_scans.append((name, plan))
+
+    db.session.rollback()
+    return full_scans
@@ -0,0 +1,277 @@
+"""
+Socket.IO identity cache
+Who is behind each Socket.IO connection (user id, role, orders they may
+track), loaded once per user and shared by their connections, so connects
+and realtime handlers authorise without going back to the users table.
+An identity is kept while its user has a connection on this worker. Role
+changes and logouts bump the user's version stamp; other workers check it
+every SOCKET_IDENTITY_TTL_SECONDS and drop the user's connections when it moved
+"""
+import threading
+import time
+
+from flask import current_app, request, session
+from flask_login import current_user, user_logged_out
+from sqlalchemy import event, select, inspect
+
+from app.extensions import db, socketio
+from app.models import User, Order, CacheVersion
+
+IDENTITY_VERSION_PREFIX = 'socket_identity:'
+
+
+class SocketIdentity:
+    """What realtime handlers need to know about a connected user"""
+
+    __slots__ = ('user_id', 'role', 'name', 'order_ids', 'version', 'checked_at')
+
+    def __init__(self, user_id, role, name, order_ids=(), version=0):
+        self.user_id = user_id
+        self.role = role
+        self.name = name
+        self.order_ids = set(order_ids)
+        # The user's version stamp when loaded, and when it was last compared
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def is_waiter(self):
+        return self.role == 'waiter'
+
+    def is_customer(self):
+        return self.role == 'customer'
+
+    def is_staff(self):
+        return self.role in ('admin', 'waiter')
+
+
+_lock = threading.Lock()
+
+
+def _cache():
+    """Get this app's {'identities': {user_id: SocketIdentity}, 'connections': {sid: user_id},
+    'sids': {user_id: set of sids}}"""
+    return current_app.extensions.setdefault(
+        'socket_identity', {'identities': {}, 'connections': {}, 'sids': {}}
+    )
+
+
+def _version_name(user_id):
+    return f'{IDENTITY_VERSION_PREFIX}{user_id}'
+
+
+def bump_identity_version(connection, user_id):
+    """Make every worker drop a user's identity and connections at its next check
+
+    Args:
+        connection: Connection of the writing transaction
+        user_id (int): User whose identity changed or who logged out
+    """
+    CacheVersion.bump(connection, _version_name(user_id))
+
+
+def _load_identity(user_id):
+    """Read a user's identity from the database (None if they cannot connect)"""
+    # Read the stamp first, so a change made while loading is caught at the next check
+    version = CacheVersion.get_version(_version_name(user_id))
+    row = db.session.execute(
+        select(User.role, User.name).where(User.user_id == user_id, User.is_active == True)
+    ).first()
+    if row is None:
+        return None
+
+    order_ids = ()
+    if row.role == 'customer':
+        order_ids = db.session.scalars(select(Order.order_id).where(Order.user_id == user_id))
+
+    return SocketIdentity(user_id, row.role, row.name, order_ids, version)
+
+
+def _is_current(identity):
+    """Compare a cached identity with its user's version stamp, at most once per TTL"""
+    now = time.monotonic()
+    if now - identity.checked_at < current_app.config.get('SOCKET_IDENTITY_TTL_SECONDS', 30):
+        return True
+    if CacheVersion.get_version(_version_name(identity.user_id)) != identity.version:
+        return False
+    identity.checked_at = now
+    return True
+
+
+def get_identity(user_id):
+    """
+    Get a user's identity: the cached one while it is current, else a fresh load
+
+    A cached identity changed on another worker is dropped with the user's
+    connections here, which still carry the old role and rooms. Loaded
+    identities are cached by the caller that registers a connection for them
+    """
+    with _lock:
+        identity = _cache()['identities'].get(user_id)
+    if identity is not None and not _is_current(identity):
+        invalidate_identity(user_id, disconnect=True)
+        identity = None
+    return identity if identity is not None else _load_identity(user_id)
+
+
+def _register(identity, sid):
+    """Cache an identity for a connection; returns the identity now cached"""
+    cache = _cache()
+    with _lock:
+        identity = cache['identities'].setdefault(identity.user_id, identity)
+        cache['connections'][sid] = identity.user_id
+        cache['sids'].setdefault(identity.user_id, set()).add(sid)
+    return identity
+
+
+def connect_identity():
+    """
+    Establish the identity of the connecting client
+
+    Uses the user id from the Flask session, so a reconnect only reads the
+    cache; falls back to Flask-Login (remember-me cookie) when it is missing
+
+    Returns:
+        SocketIdentity: Or None when the client is not logged in
+    """
+    user_id = session.get('_user_id')
+    if user_id is None:
+        if not current_user.is_authenticated:
+            return None
+        user_id = current_user.get_id()
+
+    identity = get_identity(int(user_id))
+    return _register(identity, request.sid) if identity is not None else None
+
+
+def current_identity():
+    """Get the identity of the client sending the current event (None if unknown)"""
+    connections = _cache()['connections']
+    with _lock:
+        user_id = connections.get(request.sid)
+    if user_id is None:
+        return None
+
+    identity = get_identity(user_id)
+    with _lock:
+        # get_identity disconnects this client when its identity changed elsewhere
+        connected = request.sid in connections
+    if identity is None or not connected:
+        return None
+    return _register(identity, request.sid)
+
+
+def forget_connection():
+    """Drop the current client's connection on disconnect, and its user's identity with their last one"""
+    cache = _cache()
+    with _lock:
+        user_id = cache['connections'].pop(request.sid, None)
+        sids = cache['sids'].get(user_id)
+        if sids is not None:
+            sids.discard(request.sid)
+            if not sids:
+                del cache['sids'][user_id]
+                cache['identities'].pop(user_id, None)
+
+
+def can_track_order(identity, order_id):
+    """Check whether a client may follow an order's updates
+
+    Staff may follow any order, customers their own. Orders placed since the
+    identity was loaded (e.g. on another worker) are checked once and remembered.
+    """
+    if identity.is_staff():
+        return True
+    try:
+        order_id = int(order_id)
+    except (TypeError, ValueError):
+        return False
+    if order_id in identity.order_ids:
+        return True
+
+    owner = db.session.scalar(select(Order.user_id).where(Order.order_id == order_id))
+    if owner == identity.user_id:
+        identity.order_ids.add(order_id)
+        return True
+    return False
+
+
+def invalidate_identity(user_id, disconnect=False):
+    """
+    Forget a user's cached identity
+
+    Args:
+        user_id (int): User whose identity changed
+        disconnect (bool): Also close their live connections, so they
+            reconnect with their new role and rooms (or not at all)
+    """
+    cache = _cache()
+    with _lock:
+        cache['identities'].pop(user_id, None)
+        sids = list(cache['sids'].get(user_id, ()))
+        if disconnect:
+            cache['sids'].pop(user_id, None)
+            for sid in sids:
+                cache['connections'].pop(sid, None)
+
+    if disconnect:
+        for sid in sids:
+            socketio.server.disconnect(sid)
+
+
+@user_logged_out.connect
+def _on_logout(sender, user):
+    if user is not None and user.is_authenticated:
+        # The user's connections on other workers go at their next check
+        bump_identity_version(db.session.connection(), user.user_id)
+        db.session.commit()
+        invalidate_identity(user.user_id, disconnect=True)
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_identity_changes(session, flush_context):
+    """Note users whose role or access changed and orders customers now own"""
+    changed = session.info.setdefault('socket_identity_changes', set())
+    new_orders = session.info.setdefault('socket_identity_orders', [])
+
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in ('role', 'name', 'is_active')):
+                changed.add(obj.user_id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.user_id)
+    for user_id in changed - session.info.setdefault('socket_identity_bumped', set()):
+        bump_identity_version(session.connection(), user_id)
+        session.info['socket_identity_bumped'].add(user_id)
+    for obj in session.new:
+        if isinstance(obj, Order):
+            new_orders.append((obj.user_id, obj.order_id))
+
+
+@event.listens_for(db.session, 'after_commit')
+def apply_identity_changes(session):
+    """Invalidate changed users and grant new orders once the writes are committed"""
+    changed = session.info.pop('socket_identity_changes', set())
+    new_orders = session.info.pop('socket_identity_orders', [])
+    session.info.pop('socket_identity_bumped', None)
+
+    identities = _cache()['identities'] if new_orders else {}
+    for user_id, order_id in new_orders:
+        with _lock:
+            identity = identities.get(user_id)
+        if identity is not None:
+            identity.order_ids.add(order_id)
+
+    for user_id in changed:
+        invalidate_identity(user_id, disconnect=True)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_identity_changes(session):
+    session.info.pop('socket_identity_changes', None)
+    session.info.pop('socket_identity_orders', None)
+    session.info.pop('socket_identity_bumped', None)
@@ -0,0 +1,74 @@
+"""
+Socket.IO message queue setup
+Lets several worker processes share one set of Socket.IO rooms, so an
+emit from any worker reaches clients connected to every worker
+"""
+import pickle
+import queue
+import threading
+from collections import defaultdict
+
+import socketio
+
+
+class InMemoryManager(socketio.PubSubManager):
+    """
+    In-process stand-in for the Redis queue, used by tests
+    Every server or write-only emitter on the same channel in this process
+    receives what the others publish, just like separate workers on Redis
+    """
+    name = 'memory'
+
+    _listeners = defaultdict(list)
+    _lock = threading.Lock()
+
+    def __init__(self, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = queue.Queue()
+        if not write_only:
+            with self._lock:
+                self._listeners[channel].append(self)
+
+    def _publish(self, data):
+        # Pickled like the Redis backend, so payloads must survive the trip
+        message = pickle.dumps(data)
+        with self._lock:
+            listeners = list(self._listeners[self.channel])
+        for listener in listeners:
+            listener.queue.put(message)
+
+    def _listen(self):
+        while True:
+            yield self.queue.get()
+
+
+def create_client_manager(app, write_only=False):
+    """
+    Build the Socket.IO client manager for the configured message queue
+
+    SOCKETIO_MESSAGE_QUEUE selects the mode:
+        unset    -- single process, rooms live in this process only
+        'redis'  -- share rooms between workers through REDIS_URL
+        'memory' -- in-process queue for tests
+
+    Args:
+        app: Flask app to read the configuration from
+        write_only (bool): Only publish (for scripts that emit without serving clients)
+
+    Returns:
+        Client manager, or None for the single-process default
+
+    Raises:
+        ValueError: If the mode is not recognised
+    """
+    mode = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    channel = app.config.get('SOCKETIO_CHANNEL', 'flask-socketio')
+
+    if not mode:
+        return None
+    if mode == 'redis':
+        return socketio.RedisManager(app.config['REDIS_URL'], channel=channel, write_only=write_only)
+    if mode == 'memory':
+        return InMemoryManager(channel=channel, write_only=write_only)
+
+    raise ValueError(f"Unknown SOCKETIO_MESSAGE_QUEUE '{mode}' (expected 'redis' or 'memory')")
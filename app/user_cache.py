@@ -0,0 +1,135 @@
+"""
+User loader cache
+Keeps the column values of recently seen users in a bounded, expiring LRU
+so Flask-Login can rebuild current_user on each request without querying
+the users table. Writes to a user drop their entry once committed; other
+workers notice within USER_CACHE_TTL_SECONDS
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import user_logged_in
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.extensions import db
+from app.models import User
+
+
+class UserCache:
+    """Bounded LRU of {user_id: column values} with a time to live and hit counters"""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        """Get hit/miss counts and the hit rate since the process started"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'max_size': self.size,
+                'ttl_seconds': self.ttl
+            }
+
+
+def get_user_cache():
+    """Get this app's user cache"""
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('user_cache', UserCache(
+            current_app.config.get('USER_CACHE_SIZE', 1024),
+            current_app.config.get('USER_CACHE_TTL_SECONDS', 60)
+        ))
+    return cache
+
+
+def _column_values(user):
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+def load_cached_user(user_id):
+    """
+    Get a user for Flask-Login, from the cache when possible
+
+    A cached user is attached to the current session without a query, so
+    relationships load and changes save as with a queried user
+
+    Returns:
+        User: Or None if the user does not exist
+    """
+    cache = get_user_cache()
+    values = cache.get(user_id)
+
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.put(user_id, _column_values(user))
+        return user
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@user_logged_in.connect
+def _on_login(sender, user):
+    # The login form just loaded the user; the next request need not
+    get_user_cache().put(user.user_id, _column_values(user))
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_user_changes(session, flush_context):
+    """Note users written by this flush"""
+    changed = session.info.setdefault('user_cache_changes', set())
+    for obj in list(session.deleted) + list(session.dirty):
+        if isinstance(obj, User) and (obj in session.deleted or session.is_modified(obj)):
+            changed.add(obj.user_id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def apply_user_changes(session):
+    """Drop written users from the cache once the writes are committed"""
+    changed = session.info.pop('user_cache_changes', set())
+    if changed:
+        cache = get_user_cache()
+        for user_id in changed:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_user_changes(session):
+    session.info.pop('user_cache_changes', None)
@@ -1,50 +1,136 @@
 from flask_socketio import emit, join_room, leave_room, rooms, disconnect
-from flask_login import current_user
-from flask import current_app
+from flask import current_app, has_app_context
 from app.extensions import socketio
+from app.socket_identity import (
+    connect_identity, current_identity, forget_connection, can_track_order
+)
 from app.models import Order, User, ServiceRequest
 from app.extensions import db
 import logging
+import threading
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Central event bus
+# Every realtime update goes through publish(): one emit per event to the
+# union of its rooms, so a client in several of them (an admin watching an
+# order room) gets it once, and bursts of updates for the same order are
+# merged into a single message per coalescing window
+STAFF_ROOMS = ('waiter', 'admin')
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def publish(event, data, rooms, coalesce_key=None):
+    """
+    Send an event to everyone in any of the given rooms
+
+    Args:
+        event (str): Socket.IO event name
+        data (dict): Payload, sent as is
+        rooms (iterable): Rooms to deliver to (duplicates and None are ignored)
+        coalesce_key: Merge this event with others for the same key published
+            within SOCKETIO_COALESCE_SECONDS (later fields win)
+    """
+    rooms = {room for room in rooms if room}
+    if not rooms:
+        return
+
+    window = current_app.config.get('SOCKETIO_COALESCE_SECONDS', 0) if has_app_context() else 0
+    if coalesce_key is None or window <= 0:
+        socketio.emit(event, data, to=sorted(rooms))
+        return
+
+    key = (event, coalesce_key)
+    with _pending_lock:
+        pending = _pending.get(key)
+        if pending:
+            merged = dict(pending['data'], **data)
+            # The burst as a whole moved from its first status
+            if 'old_status' in pending['data']:
+                merged['old_status'] = pending['data']['old_status']
+            pending['data'] = merged
+            pending['rooms'] |= rooms
+            return
+        _pending[key] = {'data': dict(data), 'rooms': rooms}
+
+    socketio.start_background_task(_flush_after, key, window)
+
+
+def _flush_after(key, window):
+    """Send a coalesced event once its window has passed"""
+    socketio.sleep(window)
+    with _pending_lock:
+        pending = _pending.pop(key, None)
+    if pending:
+        socketio.emit(key[0], pending['data'], to=sorted(pending['rooms']))
+
+
+def order_rooms(order):
+    """Rooms interested in an order: its customer, its order room and staff"""
+    return [f"user_{order.user_id}", f"order_{order.order_id}", *STAFF_ROOMS]
+
+
+def publish_order_update(order, event='order_status_updated', **fields):
+    """
+    Publish an order change to its customer, order room and staff,
+    coalesced per order
+
+    Args:
+        order (Order): The updated order
+        event (str): Socket.IO event name
+        **fields: Extra payload fields (old_status, updated_by, ...)
+    """
+    data = {
+        'order_id': order.order_id,
+        'status': order.status,
+        'new_status': order.status,
+        'user_id': order.user_id,
+        'table_id': order.table_id,
+        'table_number': order.table.table_number if order.table else None,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    data.update(fields)
+    publish(event, data, order_rooms(order), coalesce_key=order.order_id)
+
+
 # Utility functions for real-time notifications
 def notify_waiters(event_type, data):
     """Send notification to all connected waiters"""
-    socketio.emit(event_type, data, room='waiter')
-    socketio.emit(event_type, data, room='admin')  # Also notify admins
+    publish(event_type, data, STAFF_ROOMS)  # Also notify admins
 
 def notify_customer(user_id, event_type, data):
     """Send notification to specific customer"""
-    socketio.emit(event_type, data, room=f'user_{user_id}')
+    publish(event_type, data, [f'user_{user_id}'])
 
 def notify_all_staff(event_type, data):
     """Send notification to all staff (waiters and admins)"""
-    socketio.emit(event_type, data, room='waiter')
-    socketio.emit(event_type, data, room='admin')
+    publish(event_type, data, STAFF_ROOMS)
 
 @socketio.on('connect')
 def handle_connect(auth=None):
     """Handle client connection"""
-    if current_user.is_authenticated:
-        logger.info(f"User {current_user.user_id} ({current_user.role}) connected")
+    identity = connect_identity()
+    if identity:
+        logger.info(f"User {identity.user_id} ({identity.role}) connected")
         
         # Join user to their personal room
-        join_room(f"user_{current_user.user_id}")
+        join_room(f"user_{identity.user_id}")
         
         # Join role-based rooms
-        if current_user.is_admin():
+        if identity.is_admin():
             join_room("admin")
-        elif current_user.is_waiter():
+        elif identity.is_waiter():
             join_room("waiter")
-        elif current_user.is_customer():
+        elif identity.is_customer():
             join_room("customer")
         
         emit('connection_status', {
             'status': 'connected',
-            'user_id': current_user.user_id,
-            'role': current_user.role,
+            'user_id': identity.user_id,
+            'role': identity.role,
             'message': 'Successfully connected to real-time updates'
         })
     else:
@@ -54,8 +140,10 @@ def handle_connect(auth=None):
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
-    if current_user.is_authenticated:
-        logger.info(f"User {current_user.user_id} ({current_user.role}) disconnected")
+    identity = current_identity()
+    if identity:
+        logger.info(f"User {identity.user_id} ({identity.role}) disconnected")
+    forget_connection()
 
 @socketio.on('join_order_room')
 def handle_join_order_room(data):
@@ -65,21 +153,14 @@ def handle_join_order_room(data):
         return
     
     # Verify user has permission to track this order
-    order = Order.query.get(order_id)
-    if not order:
-        emit('error', {'message': 'Order not found'})
-        return
-    
-    # Check permissions
-    if (current_user.is_customer() and order.customer_id != current_user.user_id) and \
-       not (current_user.is_admin() or current_user.is_waiter()):
+    identity = current_identity()
+    if not identity or not can_track_order(identity, order_id):
         emit('error', {'message': 'Permission denied'})
         return
     
     join_room(f"order_{order_id}")
     emit('joined_order_room', {
         'order_id': order_id,
-        'current_status': order.status,
         'message': f'Joined order {order_id} updates'
     })
 
@@ -99,7 +180,8 @@ def handle_join_table_room(data):
         return
     
     # Only waiters and admins can join table rooms
-    if not (current_user.is_admin() or current_user.is_waiter()):
+    identity = current_identity()
+    if not identity or not identity.is_staff():
         emit('error', {'message': 'Permission denied'})
         return
     
@@ -112,7 +194,8 @@ def handle_join_table_room(data):
 @socketio.on('update_order_status')
 def handle_update_order_status(data):
     """Handle order status updates from staff"""
-    if not (current_user.is_admin() or current_user.is_waiter()):
+    identity = current_identity()
+    if not identity or not identity.is_staff():
         emit('error', {'message': 'Permission denied'})
         return
     
@@ -137,43 +220,20 @@ def handle_update_order_status(data):
         if estimated_time:
             order.estimated_delivery_time = estimated_time
 
-        db.session.commit()
-
-        # Award loyalty points when order is completed
+        # Loyalty points are awarded in the background, queued in the same commit
         if new_status == 'completed' and old_status != 'completed':
-            try:
-                from app.modules.loyalty.loyalty_service import award_points_for_order
-                current_app.logger.info(f"Attempting to award points for order {order_id} to user {order.user_id}")
-                result = award_points_for_order(order_id, order.user_id)
-                current_app.logger.info(f"Point awarding result for order {order_id}: {result}")
-            except Exception as e:
-                current_app.logger.error(f"Error awarding loyalty points for order {order_id}: {str(e)}")
-                import traceback
-                current_app.logger.error(f"Traceback: {traceback.format_exc()}")
-        
-        # Broadcast update to all relevant rooms
-        update_data = {
-            'order_id': order_id,
-            'old_status': old_status,
-            'new_status': new_status,
-            'estimated_time': estimated_time,
-            'updated_by': current_user.name,
-            'timestamp': order.updated_at.isoformat() if order.updated_at else None
-        }
-        
-        # Notify customer
-        socketio.emit('order_status_updated', update_data, 
-                     room=f"user_{order.customer_id}")
-        
-        # Notify order room
-        socketio.emit('order_status_updated', update_data, 
-                     room=f"order_{order_id}")
+            from app.modules.loyalty.loyalty_service import queue_points_for_order
+            queue_points_for_order(order)
+
+        db.session.commit()
         
-        # Notify staff
-        socketio.emit('order_status_updated', update_data, 
-                     room="waiter")
-        socketio.emit('order_status_updated', update_data, 
-                     room="admin")
+        # Broadcast update to the customer, order room and staff
+        publish_order_update(
+            order,
+            old_status=old_status,
+            estimated_time=estimated_time,
+            updated_by=identity.name
+        )
         
         emit('status_update_success', {
             'order_id': order_id,
@@ -188,7 +248,8 @@ def handle_update_order_status(data):
 @socketio.on('service_request')
 def handle_service_request(data):
     """Handle service requests from customers"""
-    if not current_user.is_customer():
+    identity = current_identity()
+    if not identity or not identity.is_customer():
         emit('error', {'message': 'Only customers can make service requests'})
         return
     
@@ -203,7 +264,7 @@ def handle_service_request(data):
     try:
         # Create service request
         service_request = ServiceRequest(
-            customer_id=current_user.user_id,
+            customer_id=identity.user_id,
             request_type=request_type,
             table_number=table_number,
             message=message,
@@ -216,8 +277,8 @@ def handle_service_request(data):
         # Broadcast to staff
         request_data = {
             'request_id': service_request.id,
-            'customer_name': current_user.name,
-            'customer_id': current_user.user_id,
+            'customer_name': identity.name,
+            'customer_id': identity.user_id,
             'type': request_type,
             'table_number': table_number,
             'message': message,
@@ -225,14 +286,9 @@ def handle_service_request(data):
             'status': 'pending'
         }
         
-        # Notify waiters and admins
-        socketio.emit('new_service_request', request_data, room="waiter")
-        socketio.emit('new_service_request', request_data, room="admin")
-        
-        # Notify specific table if applicable
-        if table_number:
-            socketio.emit('new_service_request', request_data, 
-                         room=f"table_{table_number}")
+        # Notify waiters, admins and the specific table if applicable
+        publish('new_service_request', request_data,
+                [*STAFF_ROOMS, f"table_{table_number}" if table_number else None])
         
         emit('service_request_sent', {
             'request_id': service_request.id,
@@ -247,7 +303,8 @@ def handle_service_request(data):
 @socketio.on('update_service_request')
 def handle_update_service_request(data):
     """Handle service request status updates from staff"""
-    if not (current_user.is_admin() or current_user.is_waiter()):
+    identity = current_identity()
+    if not identity or not identity.is_staff():
         emit('error', {'message': 'Permission denied'})
         return
     
@@ -266,7 +323,7 @@ def handle_update_service_request(data):
         
         old_status = service_request.status
         service_request.status = new_status
-        service_request.handled_by = current_user.user_id
+        service_request.handled_by = identity.user_id
         
         db.session.commit()
         
@@ -275,17 +332,13 @@ def handle_update_service_request(data):
             'request_id': request_id,
             'old_status': old_status,
             'new_status': new_status,
-            'handled_by': current_user.name,
+            'handled_by': identity.name,
             'timestamp': service_request.updated_at.isoformat()
         }
         
-        # Notify customer
-        socketio.emit('service_request_updated', update_data, 
-                     room=f"user_{service_request.customer_id}")
-        
-        # Notify staff
-        socketio.emit('service_request_updated', update_data, room="waiter")
-        socketio.emit('service_request_updated', update_data, room="admin")
+        # Notify customer and staff
+        publish('service_request_updated', update_data,
+                [f"user_{service_request.customer_id}", *STAFF_ROOMS])
         
         emit('service_update_success', {
             'request_id': request_id,
@@ -300,7 +353,8 @@ def handle_update_service_request(data):
 @socketio.on('payment_status_update')
 def handle_payment_status_update(data):
     """Handle payment status updates"""
-    if not (current_user.is_admin() or current_user.is_waiter()):
+    identity = current_identity()
+    if not identity or not identity.is_staff():
         emit('error', {'message': 'Permission denied'})
         return
     
@@ -329,17 +383,13 @@ def handle_payment_status_update(data):
             'order_id': payment.order_id,
             'old_status': old_status,
             'new_status': new_status,
-            'updated_by': current_user.name,
-            'timestamp': payment.updated_at.isoformat()
+            'updated_by': identity.name,
+            'timestamp': datetime.utcnow().isoformat()
         }
         
-        # Notify customer
-        socketio.emit('payment_status_updated', update_data, 
-                     room=f"user_{payment.customer_id}")
-        
-        # Notify order room
-        socketio.emit('payment_status_updated', update_data, 
-                     room=f"order_{payment.order_id}")
+        # Notify customer and order room
+        publish('payment_status_updated', update_data,
+                [f"user_{payment.order.user_id}", f"order_{payment.order_id}"])
         
         emit('payment_update_success', {
             'payment_id': payment_id,
@@ -354,7 +404,8 @@ def handle_payment_status_update(data):
 @socketio.on('get_real_time_stats')
 def handle_get_real_time_stats():
     """Get real-time statistics (admin only)"""
-    if not current_user.is_admin():
+    identity = current_identity()
+    if not identity or not identity.is_admin():
         emit('error', {'message': 'Permission denied'})
         return
     
@@ -390,25 +441,13 @@ def broadcast_order_update(order_id, status, estimated_time=None, updated_by=Non
         if not order:
             return
         
-        update_data = {
-            'order_id': order_id,
-            'new_status': status,
-            'estimated_time': estimated_time,
-            'updated_by': updated_by or 'System',
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        # Notify customer
-        socketio.emit('order_status_updated', update_data, 
-                     room=f"user_{order.customer_id}")
-        
-        # Notify order room
-        socketio.emit('order_status_updated', update_data, 
-                     room=f"order_{order_id}")
-        
-        # Notify staff
-        socketio.emit('order_status_updated', update_data, room="waiter")
-        socketio.emit('order_status_updated', update_data, room="admin")
+        publish_order_update(
+            order,
+            new_status=status,
+            status=status,
+            estimated_time=estimated_time,
+            updated_by=updated_by or 'System'
+        )
         
     except Exception as e:
         logger.error(f"Error broadcasting order update: {str(e)}")
@@ -422,8 +461,8 @@ def broadcast_new_order(order_id):
         
         order_data = {
             'order_id': order_id,
-            'customer_name': order.customer.name,
-            'table_number': order.table_number,
+            'customer_name': order.customer.name if order.customer else None,
+            'table_number': order.table.table_number if order.table else None,
             'total_amount': float(order.total_amount),
             'status': order.status,
             'timestamp': order.order_time.isoformat(),
@@ -431,8 +470,7 @@ def broadcast_new_order(order_id):
         }
         
         # Notify staff
-        socketio.emit('new_order', order_data, room="waiter")
-        socketio.emit('new_order', order_data, room="admin")
+        publish('new_order', order_data, STAFF_ROOMS)
         
     except Exception as e:
         logger.error(f"Error broadcasting new order: {str(e)}")
@@ -452,15 +490,9 @@ def broadcast_payment_update(payment_id, status):
             'timestamp': datetime.utcnow().isoformat()
         }
         
-        # Notify customer
-        socketio.emit('payment_status_updated', update_data, 
-                     room=f"user_{payment.customer_id}")
-        
-        # Notify order room
-        socketio.emit('payment_status_updated', update_data, 
-                     room=f"order_{payment.order_id}")
+        # Notify customer and order room
+        publish('payment_status_updated', update_data,
+                [f"user_{payment.order.user_id}", f"order_{payment.order_id}"])
         
     except Exception as e:
         logger.error(f"Error broadcasting payment update: {str(e)}")
-
-from datetime import datetime
@@ -25,9 +25,42 @@ class Config:
     POINTS_PER_50_EGP = 100
     POINT_EXPIRY_MONTHS = 6
     
+    # Table sessions idle longer than this are ended by `flask reconcile-tables`
+    TABLE_SESSION_TIMEOUT_HOURS = 4
+    
+    # Reserve MenuItem.stock for orders and mark sold-out items out_of_stock;
+    # items with no stock set (NULL) are not tracked and never sell out
+    MENU_STOCK_TRACKING = True
+    
+    # Logged-in users are cached per worker; changes made on another worker
+    # show up once the entry expires
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL_SECONDS = 60
+    
+    # Socket.IO connections notice a role change or logout made on another
+    # worker within this many seconds, and are disconnected
+    SOCKET_IDENTITY_TTL_SECONDS = 30
+    
+    # Loyalty redemptions and awards re-run this many times on lock conflicts
+    LOYALTY_WRITE_ATTEMPTS = 3
+    
+    # Days (Monday is 0) that 'weekends' campaigns run on: Friday and Saturday
+    CAMPAIGN_WEEKEND_DAYS = (4, 5)
+    
+    # Side effects of order updates (points, notifications) run on this many
+    # worker threads, started with the app; 0 leaves them to `flask run-jobs`
+    BACKGROUND_JOB_WORKERS = 2
+    BACKGROUND_JOB_MAX_ATTEMPTS = 5
+    # Failed jobs wait this long before their next attempt, doubling each time
+    BACKGROUND_JOB_RETRY_SECONDS = 10
+    # Jobs still running after this long are assumed lost with their worker
+    BACKGROUND_JOB_TIMEOUT_SECONDS = 300
+    BACKGROUND_JOB_POLL_SECONDS = 5
+    
     # Pagination
     ORDERS_PER_PAGE = 20
     MENU_ITEMS_PER_PAGE = 12
+    POPULAR_ITEMS_PER_PAGE = 15
     
     # Email settings (for future use)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
@@ -38,6 +71,13 @@ class Config:
     
     # Redis settings for caching and real-time features
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    
+    # Socket.IO message queue, required when running more than one worker:
+    # unset = single process, 'redis' = share rooms through REDIS_URL
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL') or 'flask-socketio'
+    # Updates for the same order within this many seconds go out as one message
+    SOCKETIO_COALESCE_SECONDS = float(os.environ.get('SOCKETIO_COALESCE_SECONDS') or 0.25)
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -50,6 +90,8 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    # Tests run queued jobs themselves with run_pending_jobs()
+    BACKGROUND_JOB_WORKERS = 0
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -63,7 +63,7 @@ def test_reorder_data():
             print(f"✅ Found completed order: {order.order_id}")
             
             # Test order items access
-            order_items = order.order_items.all()
+            order_items = order.order_items
             print(f"✅ Order has {len(order_items)} items")
             
             for item in order_items:
@@ -23,13 +23,13 @@ with app.app_context():
         print(f"  Order {order.order_id}: User {order.user_id}, Status: {order.status}, Amount: ${order.total_amount}")
         
         # Check order items
-        items = order.order_items.all()
+        items = order.order_items
         print(f"    Items: {len(items)}")
         for item in items:
             print(f"      - {item.menu_item.name if item.menu_item else 'Unknown'}: {item.quantity}x ${item.unit_price}")
         
         # Check payments
-        payments = order.payments.all()
+        payments = order.payments
         print(f"    Payments: {len(payments)}")
         for payment in payments:
             print(f"      - Payment {payment.payment_id}: ${payment.amount}, Status: {payment.status}")
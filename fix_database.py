@@ -171,8 +171,8 @@ with app.app_context():
         customer_orders = Order.query.filter_by(user_id=customer.user_id).all()
         print(f"Customer orders: {len(customer_orders)}")
         for order in customer_orders:
-            items = order.order_items.all()
-            payments = order.payments.all()
+            items = order.order_items
+            payments = order.payments
             print(f"  Order {order.order_id}: {order.status}, {len(items)} items, {len(payments)} payments")
         
         print("\n✅ Database setup complete!")
@@ -0,0 +1,58 @@
+"""add indexes for hot order, loyalty and service queries
+
+Revision ID: 3f1c2a9d8b7e
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+Tables are still created by db.create_all(), which already builds these
+indexes on a fresh database, so each index is only created when missing.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8b7e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('orders', 'ix_orders_status_order_time', ['status', 'order_time']),
+    ('orders', 'ix_orders_order_time', ['order_time']),
+    ('orders', 'ix_orders_user_id_order_time', ['user_id', 'order_time']),
+    ('orders', 'ix_orders_table_id_status', ['table_id', 'status']),
+    ('order_items', 'ix_order_items_order_id', ['order_id']),
+    ('order_items', 'ix_order_items_item_id', ['item_id']),
+    ('payments', 'ix_payments_order_id', ['order_id']),
+    ('service_requests', 'ix_service_requests_status_created_at', ['status', 'created_at']),
+    ('notifications', 'ix_notifications_user_id_seen', ['user_id', 'seen']),
+    ('feedback', 'ix_feedback_item_id_is_approved', ['item_id', 'is_approved']),
+    ('point_transactions', 'ix_point_transactions_user_id_timestamp', ['user_id', 'timestamp']),
+    ('point_transactions', 'ix_point_transactions_order_id_type', ['order_id', 'transaction_type']),
+    ('point_transactions', 'ix_point_transactions_type_expiry_date', ['transaction_type', 'expiry_date']),
+    ('table_sessions', 'ix_table_sessions_table_id_is_active', ['table_id', 'is_active']),
+]
+
+
+def _existing_indexes(table_name):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table_name):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def upgrade():
+    for table_name, index_name, columns in INDEXES:
+        existing = _existing_indexes(table_name)
+        if existing is not None and index_name not in existing:
+            op.create_index(index_name, table_name, columns)
+
+
+def downgrade():
+    for table_name, index_name, columns in reversed(INDEXES):
+        existing = _existing_indexes(table_name)
+        if existing and index_name in existing:
+            op.drop_index(index_name, table_name=table_name)
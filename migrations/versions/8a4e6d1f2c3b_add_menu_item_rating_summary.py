@@ -0,0 +1,51 @@
+"""add rating_avg/rating_count to menu items
+
+Revision ID: 8a4e6d1f2c3b
+Revises: 3f1c2a9d8b7e
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6d1f2c3b'
+down_revision = '3f1c2a9d8b7e'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+
+def upgrade():
+    existing = _existing_columns('menu_items')
+
+    with op.batch_alter_table('menu_items') as batch_op:
+        if 'rating_avg' not in existing:
+            batch_op.add_column(sa.Column('rating_avg', sa.Numeric(3, 2), nullable=False,
+                                          server_default='0'))
+        if 'rating_count' not in existing:
+            batch_op.add_column(sa.Column('rating_count', sa.Integer(), nullable=False,
+                                          server_default='0'))
+
+    # Backfill from approved feedback
+    menu_items = sa.table('menu_items', sa.column('item_id'), sa.column('rating_avg'),
+                          sa.column('rating_count'))
+    feedback = sa.table('feedback', sa.column('feedback_id'), sa.column('item_id'),
+                        sa.column('rating'), sa.column('is_approved', sa.Boolean))
+    approved = (feedback.c.item_id == menu_items.c.item_id) & (feedback.c.is_approved == sa.true())
+
+    op.execute(menu_items.update().values(
+        rating_count=sa.select(sa.func.count(feedback.c.feedback_id)).where(approved).scalar_subquery(),
+        rating_avg=sa.select(sa.func.coalesce(sa.func.avg(feedback.c.rating), 0)).where(approved).scalar_subquery()
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('menu_items') as batch_op:
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('rating_avg')
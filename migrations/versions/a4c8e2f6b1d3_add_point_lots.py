@@ -0,0 +1,85 @@
+"""add points_remaining lots to point transactions
+
+Revision ID: a4c8e2f6b1d3
+Revises: e7b3a9c1d4f2
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c8e2f6b1d3'
+down_revision = 'e7b3a9c1d4f2'
+branch_labels = None
+depends_on = None
+
+OPEN_LOT = sa.text('points_remaining > 0')
+
+
+def _existing_columns(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+
+def _existing_indexes(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def upgrade():
+    if 'points_remaining' not in _existing_columns('point_transactions'):
+        with op.batch_alter_table('point_transactions') as batch_op:
+            batch_op.add_column(sa.Column('points_remaining', sa.Integer(), nullable=False,
+                                          server_default='0'))
+
+    indexes = _existing_indexes('point_transactions')
+    if 'ix_point_transactions_open_lots' not in indexes:
+        op.create_index('ix_point_transactions_open_lots', 'point_transactions', ['user_id', 'timestamp'],
+                        sqlite_where=OPEN_LOT, postgresql_where=OPEN_LOT)
+    if 'ix_point_transactions_expiring_lots' not in indexes:
+        op.create_index('ix_point_transactions_expiring_lots', 'point_transactions', ['expiry_date'],
+                        sqlite_where=OPEN_LOT, postgresql_where=OPEN_LOT)
+
+    # Backfill: a customer's current balance sits in their newest credits,
+    # as spending has always used up the oldest points first
+    transactions = sa.table('point_transactions', sa.column('transaction_id'), sa.column('user_id'),
+                            sa.column('points_earned'), sa.column('points_remaining'),
+                            sa.column('timestamp'))
+    accounts = sa.table('customer_loyalty', sa.column('user_id'), sa.column('total_points'))
+
+    newer = sa.func.sum(transactions.c.points_earned).over(
+        partition_by=transactions.c.user_id,
+        order_by=(transactions.c.timestamp.desc(), transactions.c.transaction_id.desc())
+    ) - transactions.c.points_earned
+
+    bind = op.get_bind()
+    credits = bind.execute(
+        sa.select(transactions.c.transaction_id, transactions.c.points_earned,
+                  accounts.c.total_points, newer)
+        .select_from(transactions.join(accounts, accounts.c.user_id == transactions.c.user_id))
+        .where(transactions.c.points_earned > 0)
+    )
+
+    update = transactions.update().where(
+        transactions.c.transaction_id == sa.bindparam('lot_id')
+    ).values(points_remaining=sa.bindparam('remaining'))
+
+    batch = []
+    for transaction_id, earned, balance, newer_points in credits:
+        remaining = min(earned, max(0, (balance or 0) - (newer_points or 0)))
+        if remaining:
+            batch.append({'lot_id': transaction_id, 'remaining': remaining})
+        if len(batch) >= 1000:
+            bind.execute(update, batch)
+            batch = []
+    if batch:
+        bind.execute(update, batch)
+
+
+def downgrade():
+    op.drop_index('ix_point_transactions_expiring_lots', table_name='point_transactions')
+    op.drop_index('ix_point_transactions_open_lots', table_name='point_transactions')
+    with op.batch_alter_table('point_transactions') as batch_op:
+        batch_op.drop_column('points_remaining')
@@ -0,0 +1,34 @@
+"""make menu item stock nullable for untracked items
+
+Revision ID: a7e1c9d3b5f8
+Revises: f3b7d1a9e5c2
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e1c9d3b5f8'
+down_revision = 'f3b7d1a9e5c2'
+branch_labels = None
+depends_on = None
+
+items = sa.table('menu_items', sa.column('stock', sa.Integer()), sa.column('status', sa.String()))
+
+
+def upgrade():
+    with op.batch_alter_table('menu_items') as batch_op:
+        batch_op.alter_column('stock', existing_type=sa.Integer(), nullable=True)
+
+    # Available items left at 0 were "unlimited" in the admin forms; keep
+    # them orderable by not tracking their stock
+    op.execute(items.update().where(items.c.stock == 0, items.c.status == 'available').values(stock=None))
+
+
+def downgrade():
+    op.execute(items.update().where(items.c.stock.is_(None)).values(stock=0))
+
+    with op.batch_alter_table('menu_items') as batch_op:
+        batch_op.alter_column('stock', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,58 @@
+"""add running point totals to customer loyalty
+
+Revision ID: b9d3f7a2c6e4
+Revises: a4c8e2f6b1d3
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d3f7a2c6e4'
+down_revision = 'a4c8e2f6b1d3'
+branch_labels = None
+depends_on = None
+
+TOTALS = ('total_earned', 'total_redeemed', 'total_bonus', 'total_expired')
+
+
+def _existing_columns(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+
+def upgrade():
+    existing = _existing_columns('customer_loyalty')
+
+    with op.batch_alter_table('customer_loyalty') as batch_op:
+        for column in TOTALS:
+            if column not in existing:
+                batch_op.add_column(sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from point transactions
+    accounts = sa.table('customer_loyalty', sa.column('user_id'), *[sa.column(column) for column in TOTALS])
+    transactions = sa.table('point_transactions', sa.column('user_id'), sa.column('transaction_type'),
+                            sa.column('points_earned'), sa.column('points_redeemed'))
+
+    expired = transactions.c.transaction_type == 'expired'
+    bonus = transactions.c.transaction_type == 'bonus'
+    sums = {
+        'total_earned': sa.func.sum(transactions.c.points_earned),
+        'total_redeemed': sa.func.sum(sa.case((expired, 0), else_=transactions.c.points_redeemed)),
+        'total_bonus': sa.func.sum(sa.case((bonus, transactions.c.points_earned), else_=0)),
+        'total_expired': sa.func.sum(sa.case((expired, transactions.c.points_redeemed), else_=0))
+    }
+    op.execute(accounts.update().values(**{
+        column: sa.select(sa.func.coalesce(total, 0)).where(
+            transactions.c.user_id == accounts.c.user_id
+        ).scalar_subquery()
+        for column, total in sums.items()
+    }))
+
+
+def downgrade():
+    with op.batch_alter_table('customer_loyalty') as batch_op:
+        for column in reversed(TOTALS):
+            batch_op.drop_column(column)
@@ -0,0 +1,44 @@
+"""add campaign_id/bonus_points to point transactions
+
+Revision ID: c5d2e8f4a1b9
+Revises: 8a4e6d1f2c3b
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2e8f4a1b9'
+down_revision = '8a4e6d1f2c3b'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+
+def upgrade():
+    existing = _existing_columns('point_transactions')
+
+    # Earlier awards were not attributed and stay untagged
+    with op.batch_alter_table('point_transactions') as batch_op:
+        if 'campaign_id' not in existing:
+            batch_op.add_column(sa.Column('campaign_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_point_transactions_campaign_id', 'promotional_campaigns',
+                                        ['campaign_id'], ['campaign_id'])
+            batch_op.create_index('ix_point_transactions_campaign_id', ['campaign_id'])
+        if 'bonus_points' not in existing:
+            batch_op.add_column(sa.Column('bonus_points', sa.Integer(), nullable=False,
+                                          server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('point_transactions') as batch_op:
+        batch_op.drop_index('ix_point_transactions_campaign_id')
+        batch_op.drop_constraint('fk_point_transactions_campaign_id', type_='foreignkey')
+        batch_op.drop_column('bonus_points')
+        batch_op.drop_column('campaign_id')
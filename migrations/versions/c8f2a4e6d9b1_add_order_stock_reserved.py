@@ -0,0 +1,35 @@
+"""add stock_reserved to orders
+
+Revision ID: c8f2a4e6d9b1
+Revises: a7e1c9d3b5f8
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f2a4e6d9b1'
+down_revision = 'a7e1c9d3b5f8'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+
+def upgrade():
+    # Orders placed before stock reservation took none, so cancelling them
+    # must not give any back
+    if 'stock_reserved' not in _existing_columns('orders'):
+        with op.batch_alter_table('orders') as batch_op:
+            batch_op.add_column(sa.Column('stock_reserved', sa.Boolean(), nullable=False,
+                                          server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('stock_reserved')
@@ -0,0 +1,53 @@
+"""make earned point transactions unique per order
+
+Revision ID: d2a6c8e4f1b7
+Revises: b9d3f7a2c6e4
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6c8e4f1b7'
+down_revision = 'b9d3f7a2c6e4'
+branch_labels = None
+depends_on = None
+
+EARNED = sa.text("transaction_type = 'earned'")
+
+
+def _existing_indexes(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def upgrade():
+    if 'uq_point_transactions_earned_order' in _existing_indexes('point_transactions'):
+        return
+
+    # Orders awarded twice by the old read-then-write race keep their first
+    # award; later ones stay in the ledger, and in the balance, as adjustments
+    transactions = sa.table('point_transactions', sa.column('transaction_id'), sa.column('order_id'),
+                            sa.column('transaction_type'), sa.column('description', sa.String))
+    first_awards = sa.select(sa.func.min(transactions.c.transaction_id)).where(
+        transactions.c.transaction_type == 'earned',
+        transactions.c.order_id.isnot(None)
+    ).group_by(transactions.c.order_id)
+
+    op.execute(transactions.update().where(
+        transactions.c.transaction_type == 'earned',
+        transactions.c.order_id.isnot(None),
+        transactions.c.transaction_id.notin_(first_awards)
+    ).values(
+        transaction_type='adjustment',
+        description=sa.func.coalesce(transactions.c.description, '') + ' (duplicate award)'
+    ))
+
+    op.create_index('uq_point_transactions_earned_order', 'point_transactions', ['order_id'], unique=True,
+                    sqlite_where=EARNED, postgresql_where=EARNED)
+
+
+def downgrade():
+    op.drop_index('uq_point_transactions_earned_order', table_name='point_transactions')
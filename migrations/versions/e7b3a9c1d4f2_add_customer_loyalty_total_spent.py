@@ -0,0 +1,58 @@
+"""add total_spent to customer loyalty
+
+Revision ID: e7b3a9c1d4f2
+Revises: c5d2e8f4a1b9
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3a9c1d4f2'
+down_revision = 'c5d2e8f4a1b9'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+
+def _existing_indexes(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def upgrade():
+    existing = _existing_columns('customer_loyalty')
+    indexes = _existing_indexes('customer_loyalty')
+
+    with op.batch_alter_table('customer_loyalty') as batch_op:
+        if 'total_spent' not in existing:
+            batch_op.add_column(sa.Column('total_spent', sa.Numeric(12, 2), nullable=False,
+                                          server_default='0'))
+        if 'ix_customer_loyalty_total_points' not in indexes:
+            batch_op.create_index('ix_customer_loyalty_total_points', ['total_points'])
+        if 'ix_customer_loyalty_total_spent' not in indexes:
+            batch_op.create_index('ix_customer_loyalty_total_spent', ['total_spent'])
+
+    # Backfill from finished orders, as the loyalty page used to sum them
+    accounts = sa.table('customer_loyalty', sa.column('user_id'), sa.column('total_spent'))
+    orders = sa.table('orders', sa.column('user_id'), sa.column('status'), sa.column('total_amount'))
+
+    op.execute(accounts.update().values(
+        total_spent=sa.select(sa.func.coalesce(sa.func.sum(orders.c.total_amount), 0)).where(
+            orders.c.user_id == accounts.c.user_id,
+            orders.c.status.in_(('completed', 'delivered'))
+        ).scalar_subquery()
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('customer_loyalty') as batch_op:
+        batch_op.drop_index('ix_customer_loyalty_total_spent')
+        batch_op.drop_index('ix_customer_loyalty_total_points')
+        batch_op.drop_column('total_spent')
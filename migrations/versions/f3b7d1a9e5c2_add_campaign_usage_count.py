@@ -0,0 +1,44 @@
+"""add usage_count to promotional campaigns
+
+Revision ID: f3b7d1a9e5c2
+Revises: d2a6c8e4f1b7
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7d1a9e5c2'
+down_revision = 'd2a6c8e4f1b7'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+
+def upgrade():
+    if 'usage_count' not in _existing_columns('promotional_campaigns'):
+        with op.batch_alter_table('promotional_campaigns') as batch_op:
+            batch_op.add_column(sa.Column('usage_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the awards each campaign boosted
+    campaigns = sa.table('promotional_campaigns', sa.column('campaign_id'), sa.column('usage_count'))
+    transactions = sa.table('point_transactions', sa.column('transaction_id'), sa.column('campaign_id'),
+                            sa.column('transaction_type'))
+
+    op.execute(campaigns.update().values(
+        usage_count=sa.select(sa.func.count(transactions.c.transaction_id)).where(
+            transactions.c.campaign_id == campaigns.c.campaign_id,
+            transactions.c.transaction_type == 'earned'
+        ).scalar_subquery()
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('promotional_campaigns') as batch_op:
+        batch_op.drop_column('usage_count')
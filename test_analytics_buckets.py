@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the revenue and customer analytics read from the hourly
+buckets give the same answers as aggregating the orders table
+Runs against an in-memory database
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.models import (
+    User, Category, MenuItem, Order, OrderItem,
+    HourlySalesBucket, HourlyCustomerBucket, HourlyItemBucket
+)
+from app.modules.admin.rollup_service import rebuild_hourly_buckets
+from app.modules.admin.routes import (
+    calculate_revenue_metrics, calculate_customer_analytics, calculate_product_performance,
+    calculate_time_analytics, calculate_growth_metrics, calculate_detailed_customer_behavior,
+    calculate_order_patterns, calculate_customer_lifecycle
+)
+
+
+def setup_data(now):
+    """Three customers, three menu items in two categories and orders over two weeks"""
+    customers = []
+    for i in range(3):
+        customer = User(name=f'Analytics {i}', email=f'analytics{i}@example.com', role='customer',
+                        created_at=now - timedelta(days=30))
+        customer.set_password('password')
+        customers.append(customer)
+    drinks = Category(name='Drinks')
+    food = Category(name='Food')
+    db.session.add_all(customers + [drinks, food])
+    db.session.flush()
+
+    items = [
+        MenuItem(name='Tea', price=20, category_id=drinks.category_id, stock=100),
+        MenuItem(name='Burger', price=100, category_id=food.category_id, stock=100),
+        MenuItem(name='Fries', price=35, category_id=food.category_id, stock=100)
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+
+    statuses = ['new', 'processing', 'completed', 'completed', 'cancelled', 'rejected']
+    for i in range(40):
+        # Every few hours over the last two weeks, plus the current partial hour
+        order_time = now - timedelta(hours=i * 8, minutes=7 * i % 60) if i else now - timedelta(seconds=30)
+        order = Order(user_id=customers[i % 3].user_id, status=statuses[i % len(statuses)],
+                      total_amount=0, order_time=order_time)
+        db.session.add(order)
+        db.session.flush()
+
+        total = 0
+        for item in items[:1 + i % 3]:
+            quantity = 1 + i % 2
+            db.session.add(OrderItem(order_id=order.order_id, item_id=item.item_id,
+                                     quantity=quantity, unit_price=item.price))
+            total += float(item.price) * quantity
+        order.total_amount = total
+        db.session.commit()
+
+    return customers, items
+
+
+def expected(start, end):
+    """Analytics computed straight from the orders of [start, end]"""
+    orders = [o for o in Order.query.all() if (start is None or o.order_time >= start) and o.order_time <= end]
+
+    statuses = defaultdict(lambda: [0.0, 0])
+    customers = defaultdict(lambda: [0.0, 0])
+    products = defaultdict(lambda: [0.0, 0])
+    hours = Counter()
+    for order in orders:
+        statuses[order.status][0] += float(order.total_amount)
+        statuses[order.status][1] += 1
+        customers[order.user_id][0] += float(order.total_amount)
+        customers[order.user_id][1] += 1
+        hours[order.order_time.hour] += 1
+        for line in order.order_items:
+            products[line.menu_item.name][0] += float(line.unit_price) * line.quantity
+            products[line.menu_item.name][1] += line.quantity
+
+    return {
+        'statuses': {status: (round(revenue, 2), count) for status, (revenue, count) in statuses.items()},
+        'customers': {user_id: (round(spent, 2), count) for user_id, (spent, count) in customers.items()},
+        'products': {name: (round(revenue, 2), quantity) for name, (revenue, quantity) in products.items()},
+        'hours': dict(hours)
+    }
+
+
+def check_period(start, end):
+    """Compare every helper's answer for a period against the orders table"""
+    want = expected(start, end)
+
+    revenue = calculate_revenue_metrics(start, end, 'custom')
+    got = {row['status']: (round(row['revenue'], 2), row['count']) for row in revenue['status_breakdown']}
+    assert got == want['statuses'], (got, want['statuses'])
+    assert revenue['total_orders'] == sum(count for _, count in want['statuses'].values())
+
+    behavior = calculate_detailed_customer_behavior(start, end)
+    got = {c['user_id']: (round(c['total_spent'], 2), c['order_count']) for c in behavior['customer_metrics']}
+    assert got == want['customers'], (got, want['customers'])
+    assert calculate_customer_analytics(start, end)['unique_customers'] == len(want['customers'])
+
+    products = calculate_product_performance(start, end)
+    got = {p['name']: (round(p['revenue'], 2), p['quantity_sold']) for p in products['top_products']}
+    assert got == want['products'], (got, want['products'])
+    categories = {c['name']: round(c['revenue'], 2) for c in products['category_performance']}
+    assert round(sum(categories.values()), 2) == round(sum(r for r, _ in want['products'].values()), 2)
+
+    got = {h['hour']: h['orders'] for h in calculate_time_analytics(start, end, 'custom')['hourly_distribution']}
+    assert got == want['hours'], (got, want['hours'])
+    patterns = calculate_order_patterns(start, end)
+    assert {h['hour']: h['orders'] for h in patterns['hour_of_day']} == want['hours']
+
+    lifecycle = calculate_customer_lifecycle(start, end)
+    assert lifecycle['returning_customers'] == len(want['customers'])
+
+
+def bucket_contents():
+    return (
+        sorted((r.hour, r.status, r.order_count, float(r.revenue))
+               for r in HourlySalesBucket.query.all() if r.order_count),
+        sorted((r.hour, r.user_id, r.order_count, float(r.revenue))
+               for r in HourlyCustomerBucket.query.all() if r.order_count),
+        sorted((r.hour, r.item_id, r.line_count, r.quantity, float(r.revenue))
+               for r in HourlyItemBucket.query.all() if r.line_count)
+    )
+
+
+def test_analytics_buckets():
+    """Bucketed analytics match the orders table through inserts, edits and deletes"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Hourly Analytics Buckets")
+        print("=" * 50)
+
+        now = datetime.now()
+        customers, items = setup_data(now)
+
+        # Unaligned starts so both partial edge hours are read from orders
+        week = now - timedelta(days=7, minutes=13)
+        for start in (week, now - timedelta(minutes=1), None):
+            check_period(start, now)
+        print("✅ Week, last minute and all-time analytics match the orders table")
+
+        growth = calculate_growth_metrics(week, now, 'week')
+        current = len([o for o in Order.query.all() if o.order_time >= week])
+        previous = len([o for o in Order.query.all() if week - (now - week) <= o.order_time < week])
+        assert growth['order_growth'] == round((current - previous) / previous * 100, 2)
+        print("✅ Growth compares against the previous period")
+
+        # Status change, item edit, quantity change and delete move the buckets
+        orders = Order.query.order_by(Order.order_id).all()
+        orders[3].status = 'completed'
+        orders[5].total_amount = 999
+        line = orders[7].order_items[0]
+        line.quantity = 5
+        db.session.delete(orders[8].order_items[-1])
+        db.session.add(OrderItem(order_id=orders[8].order_id, item_id=items[1].item_id,
+                                 quantity=3, unit_price=items[1].price))
+        db.session.delete(orders[10])
+        db.session.commit()
+
+        for start in (week, None):
+            check_period(start, now)
+        print("✅ Edited and deleted orders move between buckets")
+
+        maintained = bucket_contents()
+        hours = rebuild_hourly_buckets()
+        assert hours > 0
+        assert bucket_contents() == maintained
+        print(f"✅ Rebuilding {hours} hours from orders matches the maintained buckets")
+
+    print("\n🎉 Analytics buckets test passed!")
+
+
+if __name__ == "__main__":
+    test_analytics_buckets()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test script to verify completing an order queues its loyalty points instead
+of awarding them in the request, that queued jobs run once the update
+commits, that failing jobs are retried and then kept as failed, and that
+the queue's depth and failures are reported, and that workers started
+with the app pick up jobs left by the last run
+"""
+
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+import click
+
+from app import create_app
+from app.extensions import db
+from app.job_queue import (
+    job, enqueue, run_pending_jobs, release_stale_jobs, retry_failed_jobs, queue_stats, get_workers
+)
+from app.models import User, Order, CustomerLoyalty, PointTransaction, Notification, BackgroundJob
+from config import config, TestingConfig
+
+
+class WorkerTestingConfig(TestingConfig):
+    """File database so the worker threads get their own connections"""
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'jobs.db')
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+    BACKGROUND_JOB_WORKERS = 2
+    BACKGROUND_JOB_POLL_SECONDS = 1
+
+
+class StoppedWorkerTestingConfig(WorkerTestingConfig):
+    """The same database with no workers running, as left by a previous run"""
+    BACKGROUND_JOB_WORKERS = 0
+
+
+attempts_seen = defaultdict(int)
+
+
+@job('test_flaky')
+def flaky(key, fail_times):
+    """Fail the first fail_times attempts of the job called key"""
+    attempts_seen[key] += 1
+    if attempts_seen[key] <= fail_times:
+        raise RuntimeError('not yet')
+
+
+def create_users():
+    admin = User(name='Jobs Admin', email='jobs-admin@example.com', role='admin')
+    admin.set_password('password')
+    customer = User(name='jobs', email='jobs@example.com', role='customer')
+    customer.set_password('password')
+    db.session.add_all([admin, customer])
+    db.session.flush()
+    db.session.add(CustomerLoyalty(user_id=customer.user_id))
+    order = Order(user_id=customer.user_id, status='processing', total_amount=100)
+    db.session.add(order)
+    db.session.commit()
+    return customer.user_id, order.order_id
+
+
+def complete_order(client, order_id):
+    client.post('/auth/login', data={'email': 'jobs-admin@example.com', 'password': 'password'})
+    response = client.patch(f'/api/order/{order_id}/status', json={'status': 'completed'})
+    assert response.status_code == 200, response.data
+    return response
+
+
+def test_background_jobs():
+    """Points are queued with the status change, run later, and failures are retried"""
+    app = create_app('testing')
+    app.config['BACKGROUND_JOB_RETRY_SECONDS'] = 0
+    app.config['BACKGROUND_JOB_MAX_ATTEMPTS'] = 3
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Background Jobs")
+        print("=" * 50)
+        user_id, order_id = create_users()
+
+    client = app.test_client()
+    complete_order(client, order_id)
+
+    with app.app_context():
+        assert PointTransaction.query.filter_by(order_id=order_id).count() == 0
+        assert BackgroundJob.query.filter_by(name='award_order_points').count() == 1
+        stats = queue_stats()
+        assert (stats['pending'], stats['due'], stats['failed']) == (1, 1, 0)
+        print("✅ Completing an order queues its points and returns")
+
+        assert run_pending_jobs() == {'succeeded': 1, 'failed': 0}
+        assert PointTransaction.query.filter_by(order_id=order_id, transaction_type='earned').one().points_earned == 200
+        assert Notification.query.filter_by(user_id=user_id, notification_type='loyalty_points').count() == 1
+        assert BackgroundJob.query.count() == 0
+        print("✅ Running the queue awards the points and notifies the customer")
+
+        enqueue('test_flaky', key='twice', fail_times=2)
+        enqueue('test_flaky', key='always', fail_times=5)
+        db.session.commit()
+        assert run_pending_jobs() == {'succeeded': 1, 'failed': 5}
+        failed = BackgroundJob.query.one()
+        assert (failed.status, failed.attempts) == ('failed', 3)
+        assert failed.last_error == 'RuntimeError: not yet'
+        print("✅ Failing jobs are retried, then kept as failed with their error")
+
+        stats = queue_stats()
+        assert (stats['pending'], stats['failed']) == (0, 1)
+        assert stats['recent_failures'][0]['payload'] == {'key': 'always', 'fail_times': 5}
+
+    response = client.get('/admin/api/job-stats')
+    assert response.get_json()['background_jobs']['failed'] == 1
+
+    with app.app_context():
+        # Two more failures, then the third fresh attempt succeeds
+        assert retry_failed_jobs() == 1
+        assert run_pending_jobs() == {'succeeded': 1, 'failed': 2}
+        print("✅ Depth and failures are reported, and failed jobs can be retried")
+
+        # A job whose worker stopped mid-run is put back
+        stale = enqueue('test_flaky', key='stale', fail_times=0)
+        db.session.commit()
+        stale.status, stale.attempts, stale.locked_at = 'running', 1, stale.run_at.replace(year=2000)
+        db.session.commit()
+        assert release_stale_jobs() == 1
+        assert run_pending_jobs() == {'succeeded': 1, 'failed': 0}
+        print("✅ Jobs left running by a stopped worker are retried")
+        db.drop_all()
+
+    print("\n🎉 Background jobs test passed!")
+
+
+def wait_for_jobs():
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and BackgroundJob.query.count():
+        time.sleep(0.05)
+        db.session.rollback()
+    assert BackgroundJob.query.count() == 0
+
+
+def test_job_workers():
+    """Workers start with the app, run what the last run left and award points after the status change"""
+    config['testing_job_workers'] = WorkerTestingConfig
+    config['testing_jobs_stopped'] = StoppedWorkerTestingConfig
+
+    previous_run = create_app('testing_jobs_stopped')
+    with previous_run.app_context():
+        db.create_all()
+        user_id, order_id = create_users()
+        enqueue('test_flaky', key='left over', fail_times=0)
+        db.session.commit()
+
+    # CLI commands such as `flask db upgrade` do not start workers
+    with click.Context(click.Command('upgrade')):
+        assert 'job_workers' not in create_app('testing_job_workers').extensions
+
+    app = create_app('testing_job_workers')
+    with app.app_context():
+        try:
+            wait_for_jobs()
+            assert attempts_seen['left over'] == 1
+            print("✅ Workers start with the app and run jobs left by the last run")
+
+            complete_order(app.test_client(), order_id)
+            wait_for_jobs()
+            assert PointTransaction.query.filter_by(order_id=order_id).count() == 1
+            assert CustomerLoyalty.query.filter_by(user_id=user_id).one().total_points == 200
+        finally:
+            get_workers().stop()
+        db.drop_all()
+    print("✅ Worker threads run queued jobs once the update commits")
+
+
+if __name__ == "__main__":
+    test_background_jobs()
+    test_job_workers()
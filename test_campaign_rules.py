@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script to verify campaigns are compiled once into rules for tier, days,
+menu categories, minimum order and usage limits, that the compiled set is
+reused until a campaign starts or ends or is edited, and that awards pick
+the best campaign an order qualifies for
+Runs against an in-memory database
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.models import (
+    User, Order, OrderItem, MenuItem, Category, CustomerLoyalty, PromotionalCampaign, PointTransaction
+)
+from app.modules.loyalty.campaign_service import get_active_campaigns, OrderFacts
+from app.modules.loyalty.loyalty_service import award_points_for_order
+
+
+def create_customer(email, tier='bronze', lifetime_points=0):
+    user = User(name=email.split('@')[0], email=email, role='customer', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(CustomerLoyalty(user_id=user.user_id, tier_level=tier, lifetime_points=lifetime_points))
+    db.session.commit()
+    return user.user_id
+
+
+def add_campaign(name, multiplier, now, **rules):
+    rules = {'status': 'active', 'start_date': now - timedelta(days=1), 'end_date': now + timedelta(days=7),
+             **rules}
+    campaign = PromotionalCampaign(name=name, bonus_multiplier=multiplier, **rules)
+    db.session.add(campaign)
+    db.session.commit()
+    return campaign.campaign_id
+
+
+def award(user_id, item_id, total, order_time):
+    """Complete an order for one item and return the campaign that boosted it"""
+    order = Order(user_id=user_id, status='completed', total_amount=total, order_time=order_time)
+    db.session.add(order)
+    db.session.flush()
+    db.session.add(OrderItem(order_id=order.order_id, item_id=item_id, quantity=1, unit_price=total))
+    db.session.commit()
+    assert award_points_for_order(order.order_id, user_id)
+    return PointTransaction.query.filter_by(order_id=order.order_id, transaction_type='earned').one().campaign_id
+
+
+def usage(campaign_id):
+    db.session.expire_all()
+    return db.session.get(PromotionalCampaign, campaign_id).usage_count
+
+
+def test_campaign_rules():
+    """Rules are enforced together, the best campaign wins and limits hold"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Campaign Rules")
+        print("=" * 50)
+
+        food = Category(name='Main Courses')
+        drinks = Category(name='Drinks')
+        db.session.add_all([food, drinks])
+        db.session.flush()
+        burger = MenuItem(name='Burger', description='Beef', price=100, category_id=food.category_id, stock=100)
+        juice = MenuItem(name='Juice', description='Fresh', price=30, category_id=drinks.category_id, stock=100)
+        db.session.add_all([burger, juice])
+        db.session.commit()
+        burger_id, juice_id, drinks_id = burger.item_id, juice.item_id, drinks.category_id
+
+        now = datetime.utcnow()
+        # The Monday and Friday of this week, at lunchtime
+        monday = (now - timedelta(days=now.weekday())).replace(hour=13, minute=0)
+        friday = monday + timedelta(days=4)
+
+        gold_only = add_campaign('Gold Week', 3.0, now, target_customer_tier='gold')
+        drinks_deal = add_campaign('Drinks Deal', 2.5, now,
+                                   specific_menu_categories=json.dumps([drinks_id]))
+        weekend = add_campaign('Weekend Treat', 2.0, now, applicable_days='weekends')
+        big_orders = add_campaign('Big Spender', 1.8, now, minimum_order_amount=500)
+        first_come = add_campaign('First Come', 1.5, now, total_usage_limit=1)
+        once_each = add_campaign('Once Each', 1.4, now, maximum_uses_per_customer=1)
+        add_campaign('Paused', 5.0, now, status='inactive')
+        add_campaign('Next Month', 4.0, now, start_date=now + timedelta(days=30), end_date=now + timedelta(days=60))
+
+        active = get_active_campaigns(now)
+        assert [campaign.name for campaign in active.campaigns] == [
+            'Gold Week', 'Drinks Deal', 'Weekend Treat', 'Big Spender', 'First Come', 'Once Each']
+        assert active.valid_until == now + timedelta(days=7)
+        assert get_active_campaigns(now + timedelta(hours=1)) is active
+        print("✅ Running campaigns are compiled once, best multiplier first")
+
+        facts = OrderFacts(None, 600, 'gold', friday)
+        facts._category_ids = frozenset([drinks_id])
+        assert [campaign.name for campaign in active.evaluate(facts)] == [
+            'Gold Week', 'Drinks Deal', 'Weekend Treat', 'Big Spender', 'First Come', 'Once Each']
+        facts = OrderFacts(None, 100, 'bronze', monday)
+        facts._category_ids = frozenset()
+        assert [campaign.name for campaign in active.evaluate(facts)] == ['First Come', 'Once Each']
+        print("✅ One pass over the compiled rules checks tier, days, categories and minimum order")
+
+        ana = create_customer('ana@example.com')
+        ben = create_customer('ben@example.com')
+        gold = create_customer('gold@example.com', tier='gold', lifetime_points=6000)
+
+        # Bronze, weekday, food only, small: only the limited campaigns apply
+        assert award(ana, burger_id, 100, monday) == first_come
+        assert award(ana, burger_id, 100, monday) == once_each
+        assert award(ana, burger_id, 100, monday) is None
+        assert award(ben, burger_id, 100, monday) == once_each
+        assert (usage(first_come), usage(once_each)) == (1, 2)
+        print("✅ Total and per-customer usage limits are claimed on the usage counters")
+
+        assert award(ben, juice_id, 100, monday) == drinks_deal
+        assert award(ben, burger_id, 100, friday) == weekend
+        assert award(ben, burger_id, 600, monday) == big_orders
+        assert award(gold, burger_id, 100, monday) == gold_only
+        # 100 EGP earns 200 base points; Gold Week triples them
+        assert PointTransaction.query.filter_by(campaign_id=gold_only).one().points_earned == 600
+        print("✅ Awards take the best campaign the order qualifies for")
+
+        # An admin edit invalidates the compiled set
+        campaign = db.session.get(PromotionalCampaign, drinks_deal)
+        campaign.status = 'inactive'
+        db.session.commit()
+        edited = get_active_campaigns(now + timedelta(hours=1))
+        assert edited is not active and 'Drinks Deal' not in [c.name for c in edited.campaigns]
+
+        # ...and so does reaching a start or end boundary
+        later = get_active_campaigns(now + timedelta(days=8))
+        assert later is not edited and later.campaigns == []
+        assert later.valid_until == now + timedelta(days=30)
+        print("✅ The compiled set is rebuilt after an edit or at the next start/end boundary")
+
+    print("\n🎉 Campaign rules test passed!")
+
+
+if __name__ == "__main__":
+    test_campaign_rules()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script to verify campaign statistics come from the point transactions
+a campaign boosted, stay current as points are awarded, and rebuild the same
+Runs against an in-memory database
+"""
+
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.models import (
+    User, Order, CustomerLoyalty, PromotionalCampaign, PointTransaction,
+    CampaignCustomerStats, CampaignHourStats
+)
+from app.modules.admin import campaign_stats_service
+from app.modules.loyalty.loyalty_service import award_points_for_order
+
+
+def create_user(email, role='customer', tier=None, lifetime_points=0):
+    user = User(name=email.split('@')[0], email=email, role=role)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    if tier:
+        db.session.add(CustomerLoyalty(user_id=user.user_id, tier_level=tier, lifetime_points=lifetime_points))
+    db.session.commit()
+    return user.user_id
+
+
+def complete_order(user_id, total, order_time):
+    order = Order(user_id=user_id, status='completed', total_amount=total, order_time=order_time)
+    db.session.add(order)
+    db.session.commit()
+    assert award_points_for_order(order.order_id, user_id)
+    return order.order_id
+
+
+def snapshot(campaign_id):
+    return (
+        sorted((r.user_id, r.order_count, r.bonus_points, float(r.revenue))
+               for r in CampaignCustomerStats.query.filter_by(campaign_id=campaign_id)),
+        sorted((r.hour, r.order_count, float(r.revenue))
+               for r in CampaignHourStats.query.filter_by(campaign_id=campaign_id))
+    )
+
+
+def test_campaign_stats():
+    """Campaign awards are tagged and counted; stats and API report them"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Campaign Statistics")
+        print("=" * 50)
+
+        now = datetime.utcnow()
+        create_user('campaign-admin@example.com', role='admin')
+        regular = create_user('campaign-regular@example.com', tier='gold', lifetime_points=6000)
+        newcomer = create_user('campaign-new@example.com', tier='bronze')
+        outsider = create_user('campaign-outsider@example.com')
+
+        # Before the campaign: the regular's earlier order and the baseline period
+        complete_order(regular, 100, now - timedelta(days=5))
+        complete_order(outsider, 50, now - timedelta(days=4))
+
+        campaign = PromotionalCampaign(name='Double Points', bonus_multiplier=2.0, status='active',
+                                       start_date=now - timedelta(days=2), end_date=now + timedelta(days=5))
+        db.session.add(campaign)
+        db.session.commit()
+        campaign_id = campaign.campaign_id
+
+        evening = (now - timedelta(days=1)).replace(hour=19, minute=15)
+        complete_order(regular, 200, evening)
+        complete_order(regular, 100, evening + timedelta(minutes=20))
+        complete_order(newcomer, 50, evening.replace(hour=12))
+
+        awards = PointTransaction.query.filter_by(campaign_id=campaign_id).all()
+        assert len(awards) == 3
+        # 100 points per 50 EGP, doubled: the bonus is the base points again
+        assert sorted(a.bonus_points for a in awards) == [100, 200, 400]
+        print("✅ Awards under the campaign are tagged with its id and bonus points")
+
+        stats = campaign_stats_service.get_campaign_stats(campaign, now)
+        assert stats['total_orders'] == 3
+        assert stats['bonus_points_awarded'] == 700
+        assert stats['customers_engaged'] == 2
+        assert stats['revenue_impact'] == '350.00'
+        assert stats['engagement_breakdown'] == {'bronze': 1, 'silver': 0, 'gold': 1, 'platinum': 0}
+        assert stats['order_patterns']['peak_time'] == '7:00 PM - 8:00 PM'
+        assert stats['order_patterns']['repeat_customers'] == 50
+        assert stats['order_patterns']['avg_order_value'] == 350 / 3
+        # Two days of campaign (3 orders, 350 EGP) against the two days before (1 order, 50 EGP)
+        assert stats['total_orders_growth'] == 200.0
+        assert stats['revenue_growth'] == 600.0
+        assert stats['performance_percentage'] == 100
+        print("✅ Orders, points, customers, tiers, peak hour and growth are real")
+
+        maintained = snapshot(campaign_id)
+        assert campaign_stats_service.rebuild_campaign_stats() == 2
+        assert snapshot(campaign_id) == maintained
+        print("✅ Rebuilding from point transactions matches the maintained totals")
+
+        # An order placed exactly at the start counts in the campaign period only
+        db.session.add(Order(user_id=outsider, status='completed', total_amount=50,
+                             order_time=campaign.start_date))
+        db.session.commit()
+        stats = campaign_stats_service.get_campaign_stats(campaign, now)
+        assert (stats['total_orders_growth'], stats['revenue_growth']) == (300.0, 700.0)
+        print("✅ The campaign start is not counted in the period before it")
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'campaign-admin@example.com', 'password': 'password'})
+    response = client.get(f'/admin/api/campaigns/{campaign_id}/stats')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['success'] and data['stats']['total_orders'] == 3
+    print("✅ The stats API returns the same numbers")
+
+    print("\n🎉 Campaign statistics test passed!")
+
+
+if __name__ == "__main__":
+    test_campaign_stats()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the customer My Orders page is paginated and loads
+each page with a fixed number of queries however many orders it shows
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Table, Category, MenuItem, Order, OrderItem, Payment
+
+
+def create_user(email, role):
+    user = User(name=role.title(), email=email, role=role)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.user_id
+
+
+def count_statements(engine, callback):
+    """Run callback and return (result, SQL statements issued)"""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        result = callback()
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return result, statements
+
+
+def test_customer_orders_page():
+    """Pages hold ORDERS_PER_PAGE orders, stats cover all orders, queries stay flat"""
+    app = create_app('testing')
+    app.config['ORDERS_PER_PAGE'] = 5
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Customer My Orders Page")
+        print("=" * 50)
+
+        customer_id = create_user('orders-page@example.com', 'customer')
+        other_id = create_user('orders-page-other@example.com', 'customer')
+        table = Table(table_number='P1', capacity=4)
+        category = Category(name='Mains')
+        db.session.add_all([table, category])
+        db.session.commit()
+        items = [MenuItem(name=f'Dish {i}', price=10 + i, category_id=category.category_id, stock=100)
+                 for i in range(3)]
+        db.session.add_all(items)
+        db.session.commit()
+
+        start = datetime(2024, 6, 1, 12, 0)
+        statuses = ['completed', 'new', 'rejected', 'processing', 'cancelled', 'completed'] * 2
+        for i, status in enumerate(statuses):
+            order = Order(user_id=customer_id, table_id=table.table_id, status=status,
+                          total_amount=20 + i, order_time=start + timedelta(hours=i))
+            db.session.add(order)
+            db.session.flush()
+            for item in items[:1 + i % 3]:
+                db.session.add(OrderItem(order_id=order.order_id, item_id=item.item_id,
+                                         quantity=2, unit_price=item.price))
+            if status == 'completed':
+                db.session.add(Payment(order_id=order.order_id, amount=order.total_amount,
+                                       status='completed'))
+        db.session.add(Order(user_id=other_id, status='completed', total_amount=999))
+        db.session.commit()
+        engine = db.engine
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'orders-page@example.com', 'password': 'password'})
+    # Warm the settings snapshot so only the page's own queries are counted
+    client.get('/customer/orders?page=2')
+
+    response, first = count_statements(engine, lambda: client.get('/customer/orders'))
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert html.count('class="order-card') == 5
+    assert '<h3>Order #12</h3>' in html and '<h3>Order #7</h3>' not in html
+    assert 'Dish 2' in html
+    assert '/customer/orders?page=2' in html
+    print("✅ First page shows the newest five orders and links to the next page")
+
+    # Stats cover all twelve orders, not just the page, and no one else's
+    spent = sum(20 + i for i, status in enumerate(statuses) if status == 'completed')
+    assert re.findall(r'<div class="stat-number">(.*?)</div>', html) == ['12', '4', '4', f'{spent} EGP']
+    print("✅ Stats count every order of the customer")
+
+    response, last = count_statements(engine, lambda: client.get('/customer/orders?page=3'))
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert html.count('class="order-card') == 2
+    assert '<h3>Order #1</h3>' in html
+    print("✅ Last page shows the remaining orders")
+
+    # Five orders with items, menu items and payments cost no more than two
+    assert len(first) == len(last), (len(first), len(last))
+    print(f"✅ Each page loads with {len(first)} queries regardless of its size")
+
+    response = client.get('/customer/orders?page=9')
+    assert response.status_code == 200
+
+    print("\n🎉 Customer orders page test passed!")
+
+
+if __name__ == "__main__":
+    test_customer_orders_page()
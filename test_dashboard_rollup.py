@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the dashboard daily sales rollup stays in sync with orders
+Runs against an in-memory database
+"""
+
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.models import (
+    User, Category, MenuItem, Order, OrderItem, DailySalesRollup, DailyCategoryRollup
+)
+from app.modules.admin.rollup_service import rebuild_daily_rollup, get_top_categories
+
+
+def setup_data():
+    """Create a customer, an admin and two menu items in two categories"""
+    customer = User(name='Rollup Customer', email='rollup@example.com', role='customer')
+    customer.set_password('password')
+    admin = User(name='Rollup Admin', email='rollup-admin@example.com', role='admin')
+    admin.set_password('password')
+    drinks = Category(name='Drinks')
+    food = Category(name='Food')
+    db.session.add_all([customer, admin, drinks, food])
+    db.session.flush()
+
+    tea = MenuItem(name='Tea', price=20, category_id=drinks.category_id, stock=10)
+    burger = MenuItem(name='Burger', price=100, category_id=food.category_id, stock=10)
+    db.session.add_all([tea, burger])
+    db.session.commit()
+    return customer, tea, burger
+
+
+def place_order(customer, lines, order_time=None):
+    """Place an order the way the checkout routes do: flush, add lines, set total"""
+    order = Order(user_id=customer.user_id, status='new', total_amount=0, order_time=order_time)
+    db.session.add(order)
+    db.session.flush()
+
+    total = 0
+    for menu_item, quantity in lines:
+        db.session.add(OrderItem(order_id=order.order_id, item_id=menu_item.item_id,
+                                 quantity=quantity, unit_price=menu_item.price))
+        total += float(menu_item.price) * quantity
+    order.total_amount = total
+    db.session.commit()
+    return order
+
+
+def snapshot():
+    """Rollup contents as plain tuples for comparison"""
+    sales = sorted(
+        (row.day, row.order_count, float(row.revenue), row.new_count, row.processing_count,
+         row.completed_count, row.rejected_count, row.cancelled_count)
+        for row in DailySalesRollup.query.all()
+    )
+    categories = sorted(
+        (row.day, row.category_id, row.item_count)
+        for row in DailyCategoryRollup.query.all() if row.item_count
+    )
+    return sales, categories
+
+
+def test_dashboard_rollup():
+    """Incremental rollup matches a full rebuild after creates, status changes and deletes"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Dashboard Rollup")
+        print("=" * 50)
+
+        customer, tea, burger = setup_data()
+        today = datetime.utcnow().date()
+
+        first = place_order(customer, [(tea, 2), (burger, 1)])
+        second = place_order(customer, [(burger, 3)])
+        place_order(customer, [(tea, 1)], order_time=datetime.utcnow() - timedelta(days=2))
+
+        row = db.session.get(DailySalesRollup, today)
+        assert row.order_count == 2
+        assert float(row.revenue) == 440.0
+        assert row.new_count == 2
+        print(f"✅ Orders counted on create: {row.order_count} orders, {row.revenue} EGP")
+
+        # Status change moves the order between buckets without touching totals
+        first.status = 'completed'
+        db.session.commit()
+        second = db.session.get(Order, second.order_id)
+        second.status = 'cancelled'
+        db.session.commit()
+
+        row = db.session.get(DailySalesRollup, today)
+        assert (row.new_count, row.completed_count, row.cancelled_count) == (0, 1, 1)
+        assert row.order_count == 2
+        print("✅ Status changes moved between buckets")
+
+        # Deleting an order (items through the cascade) reverses it entirely
+        db.session.delete(db.session.get(Order, second.order_id))
+        db.session.commit()
+        row = db.session.get(DailySalesRollup, today)
+        assert row.order_count == 1 and float(row.revenue) == 140.0
+        print("✅ Deleted orders removed from the rollup")
+
+        top = get_top_categories(today - timedelta(days=30))
+        assert [(name, int(count)) for name, count in top] == [('Drinks', 2), ('Food', 1)]
+        print(f"✅ Top categories: {top}")
+
+        incremental = snapshot()
+        rebuild_daily_rollup()
+        assert snapshot() == incremental
+        print("✅ Incremental rollup matches full rebuild")
+
+        client = app.test_client()
+        client.post('/auth/login', data={'email': 'rollup-admin@example.com', 'password': 'password'})
+        response = client.get('/admin/dashboard')
+        assert response.status_code == 200
+        print("✅ Dashboard renders from the rollup")
+
+
+if __name__ == "__main__":
+    test_dashboard_rollup()
@@ -158,7 +158,7 @@ def create_test_reviews():
             print("  ❌ No completed orders found")
             return
             
-        order_items = order.order_items.all()
+        order_items = order.order_items
         if not order_items:
             print("  ❌ No order items found")
             return
@@ -42,7 +42,7 @@ def test_reorder_and_checkout():
             print(f"   Total: ${test_order.total_amount}")
             
             # 3. Test order items loading
-            order_items = test_order.order_items.all()
+            order_items = test_order.order_items
             print(f"✅ Order has {len(order_items)} items")
             
             # Check if menu items still exist
@@ -63,7 +63,7 @@ def test_functionality():
                 print("\n🔍 Testing reorder functionality...")
                 
                 # Check order items
-                items = orders.order_items.all()
+                items = orders.order_items
                 print(f"✅ Order has {len(items)} items")
                 
                 for item in items:
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Stress test to verify concurrent reward redemptions never spend more points
+than a customer has, concurrent awards credit each order exactly once, and
+concurrent awards never boost more orders than a campaign's usage limit
+Runs against a file database so each worker thread gets its own connection
+"""
+
+import os
+import tempfile
+import threading
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app import create_app
+from app.extensions import db
+from app.models import (
+    User, Order, CustomerLoyalty, PointTransaction, RewardItem, RewardRedemption, PromotionalCampaign
+)
+from app.modules.loyalty.ledger_service import InsufficientPoints
+from app.modules.loyalty.loyalty_service import award_points_for_order, redeem_reward
+from config import config, TestingConfig
+
+
+class ConcurrentTestingConfig(TestingConfig):
+    """File database so each worker thread gets its own connection"""
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loyalty.db')
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+    LOYALTY_WRITE_ATTEMPTS = 5
+
+
+def run_concurrently(app, work, count):
+    """Run work() in count threads at once, each in its own app context"""
+    results = []
+    start = threading.Barrier(count)
+
+    def worker():
+        with app.app_context():
+            start.wait()
+            try:
+                results.append(work())
+            except InsufficientPoints:
+                results.append('insufficient')
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def account(user_id):
+    db.session.expire_all()
+    return CustomerLoyalty.query.filter_by(user_id=user_id).one()
+
+
+def test_loyalty_concurrency():
+    """Twenty redemptions of a 500-point balance; ten awards of one order"""
+    config['testing_loyalty_concurrent'] = ConcurrentTestingConfig
+    app = create_app('testing_loyalty_concurrent')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Loyalty Concurrency")
+        print("=" * 50)
+
+        user = User(name='racer', email='racer@example.com', role='customer', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        user_id = user.user_id
+        db.session.add(CustomerLoyalty(user_id=user_id))
+        db.session.add_all([PointTransaction(user_id=user_id, points_earned=250, transaction_type='earned')
+                            for _ in range(2)])
+        reward = RewardItem(name='Free Coffee', points_required=100, status='active')
+        db.session.add(reward)
+        db.session.commit()
+        CustomerLoyalty.query.filter_by(user_id=user_id).update({CustomerLoyalty.total_points: 500,
+                                                                  CustomerLoyalty.lifetime_points: 1500})
+        db.session.commit()
+        reward_id = reward.reward_id
+
+    results = run_concurrently(
+        app, lambda: redeem_reward(user_id, db.session.get(RewardItem, reward_id))[1], 20
+    )
+
+    with app.app_context():
+        redeemed = [result for result in results if result != 'insufficient']
+        assert len(redeemed) == 5 and results.count('insufficient') == 15, results
+        assert sorted(redeemed) == [0, 100, 200, 300, 400]
+        assert account(user_id).total_points == 0
+        assert RewardRedemption.query.filter_by(user_id=user_id).count() == 5
+        assert db.session.query(func.sum(PointTransaction.points_remaining)).filter_by(user_id=user_id).scalar() == 0
+        assert account(user_id).total_redeemed == 500
+        print(f"✅ 20 concurrent redemptions of 500 points: {len(redeemed)} redeemed, "
+              f"{results.count('insufficient')} refused, balance 0")
+
+        order = Order(user_id=user_id, status='completed', total_amount=100)
+        db.session.add(order)
+        db.session.commit()
+        order_id = order.order_id
+
+    results = run_concurrently(app, lambda: award_points_for_order(order_id, user_id), 10)
+
+    with app.app_context():
+        assert results == [True] * 10, results
+        earned = PointTransaction.query.filter_by(order_id=order_id, transaction_type='earned').all()
+        assert len(earned) == 1
+        assert account(user_id).total_points == earned[0].points_earned == 200
+        print("✅ 10 concurrent awards of one order credit it once")
+
+        orders = [Order(user_id=user_id, status='completed', total_amount=50) for _ in range(8)]
+        db.session.add_all(orders)
+        db.session.commit()
+        order_ids = iter([order.order_id for order in orders])
+        next_order = threading.Lock()
+
+    def award_next():
+        with next_order:
+            order_id = next(order_ids)
+        return award_points_for_order(order_id, user_id)
+
+    results = run_concurrently(app, award_next, 8)
+
+    with app.app_context():
+        assert results == [True] * 8, results
+        loyalty = account(user_id)
+        assert loyalty.lifetime_points == 1500 + 200 + 8 * 100
+        assert loyalty.tier_level == 'silver'
+        # Crossing into silver earns its bonus once, whichever award crossed it
+        bonuses = PointTransaction.query.filter_by(user_id=user_id, transaction_type='bonus').all()
+        assert [bonus.points_earned for bonus in bonuses] == [200]
+        assert loyalty.total_points == 200 + 8 * 100 + 200
+        db.drop_all()
+    print("✅ 8 concurrent awards of different orders lose no points")
+
+    print("\n🎉 Loyalty concurrency test passed!")
+
+
+def test_concurrent_campaign_limit():
+    """Twelve customers' awards at once under a campaign limited to three uses"""
+    config['testing_loyalty_concurrent'] = ConcurrentTestingConfig
+    app = create_app('testing_loyalty_concurrent')
+
+    with app.app_context():
+        db.create_all()
+        now = datetime.utcnow()
+        campaign = PromotionalCampaign(name='First Three', bonus_multiplier=2.0, status='active',
+                                       start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+                                       total_usage_limit=3)
+        db.session.add(campaign)
+        awards = []
+        for index in range(12):
+            user = User(name=f'early-{index}', email=f'early-{index}@example.com', role='customer',
+                        password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            order = Order(user_id=user.user_id, status='completed', total_amount=50)
+            db.session.add(order)
+            db.session.flush()
+            awards.append((order.order_id, user.user_id))
+        db.session.commit()
+        campaign_id = campaign.campaign_id
+        pending = iter(awards)
+        next_award = threading.Lock()
+
+    def award_next():
+        with next_award:
+            order_id, user_id = next(pending)
+        return award_points_for_order(order_id, user_id)
+
+    results = run_concurrently(app, award_next, 12)
+
+    with app.app_context():
+        assert results == [True] * 12, results
+        assert PointTransaction.query.filter_by(campaign_id=campaign_id).count() == 3
+        assert db.session.get(PromotionalCampaign, campaign_id).usage_count == 3
+        assert PointTransaction.query.filter_by(transaction_type='earned').count() == 12
+        db.drop_all()
+    print("✅ 12 concurrent awards under a 3-use campaign boost exactly 3")
+
+
+if __name__ == "__main__":
+    test_loyalty_concurrency()
+    test_concurrent_campaign_limit()
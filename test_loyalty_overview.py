@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test script to verify loyalty accounts keep total_spent current and the
+loyalty management page runs the same number of queries however many
+customers are on it
+Runs against an in-memory database
+"""
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Order, CustomerLoyalty
+from app.modules.admin import loyalty_overview_service
+
+
+def create_customer(email, points=0, tier='bronze'):
+    user = User(name=email.split('@')[0], email=email, role='customer')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(CustomerLoyalty(user_id=user.user_id, total_points=points, tier_level=tier))
+    db.session.commit()
+    return user.user_id
+
+
+def spent(user_id):
+    db.session.expire_all()
+    return float(CustomerLoyalty.query.filter_by(user_id=user_id).one().total_spent)
+
+
+def count_page_statements(client, url):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    response = client.get(url)
+    event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements), response
+
+
+def test_loyalty_overview():
+    """total_spent follows finished orders; the page is a fixed set of queries"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Loyalty Overview")
+        print("=" * 50)
+
+        admin = User(name='Loyalty Admin', email='loyalty-admin@example.com', role='admin')
+        admin.set_password('password')
+        db.session.add(admin)
+        db.session.commit()
+
+        big = create_customer('big-spender@example.com', points=10, tier='gold')
+        small = create_customer('small-spender@example.com', points=500, tier='silver')
+
+        order = Order(user_id=big, status='processing', total_amount=300)
+        db.session.add_all([order, Order(user_id=small, status='completed', total_amount=40)])
+        db.session.commit()
+        assert spent(big) == 0 and spent(small) == 40
+
+        order.status = 'completed'
+        db.session.commit()
+        assert spent(big) == 300
+
+        order.total_amount = 250
+        db.session.commit()
+        assert spent(big) == 250
+
+        # Delivered orders (a status older rows still carry) are finished too
+        db.session.add(Order(user_id=small, status='delivered', total_amount=20))
+        db.session.commit()
+        assert spent(small) == 60
+
+        # Orders that do not count yet leave the accounts alone
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        db.session.add(Order(user_id=big, status='new', total_amount=999))
+        db.session.commit()
+        event.remove(db.engine, 'before_cursor_execute', count)
+        assert not [s for s in statements if 'customer_loyalty' in s], statements
+        assert spent(big) == 250
+
+        # Moving or deleting a finished order takes its spend with it
+        moved = Order(user_id=big, status='completed', total_amount=30)
+        db.session.add(moved)
+        db.session.commit()
+        moved.user_id = small
+        db.session.commit()
+        assert (spent(big), spent(small)) == (250, 90)
+        db.session.delete(moved)
+        db.session.commit()
+        assert spent(small) == 60
+        print("✅ Completing, delivering, moving and editing orders updates total_spent")
+
+        # An account opened after the customer has ordered starts from their history
+        late = User(name='late', email='late@example.com', role='customer')
+        late.set_password('password')
+        db.session.add(late)
+        db.session.flush()
+        db.session.add(Order(user_id=late.user_id, status='completed', total_amount=75))
+        db.session.commit()
+        db.session.add(CustomerLoyalty(user_id=late.user_id))
+        db.session.commit()
+        assert spent(late.user_id) == 75
+        print("✅ New loyalty accounts start with the customer's past spend")
+
+        CustomerLoyalty.query.update({CustomerLoyalty.total_spent: 0})
+        db.session.commit()
+        assert loyalty_overview_service.rebuild_total_spent() == 3
+        assert (spent(big), spent(small), spent(late.user_id)) == (250, 60, 75)
+
+        assert loyalty_overview_service.get_tier_distribution() == {
+            'bronze': 1, 'silver': 1, 'gold': 1, 'platinum': 0, 'total': 3, 'active': 2}
+        print("✅ Rebuild and tier distribution agree")
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'loyalty-admin@example.com', 'password': 'password'})
+    client.get('/admin/loyalty-management')  # Warm up per-process settings
+
+    few, response = count_page_statements(client, '/admin/loyalty-management?sort=spent')
+    body = response.data.decode()
+    assert body.index('big-spender@example.com') < body.index('late@example.com') < body.index('small-spender@example.com')
+
+    with app.app_context():
+        for index in range(15):
+            create_customer(f'extra-{index}@example.com', points=index)
+    many, _ = count_page_statements(client, '/admin/loyalty-management')
+    assert many == few, (few, many)
+    print(f"✅ The page takes {few} queries for 3 or 18 customers and sorts by total spent")
+
+    print("\n🎉 Loyalty overview test passed!")
+
+
+if __name__ == "__main__":
+    test_loyalty_overview()
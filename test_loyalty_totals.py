@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script to verify loyalty accounts keep running totals of points earned,
+redeemed, given as bonuses and expired as the ledger is written, and that the
+verification finds and fixes drift
+Runs against an in-memory database
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from app.extensions import db
+from app.models import User, CustomerLoyalty, PointTransaction, RewardItem
+from app.modules.loyalty.ledger_service import expire_lots, verify_totals, find_drift
+
+
+def totals(user_id):
+    db.session.expire_all()
+    account = CustomerLoyalty.query.filter_by(user_id=user_id).one()
+    return (account.total_earned, account.total_redeemed, account.total_bonus, account.total_expired)
+
+
+def test_loyalty_totals():
+    """Running totals follow every kind of ledger write; drift is detected and fixed"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Loyalty Totals")
+        print("=" * 50)
+
+        admin = User(name='Totals Admin', email='totals-admin@example.com', role='admin')
+        admin.set_password('password')
+        customer = User(name='totals', email='totals@example.com', role='customer')
+        customer.set_password('password')
+        db.session.add_all([admin, customer])
+        db.session.commit()
+        user_id = customer.user_id
+
+        # History written before the customer had an account
+        now = datetime.utcnow()
+        db.session.add(PointTransaction(user_id=user_id, points_earned=300, transaction_type='earned',
+                                        timestamp=now - timedelta(days=40), expiry_date=now - timedelta(days=1)))
+        db.session.commit()
+        db.session.add(CustomerLoyalty(user_id=user_id, total_points=300, lifetime_points=300))
+        db.session.commit()
+        assert totals(user_id) == (300, 0, 0, 0)
+        print("✅ A new account starts from the customer's existing transactions")
+
+        db.session.add_all([
+            PointTransaction(user_id=user_id, points_earned=200, transaction_type='earned',
+                             expiry_date=now + timedelta(days=180)),
+            PointTransaction(user_id=user_id, points_earned=50, transaction_type='bonus',
+                             expiry_date=now + timedelta(days=180))
+        ])
+        account = CustomerLoyalty.query.filter_by(user_id=user_id).one()
+        account.total_points += 250
+        reward = RewardItem(name='Free Cake', points_required=100, status='active')
+        db.session.add(reward)
+        db.session.commit()
+        loyalty_id, reward_id = account.loyalty_id, reward.reward_id
+        assert totals(user_id) == (550, 0, 50, 0)
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'totals@example.com', 'password': 'password'})
+    assert client.post('/api/loyalty/redeem', json={'reward_id': reward_id}).status_code == 200
+    data = client.get('/api/loyalty/points').get_json()['data']
+    assert (data['total_earned'], data['total_redeemed'], data['total_bonus']) == (550, 100, 50)
+    dashboard = client.get('/loyalty/')
+    assert dashboard.status_code == 200
+    assert '200 points</strong> are expiring' in dashboard.data.decode()
+    client.get('/auth/logout')
+
+    with app.app_context():
+        report = expire_lots()
+        assert report['points'] == 200  # The oldest lot lost 100 points to the redemption
+        assert totals(user_id) == (550, 100, 50, 200)
+
+        # Bulk inserts skip flush events but are counted too
+        db.session.execute(insert(PointTransaction), [
+            dict(user_id=user_id, points_earned=10, transaction_type='earned') for _ in range(3)
+        ])
+        db.session.commit()
+        assert totals(user_id) == (580, 100, 50, 200)
+        print("✅ Earning, bonuses, redemptions, expiry and bulk inserts update the totals")
+
+    client.post('/auth/login', data={'email': 'totals-admin@example.com', 'password': 'password'})
+    response = client.get(f'/admin/loyalty-transactions/{loyalty_id}')
+    assert response.status_code == 200
+    body = response.data.decode()
+    assert '580' in body and '200 expired' in body
+    print("✅ The admin transactions page shows the stored totals")
+
+    with app.app_context():
+        assert verify_totals() == []
+
+        CustomerLoyalty.query.filter_by(user_id=user_id).update({CustomerLoyalty.total_earned: 1})
+        db.session.commit()
+        drifted = verify_totals()
+        assert drifted == [{'user_id': user_id, 'total_earned': (1, 580)}]
+
+        verify_totals(fix=True)
+        assert find_drift() == []
+        assert totals(user_id) == (580, 100, 50, 200)
+        print("✅ Verification finds drifted accounts and --fix recomputes them")
+
+    print("\n🎉 Loyalty totals test passed!")
+
+
+if __name__ == "__main__":
+    test_loyalty_totals()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the cached menu catalog, its version bumps and
+ETag/304 handling on /api/menu-items
+Runs against an in-memory database
+"""
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Category, MenuItem, Feedback
+from app.modules.menu.catalog_service import get_catalog_version
+
+
+def count_statements(app, callback):
+    """Run callback and return (result, SQL statements issued)"""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = callback()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, statements
+
+
+def test_menu_catalog():
+    """Menu reads come from one snapshot per catalog version"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Menu Catalog Cache")
+        print("=" * 50)
+
+        customer = User(name='Catalog Customer', email='catalog@example.com', role='customer')
+        customer.set_password('password')
+        drinks = Category(name='Drinks', display_order=1)
+        mains = Category(name='Main Courses', display_order=0)
+        db.session.add_all([customer, drinks, mains, ])
+        db.session.flush()
+        tea = MenuItem(name='Tea', description='Hot tea', price=20, category_id=drinks.category_id, stock=10)
+        steak = MenuItem(name='Steak', description='Grilled', price=300, category_id=mains.category_id, stock=4)
+        db.session.add_all([tea, steak])
+        db.session.commit()
+        version = get_catalog_version()
+        assert version > 0
+        print(f"✅ Menu writes bump the catalog version ({version})")
+
+        client = app.test_client()
+        response = client.get('/api/menu-items')
+        etag = response.headers['ETag']
+        data = response.get_json()['data']
+        assert [item['name'] for item in data] == ['Tea', 'Steak']
+        assert data[0]['image'].startswith('https://images.unsplash.com/photo-1544145945')
+
+        # Repeat calls only look up the version; matching ETags get a 304
+        response, statements = count_statements(app, lambda: client.get('/api/menu-items'))
+        assert response.status_code == 200 and response.headers['ETag'] == etag
+        assert len(statements) == 1, statements
+        response = client.get('/api/menu-items', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        print(f"✅ Cached catalog served with ETag {etag} and 304 on revalidation")
+
+        # Editing an item invalidates the snapshot
+        tea.price = 25
+        db.session.commit()
+        response = client.get('/api/menu-items', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert response.get_json()['data'][0]['price'] == 25.0
+        etag = response.headers['ETag']
+        print("✅ Menu edits invalidate the snapshot")
+
+        # New reviews invalidate it too, so the menu shows fresh ratings
+        version = get_catalog_version()
+        db.session.add(Feedback(user_id=customer.user_id, item_id=steak.item_id, rating=4))
+        db.session.commit()
+        assert get_catalog_version() > version
+        response = client.get('/customer/menu')
+        assert response.status_code == 200
+        assert b'data-rating-count="1"' in response.data
+
+        # The API payload has no ratings, so its content-based ETag still matches
+        assert client.get('/api/menu-items', headers={'If-None-Match': etag}).status_code == 304
+        print("✅ Reviews refresh the menu page ratings")
+
+        # Items that go out of stock leave the menu
+        steak.status = 'out_of_stock'
+        db.session.commit()
+        assert [item['name'] for item in client.get('/api/menu-items').get_json()['data']] == ['Tea']
+
+        suggested = client.get('/api/menu-items/suggested').get_json()['data']
+        assert [item['name'] for item in suggested] == ['Tea']
+        assert client.get('/').status_code == 200
+        print("✅ Suggested items and landing pages render from the snapshot")
+
+
+if __name__ == "__main__":
+    test_menu_catalog()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script to verify menu item ratings follow feedback writes
+and that the menu page loads ratings without a query per item
+Runs against an in-memory database
+"""
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Category, MenuItem, Feedback
+from app.modules.customer.rating_service import rebuild_item_ratings
+
+
+def test_menu_ratings():
+    """Denormalized ratings match feedback; the menu page issues a constant number of queries"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Menu Ratings")
+        print("=" * 50)
+
+        customer = User(name='Rating Customer', email='rating@example.com', role='customer')
+        customer.set_password('password')
+        category = Category(name='Mains')
+        db.session.add_all([customer, category])
+        db.session.flush()
+        items = [MenuItem(name=f'Dish {n}', description='House dish', price=50, category_id=category.category_id, stock=5)
+                 for n in range(12)]
+        db.session.add_all(items)
+        db.session.commit()
+        first, second = items[0], items[1]
+
+        # Inserts update the summary
+        db.session.add_all([
+            Feedback(user_id=customer.user_id, item_id=first.item_id, rating=5),
+            Feedback(user_id=customer.user_id, item_id=first.item_id, rating=4),
+            Feedback(user_id=customer.user_id, item_id=second.item_id, rating=2),
+            Feedback(user_id=customer.user_id, item_id=None, rating=1)
+        ])
+        db.session.commit()
+        assert MenuItem.get_ratings([first.item_id, second.item_id, items[2].item_id]) == {
+            first.item_id: (4.5, 2), second.item_id: (2.0, 1), items[2].item_id: (0.0, 0)
+        }
+        print("✅ New feedback updates the rating summary")
+
+        # Unapproving and approving feedback
+        review = Feedback.query.filter_by(item_id=first.item_id, rating=4).one()
+        review.is_approved = False
+        db.session.commit()
+        assert first.get_average_rating() == {'average': 5.0, 'count': 1}
+        assert first.get_rating_distribution() == {1: 0, 2: 0, 3: 0, 4: 0, 5: 1}
+        review.is_approved = True
+        db.session.commit()
+        assert first.get_average_rating() == {'average': 4.5, 'count': 2}
+        print("✅ Approval changes update the rating summary")
+
+        # Deleting feedback
+        db.session.delete(Feedback.query.filter_by(item_id=second.item_id).one())
+        db.session.commit()
+        assert second.get_average_rating() == {'average': 0.0, 'count': 0}
+        print("✅ Deleted feedback removed from the summary")
+
+        # A full rebuild agrees with the incremental summary
+        before = MenuItem.get_ratings(item.item_id for item in items)
+        rebuild_item_ratings()
+        assert MenuItem.get_ratings(item.item_id for item in items) == before
+        print("✅ Incremental summary matches full rebuild")
+
+        # The menu page runs the same number of queries regardless of menu size
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        client = app.test_client()
+        response = client.get('/customer/menu')
+        event.remove(db.engine, 'before_cursor_execute', listener)
+        assert response.status_code == 200
+        feedback_queries = [s for s in statements if 'FROM feedback' in s]
+        assert not feedback_queries, feedback_queries
+        print(f"✅ Menu page rendered with {len(statements)} queries and no feedback lookups")
+
+        assert client.get('/').status_code == 200
+        print("✅ Landing page renders popular item ratings")
+
+
+if __name__ == "__main__":
+    test_menu_ratings()
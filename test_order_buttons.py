@@ -99,7 +99,7 @@ def test_reorder_functionality(orders):
     if completed_orders:
         print(f"  ✅ {len(completed_orders)} orders can be reordered")
         order = completed_orders[0]
-        items = order.order_items.all()
+        items = order.order_items
         print(f"  ✅ Order #{order.order_id} has {len(items)} items for reordering")
     else:
         print("  ⚠️  No completed orders available for reordering")
@@ -76,7 +76,7 @@ with app.app_context():
         
         # Verify the relationships work
         test_order = Order.query.get(order.order_id)
-        items = test_order.order_items.all()
+        items = test_order.order_items
         print(f"✅ Order has {len(items)} items")
         
         if items:
@@ -31,7 +31,7 @@ def test_order_loading():
         print(f"   User ID: {order.user_id}")
         
         # Get order items
-        order_items = order.order_items.all()
+        order_items = order.order_items
         print(f"✅ Found {len(order_items)} order items")
         
         for item in order_items:
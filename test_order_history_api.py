@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script to verify /api/order/all and /api/order/history page with
+keyset cursors, filter, and stream NDJSON exports
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Table, Order
+from app.modules.order import history_service
+
+
+def create_user(email, role):
+    user = User(name=role.title(), email=email, role=role)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.user_id
+
+
+def login(app, email):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': email, 'password': 'password'})
+    return client
+
+
+def collect_pages(client, url):
+    """Follow X-Next-Cursor until the last page"""
+    orders, pages = [], 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200, response.data
+        orders += response.get_json()
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        url = response.headers['Link'].split('>')[0].lstrip('<') if cursor else None
+    return orders, pages
+
+
+def test_order_history_api():
+    """Keyset pages cover every order once, filters apply, exports stream"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Order History API")
+        print("=" * 50)
+
+        create_user('history-waiter@example.com', 'waiter')
+        customer_id = create_user('history-customer@example.com', 'customer')
+        other_id = create_user('history-other@example.com', 'customer')
+        table = Table(table_number='H1', capacity=4)
+        db.session.add(table)
+        db.session.commit()
+
+        start = datetime(2024, 5, 1, 12, 0)
+        statuses = ['new', 'processing', 'completed', 'completed', 'cancelled', 'new', 'completed']
+        for i, status in enumerate(statuses):
+            db.session.add(Order(
+                user_id=customer_id if i % 2 == 0 else other_id,
+                table_id=table.table_id if i < 3 else None,
+                status=status,
+                total_amount=10 + i,
+                # Pairs of orders share a timestamp; order_id breaks the tie
+                order_time=start + timedelta(days=i // 2)
+            ))
+        db.session.commit()
+        table_id = table.table_id
+        expected = [o.order_id for o in Order.query.order_by(Order.order_time.desc(), Order.order_id.desc())]
+
+    waiter = login(app, 'history-waiter@example.com')
+
+    orders, pages = collect_pages(waiter, '/api/order/all?limit=3')
+    assert [o['order_id'] for o in orders] == expected
+    assert pages == 3
+    print("✅ Keyset pages return every order once, newest first")
+
+    completed, _ = collect_pages(waiter, '/api/order/all?limit=2&status=completed')
+    assert [o['status'] for o in completed] == ['completed'] * 3
+
+    at_table, _ = collect_pages(waiter, f'/api/order/all?table_id={table_id}')
+    assert len(at_table) == 3 and all(o['table_id'] == table_id for o in at_table)
+
+    in_range, _ = collect_pages(waiter, '/api/order/all?from=2024-05-02&to=2024-05-03')
+    assert len(in_range) == 4
+    assert all(o['order_time'].startswith(('2024-05-02', '2024-05-03')) for o in in_range)
+    print("✅ Status, table and date filters")
+
+    assert waiter.get('/api/order/all?cursor=not-a-cursor').status_code == 400
+    assert waiter.get('/api/order/all?limit=0').status_code == 400
+    assert waiter.get('/api/order/all?from=yesterday').status_code == 400
+
+    # Exports stream in batches
+    history_service.EXPORT_BATCH_SIZE = 2
+    try:
+        response = waiter.get('/api/order/all?format=ndjson')
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    finally:
+        history_service.EXPORT_BATCH_SIZE = 500
+    assert [o['order_id'] for o in lines] == expected
+    print("✅ NDJSON export streams every order")
+
+    customer = login(app, 'history-customer@example.com')
+    assert customer.get('/api/order/all').status_code == 403
+    history, _ = collect_pages(customer, '/api/order/history?limit=1')
+    assert len(history) == 4
+    assert set(history[0]) == {'order_id', 'status', 'total', 'order_time'}
+    print("✅ History only lists the customer's own orders")
+
+    with app.app_context():
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    test_order_history_api()
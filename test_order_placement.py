@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script to verify both order endpoints place orders through the shared
+service with one menu lookup and one batched order-item insert
+Runs against an in-memory database
+"""
+
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Category, MenuItem, Order, OrderItem, DailyCategoryRollup
+
+
+def test_order_placement():
+    """Orders from both endpoints are priced in Decimal and written in bulk"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Order Placement")
+        print("=" * 50)
+
+        customer = User(name='Checkout Customer', email='checkout@example.com', role='customer')
+        customer.set_password('password')
+        category = Category(name='Food')
+        db.session.add_all([customer, category])
+        db.session.flush()
+        items = [MenuItem(name=f'Dish {n}', price=Decimal('10.10'), category_id=category.category_id, stock=50)
+                 for n in range(5)]
+        sold_out = MenuItem(name='Sold Out', price=5, category_id=category.category_id, status='out_of_stock')
+        db.session.add_all(items + [sold_out])
+        db.session.commit()
+        item_ids = [item.item_id for item in items]
+
+        client = app.test_client()
+        client.post('/auth/login', data={'email': 'checkout@example.com', 'password': 'password'})
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        response = client.post('/api/orders', json={
+            'paymentMethod': 'cash',
+            'items': [{'id': item_id, 'quantity': 3} for item_id in item_ids]
+        })
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert response.status_code == 200, response.get_json()
+        data = response.get_json()['data']
+        # 5 lines x 3 x 10.10 + 2.00 service charge, with no float drift
+        assert data['total_amount'] == 153.5
+        order = db.session.get(Order, data['order_id'])
+        assert order.total_amount == Decimal('153.50')
+        assert len(order.order_items) == 5
+
+        menu_lookups = [s for s in statements if s.startswith('SELECT') and 'FROM menu_items' in s
+                        and 'menu_items.item_id IN' in s]
+        item_inserts = [s for s in statements if s.startswith('INSERT INTO order_items')]
+        assert len(menu_lookups) == 1, menu_lookups
+        assert len(item_inserts) == 1, item_inserts
+        # Bulk-inserted lines still reach the dashboard rollup
+        assert DailyCategoryRollup.query.one().item_count == 5
+        print(f"✅ /api/orders: 1 menu lookup, 1 order-item insert, total {order.total_amount}")
+
+        response = client.post('/api/order/', json={
+            'items': [{'item_id': item_ids[0], 'quantity': 2, 'note': 'No onions'}, {'item_id': item_ids[1]}]
+        })
+        assert response.status_code == 201
+        assert response.get_json()['total'] == 30.3
+        print("✅ /api/order/ delegates to the same service")
+
+        # Invalid carts are rejected without writing anything
+        orders_before = Order.query.count()
+        response = client.post('/api/order/', json={'items': [{'item_id': item_ids[0]}, {'item_id': sold_out.item_id}]})
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Menu item Sold Out is not available'
+        response = client.post('/api/orders', json={'paymentMethod': 'cash', 'items': [{'id': 999999, 'quantity': 1}]})
+        assert response.status_code == 400
+        assert 'not found' in response.get_json()['message']
+        response = client.post('/api/orders', json={'paymentMethod': 'cash', 'items': [{'id': item_ids[0], 'quantity': 0}]})
+        assert response.status_code == 400
+        assert Order.query.count() == orders_before
+        assert OrderItem.query.count() == 7
+        print("✅ Unavailable, unknown and zero-quantity lines are rejected")
+
+
+if __name__ == "__main__":
+    test_order_placement()
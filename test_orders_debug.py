@@ -29,9 +29,9 @@ def debug_orders():
             
             for order in orders:
                 print(f"  Order {order.order_id}: {order.status}, ${order.total_amount}")
-                items = order.order_items.all()
+                items = order.order_items
                 print(f"    Items: {len(items)}")
-                payments = order.payments.all()
+                payments = order.payments
                 print(f"    Payments: {len(payments)}")
                 for payment in payments:
                     print(f"      Payment {payment.payment_id}: {payment.status}, ${payment.amount}")
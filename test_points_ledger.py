@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script to verify point credits are lots that redemptions spend oldest
+first, and that the expiry job expires only unspent points, once, in batches
+Runs against an in-memory database
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from app.extensions import db
+from app.models import User, CustomerLoyalty, PointTransaction, RewardItem
+from app.modules.loyalty.ledger_service import expire_lots
+
+
+def create_customer(email, points=0):
+    user = User(name=email.split('@')[0], email=email, role='customer')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(CustomerLoyalty(user_id=user.user_id, total_points=points, lifetime_points=points))
+    db.session.commit()
+    return user.user_id
+
+
+def credit(user_id, points, days_ago, expires_in):
+    now = datetime.utcnow()
+    lot = PointTransaction(user_id=user_id, points_earned=points, transaction_type='earned',
+                           timestamp=now - timedelta(days=days_ago),
+                           expiry_date=now + timedelta(days=expires_in))
+    db.session.add(lot)
+    db.session.commit()
+    return lot.transaction_id
+
+
+def remaining(*lot_ids):
+    db.session.expire_all()
+    return [db.session.get(PointTransaction, lot_id).points_remaining for lot_id in lot_ids]
+
+
+def balance(user_id):
+    db.session.expire_all()
+    return CustomerLoyalty.query.filter_by(user_id=user_id).one().total_points
+
+
+def test_points_ledger():
+    """FIFO spending, idempotent expiry, batched expiry of many customers"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Points Ledger")
+        print("=" * 50)
+
+        user_id = create_customer('ledger@example.com', points=450)
+        oldest = credit(user_id, 200, days_ago=170, expires_in=10)
+        middle = credit(user_id, 150, days_ago=90, expires_in=90)
+        newest = credit(user_id, 100, days_ago=1, expires_in=179)
+        assert remaining(oldest, middle, newest) == [200, 150, 100]
+        print("✅ Credits start as lots holding all their points")
+
+        reward = RewardItem(name='Free Tea', points_required=250, status='active')
+        db.session.add(reward)
+        db.session.commit()
+        reward_id = reward.reward_id
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'ledger@example.com', 'password': 'password'})
+    response = client.post('/api/loyalty/redeem', json={'reward_id': reward_id})
+    assert response.status_code == 200, response.get_json()
+
+    with app.app_context():
+        assert remaining(oldest, middle, newest) == [0, 100, 100]
+        assert balance(user_id) == 200
+        print("✅ Redeeming spends the oldest lots first")
+
+        # A hundred days on, the oldest and middle lots are past their expiry date
+        later = datetime.utcnow() + timedelta(days=100)
+        report = expire_lots(now=later)
+        assert (report['customers'], report['lots'], report['points']) == (1, 1, 100)
+        assert remaining(oldest, middle, newest) == [0, 0, 100]
+        assert balance(user_id) == 100
+        expired = PointTransaction.query.filter_by(user_id=user_id, transaction_type='expired').all()
+        assert [(t.points_redeemed, t.points_remaining) for t in expired] == [(100, 0)]
+
+        again = expire_lots(now=later)
+        assert (again['customers'], again['points']) == (0, 0)
+        assert balance(user_id) == 100
+        print("✅ Only unspent points expire, and a second run expires nothing")
+
+        # Many customers with several expired lots each, in batches
+        db.session.execute(insert(User), [
+            dict(name=f'bulk-{index}', email=f'bulk-{index}@example.com', password_hash='x', role='customer')
+            for index in range(120)
+        ])
+        user_ids = [row.user_id for row in User.query.filter(User.email.like('bulk-%'))]
+        db.session.execute(insert(CustomerLoyalty), [
+            dict(user_id=bulk_user, total_points=500, lifetime_points=500) for bulk_user in user_ids
+        ])
+        past = datetime.utcnow() - timedelta(days=1)
+        db.session.execute(insert(PointTransaction), [
+            dict(user_id=bulk_user, points_earned=100, transaction_type='earned',
+                 timestamp=past - timedelta(days=200 - lot), expiry_date=past)
+            for bulk_user in user_ids for lot in range(5)
+        ])
+        db.session.commit()
+
+        started = time.perf_counter()
+        report = expire_lots(batch_size=50)
+        assert (report['customers'], report['lots'], report['points'], report['batches']) == (120, 600, 60000, 3)
+        assert {balance(bulk_user) for bulk_user in user_ids[:5]} == {0}
+        assert balance(user_id) == 100
+        print(f"✅ Expired 600 lots of 120 customers in {report['batches']} batches "
+              f"({time.perf_counter() - started:.2f}s)")
+
+    print("\n🎉 Points ledger test passed!")
+
+
+if __name__ == "__main__":
+    test_points_ledger()
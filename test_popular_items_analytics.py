@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the popular-items analytics report revenue at the
+prices lines sold for, keep discontinued items, and page the long tail
+Runs against an in-memory database
+"""
+
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Category, MenuItem, Order, OrderItem
+from app.modules.menu import popularity_service
+from app.modules.order.order_service import place_order
+
+
+def test_popular_items_analytics():
+    """Sales projections use unit prices, include discontinued items and paginate"""
+    app = create_app('testing')
+    app.config['POPULAR_ITEMS_PER_PAGE'] = 2
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Popular Items Analytics")
+        print("=" * 50)
+
+        admin = User(name='Sales Admin', email='sales-admin@example.com', role='admin')
+        admin.set_password('password')
+        customer = User(name='Sales Customer', email='sales@example.com', role='customer')
+        customer.set_password('password')
+        category = Category(name='Grill')
+        db.session.add_all([admin, customer, category])
+        db.session.flush()
+        kofta, tarb, hawawshi = [
+            MenuItem(name=name, price=price, category_id=category.category_id, stock=100)
+            for name, price in (('Kofta', 100), ('Tarb', 150), ('Hawawshi', 60))
+        ]
+        db.session.add_all([kofta, tarb, hawawshi])
+        db.session.commit()
+
+        place_order(customer.user_id, [(kofta.item_id, 3, ''), (tarb.item_id, 1, '')])
+        place_order(customer.user_id, [(hawawshi.item_id, 2, '')])
+
+        # Older sales of kofta at its old price, then a price rise
+        old = Order(user_id=customer.user_id, status='completed', total_amount=160,
+                    order_time=datetime.utcnow() - timedelta(days=40))
+        old.order_items.append(OrderItem(item_id=kofta.item_id, quantity=2, unit_price=80))
+        db.session.add(old)
+        kofta.price = 120
+        tarb.status = 'discontinued'
+        db.session.commit()
+
+        sales = popularity_service.get_item_sales(page=1, per_page=2)
+        assert sales.total == 3 and sales.pages == 2
+        assert [(row.name, row.quantity, float(row.revenue)) for row in sales.items] == [
+            ('Kofta', 5, 460.0), ('Hawawshi', 2, 120.0)]
+        tail = popularity_service.get_item_sales(page=2, per_page=2)
+        assert [(row.name, row.status, float(row.revenue)) for row in tail.items] == [
+            ('Tarb', 'discontinued', 150.0)]
+        print("✅ Revenue uses line prices; discontinued items stay on the board")
+
+        recent = popularity_service.get_item_sales(
+            per_page=10, start_date=datetime.utcnow() - timedelta(days=7), end_date=datetime.utcnow())
+        assert [(row.name, int(row.quantity), float(row.revenue)) for row in recent.items] == [
+            ('Kofta', 3, 300.0), ('Hawawshi', 2, 120.0), ('Tarb', 1, 150.0)]
+        assert popularity_service.get_item_sales_totals() == {
+            'quantity': 8, 'revenue': 730.0, 'top_quantity': 5, 'items': 3}
+        print("✅ Date ranges and totals come from the same projection")
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'sales-admin@example.com', 'password': 'password'})
+    response = client.get('/admin/analytics/popular-items?period=all&page=2')
+    assert response.status_code == 200
+    assert b'Tarb' in response.data and b'Discontinued' in response.data
+    assert b'Kofta' not in response.data
+    print("✅ The analytics page shows one page of items")
+
+    print("\n🎉 Popular items analytics test passed!")
+
+
+if __name__ == "__main__":
+    test_popular_items_analytics()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the popular-items counters follow order placement,
+edits and cancellation, roll their 7- and 30-day windows, and rebuild the same
+Runs against an in-memory database
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Category, MenuItem, Order, OrderItem, ItemPopularity
+from app.modules.menu import popularity_service
+from app.modules.order.order_service import place_order
+
+
+def create_menu():
+    customer = User(name='Popular Customer', email='popular@example.com', role='customer')
+    customer.set_password('password')
+    category = Category(name='Food')
+    db.session.add_all([customer, category])
+    db.session.flush()
+    items = [MenuItem(name=name, description=f'House {name}', price=50,
+                      category_id=category.category_id, stock=100)
+             for name in ('Koshari', 'Falafel', 'Basbousa')]
+    db.session.add_all(items)
+    db.session.commit()
+    return customer.user_id, [item.item_id for item in items]
+
+
+def counters():
+    db.session.expire_all()
+    return {row.item_id: (row.all_time, row.last_7_days, row.last_30_days)
+            for row in ItemPopularity.query.all()}
+
+
+def test_popular_items_counter():
+    """Counters track live orders; reads are one indexed query"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Popular Items Counters")
+        print("=" * 50)
+
+        user_id, (koshari, falafel, basbousa) = create_menu()
+
+        place_order(user_id, [(koshari, 2, ''), (falafel, 1, '')])
+        place_order(user_id, [(falafel, 4, '')])
+        cancelled = place_order(user_id, [(basbousa, 9, '')])
+
+        # An older completed order written through the ORM
+        old = Order(user_id=user_id, status='completed', total_amount=150,
+                    order_time=datetime.utcnow() - timedelta(days=10))
+        old.order_items.append(OrderItem(item_id=koshari, quantity=3, unit_price=50))
+        db.session.add(old)
+        db.session.commit()
+
+        assert counters() == {koshari: (5, 2, 5), falafel: (5, 5, 5), basbousa: (9, 9, 9)}
+        print("✅ Bulk and ORM order lines count all-time and in their windows")
+
+        cancelled.status = 'cancelled'
+        db.session.commit()
+        assert counters()[basbousa] == (0, 0, 0)
+
+        old.order_items[0].quantity = 6
+        db.session.commit()
+        assert counters()[koshari] == (8, 2, 8)
+        print("✅ Cancellations and edited lines adjust the counters")
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        popular = MenuItem.get_popular_items(limit=2)
+        event.remove(db.engine, 'before_cursor_execute', count)
+        assert [item.item_id for item in popular] == [koshari, falafel]
+        assert len(statements) == 1 and 'order_items' not in statements[0]
+        print("✅ The landing page's popular items are one query on the counters")
+
+        weekly = MenuItem.get_popular_items_with_counts(limit=5, days=7)
+        assert [(item.item_id, count) for item, count in weekly] == [(falafel, 5), (koshari, 2)]
+        ranged = MenuItem.get_popular_items_with_counts(
+            limit=5, start_date=datetime.utcnow() - timedelta(days=12), end_date=datetime.utcnow())
+        assert [(item.item_id, int(count)) for item, count in ranged] == [(koshari, 8), (falafel, 5)]
+        print("✅ Rolling windows and date ranges rank the same items")
+
+        maintained = counters()
+
+        # Three weeks on, today's orders leave the 7-day window and the old one the 30-day window
+        later = datetime.utcnow().date() + timedelta(days=21)
+        assert popularity_service.roll_windows(db.session.connection(), later) == 3
+        db.session.commit()
+        assert counters() == {koshari: (8, 0, 2), falafel: (5, 0, 5), basbousa: (0, 0, 0)}
+        print("✅ Rolling the windows forward drops the days that aged out")
+
+        # Rebuilding counts as of today; cancelled-only items get no row
+        assert popularity_service.rebuild_item_popularity() == 2
+        del maintained[basbousa]
+        assert counters() == maintained
+        print("✅ Rebuilding from orders matches the maintained counters")
+
+    client = app.test_client()
+    response = client.get('/')
+    assert response.status_code == 200
+    assert b'Koshari' in response.data
+    print("✅ The landing page shows the popular items")
+
+    print("\n🎉 Popular items counter test passed!")
+
+
+if __name__ == "__main__":
+    test_popular_items_counter()
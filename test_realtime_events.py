@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script to verify realtime updates reach each client once, with bursts
+of updates for the same order coalesced into one message
+"""
+
+import time
+
+from app import create_app
+from app.extensions import db, socketio
+from app.models import User, Order
+from app.websocket_handlers import publish
+
+
+def create_user(email, role):
+    user = User(name=role.title(), email=email, role=role)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.user_id
+
+
+def connect(app, email):
+    """Log a user in and open a Socket.IO test connection for them
+
+    Called outside an app context, so each event sees its own user
+    """
+    client = app.test_client()
+    client.post('/auth/login', data={'email': email, 'password': 'password'})
+    sio = socketio.test_client(app, flask_test_client=client)
+    assert sio.is_connected()
+    sio.get_received()  # connection_status
+    return client, sio
+
+
+def events(sio, name):
+    return [packet['args'][0] for packet in sio.get_received() if packet['name'] == name]
+
+
+def test_realtime_events():
+    """Order updates are deduplicated across rooms and coalesced per order"""
+    app = create_app('testing')
+    app.config['SOCKETIO_COALESCE_SECONDS'] = 0.2
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Realtime Event Bus")
+        print("=" * 50)
+
+        customer_id = create_user('rt-customer@example.com', 'customer')
+        create_user('rt-admin@example.com', 'admin')
+        create_user('rt-waiter@example.com', 'waiter')
+
+        order = Order(user_id=customer_id, status='new', total_amount=50)
+        db.session.add(order)
+        db.session.commit()
+        order_id = order.order_id
+
+    _, customer_sio = connect(app, 'rt-customer@example.com')
+    admin_client, admin_sio = connect(app, 'rt-admin@example.com')
+    _, waiter_sio = connect(app, 'rt-waiter@example.com')
+
+    # The admin is now in both the admin and the order room
+    admin_sio.emit('join_order_room', {'order_id': order_id})
+    assert events(admin_sio, 'joined_order_room')
+
+    # A burst of status changes
+    for status in ('processing', 'completed', 'cancelled'):
+        response = admin_client.patch(f'/api/order/{order_id}/status', json={'status': status})
+        assert response.status_code == 200
+
+    assert events(admin_sio, 'order_status_updated') == []
+    time.sleep(0.5)
+
+    for sio in (admin_sio, waiter_sio, customer_sio):
+        received = events(sio, 'order_status_updated')
+        assert len(received) == 1, received
+        assert received[0]['order_id'] == order_id
+        assert received[0]['old_status'] == 'new'
+        assert received[0]['status'] == received[0]['new_status'] == 'cancelled'
+    print("✅ Burst of updates delivered once to the customer, admin and waiter")
+
+    # Without a window every publish goes out straight away, once per client
+    app.config['SOCKETIO_COALESCE_SECONDS'] = 0
+    with app.app_context():
+        publish('new_order', {'order_id': order_id}, ['admin', f'order_{order_id}', 'admin', None])
+    assert events(admin_sio, 'new_order') == [{'order_id': order_id}]
+    assert events(waiter_sio, 'new_order') == []
+    print("✅ Overlapping rooms deliver a single copy")
+
+    for sio in (admin_sio, waiter_sio, customer_sio):
+        sio.disconnect()
+    with app.app_context():
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    test_realtime_events()
@@ -77,12 +77,7 @@ def test_revenue_metrics():
     start_date = datetime(now.year, now.month, 1)
     end_date = now
     
-    base_query = Order.query.filter(
-        Order.order_time >= start_date,
-        Order.order_time <= end_date
-    )
-    
-    revenue_data = calculate_revenue_metrics(base_query, start_date, end_date, 'month')
+    revenue_data = calculate_revenue_metrics(start_date, end_date, 'month')
     
     print(f"   💰 Total Revenue: {revenue_data['total_revenue']:.2f} EGP")
     print(f"   📋 Total Orders: {revenue_data['total_orders']}")
@@ -96,12 +91,7 @@ def test_customer_analytics():
     start_date = datetime(now.year, now.month, 1)
     end_date = now
     
-    base_query = Order.query.filter(
-        Order.order_time >= start_date,
-        Order.order_time <= end_date
-    )
-    
-    customer_data = calculate_customer_analytics(base_query, start_date, end_date)
+    customer_data = calculate_customer_analytics(start_date, end_date)
     
     print(f"   👥 Unique Customers: {customer_data['unique_customers']}")
     print(f"   📋 Total Orders: {customer_data['total_orders']}")
@@ -114,12 +104,7 @@ def test_product_performance():
     start_date = datetime(now.year, now.month, 1)
     end_date = now
     
-    base_query = Order.query.filter(
-        Order.order_time >= start_date,
-        Order.order_time <= end_date
-    )
-    
-    product_data = calculate_product_performance(base_query, start_date, end_date)
+    product_data = calculate_product_performance(start_date, end_date)
     
     print(f"   🌟 Top Products: {len(product_data['top_products'])}")
     print(f"   📂 Category Performance: {len(product_data['category_performance'])}")
@@ -134,12 +119,7 @@ def test_time_analytics():
     start_date = datetime(now.year, now.month, 1)
     end_date = now
     
-    base_query = Order.query.filter(
-        Order.order_time >= start_date,
-        Order.order_time <= end_date
-    )
-    
-    time_data = calculate_time_analytics(base_query, start_date, end_date, 'month')
+    time_data = calculate_time_analytics(start_date, end_date, 'month')
     
     print(f"   🕐 Hourly Distribution: {len(time_data['hourly_distribution'])} hours")
     
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test script to verify system settings are served from the cached snapshot
+and every worker picks up changes through the settings version
+"""
+
+import os
+import tempfile
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import User, SystemSettings
+from config import config, TestingConfig
+
+
+class SharedDatabaseConfig(TestingConfig):
+    """File database shared by two app instances, standing in for two workers"""
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'settings.db')
+
+
+def test_settings_cache():
+    """Settings reads cost one version lookup per request; writes reach other workers"""
+    config['testing_shared'] = SharedDatabaseConfig
+    app = create_app('testing_shared')
+    other_worker = create_app('testing_shared')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing System Settings Cache")
+        print("=" * 50)
+
+        SystemSettings.set_setting('restaurant_name', 'Cairo Kitchen')
+        SystemSettings.set_setting('points_per_currency', '3', setting_type='integer')
+        SystemSettings.set_setting('loyalty_enabled', 'False', setting_type='boolean')
+        SystemSettings.set_setting('tax_rate', '', setting_type='float')
+        engine = db.engine
+
+    statements = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.test_request_context():
+        assert SystemSettings.get_setting('restaurant_name') == 'Cairo Kitchen'
+        assert SystemSettings.get_setting('points_per_currency') == 3
+        assert SystemSettings.get_setting('loyalty_enabled', True) is False
+        assert SystemSettings.get_setting('tax_rate', 14.0) == 14.0
+        assert SystemSettings.get_setting('missing', 'x') == 'x'
+
+    statements.clear()
+    with app.test_request_context():
+        for _ in range(10):
+            SystemSettings.get_setting('restaurant_name')
+            SystemSettings.get_setting('points_per_currency')
+    assert len(statements) == 1, statements
+    assert 'cache_versions' in statements[0]
+    print("✅ Twenty reads in a request cost one version lookup")
+
+    # A write in the same request is visible straight away
+    with app.test_request_context():
+        SystemSettings.get_setting('restaurant_name')
+        SystemSettings.set_setting('restaurant_name', 'Nile Kitchen')
+        assert SystemSettings.get_setting('restaurant_name') == 'Nile Kitchen'
+
+    # ...and a write on another worker is picked up on the next request
+    with other_worker.test_request_context():
+        assert SystemSettings.get_setting('points_per_currency') == 3
+        SystemSettings.set_setting('points_per_currency', '5', setting_type='integer')
+    with app.test_request_context():
+        assert SystemSettings.get_setting('points_per_currency') == 5
+    print("✅ Writes invalidate every worker's snapshot")
+
+    # The admin settings form saves typed values
+    with app.app_context():
+        admin = User(name='Settings Admin', email='settings-admin@example.com', role='admin')
+        admin.set_password('password')
+        db.session.add(admin)
+        db.session.commit()
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'settings-admin@example.com', 'password': 'password'})
+    response = client.post('/admin/system-settings', data={
+        'restaurant_name': 'Delta Grill',
+        'points_per_currency': '4',
+        'loyalty_enabled': 'on'
+    })
+    assert response.status_code == 200
+    with app.test_request_context():
+        assert SystemSettings.get_setting('restaurant_name') == 'Delta Grill'
+        assert SystemSettings.get_setting('points_per_currency') == 4
+        assert SystemSettings.get_setting('loyalty_enabled') is True
+    print("✅ Admin settings form saves typed settings")
+
+    with app.app_context():
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    test_settings_cache()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script to verify Socket.IO connections authorise from the cached
+identity, that logout or a role change invalidates it on every worker,
+and that an identity is dropped with its user's last connection
+"""
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db, socketio
+from app.models import User, Order, CacheVersion
+
+
+def create_user(email, role):
+    user = User(name=role.title(), email=email, role=role)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.user_id
+
+
+def login(app, email):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': email, 'password': 'password'})
+    return client
+
+
+def connect(app, client):
+    sio = socketio.test_client(app, flask_test_client=client)
+    if not sio.is_connected():
+        return sio, []
+    received = sio.get_received()
+    return sio, [packet['args'][0] for packet in received if packet['name'] == 'connection_status']
+
+
+def test_socket_identity():
+    """Reconnects and room joins do not query users; logout and role changes disconnect"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Socket.IO Identity Cache")
+        print("=" * 50)
+
+        customer_id = create_user('id-customer@example.com', 'customer')
+        other_id = create_user('id-other@example.com', 'customer')
+        orders = [Order(user_id=customer_id, status='new', total_amount=10),
+                  Order(user_id=other_id, status='new', total_amount=10)]
+        db.session.add_all(orders)
+        db.session.commit()
+        own_order, other_order = (order.order_id for order in orders)
+        engine = db.engine
+
+    statements = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = login(app, 'id-customer@example.com')
+
+    statements.clear()
+    sio, status = connect(app, client)
+    assert status[0]['role'] == 'customer'
+    assert len([s for s in statements if 'FROM users' in s]) == 1
+
+    # Reconnects read the cache while the user has another tab open
+    tab, _ = connect(app, client)
+    statements.clear()
+    for _ in range(5):
+        sio.disconnect()
+        sio, status = connect(app, client)
+        assert status[0]['user_id'] == customer_id
+    assert statements == []
+    print("✅ Reconnect storm served without queries")
+
+    # The identity goes with the user's last connection
+    identities = app.extensions['socket_identity']['identities']
+    tab.disconnect()
+    assert customer_id in identities
+    other_client = login(app, 'id-other@example.com')
+    other, _ = connect(app, other_client)
+    assert other_id in identities
+    other.disconnect()
+    assert other_id not in identities
+    print("✅ Identities are evicted when their last connection closes")
+
+    statements.clear()
+    sio.emit('join_order_room', {'order_id': own_order})
+    assert [p['name'] for p in sio.get_received()] == ['joined_order_room']
+    assert statements == []
+
+    sio.emit('join_order_room', {'order_id': other_order})
+    assert [p['args'][0] for p in sio.get_received()] == [{'message': 'Permission denied'}]
+    print("✅ Order rooms authorised from the identity")
+
+    # Orders placed after connecting are allowed straight away
+    with app.app_context():
+        order = Order(user_id=customer_id, status='new', total_amount=10)
+        db.session.add(order)
+        db.session.commit()
+        new_order = order.order_id
+    statements.clear()
+    sio.emit('join_order_room', {'order_id': new_order})
+    assert [p['name'] for p in sio.get_received()] == ['joined_order_room']
+    assert statements == []
+
+    # A role change disconnects, and the reconnect picks up the new role
+    with app.app_context():
+        db.session.get(User, customer_id).role = 'waiter'
+        db.session.commit()
+    assert not sio.is_connected()
+    sio, status = connect(app, client)
+    assert status[0]['role'] == 'waiter'
+    print("✅ Role change invalidates the identity")
+
+    # A change committed by another worker is picked up once the TTL passes
+    with app.app_context():
+        CacheVersion.bump(db.session.connection(), f'socket_identity:{customer_id}')
+        db.session.commit()
+    sio.emit('join_order_room', {'order_id': own_order})
+    assert [p['name'] for p in sio.get_received()] == ['joined_order_room']
+    app.config['SOCKET_IDENTITY_TTL_SECONDS'] = 0
+    sio.emit('join_order_room', {'order_id': own_order})
+    assert not sio.is_connected()
+    sio, status = connect(app, client)
+    assert status[0]['role'] == 'waiter'
+    statements.clear()
+    sio.emit('join_order_room', {'order_id': own_order})
+    assert [p['name'] for p in sio.get_received()] == ['joined_order_room']
+    assert not [s for s in statements if 'FROM users' in s]
+    app.config['SOCKET_IDENTITY_TTL_SECONDS'] = 30
+    print("✅ Other workers' changes disconnect stale connections after the TTL")
+
+    # Logout disconnects and the old session can no longer connect
+    client.get('/auth/logout')
+    assert not sio.is_connected()
+    sio, status = connect(app, client)
+    assert status == []
+    assert customer_id not in identities
+    print("✅ Logout invalidates the identity")
+
+    with app.app_context():
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    test_socket_identity()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script to verify Socket.IO events reach clients through the message
+queue, as they do when several workers share Redis
+"""
+
+import time
+
+import socketio as python_socketio
+
+from app import create_app
+from app.extensions import db, socketio
+from app.models import User
+from app.socketio_queue import InMemoryManager, create_client_manager
+from config import config, TestingConfig
+
+
+class QueueTestingConfig(TestingConfig):
+    SOCKETIO_MESSAGE_QUEUE = 'memory'
+    SOCKETIO_CHANNEL = 'test-socketio-queue'
+
+
+config['testing_queue'] = QueueTestingConfig
+
+
+def connect_waiter(app):
+    """Log a waiter in and open a Socket.IO test connection for them"""
+    waiter = User(name='Queue Waiter', email='queue-waiter@example.com', role='waiter')
+    waiter.set_password('password')
+    db.session.add(waiter)
+    db.session.commit()
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'queue-waiter@example.com', 'password': 'password'})
+    sio = socketio.test_client(app, flask_test_client=client)
+    assert sio.is_connected()
+    sio.get_received()  # connection_status
+    return sio
+
+
+class Worker:
+    """A Socket.IO server with one connected client in the given room,
+    recording what that client is sent"""
+
+    def __init__(self, server, room):
+        self.server = server
+        self.received = []
+        self.server._emit_internal = lambda eio_sid, event, data, namespace=None, id=None: \
+            self.received.append((event, data))
+
+        # What the first client connection would do
+        self.server.manager_initialized = True
+        self.server.manager.initialize()
+        sid = self.server.manager.connect('eio-' + room, '/')
+        self.server.manager.enter_room(sid, '/', room)
+
+    def wait_for(self, event, count=1, timeout=2):
+        """Get the payloads of `event` once `count` of them have arrived"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            matches = [data for name, data in self.received if name == event]
+            if len(matches) >= count:
+                return matches
+            time.sleep(0.02)
+        return [data for name, data in self.received if name == event]
+
+
+def test_message_queue():
+    """Emits from one worker reach clients connected to another"""
+    app = create_app('testing_queue')
+
+    with app.app_context():
+        print("🧪 Testing Socket.IO Message Queue")
+        print("=" * 50)
+
+        assert isinstance(socketio.server.manager, InMemoryManager)
+        this_worker = Worker(socketio.server, 'waiter')
+        other_worker = Worker(
+            python_socketio.Server(client_manager=create_client_manager(app)), 'customer'
+        )
+
+        # This app's emits reach the other worker's clients
+        socketio.emit('order_status_update', {'order_id': 7, 'status': 'preparing'}, room='customer')
+        assert other_worker.wait_for('order_status_update') == [{'order_id': 7, 'status': 'preparing'}]
+        print("✅ Event delivered to another worker")
+
+        # ...and the other worker's emits reach this app's clients
+        other_worker.server.emit('new_order', {'order_id': 8}, room='waiter')
+        assert this_worker.wait_for('new_order') == [{'order_id': 8}]
+        print("✅ Event from another worker delivered")
+
+        # Rooms are still respected across workers
+        time.sleep(0.1)
+        assert not [name for name, _ in this_worker.received if name == 'order_status_update']
+        assert not [name for name, _ in other_worker.received if name == 'new_order']
+        print("✅ Events only reach their rooms")
+
+        # A write-only emitter, e.g. a script or job outside the workers
+        InMemoryManager(channel='test-socketio-queue', write_only=True).emit(
+            'new_order', {'order_id': 9}, room='waiter'
+        )
+        assert this_worker.wait_for('new_order', count=2) == [{'order_id': 8}, {'order_id': 9}]
+        print("✅ Write-only emitter delivered")
+
+
+def test_single_process():
+    """Without a queue, emits are delivered in-process"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        assert not isinstance(socketio.server.manager, InMemoryManager)
+        sio = connect_waiter(app)
+
+        socketio.emit('new_order', {'order_id': 9}, room='waiter')
+        received = sio.get_received()
+        assert [packet['args'][0] for packet in received if packet['name'] == 'new_order'] == [{'order_id': 9}]
+        print("✅ Single-process mode delivers without a queue")
+
+        sio.disconnect()
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    test_message_queue()
+    test_single_process()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Test script to verify orders reserve and release menu item stock,
+sold-out items leave the menu, and concurrent checkouts never oversell
+"""
+
+import os
+import tempfile
+import threading
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Category, MenuItem, Order, OrderItem
+from app.modules.menu.catalog_service import get_catalog_version
+from app.modules.order.order_service import place_order, OutOfStock
+from config import config, TestingConfig
+
+
+def create_menu(stock):
+    """Create a customer and a menu item with the given stock"""
+    customer = User(name='Stock Customer', email='stock@example.com', role='customer')
+    customer.set_password('password')
+    category = Category(name='Food')
+    db.session.add_all([customer, category])
+    db.session.flush()
+    item = MenuItem(name='Shawarma', price=80, category_id=category.category_id, stock=stock)
+    db.session.add(item)
+    db.session.commit()
+    return customer.user_id, item.item_id
+
+
+def item_state(item_id):
+    db.session.expire_all()
+    item = db.session.get(MenuItem, item_id)
+    return item.stock, item.status
+
+
+def test_stock_reservation():
+    """Orders, edits and cancellations move stock; sold-out items leave the menu"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing Stock Reservation")
+        print("=" * 50)
+
+        user_id, item_id = create_menu(stock=5)
+        admin = User(name='Stock Admin', email='stock-admin@example.com', role='admin')
+        admin.set_password('password')
+        db.session.add(admin)
+        db.session.commit()
+
+        first = place_order(user_id, [(item_id, 3, '')])
+        assert item_state(item_id) == (2, 'available')
+
+        try:
+            place_order(user_id, [(item_id, 2, ''), (item_id, 1, '')])
+            assert False, "Order should not exceed stock"
+        except OutOfStock as e:
+            assert str(e) == 'Not enough stock for Shawarma'
+        assert item_state(item_id) == (2, 'available')
+        assert Order.query.count() == 1
+        print("✅ Orders reserve stock and cannot exceed it")
+
+        client = app.test_client()
+        second = place_order(user_id, [(item_id, 2, '')])
+        assert item_state(item_id) == (0, 'out_of_stock')
+        assert client.get('/api/menu-items').get_json()['data'] == []
+        print("✅ Sold-out items become out_of_stock and leave the menu")
+
+        # Cancelling gives the stock back
+        second.status = 'cancelled'
+        db.session.commit()
+        assert item_state(item_id) == (2, 'available')
+        assert [item['id'] for item in client.get('/api/menu-items').get_json()['data']] == [item_id]
+        print("✅ Cancelled orders release their stock")
+
+        # Editing an order reserves only the difference
+        client.post('/auth/login', data={'email': 'stock-admin@example.com', 'password': 'password'})
+        response = client.put(f'/api/order/{first.order_id}', json={'items': [{'item_id': item_id, 'quantity': 4}]})
+        assert response.status_code == 200, response.get_json()
+        assert item_state(item_id) == (1, 'available')
+        response = client.put(f'/api/order/{first.order_id}', json={'items': [{'item_id': item_id, 'quantity': 9}]})
+        assert response.status_code == 400
+        assert item_state(item_id) == (1, 'available')
+        print("✅ Order edits adjust stock by the difference")
+
+        # Deleting an order gives its stock back too
+        db.session.delete(db.session.get(Order, first.order_id))
+        db.session.commit()
+        assert item_state(item_id) == (5, 'available')
+        print("✅ Deleted orders release their stock")
+
+        # Databases without UPDATE ... RETURNING undo a partial batch too
+        other = MenuItem(name='Hummus', price=30, category_id=db.session.get(MenuItem, item_id).category_id, stock=4)
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.item_id
+        dialect = db.session.connection().dialect
+        dialect.update_returning = False
+        try:
+            place_order(user_id, [(other_id, 1, ''), (item_id, 6, '')])
+            assert False, "Order should not exceed stock"
+        except OutOfStock as e:
+            assert str(e) == 'Not enough stock for Shawarma'
+        finally:
+            dialect.update_returning = True
+        assert item_state(other_id) == (4, 'available') and item_state(item_id) == (5, 'available')
+        print("✅ A short batch is rolled back whole without RETURNING")
+
+        # Orders placed before stock was reserved give none back
+        legacy = Order(user_id=user_id, total_amount=80, stock_reserved=False)
+        db.session.add(legacy)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=legacy.order_id, item_id=item_id, quantity=2, unit_price=80))
+        db.session.commit()
+        assert item_state(item_id) == (5, 'available')
+        legacy.status = 'cancelled'
+        db.session.commit()
+        assert item_state(item_id) == (5, 'available')
+
+        app.config['MENU_STOCK_TRACKING'] = False
+        untracked_order = place_order(user_id, [(item_id, 1, '')])
+        assert untracked_order.stock_reserved is False
+        app.config['MENU_STOCK_TRACKING'] = True
+        untracked_order.status = 'rejected'
+        db.session.commit()
+        assert item_state(item_id) == (5, 'available')
+        print("✅ Orders that reserved no stock release none")
+
+        # Items without a stock count are not tracked and never sell out
+        untracked = MenuItem(name='Tea', price=20, category_id=db.session.get(MenuItem, item_id).category_id)
+        db.session.add(untracked)
+        db.session.commit()
+        untracked_id = untracked.item_id
+        version = get_catalog_version()
+        order = place_order(user_id, [(untracked_id, 50, '')])
+        assert item_state(untracked_id) == (None, 'available')
+        order.status = 'cancelled'
+        db.session.commit()
+        assert item_state(untracked_id) == (None, 'available')
+        assert get_catalog_version() == version
+        print("✅ Untracked items can always be ordered and leave the catalog version alone")
+
+        # A mixed order bumps the version once for its tracked item, with or without RETURNING
+        dialect = db.session.connection().dialect
+        for returning in (True, False):
+            dialect.update_returning = returning
+            try:
+                version = get_catalog_version()
+                place_order(user_id, [(untracked_id, 2, ''), (item_id, 1, '')])
+            finally:
+                dialect.update_returning = True
+            assert get_catalog_version() == version + 1
+        assert item_state(untracked_id) == (None, 'available') and item_state(item_id) == (3, 'available')
+
+        # New items added with no stock start sold out; a blank count leaves them untracked
+        category_id = db.session.get(MenuItem, item_id).category_id
+        for name, stock in (('Kofta', '0'), ('Falafel', '')):
+            client.post('/admin/menu/items/add', data={
+                'name': name, 'price': '40', 'category_id': str(category_id), 'stock': stock, 'status': 'available'
+            })
+        assert (MenuItem.query.filter_by(name='Kofta').one().stock,
+                MenuItem.query.filter_by(name='Kofta').one().status) == (0, 'out_of_stock')
+        assert MenuItem.query.filter_by(name='Falafel').one().stock is None
+        print("✅ Items created with zero stock are out_of_stock")
+
+
+class ConcurrentTestingConfig(TestingConfig):
+    """File database so each worker thread gets its own connection"""
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stock.db')
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+
+def test_concurrent_checkout():
+    """Twenty concurrent one-item checkouts against a stock of ten sell exactly ten"""
+    config['testing_concurrent'] = ConcurrentTestingConfig
+    app = create_app('testing_concurrent')
+
+    with app.app_context():
+        db.create_all()
+        user_id, item_id = create_menu(stock=10)
+
+    results = []
+
+    def checkout():
+        with app.app_context():
+            try:
+                place_order(user_id, [(item_id, 1, '')])
+                results.append('placed')
+            except OutOfStock:
+                results.append('sold out')
+
+    threads = [threading.Thread(target=checkout) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        assert results.count('placed') == 10, results
+        assert Order.query.count() == 10
+        assert item_state(item_id) == (0, 'out_of_stock')
+        db.drop_all()
+    print(f"✅ Concurrent checkouts: {results.count('placed')} placed, {results.count('sold out')} sold out")
+
+
+if __name__ == "__main__":
+    test_stock_reservation()
+    test_concurrent_checkout()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test script to verify Flask-Login users are served from the user cache,
+and that profile edits and deactivation still save and invalidate it
+"""
+
+import time
+
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.models import User
+from app.user_cache import UserCache
+
+
+def create_user(email, role):
+    user = User(name=role.title(), email=email, role=role)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.user_id
+
+
+def test_user_cache():
+    """Authenticated requests reuse the cached user; writes invalidate it"""
+    app = create_app('testing')
+
+    with app.app_context():
+        db.create_all()
+        print("🧪 Testing User Cache")
+        print("=" * 50)
+
+        create_user('cache-admin@example.com', 'admin')
+        customer_id = create_user('cache-customer@example.com', 'customer')
+        engine = db.engine
+
+    statements = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    admin = app.test_client()
+    admin.post('/auth/login', data={'email': 'cache-admin@example.com', 'password': 'password'})
+
+    statements.clear()
+    for _ in range(5):
+        assert admin.get('/admin/api/cache-stats').status_code == 200
+    assert not [s for s in statements if 'FROM users' in s], statements
+
+    stats = admin.get('/admin/api/cache-stats').get_json()['user_cache']
+    assert stats['hits'] >= 5 and 0 < stats['hit_rate'] <= 1
+    print(f"✅ Repeated requests served from the cache (hit rate {stats['hit_rate']})")
+
+    # Edits through the cached current_user are saved and drop the entry
+    customer = app.test_client()
+    customer.post('/auth/login', data={'email': 'cache-customer@example.com', 'password': 'password'})
+    customer.get('/customer/profile/edit')
+    response = customer.post('/customer/profile/edit', data={
+        'name': 'Renamed Customer',
+        'email': 'cache-customer@example.com',
+        'phone': '0100'
+    })
+    assert response.status_code == 302
+
+    statements.clear()
+    page = customer.get('/customer/profile/edit')
+    assert b'Renamed Customer' in page.data
+    assert [s for s in statements if 'FROM users' in s], "Edited user should be reloaded"
+    print("✅ Profile edits save and invalidate the cached user")
+
+    customer.post('/customer/settings', data={'deactivate_account': '1', 'deactivate_password': 'password'})
+    with app.app_context():
+        assert db.session.get(User, customer_id).is_active is False
+    print("✅ Deactivation saves through the cached user")
+
+    with app.app_context():
+        db.drop_all()
+
+
+def test_cache_bounds():
+    """Entries expire after the TTL and the least recently used are evicted"""
+    cache = UserCache(size=2, ttl=60)
+    cache.put(1, {'user_id': 1})
+    cache.put(2, {'user_id': 2})
+    assert cache.get(1) == {'user_id': 1}
+    cache.put(3, {'user_id': 3})
+    assert cache.get(2) is None
+    assert cache.get(1) and cache.get(3)
+    assert cache.stats()['size'] == 2
+
+    cache = UserCache(size=2, ttl=0.01)
+    cache.put(1, {'user_id': 1})
+    time.sleep(0.02)
+    assert cache.get(1) is None
+    assert cache.stats()['misses'] == 1
+    print("✅ Cache is bounded and expires entries")
+
+
+if __name__ == "__main__":
+    test_user_cache()
+    test_cache_bounds()